@@ -12,6 +12,7 @@ setup(
         "requests",
         "urllib3",
         "fastapi_utils",
+        "orjson",
         # s2_inference:
         "clip-marqo==1.0.2",
         "more_itertools",
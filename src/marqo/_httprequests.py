@@ -1,11 +1,11 @@
 import copy
-import json
 import pprint
 from http import HTTPStatus
 from typing import Any, Callable, Dict, List, Optional, Union
 import requests
 from json.decoder import JSONDecodeError
 from marqo.config import Config
+from marqo.tensor_search import serialization
 from marqo.errors import (
     MarqoWebError,
     BackendCommunicationError,
@@ -66,7 +66,7 @@ class HttpRequests:
                         request_path,
                         timeout=self.config.timeout,
                         headers=req_headers,
-                        data=json.dumps(body) if body else None,
+                        data=serialization.dumps(body) if body else None,
                         verify=to_verify
                     )
                 return self.__validate(response)
@@ -116,7 +116,7 @@ class HttpRequests:
     ) -> Any:
         if request.content == b'':
             return request
-        return request.json()
+        return serialization.loads(request.content)
 
     @staticmethod
     def __validate(
@@ -180,6 +180,16 @@ class ModelNotInCacheError(__InvalidRequestError):
     code = "model_not_in_cache"
     status_code = HTTPStatus.NOT_FOUND
 
+
+class TaskNotFoundError(__InvalidRequestError):
+    code = "task_not_found"
+    status_code = HTTPStatus.NOT_FOUND
+
+
+class IngestJobNotFoundError(__InvalidRequestError):
+    code = "ingest_job_not_found"
+    status_code = HTTPStatus.NOT_FOUND
+
 # ---MARQO INTERNAL ERROR---
 
 
@@ -1,6 +1,8 @@
 # from torch import FloatTensor
 # from typing import Any, Dict, List, Optional, Union
+import io
 import os
+import time
 import PIL.Image
 import validators
 import requests
@@ -80,13 +82,16 @@ def format_and_load_CLIP_images(images: List[Union[str, ndarray, ImageType]], im
     return results
 
 
-def load_image_from_path(image_path: str, image_download_headers: dict, timeout=3) -> ImageType:
+def load_image_from_path(image_path: str, image_download_headers: dict, timeout=3,
+                         deadline: Optional[float] = None) -> ImageType:
     """Loads an image into PIL from a string path that is either local or a url
 
     Args:
         image_path (str): Local or remote path to image.
         image_download_headers (dict): header for the image download
         timeout (number): timeout (in seconds)
+        deadline (float): if given, the time.monotonic() time by which a url's image must be
+            fully downloaded. The image is then downloaded in full before it is returned.
     Raises:
         ValueError: If the local path is invalid, and is not a url
         UnidentifiedImageError: If the image is irretrievable or unprocessable.
@@ -97,6 +102,11 @@ def load_image_from_path(image_path: str, image_download_headers: dict, timeout=
     if os.path.isfile(image_path):
         img = Image.open(image_path)
     elif validators.url(image_path):
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+            if timeout <= 0:
+                raise UnidentifiedImageError(
+                    f"image url `{image_path}` wasn't downloaded, as its download deadline had passed")
         try:
             resp = requests.get(image_path, stream=True, timeout=timeout, headers=image_download_headers)
         except (requests.exceptions.ConnectTimeout, requests.exceptions.ConnectionError,
@@ -108,13 +118,34 @@ def load_image_from_path(image_path: str, image_download_headers: dict, timeout=
                 f"\nConnection error type: `{e.__class__.__name__}`")
         if not resp.ok:
             raise UnidentifiedImageError(f"image url `{image_path}` returned {resp.status_code}. Reason: {resp.reason}")
-        img = Image.open(resp.raw)
+        if deadline is None:
+            img = Image.open(resp.raw)
+        else:
+            img = Image.open(io.BytesIO(_read_before_deadline(resp, image_path, deadline)))
     else:
         raise UnidentifiedImageError(f"input str of `{image_path}` is not a local file or a valid url")
 
     return img
 
 
+def _read_before_deadline(resp: requests.Response, image_path: str, deadline: float) -> bytes:
+    """Reads the body of a streamed response. Each read is bounded by the request's read
+    timeout, so a body that trickles in is only noticed between reads."""
+    content = bytearray()
+    try:
+        for chunk in resp.iter_content(chunk_size=64 * 1024):
+            content.extend(chunk)
+            if time.monotonic() > deadline:
+                raise UnidentifiedImageError(
+                    f"image url `{image_path}` wasn't downloaded before its download deadline")
+    except requests.exceptions.RequestException as e:
+        raise UnidentifiedImageError(
+            f"image url `{image_path}` couldn't be downloaded. Connection error type: `{e.__class__.__name__}`")
+    finally:
+        resp.close()
+    return bytes(content)
+
+
 def format_and_load_CLIP_image(image: Union[str, ndarray, ImageType], image_download_headers: dict) -> ImageType:
     """standardizes the input to be a PIL image
 
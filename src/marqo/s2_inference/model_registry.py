@@ -621,6 +621,17 @@ def _get_sbert_onnx_properties() -> Dict:
     return SBERT_ONNX_MODEL_PROPERTIES
 
 
+def _get_sbert_onnx_int8_properties() -> Dict:
+    # int8 dynamically quantized variants of the sbert onnx models, e.g. "onnx-int8/all-MiniLM-L6-v2".
+    # The quantized model is created from the exported onnx model on first load and cached on disk.
+    SBERT_ONNX_INT8_MODEL_PROPERTIES = {
+        model_name.replace("onnx/", "onnx-int8/", 1): {**properties, "quantize": "int8",
+                                                      "notes": "int8 dynamically quantized"}
+        for model_name, properties in _get_sbert_onnx_properties().items()
+    }
+    return SBERT_ONNX_INT8_MODEL_PROPERTIES
+
+
 def _get_sbert_test_properties() -> Dict:
     TEST_MODEL_PROPERTIES = {
             "sentence-transformers/test":
@@ -1641,6 +1652,18 @@ def _get_onnx_clip_properties() -> Dict:
     return ONNX_CLIP_MODEL_PROPERTIES
 
 
+def _get_onnx_clip_int8_properties() -> Dict:
+    # int8 dynamically quantized text encoders of the onnx32 clip models, e.g. "onnx32-int8/openai/ViT-L/14".
+    # "name" still points to the onnx32 model, as CLIP_ONNX uses it to find the model files.
+    ONNX_CLIP_INT8_MODEL_PROPERTIES = {
+        model_name.replace("onnx32/", "onnx32-int8/", 1): {**properties, "quantize": "int8",
+                                                          "note": f"{properties.get('note', model_name)}, with an int8 dynamically quantized text encoder"}
+        for model_name, properties in _get_onnx_clip_properties().items()
+        if model_name.startswith("onnx32/")
+    }
+    return ONNX_CLIP_INT8_MODEL_PROPERTIES
+
+
 def _get_fp16_clip_properties() -> Dict:
     FP16_CLIP_MODEL_PROPERTIES = {
         "fp16/ViT-L/14": {
@@ -1714,6 +1737,7 @@ def load_model_properties() -> Dict:
     sbert_model_properties.update({k.split('/')[-1]:v for k,v in sbert_model_properties.items()})
 
     sbert_onnx_model_properties = _get_sbert_onnx_properties()
+    sbert_onnx_int8_model_properties = _get_sbert_onnx_int8_properties()
 
     clip_model_properties = _get_clip_properties()
     test_model_properties = _get_sbert_test_properties()
@@ -1721,6 +1745,7 @@ def load_model_properties() -> Dict:
     hf_model_properties = _get_hf_properties()
     open_clip_model_properties = _get_open_clip_properties()
     onnx_clip_model_properties = _get_onnx_clip_properties()
+    onnx_clip_int8_model_properties = _get_onnx_clip_int8_properties()
     multilingual_clip_model_properties = get_multilingual_clip_properties()
     fp16_clip_model_properties = _get_fp16_clip_properties()
 
@@ -1729,10 +1754,12 @@ def load_model_properties() -> Dict:
     model_properties.update(sbert_model_properties)
     model_properties.update(test_model_properties)
     model_properties.update(sbert_onnx_model_properties)
+    model_properties.update(sbert_onnx_int8_model_properties)
     model_properties.update(random_model_properties)
     model_properties.update(hf_model_properties)
     model_properties.update(open_clip_model_properties)
     model_properties.update(onnx_clip_model_properties)
+    model_properties.update(onnx_clip_int8_model_properties)
     model_properties.update(multilingual_clip_model_properties)
     model_properties.update(fp16_clip_model_properties)
 
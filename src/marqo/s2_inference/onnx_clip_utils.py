@@ -17,7 +17,8 @@ from torchvision.transforms import Compose, Resize, CenterCrop, ToTensor, Normal
 import marqo.s2_inference.model_registry as model_registry
 from zipfile import ZipFile
 from huggingface_hub.utils import RevisionNotFoundError,RepositoryNotFoundError, EntryNotFoundError, LocalEntryNotFoundError
-from marqo.s2_inference.errors import ModelDownloadError
+from marqo.s2_inference.errors import ModelDownloadError, InvalidModelPropertiesError
+from marqo.s2_inference.onnx_quantization import quantize_onnx_model, validate_quantization
 
 # Loading shared functions from clip_utils.py. This part should be decoupled from models in the future
 from marqo.s2_inference.clip_utils import get_allowed_image_types, format_and_load_CLIP_image, \
@@ -72,6 +73,13 @@ class CLIP_ONNX(object):
         self.visual_type = np.float16 if self.onnx_type == "onnx16" else np.float32
         self.textual_type = np.int64 if self.source == "open_clip" else np.int32
 
+        # optional dynamic quantization of the text encoder, e.g. 'int8'
+        model_properties = kwargs.get("model_properties") or dict()
+        self.quantize = validate_quantization(model_properties.get("quantize", None))
+        if self.quantize is not None and self.onnx_type != "onnx32":
+            raise InvalidModelPropertiesError(
+                f"quantize=`{self.quantize}` is only supported for onnx32 models. Received model `{self.model_name}`")
+
 
     def load(self):
         self.load_onnx()
@@ -175,6 +183,8 @@ class CLIP_ONNX(object):
 
         self.visual_file = self.download_model(self.model_info["repo_id"], self.model_info["visual_file"])
         self.textual_file = self.download_model(self.model_info["repo_id"], self.model_info["textual_file"])
+        if self.quantize is not None:
+            self.textual_file = quantize_onnx_model(self.textual_file, quantize=self.quantize)
         self.visual_session = ort.InferenceSession(self.visual_file, providers=self.provider)
         self.textual_session = ort.InferenceSession(self.textual_file, providers=self.provider)
 
@@ -0,0 +1,81 @@
+"""Dynamic quantization of ONNX models.
+
+Quantization is done once per source model and written to disk next to the
+other cached ONNX models, so later loads of the same model reuse it.
+"""
+import os
+from pathlib import Path
+
+from onnxruntime.quantization import quantize_dynamic, QuantType
+
+from marqo.s2_inference.types import *
+from marqo.s2_inference.errors import InvalidModelPropertiesError
+from marqo.s2_inference.configs import ModelCache
+from marqo.s2_inference.logger import get_logger
+
+logger = get_logger(__name__)
+
+# maps the `quantize` model property to the onnxruntime weight type
+QUANTIZATION_WEIGHT_TYPES = {
+    "int8": QuantType.QInt8,
+}
+
+
+def validate_quantization(quantize: Optional[str]) -> Optional[str]:
+    """checks the `quantize` model property is supported
+
+    Returns:
+        quantize, if it is None or a supported value
+
+    Raises:
+        InvalidModelPropertiesError if the quantization type is unknown
+    """
+    if quantize is None:
+        return quantize
+    if quantize not in QUANTIZATION_WEIGHT_TYPES:
+        raise InvalidModelPropertiesError(
+            f"model_properties has an unsupported value quantize=`{quantize}`. "
+            f"Supported values: {list(QUANTIZATION_WEIGHT_TYPES)}")
+    return quantize
+
+
+def get_quantized_model_path(model_path: str, quantize: str, output_folder: Optional[str] = None) -> str:
+    """returns where the quantized version of model_path is stored on disk
+    """
+    if output_folder is None:
+        output_folder = ModelCache.onnx_cache_path
+    model_stem = os.path.splitext(os.path.basename(model_path))[0]
+    return os.path.join(output_folder, f"{model_stem}-{quantize}.onnx")
+
+
+def quantize_onnx_model(model_path: str, quantize: str, output_folder: Optional[str] = None,
+                        enable_overwrite: bool = False) -> str:
+    """dynamically quantizes the weights of an onnx model, caching the result on disk
+
+    Args:
+        model_path (str): path to the fp32 onnx model
+        quantize (str): the quantization type, e.g. 'int8'
+        output_folder (str, optional): where to store the quantized model. Defaults to the onnx cache.
+        enable_overwrite (bool, optional): re-quantize even if a cached model exists.
+
+    Returns:
+        str: path to the quantized model
+    """
+    validate_quantization(quantize)
+    quantized_path = get_quantized_model_path(model_path, quantize, output_folder)
+
+    if os.path.exists(quantized_path) and not enable_overwrite:
+        logger.info(f"loading cached quantized model from {quantized_path}")
+        return quantized_path
+
+    Path(os.path.dirname(quantized_path)).mkdir(parents=True, exist_ok=True)
+
+    # write to a temporary file first so a concurrent or interrupted quantization
+    # never leaves a partially written model at quantized_path
+    tmp_path = f"{quantized_path[:-len('.onnx')]}.{os.getpid()}.tmp.onnx"
+    quantize_dynamic(model_input=model_path, model_output=tmp_path,
+                     weight_type=QUANTIZATION_WEIGHT_TYPES[quantize])
+    os.replace(tmp_path, quantized_path)
+
+    logger.info(f"quantized {model_path} to {quantize} at {quantized_path}")
+    return quantized_path
@@ -10,6 +10,7 @@ from transformers import (
 )
 
 from optimum.onnxruntime import ORTModelForSequenceClassification
+from optimum.onnxruntime.utils import ONNX_WEIGHTS_NAME
 from sentence_transformers import CrossEncoder
 import torch
 
@@ -17,6 +18,7 @@ from marqo.s2_inference.types import *
 from marqo.s2_inference.s2_inference import available_models
 from marqo.s2_inference.s2_inference import _create_model_cache_key, _float_tensor_to_list, _nd_array_to_list
 from marqo.s2_inference.configs import ModelCache
+from marqo.s2_inference.onnx_quantization import quantize_onnx_model, get_quantized_model_path, validate_quantization
 
 from marqo.s2_inference.logger import get_logger
 logger = get_logger(__name__)
@@ -151,20 +153,24 @@ class HFClassificationOnnx:
         _type_: _description_
     """
     
-    def __init__(self, model_name: str, device: str = 'cpu', max_length: int = 512) -> None:
+    def __init__(self, model_name: str, device: str = 'cpu', max_length: int = 512, quantize: Optional[str] = None) -> None:
 
         self.model_name = model_name
         self.save_path = None
         self.device_string = device
         self.device = convert_device_id_to_int(device)
         self.max_length = max_length
+        self.quantize = validate_quantization(quantize)
         self.tokenizer_kwargs = {'padding':True, 'truncation':True,  'max_length':self.max_length}
 
         # TODO load local version
         #self.load_from_cache = load_from_cache
 
-        self.model = ORTModelForSequenceClassification.from_pretrained(self.model_name, from_transformers=True)
-        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        if self.quantize is None:
+            self.model = ORTModelForSequenceClassification.from_pretrained(self.model_name, from_transformers=True)
+            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        else:
+            self._load_quantized()
         
         self.onnx_classifier = pipeline("text-classification", model=self.model, 
                                         tokenizer=self.tokenizer, device=self.device)
@@ -176,6 +182,24 @@ class HFClassificationOnnx:
         self.model_save_name = self.save_path
         self.tokenizer_save_name = self.save_path
 
+    def _load_quantized(self) -> None:
+        """exports and quantizes the model on first use, and loads the
+        quantized version from the local cache afterwards
+        """
+        self._get_save_name()
+        quantized_path = get_quantized_model_path(ONNX_WEIGHTS_NAME, self.quantize, output_folder=self.save_path)
+
+        if not os.path.exists(quantized_path):
+            self.model = ORTModelForSequenceClassification.from_pretrained(self.model_name, from_transformers=True)
+            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            self.save()
+            quantized_path = quantize_onnx_model(os.path.join(self.save_path, ONNX_WEIGHTS_NAME),
+                                                 quantize=self.quantize, output_folder=self.save_path)
+
+        self.model = ORTModelForSequenceClassification.from_pretrained(
+            self.save_path, file_name=os.path.basename(quantized_path))
+        self.tokenizer = AutoTokenizer.from_pretrained(self.save_path)
+
     def save(self) -> None:
         """saves the model locally
         """
@@ -259,6 +283,8 @@ def load_sbert_cross_encoder_model(model_name: str, device: str = 'cpu', max_len
             logger.warning('using the test model - << TESTING PURPOSES ONLY >>')
         elif model_name.startswith('onnx/'):
             model = HFClassificationOnnx(model_name.replace('onnx/', ''), device=device)
+        elif model_name.startswith('onnx-int8/'):
+            model = HFClassificationOnnx(model_name.replace('onnx-int8/', ''), device=device, quantize='int8')
         else:
             model = CrossEncoder(model_name, max_length=max_length, device=device, default_activation_function=torch.nn.Sigmoid())
             if hasattr(model.tokenizer, 'model_max_length'):
@@ -6,11 +6,13 @@ import numpy as np
 from marqo.s2_inference.errors import VectoriseError, InvalidModelPropertiesError, ModelLoadError, UnknownModelError, ModelNotInCacheError
 from PIL import UnidentifiedImageError
 from marqo.s2_inference.model_registry import load_model_properties
+from marqo.s2_inference.onnx_quantization import validate_quantization
 from marqo.s2_inference.configs import get_default_device, get_default_normalization, get_default_seq_length
 from marqo.s2_inference.types import *
 from marqo.s2_inference.logger import get_logger
 import torch
-from marqo.tensor_search.utils import read_env_vars_and_defaults, generate_batches
+from transformers import PreTrainedTokenizerBase
+from marqo.tensor_search.utils import read_env_vars_and_defaults, read_int_env_var, generate_batches
 from marqo.tensor_search.configs import EnvVars
 from marqo.errors import ConfigurationError
 
@@ -22,7 +24,7 @@ MODEL_PROPERTIES = load_model_properties()
 
 def vectorise(model_name: str, content: Union[str, List[str]], model_properties: dict = None,
               device: str = get_default_device(), normalize_embeddings: bool = get_default_normalization(),
-              **kwargs) -> List[List[float]]:
+              as_numpy: bool = False, **kwargs) -> Union[List[List[float]], ndarray]:
     """vectorizes the content by model name
 
     Args:
@@ -33,9 +35,11 @@ def vectorise(model_name: str, content: Union[str, List[str]], model_properties:
                                 if model_properties['name'] is not in model_registry, these properties are used to fetch the model
                                 if model_properties['name'] is in model_registry, default properties are overridden
                                 model_properties can be None only if model_name is a model present in the registry
+        as_numpy (bool): return the vectors as a contiguous (samples x vector dim) float32 array rather than
+                        as lists of floats. This avoids creating a python float per dimension on the hot paths.
 
     Returns:
-        List[List[float]]: _description_
+        List[List[float]], or an ndarray if as_numpy is True
 
     Raises:
         VectoriseError: if the content can't be vectorised, for some reason.
@@ -50,18 +54,31 @@ def vectorise(model_name: str, content: Union[str, List[str]], model_properties:
         if isinstance(content, str):
             vectorised = available_models[model_cache_key].encode(content, normalize=normalize_embeddings, **kwargs)
         else:
+            model = available_models[model_cache_key]
             vector_batches = []
             batch_size = _get_max_vectorise_batch_size()
-            for batch in generate_batches(content, batch_size=batch_size):
-                vector_batches.append(_convert_tensor_to_numpy(available_models[model_cache_key].encode(batch, normalize=normalize_embeddings, **kwargs)))
+            token_lengths = _get_token_lengths(model, content)
+            if token_lengths is None:
+                batch_order = None
+                batches = generate_batches(content, batch_size=batch_size)
+            else:
+                batch_order, batches = _generate_length_bucketed_batches(
+                    content, token_lengths, batch_size=batch_size, max_batch_tokens=_get_max_vectorise_batch_tokens())
+            for batch in batches:
+                vector_batches.append(_convert_tensor_to_numpy(model.encode(batch, normalize=normalize_embeddings, **kwargs)))
             if not vector_batches or all(
                     len(batch) == 0 for batch in vector_batches):  # Check for empty vector_batches or empty arrays
                 raise RuntimeError(f"Vectorise created an empty list of batches! Content: {content}")
             else:
                 vectorised = np.concatenate(vector_batches, axis=0)
+            if batch_order is not None:
+                # put the vectors back into the order of the content
+                vectorised = vectorised[np.argsort(batch_order)]
     except UnidentifiedImageError as e:
         raise VectoriseError(str(e)) from e
 
+    if as_numpy:
+        return _convert_vectorized_output_to_numpy(vectorised)
     return _convert_vectorized_output(vectorised)
 
 
@@ -86,6 +103,69 @@ def _get_max_vectorise_batch_size() -> int:
     return batch_size
 
 
+def _get_max_vectorise_batch_tokens() -> int:
+    """Gets MARQO_MAX_VECTORISE_BATCH_TOKENS from the environment, validates it before returning it."""
+    return read_int_env_var(EnvVars.MARQO_MAX_VECTORISE_BATCH_TOKENS)
+
+
+def _get_text_tokenizer(model: Any) -> Optional[PreTrainedTokenizerBase]:
+    """returns the huggingface tokenizer a loaded model uses for text, if it has one.
+
+    SBERT keeps its tokenizer on the underlying SentenceTransformer. HF_MODEL, SBERT_ONNX and
+    MULTILINGUAL_CLIP keep it on the model. The openai and open_clip tokenizers always pad to
+    the full context length, so there is no padding to save and None is returned for them.
+    """
+    for owner in (model, getattr(model, "model", None)):
+        tokenizer = getattr(owner, "tokenizer", None)
+        if isinstance(tokenizer, PreTrainedTokenizerBase):
+            return tokenizer
+    return None
+
+
+def _get_token_lengths(model: Any, content: List[Any]) -> Optional[List[int]]:
+    """returns the number of tokens each item of content is encoded with, truncated to the
+    model's max_seq_length. Returns None if the lengths can't be found, e.g. the content
+    contains images or the model doesn't use a huggingface tokenizer.
+    """
+    if len(content) < 2 or not all(isinstance(item, str) for item in content):
+        return None
+    tokenizer = _get_text_tokenizer(model)
+    if tokenizer is None:
+        return None
+
+    max_seq_length = getattr(model, "max_seq_length", None)
+    if isinstance(max_seq_length, int) and max_seq_length > 0:
+        input_ids = tokenizer(content, truncation=True, max_length=max_seq_length)["input_ids"]
+    else:
+        input_ids = tokenizer(content, truncation=False)["input_ids"]
+    return [len(ids) for ids in input_ids]
+
+
+def _generate_length_bucketed_batches(content: List[Any], token_lengths: List[int], batch_size: int,
+                                      max_batch_tokens: int) -> Tuple[List[int], List[List[Any]]]:
+    """groups content of similar token lengths into batches, so that little of each batch is padding.
+
+    Each batch holds at most batch_size items and, unless it holds a single item, at most
+    max_batch_tokens tokens once padded to its longest item.
+
+    Returns:
+        the order of the content indexes across the batches, and the batches
+    """
+    batch_order = sorted(range(len(content)), key=lambda i: token_lengths[i])
+    batches = []
+    current_batch = []
+    for i in batch_order:
+        # the content is sorted by length, so item i is the longest of the batch it joins
+        if current_batch and (len(current_batch) == batch_size
+                              or token_lengths[i] * (len(current_batch) + 1) > max_batch_tokens):
+            batches.append(current_batch)
+            current_batch = []
+        current_batch.append(content[i])
+    if current_batch:
+        batches.append(current_batch)
+    return batch_order, batches
+
+
 def _create_model_cache_key(model_name: str, device: str, model_properties: dict = None) -> str:
     """creates a key to store the loaded model by in the cache
 
@@ -106,8 +186,13 @@ def _create_model_cache_key(model_name: str, device: str, model_properties: dict
                        model_properties.get('name', '') + "||" +
                        str(model_properties.get('dimensions', '')) + "||" +
                        model_properties.get('type', '') + "||" +
-                       str(model_properties.get('tokens', '')) + "||" +
-                       device)
+                       str(model_properties.get('tokens', '')) + "||")
+
+    # quantized variants of a model must not share a cache entry with the original model
+    if model_properties.get('quantize') is not None:
+        model_cache_key += model_properties['quantize'] + "||"
+
+    model_cache_key += device
 
     return model_cache_key
 
@@ -161,6 +246,8 @@ def _validate_model_properties(model_name: str, model_properties: dict) -> dict:
     else:
         model_properties = get_model_properties_from_registry(model_name)
 
+    validate_quantization(model_properties.get("quantize", None))
+
     return model_properties
 
 
@@ -307,6 +394,23 @@ def _convert_vectorized_output(output: Union[FloatTensor, ndarray, List[List[flo
     raise TypeError(f"unable to convert input of type {type(output)} to a list of lists of floats")
 
 
+def _convert_vectorized_output_to_numpy(output: Union[FloatTensor, ndarray, List[List[float]]]) -> ndarray:
+    """converts the model outputs to a contiguous (samples x vector dim) float32 array.
+    if a single sample is present, will pad the first dim to make it (1 x vector_dim)
+    """
+    if isinstance(output, list) and len(output) > 0 and not isinstance(output[0], (float, int, list)):
+        output = [_convert_tensor_to_numpy(_o) for _o in output]
+    elif not isinstance(output, list):
+        output = _convert_tensor_to_numpy(output)
+
+    output = np.ascontiguousarray(output, dtype=np.float32)
+    if output.ndim == 1:
+        output = output[np.newaxis, :]
+    if output.ndim != 2 or output.size == 0:
+        raise TypeError(f"unable to convert output with shape {output.shape} to a (samples x vector dim) array")
+    return output
+
+
 def _get_model_loader(model_name: str, model_properties: dict) -> Any:
     """ Returns a dict describing properties of a model.
 
@@ -11,6 +11,7 @@ from pathlib import Path
 from marqo.s2_inference.types import *
 from marqo.s2_inference.logger import get_logger
 from marqo.s2_inference.configs import ModelCache
+from marqo.s2_inference.onnx_quantization import quantize_onnx_model, validate_quantization
 
 logger = get_logger(__name__)
 
@@ -44,10 +45,15 @@ class SBERT_ONNX(object):
         self.do_lower_case = lower_case
         self.embedding_dim = embedding_dim
 
+        # optional dynamic quantization of the exported model, e.g. 'int8'
+        model_properties = kwargs.get("model_properties") or dict()
+        self.quantize = validate_quantization(model_properties.get("quantize", None))
+
         self.fast_onnxprovider = None
         self.onnxproviders = None
         self.model_path = None
         self.export_model_name = None
+        self.session_model_name = None
         self.model = None
         self.tokenizer = None
         self.session = None
@@ -60,6 +66,7 @@ class SBERT_ONNX(object):
         """
         self._prepare()
         self._convert_to_onnx()
+        self._quantize()
         self._load_sbert_session()
         logger.info(f"loaded {self.onnx_model_name} succesfully")
 
@@ -77,6 +84,7 @@ class SBERT_ONNX(object):
             self.onnx_model_name = f"{os.path.basename(self.model_name_or_path.replace('/', '_'))}.onnx"
     
         self.export_model_name = os.path.join(self.onnx_folder, f"{self.onnx_model_name}") 
+        self.session_model_name = self.export_model_name
 
     def _get_onnx_provider(self) -> None:
         """determine where the model should run based on specified device
@@ -115,7 +123,7 @@ class SBERT_ONNX(object):
         sess_options = onnxruntime.SessionOptions()
         # sess_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
         self.session = onnxruntime.InferenceSession(
-            self.export_model_name, sess_options, providers=[self.fast_onnxprovider])
+            self.session_model_name, sess_options, providers=[self.fast_onnxprovider])
 
         logger.info(f"loaded session {self.session.get_providers()}")
 
@@ -159,6 +167,16 @@ class SBERT_ONNX(object):
             # optimized_model.convert_float_to_float16()
             # optimized_model.save_model_to_file(self.export_model_name)
 
+    def _quantize(self) -> None:
+        """quantizes the exported onnx model if requested. the quantized model
+        is cached on disk alongside the exported one
+        """
+        if self.quantize is None:
+            return
+        self.session_model_name = quantize_onnx_model(
+            self.export_model_name, quantize=self.quantize,
+            output_folder=self.onnx_folder, enable_overwrite=self.enable_overwrite)
+
     @staticmethod
     def normalize(outputs: FloatTensor) -> FloatTensor:
         """normalizes vector or matrix to have unit length across rows
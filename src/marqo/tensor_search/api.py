@@ -12,13 +12,12 @@ from typing import List, Dict
 import os
 from marqo.tensor_search.models.api_models import BulkSearchQuery, SearchQuery
 from marqo.tensor_search.web import api_validation, api_utils
-from marqo.tensor_search import utils
+from marqo.tensor_search import utils, tasks, ingest_jobs
 from marqo.tensor_search.on_start_script import on_start
 from marqo import version
 from marqo.tensor_search.backend import get_index_info
 from marqo.tensor_search.enums import RequestType
 from marqo.tensor_search.throttling.redis_throttle import throttle
-from marqo.tensor_search.utils import add_timing
 import pydantic
 
 
@@ -54,7 +53,8 @@ if __name__ in ["__main__", "api"]:
 
 app = FastAPI(
     title="Marqo",
-    version=version.get_version()
+    version=version.get_version(),
+    default_response_class=api_utils.MarqoJSONResponse
 )
 
 
@@ -134,15 +134,17 @@ def create_index(index_name: str, settings: Dict = None, marqo_config: config.Co
 
 @app.post("/indexes/bulk/search")
 @throttle(RequestType.SEARCH)
-@add_timing
 def bulk_search(query: BulkSearchQuery, device: str = Depends(api_validation.validate_device), marqo_config: config.Config = Depends(generate_config)):
-    return tensor_search.bulk_search(query, marqo_config, device=device)
+    # tensor_search.bulk_search adds the processingTimeMs
+    return api_utils.MarqoJSONResponse(tensor_search.bulk_search(query, marqo_config, device=device))
 
 @app.post("/indexes/{index_name}/search")
 @throttle(RequestType.SEARCH)
 def search(search_query: SearchQuery, index_name: str, device: str = Depends(api_validation.validate_device),
-           marqo_config: config.Config = Depends(generate_config)):
-    return tensor_search.search(
+           stream: bool = False, marqo_config: config.Config = Depends(generate_config)):
+    """With stream=true, the hits are streamed as NDJSON, a hit per line, without the
+    other fields of the response"""
+    search_result = tensor_search.search(
         config=marqo_config, text=search_query.q,
         index_name=index_name, highlights=search_query.showHighlights,
         searchable_attributes=search_query.searchableAttributes,
@@ -154,7 +156,14 @@ def search(search_query: SearchQuery, index_name: str, device: str = Depends(api
         image_download_headers=search_query.image_download_headers,
         context=search_query.context,
         score_modifiers=search_query.scoreModifiers,
+        hybrid_parameters=search_query.hybridParameters,
+        knn_parameters=search_query.knnParameters,
+        image_download_timeout_ms=search_query.imageDownloadTimeoutMs,
+        stream=stream,
     )
+    if stream:
+        return api_utils.MarqoNDJSONStreamingResponse(search_result["hits"])
+    return api_utils.MarqoJSONResponse(search_result)
 
 
 @app.post("/indexes/{index_name}/documents")
@@ -168,7 +177,8 @@ def add_or_replace_documents(docs: List[Dict], index_name: str, refresh: bool =
                         image_download_headers: typing.Optional[dict] = Depends(
                             api_utils.decode_image_download_headers),
                         mappings: typing.Optional[dict] = Depends(
-                            api_utils.decode_mappings)
+                            api_utils.decode_mappings),
+                        async_mode: bool = False
                              ):
     """add_documents endpoint (replace existing docs with the same id)"""
     return tensor_search.add_documents_orchestrator(
@@ -179,7 +189,7 @@ def add_or_replace_documents(docs: List[Dict], index_name: str, refresh: bool =
         non_tensor_fields=non_tensor_fields, update_mode='replace',
         image_download_headers=image_download_headers,
         use_existing_tensors=use_existing_tensors,
-        mappings=mappings
+        mappings=mappings, async_mode=async_mode
     )
 
 
@@ -189,41 +199,48 @@ def add_or_update_documents(docs: List[Dict], index_name: str, refresh: bool = T
                         marqo_config: config.Config = Depends(generate_config),
                         batch_size: int = 0, processes: int = 1,
                         non_tensor_fields: List[str] = Query(default=[]),
-                        device: str = Depends(api_validation.validate_device)):
+                        device: str = Depends(api_validation.validate_device),
+                        use_existing_tensors: bool = False):
     """WILL BE DEPRECATED SOON. update add_documents endpoint"""
     return tensor_search.add_documents_orchestrator(
         config=marqo_config,
         docs=docs,
         index_name=index_name, auto_refresh=refresh,
         batch_size=batch_size, processes=processes, device=device,
-        non_tensor_fields=non_tensor_fields, update_mode='update'
+        non_tensor_fields=non_tensor_fields, update_mode='update',
+        use_existing_tensors=use_existing_tensors
     )
 
 @app.get("/indexes/{index_name}/documents/{document_id}")
 def get_document_by_id(index_name: str, document_id: str,
                              marqo_config: config.Config = Depends(generate_config),
                              expose_facets: bool = False):
-    return tensor_search.get_document_by_id(
+    return api_utils.MarqoJSONResponse(tensor_search.get_document_by_id(
         config=marqo_config, index_name=index_name, document_id=document_id,
         show_vectors=expose_facets
-    )
+    ))
 
 
 @app.get("/indexes/{index_name}/documents")
 def get_documents_by_ids(
         index_name: str, document_ids: List[str],
         marqo_config: config.Config = Depends(generate_config),
-        expose_facets: bool = False):
-    return tensor_search.get_documents_by_ids(
+        expose_facets: bool = False, stream: bool = False):
+    """With stream=true, the results are streamed as NDJSON, a result per line"""
+    results = tensor_search.get_documents_by_ids(
         config=marqo_config, index_name=index_name, document_ids=document_ids,
-        show_vectors=expose_facets
+        show_vectors=expose_facets, stream=stream
     )
+    if stream:
+        return api_utils.MarqoNDJSONStreamingResponse(results["results"])
+    return api_utils.MarqoJSONResponse(results)
 
 
 @app.get("/indexes/{index_name}/stats")
-def get_index_stats(index_name: str, marqo_config: config.Config = Depends(generate_config)):
+def get_index_stats(index_name: str, refresh_metrics: bool = False,
+                    marqo_config: config.Config = Depends(generate_config)):
     return tensor_search.get_stats(
-        config=marqo_config, index_name=index_name
+        config=marqo_config, index_name=index_name, refresh_metrics=refresh_metrics
     )
 
 
@@ -235,14 +252,24 @@ def delete_index(index_name: str, marqo_config: config.Config = Depends(generate
 
 
 @app.post("/indexes/{index_name}/documents/delete-batch")
-def delete_docs(index_name: str, documentIds: List[str], refresh: bool = True,
+def delete_docs(index_name: str, documentIds: List[str], refresh: bool = True, async_mode: bool = False,
                       marqo_config: config.Config = Depends(generate_config)):
     return tensor_search.delete_documents(
         index_name=index_name, config=marqo_config, doc_ids=documentIds,
-        auto_refresh=refresh
+        auto_refresh=refresh, async_mode=async_mode
     )
 
 
+@app.get("/tasks/{task_id}")
+def get_task(task_id: str):
+    return tasks.get_task(task_id=task_id)
+
+
+@app.get("/ingest-jobs/{job_id}")
+def get_ingest_job(job_id: str, marqo_config: config.Config = Depends(generate_config)):
+    return ingest_jobs.get_job(config=marqo_config, job_id=job_id)
+
+
 @app.post("/indexes/{index_name}/refresh")
 def refresh_index(index_name: str, marqo_config: config.Config = Depends(generate_config)):
     return tensor_search.refresh_index(
@@ -337,6 +364,7 @@ curl -XGET http://localhost:8882/indexes/my-irst-ix/documents/honey_facts_119
 # GET index stats
 """
 curl -XGET http://localhost:8882/indexes/my-irst-ix/stats
+curl -XGET 'http://localhost:8882/indexes/my-irst-ix/stats?refresh_metrics=true'
 """
 
 # GET index settings
@@ -355,6 +383,22 @@ curl -XPOST  http://localhost:8882/indexes/my-irst-ix/documents/delete-batch -H
 ]'
 """
 
+# DELETE docs in the background, then poll the task
+"""
+curl -XPOST  'http://localhost:8882/indexes/my-irst-ix/documents/delete-batch?async_mode=true' -H 'Content-type:application/json' -d '[
+    "honey_facts_119", "moon_fact_145"
+]'
+curl -XGET http://localhost:8882/tasks/<task_id>
+"""
+
+# ADD docs in the background, as an ingest job, then poll the job
+"""
+curl -XPOST  'http://localhost:8882/indexes/my-irst-ix/documents?async_mode=true&batch_size=50' -H 'Content-type:application/json' -d '[
+    {"_id": "honey_facts_119", "Title": "Honey", "Description": "Honey never spoils"}
+]'
+curl -XGET http://localhost:8882/ingest-jobs/<job_id>
+"""
+
 # DELETE index
 """
 curl -XDELETE http://localhost:8882/indexes/my-irst-ix
@@ -1,6 +1,6 @@
 """Communication with Marqo's persistence and search layer (OpenSearch)"""
-import copy
 import json
+import threading
 import typing
 from marqo.tensor_search.models.index_info import IndexInfo
 # client-specific modules - we may want to replace these:
@@ -60,12 +60,26 @@ def get_index_info(config: Config, index_name: str) -> IndexInfo:
     return index_info
 
 
+# One lock per index. Mapping updates for an index are made one at a time, so that
+# concurrent batches that discover the same new fields send a single mapping update.
+_mapping_update_locks: Dict[str, threading.Lock] = dict()
+_mapping_update_locks_lock = threading.Lock()
+
+
+def _get_mapping_update_lock(index_name: str) -> threading.Lock:
+    with _mapping_update_locks_lock:
+        if index_name not in _mapping_update_locks:
+            _mapping_update_locks[index_name] = threading.Lock()
+        return _mapping_update_locks[index_name]
+
+
 def add_customer_field_properties(config: Config, index_name: str,
                                   customer_field_names: Iterable[Tuple[str, enums.OpenSearchDataType]],
                                   model_properties: dict, multimodal_combination_fields: Dict[str, Iterable[Tuple[str, enums.OpenSearchDataType]]]):
     """Adds new customer fields to index mapping.
 
-    Pushes the updated mapping to OpenSearch, and updates the local cache.
+    Only the properties that aren't in the cached IndexInfo are sent to OpenSearch. If there
+    are none, no request is sent. The local cache is updated either way.
 
     Args:
         config:
@@ -76,94 +90,122 @@ def add_customer_field_properties(config: Config, index_name: str,
         model_properties: properties of the machine learning model
 
     Returns:
-        HTTP Response
+        HTTP Response, or None if the mapping was already up to date
     """
-    existing_info = get_cached_index_info(config=config, index_name=index_name)
-
-    # check if there is multimodal fie;ds and convert the fields name to a list with the same
-    # format of customer_field_names
-    knn_field_names = copy.deepcopy(customer_field_names)
-    if len(multimodal_combination_fields) > 0:
-        multimodal_customer_field_names = set([(field_name, "_") for field_name in list(multimodal_combination_fields)])
-        knn_field_names = knn_field_names.union(multimodal_customer_field_names)
-
-    body = {
-        "properties": {
-            enums.TensorField.chunks: {
-                "type": "nested",
-                "properties": {
-                    validation.validate_vector_name(
-                        utils.generate_vector_name(field_name[0])): {
-                        "type": "knn_vector",
-                        "dimension": model_properties["dimensions"],
-                        "method": existing_info.get_ann_parameters()
-                    } for field_name in knn_field_names
+    with _get_mapping_update_lock(index_name):
+        # read inside the lock, so that the updates made by a concurrent batch are seen
+        existing_info = get_cached_index_info(config=config, index_name=index_name)
+        existing_chunk_properties = existing_info.properties[enums.TensorField.chunks]["properties"]
+
+        # check if there is multimodal fie;ds and convert the fields name to a list with the same
+        # format of customer_field_names
+        knn_field_names = {field_name[0] for field_name in customer_field_names}.union(multimodal_combination_fields)
+
+        new_chunk_properties = dict()
+        for field_name in knn_field_names:
+            vector_name = validation.validate_vector_name(utils.generate_vector_name(field_name))
+            if vector_name not in existing_chunk_properties:
+                new_chunk_properties[vector_name] = {
+                    "type": "knn_vector",
+                    "dimension": model_properties["dimensions"],
+                    "method": existing_info.get_ann_parameters()
                 }
+
+        # copy fields to the chunk for prefiltering. If it is text, convert it to a keyword type to save space
+        # if it's not text, ignore it, and leave it up to OpenSearch (e.g: if it's a number)
+        # Fields that aren't filterable aren't copied into the chunks, so they aren't mapped there.
+        filterable_fields = existing_info.get_filterable_fields()
+        for field_name in customer_field_names:
+            if filterable_fields is not None and field_name[0] not in filterable_fields:
+                continue
+            if field_name[1] == enums.OpenSearchDataType.text \
+                    or field_name[1] == enums.OpenSearchDataType.keyword:
+                if field_name[0] not in existing_chunk_properties:
+                    new_chunk_properties[validation.validate_field_name(field_name[0])] = {
+                        "type": enums.OpenSearchDataType.keyword,
+                        "ignore_above": 32766  # this is the Marqo-OS bytes limit
+                    }
+
+        for field_name in list(multimodal_combination_fields):
+            if filterable_fields is not None and field_name not in filterable_fields:
+                continue
+            existing_sub_fields = existing_chunk_properties.get(field_name, dict()).get("properties", dict())
+            new_sub_fields = {
+                sub_field[0]: {
+                    "type": enums.OpenSearchDataType.keyword,
+                    "ignore_above": 32766  # this is the Marqo-OS bytes limit
+                } for sub_field in multimodal_combination_fields[field_name] if sub_field[0] not in existing_sub_fields
             }
-        }
-    }
-    new_index_properties = existing_info.properties.copy()
-
-    # copy fields to the chunk for prefiltering. If it is text, convert it to a keyword type to save space
-    # if it's not text, ignore it, and leave it up to OpenSearch (e.g: if it's a number)
-    for field_name in customer_field_names:
-        if field_name[1] == enums.OpenSearchDataType.text \
-                or field_name[1] == enums.OpenSearchDataType.keyword:
-            body["properties"][enums.TensorField.chunks]["properties"][validation.validate_field_name(field_name[0])] = {
-                "type": enums.OpenSearchDataType.keyword,
-                "ignore_above": 32766  # this is the Marqo-OS bytes limit
+            if new_sub_fields:
+                new_chunk_properties[validation.validate_field_name(field_name)] = {"properties": new_sub_fields}
+
+        body = {"properties": dict()}
+        if new_chunk_properties:
+            body["properties"][enums.TensorField.chunks] = {
+                "type": "nested",
+                "properties": new_chunk_properties
             }
+        # indexes created before field hashes were introduced don't have them mapped yet
+        if enums.TensorField.field_hashes not in existing_info.properties:
+            body["properties"][enums.TensorField.field_hashes] = {"type": "object", "enabled": False}
 
-    for field_name in list(multimodal_combination_fields):
-        body["properties"][enums.TensorField.chunks]["properties"][
-            validation.validate_field_name(field_name)] = {"properties":{
-            sub_field[0]:{
-                "type": enums.OpenSearchDataType.keyword,
-                "ignore_above": 32766  # this is the Marqo-OS bytes limit
-            } for sub_field in multimodal_combination_fields[field_name]
-        },
-    }
-
-    mapping_res = HttpRequests(config).put(path=F"{index_name}/_mapping", body=json.dumps(body))
-
-    merged_chunk_properties = {
-        **existing_info.properties[enums.TensorField.chunks]["properties"],
-        **body["properties"][enums.TensorField.chunks]["properties"]
-    }
-    new_index_properties[enums.TensorField.chunks]["properties"] = merged_chunk_properties
-
-    # Save newly created fields to document-level so that it is searchable by lexical search
-    # These will be undefined, and we let OpenSearch define them, the next
-    #   time they're retrieved from the cache
-    existing_properties = set(existing_info.get_text_properties())
-    applying_properties = {field[0] for field in customer_field_names}
-    app_type_mapping = {field: field_type for field, field_type in customer_field_names}
-    new_properties = applying_properties - existing_properties
-    for new_prop in new_properties:
-        type_to_set = app_type_mapping[new_prop] if app_type_mapping[new_prop] == enums.OpenSearchDataType.text \
-                        else enums.OpenSearchDataType.to_be_defined
-        new_index_properties[validation.validate_field_name(new_prop)] = {
-            "type": type_to_set
-        }
-
-
-    for multimodal_field, child_fields in multimodal_combination_fields.items():
-        # update the new multimodal_field if it's not in it
-        if multimodal_field not in new_index_properties:
-            new_index_properties[validation.validate_field_name(multimodal_field)] = \
-                {"properties": {validation.validate_field_name(child_field_name): {"type":child_type}
-                 for child_field_name, child_type in child_fields}}
-        # update the new child fields if the multimodal_field already in it
+        if body["properties"]:
+            mapping_res = HttpRequests(config).put(path=F"{index_name}/_mapping", body=json.dumps(body))
         else:
-            for child_field_name, child_type in child_fields:
-                new_index_properties[validation.validate_field_name(multimodal_field)]["properties"][child_field_name] = {"type":child_type}
-
-    get_cache()[index_name] = IndexInfo(
-        model_name=existing_info.model_name,
-        properties=new_index_properties,
-        index_settings=existing_info.index_settings.copy()
-    )
-    return mapping_res
+            mapping_res = None
+
+        new_index_properties = existing_info.properties.copy()
+        new_index_properties.update({
+            prop: prop_mapping for prop, prop_mapping in body["properties"].items()
+            if prop != enums.TensorField.chunks
+        })
+
+        merged_chunk_properties = {**existing_chunk_properties}
+        for prop, prop_mapping in new_chunk_properties.items():
+            if prop in merged_chunk_properties and "properties" in prop_mapping:
+                # new sub fields of a multimodal field
+                merged_chunk_properties[prop] = {"properties": {
+                    **merged_chunk_properties[prop].get("properties", dict()), **prop_mapping["properties"]}}
+            else:
+                merged_chunk_properties[prop] = prop_mapping
+        new_index_properties[enums.TensorField.chunks] = {
+            **existing_info.properties[enums.TensorField.chunks], "properties": merged_chunk_properties}
+
+        # Save newly created fields to document-level so that it is searchable by lexical search
+        # These will be undefined, and we let OpenSearch define them, the next
+        #   time they're retrieved from the cache
+        existing_properties = set(existing_info.get_text_properties())
+        applying_properties = {field[0] for field in customer_field_names}
+        app_type_mapping = {field: field_type for field, field_type in customer_field_names}
+        new_properties = applying_properties - existing_properties
+        for new_prop in new_properties:
+            type_to_set = app_type_mapping[new_prop] if app_type_mapping[new_prop] == enums.OpenSearchDataType.text \
+                            else enums.OpenSearchDataType.to_be_defined
+            new_index_properties[validation.validate_field_name(new_prop)] = {
+                "type": type_to_set
+            }
+
+
+        for multimodal_field, child_fields in multimodal_combination_fields.items():
+            # update the new multimodal_field if it's not in it
+            if multimodal_field not in new_index_properties:
+                new_index_properties[validation.validate_field_name(multimodal_field)] = \
+                    {"properties": {validation.validate_field_name(child_field_name): {"type":child_type}
+                     for child_field_name, child_type in child_fields}}
+            # update the new child fields if the multimodal_field already in it
+            else:
+                new_index_properties[multimodal_field] = {
+                    **new_index_properties[multimodal_field],
+                    "properties": {**new_index_properties[multimodal_field].get("properties", dict())}}
+                for child_field_name, child_type in child_fields:
+                    new_index_properties[validation.validate_field_name(multimodal_field)]["properties"][child_field_name] = {"type":child_type}
+
+        get_cache()[index_name] = IndexInfo(
+            model_name=existing_info.model_name,
+            properties=new_index_properties,
+            index_settings=existing_info.index_settings.copy()
+        )
+        return mapping_res
 
 
 def get_cluster_indices(config: Config):
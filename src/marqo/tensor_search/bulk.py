@@ -0,0 +1,190 @@
+"""Sends _bulk requests to Marqo-OS.
+
+The actions of a _bulk request are split into sub-requests of at most
+MARQO_MAX_BULK_REQUEST_BYTES and MARQO_MAX_BULK_REQUEST_ACTIONS. Up to
+MARQO_MAX_CONCURRENT_BULK_REQUESTS sub-requests are sent at a time. Their responses
+are merged into a single _bulk response, with the items in the order of the actions.
+
+Marqo-OS rejects requests when its write queue is full: the whole request with a 429,
+or single actions with an es_rejected_execution_exception. Rejected requests and actions
+are retried with exponential backoff, and the number of sub-requests sent at a time is
+halved after each rejection. It grows back by one with each accepted sub-request.
+"""
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from marqo.config import Config
+from marqo._httprequests import HttpRequests
+from marqo.errors import TooManyRequestsError
+from marqo.tensor_search import utils
+from marqo.tensor_search.enums import EnvVars
+from marqo.tensor_search.tensor_search_logging import get_logger
+
+logger = get_logger(__name__)
+
+# retries of rejected sub-requests and actions, before their rejection is returned
+MAX_REJECTED_RETRIES = 5
+INITIAL_BACKOFF_SECONDS = 0.1
+MAX_BACKOFF_SECONDS = 5.0
+
+
+def split_bulk_actions(actions: List[bytes], max_bytes: int, max_actions: int) -> List[List[bytes]]:
+    """Groups serialised bulk actions into consecutive sub-requests.
+
+    A sub-request has at most max_actions actions, and at most max_bytes bytes unless it
+    has a single action that is larger than max_bytes by itself.
+    """
+    sub_requests = []
+    current, current_bytes = [], 0
+    for action in actions:
+        if current and (len(current) >= max_actions or current_bytes + len(action) > max_bytes):
+            sub_requests.append(current)
+            current, current_bytes = [], 0
+        current.append(action)
+        current_bytes += len(action)
+    if current:
+        sub_requests.append(current)
+    return sub_requests
+
+
+def _is_rejected(item: dict) -> bool:
+    """Whether Marqo-OS rejected a _bulk item because it was overloaded"""
+    result = next(iter(item.values()))
+    return result.get("status") == 429 or \
+        (result.get("error") or dict()).get("type") == "es_rejected_execution_exception"
+
+
+def _get_backoff_seconds(attempt: int) -> float:
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(MAX_BACKOFF_SECONDS, INITIAL_BACKOFF_SECONDS * 2 ** attempt))
+
+
+class _AdaptiveConcurrency:
+    """Bounds the sub-requests in flight. The bound halves when Marqo-OS rejects a sub-request,
+    and grows back by one, up to max_concurrent, with each accepted sub-request."""
+
+    def __init__(self, max_concurrent: int):
+        self.max_concurrent = max_concurrent
+        self.limit = max_concurrent
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._condition:
+            while self.in_flight >= self.limit:
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, rejected: bool) -> None:
+        with self._condition:
+            self.in_flight -= 1
+            if rejected:
+                self.limit = max(1, self.limit // 2)
+            else:
+                self.limit = min(self.max_concurrent, self.limit + 1)
+            self._condition.notify_all()
+
+
+def _merge_bulk_responses(responses: List[dict]) -> dict:
+    """Merges the responses of sub-requests into the response of a single _bulk request.
+    `took` is the sum of the sub-requests' times."""
+    if len(responses) == 1:
+        return responses[0]
+    return {
+        "took": sum(response["took"] for response in responses),
+        "errors": any(response["errors"] for response in responses),
+        "items": [item for response in responses for item in response["items"]],
+    }
+
+
+def _send_sub_request(config: Config, actions: List[bytes], concurrency: _AdaptiveConcurrency) -> dict:
+    """Sends a sub-request, retrying it, or the actions Marqo-OS rejected, with backoff.
+
+    Returns:
+        the sub-request's _bulk response, with an item per action. Actions that are still
+        rejected after MAX_REJECTED_RETRIES retries keep their rejected item.
+
+    Raises:
+        TooManyRequestsError if the whole sub-request is still rejected after MAX_REJECTED_RETRIES retries
+    """
+    items: List[Optional[dict]] = [None] * len(actions)
+    pending = list(range(len(actions)))
+    took = 0
+    for attempt in range(MAX_REJECTED_RETRIES + 1):
+        is_last_attempt = attempt == MAX_REJECTED_RETRIES
+        concurrency.acquire()
+        rejected = True
+        try:
+            response = HttpRequests(config).post(path="_bulk", body=b"".join([actions[i] for i in pending]))
+            took += response["took"]
+            still_pending = []
+            for i, item in zip(pending, response["items"]):
+                if _is_rejected(item) and not is_last_attempt:
+                    still_pending.append(i)
+                else:
+                    items[i] = item
+            rejected = bool(still_pending)
+            pending = still_pending
+        except TooManyRequestsError:
+            if is_last_attempt:
+                raise
+        finally:
+            concurrency.release(rejected=rejected)
+        if not pending:
+            break
+        backoff = _get_backoff_seconds(attempt)
+        logger.debug(f"Marqo-OS rejected {len(pending)} bulk actions. Retrying in {backoff:.2f}s")
+        time.sleep(backoff)
+
+    return {
+        "took": took,
+        "errors": any("error" in next(iter(item.values())) for item in items),
+        "items": items,
+    }
+
+
+def send_bulk(config: Config, actions: List[List[dict]],
+              on_sub_response: Optional[Callable[[int, dict], None]] = None) -> Optional[dict]:
+    """Sends bulk actions to Marqo-OS, splitting them into sub-requests that are sent concurrently.
+
+    Args:
+        config: the Marqo config
+        actions: each action is its instruction dict, followed by its source dict if it has one
+        on_sub_response: called with the number of actions and the response of each
+            sub-request, as they complete
+
+    Returns:
+        the merged _bulk response, with the items in the order of actions. None if there
+        are no actions.
+
+    Raises:
+        the error of the first failed sub-request, after all sub-requests have been sent
+    """
+    if not actions:
+        return None
+    max_bytes = utils.read_int_env_var(EnvVars.MARQO_MAX_BULK_REQUEST_BYTES)
+    max_actions = utils.read_int_env_var(EnvVars.MARQO_MAX_BULK_REQUEST_ACTIONS)
+    max_concurrent = utils.read_int_env_var(EnvVars.MARQO_MAX_CONCURRENT_BULK_REQUESTS)
+
+    sub_requests = split_bulk_actions(
+        [utils.dicts_to_jsonl(action) for action in actions], max_bytes=max_bytes, max_actions=max_actions)
+    concurrency = _AdaptiveConcurrency(max_concurrent=max_concurrent)
+
+    def send(sub_request: List[bytes]) -> dict:
+        response = _send_sub_request(config=config, actions=sub_request, concurrency=concurrency)
+        if on_sub_response is not None:
+            on_sub_response(len(sub_request), response)
+        return response
+
+    if len(sub_requests) == 1:
+        return send(sub_requests[0])
+
+    logger.debug(f"sending {len(actions)} bulk actions as {len(sub_requests)} sub-requests, "
+                 f"up to {max_concurrent} at a time")
+    with ThreadPoolExecutor(max_workers=min(max_concurrent, len(sub_requests))) as executor:
+        futures = [executor.submit(send, sub_request) for sub_request in sub_requests]
+    # the executor has waited for every sub-request. result() raises a failed sub-request's error.
+    return _merge_bulk_responses([future.result() for future in futures])
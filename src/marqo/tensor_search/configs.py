@@ -39,6 +39,13 @@ def get_default_ann_parameters():
         }
     }
 
+def get_default_knn_parameters():
+    return {
+        # None: each field's knn query retrieves just the chunks the page needs
+        NsFields.knn_ef_search: None,
+        NsFields.knn_over_fetch: 1
+    }
+
 def default_env_vars() -> dict:
     """Returns a dict of default env vars.
     This is used by utils.read_env_vars_and_defaults() as the source for
@@ -55,6 +62,41 @@ def default_env_vars() -> dict:
         EnvVars.MARQO_ENABLE_THROTTLING: "TRUE",
         EnvVars.MARQO_LOG_LEVEL: "info",             # This env variable is set to "info" by default in run_marqo.sh, which overrides this value
         EnvVars.MARQO_EF_CONSTRUCTION_MAX_VALUE: 4096,
-        EnvVars.MARQO_MAX_VECTORISE_BATCH_SIZE: 16
+        EnvVars.MARQO_MAX_VECTORISE_BATCH_SIZE: 16,
+        # padded tokens per text batch. Enough for a full batch of 512 token sequences
+        EnvVars.MARQO_MAX_VECTORISE_BATCH_TOKENS: 8192,
+        EnvVars.MARQO_JSON_SERIALIZER: "orjson",    # falls back to "json" if orjson isn't installed
+        # how long refresh requests for an index are gathered before a single _refresh is sent.
+        # Requests made while a refresh is in flight are always gathered.
+        EnvVars.MARQO_REFRESH_COALESCE_WINDOW_MS: 0,
+        # _bulk requests are split into sub-requests of at most this many bytes and actions
+        EnvVars.MARQO_MAX_BULK_REQUEST_BYTES: 10000000,
+        EnvVars.MARQO_MAX_BULK_REQUEST_ACTIONS: 1000,
+        # sub-requests of a single _bulk request that are sent at the same time
+        EnvVars.MARQO_MAX_CONCURRENT_BULK_REQUESTS: 4,
+        # when adding docs in batches, the _bulk requests of up to this many batches are in flight
+        # while the next batch is vectorised. 0 adds the batches one after the other.
+        EnvVars.MARQO_MAX_PIPELINED_BULK_REQUESTS: 1,
+        # ingest jobs that are processed at a time, and the docs per batch of a job
+        EnvVars.MARQO_INGEST_JOB_WORKERS: 1,
+        EnvVars.MARQO_INGEST_JOB_BATCH_SIZE: 100,
+        # inference calls of searches, bulk searches and add_documents that run at a time on
+        # the CPU, and on each CUDA device
+        EnvVars.MARQO_MAX_CONCURRENT_CPU_INFERENCE: 2,
+        EnvVars.MARQO_MAX_CONCURRENT_CUDA_INFERENCE: 1,
+        # how long the images of a search query may take to download, unless the query sets
+        # imageDownloadTimeoutMs
+        EnvVars.MARQO_QUERY_IMAGE_DOWNLOAD_TIMEOUT_MS: 3000,
+        # the largest imageDownloadTimeoutMs a query may set
+        EnvVars.MARQO_MAX_QUERY_IMAGE_DOWNLOAD_TIMEOUT_MS: 30000,
+        # vectors of image queries that are kept, so that repeated image queries aren't
+        # downloaded and vectorised again. 0 keeps none.
+        EnvVars.MARQO_QUERY_IMAGE_VECTOR_CACHE_SIZE: 0,
+        # streamed (NDJSON) responses are sent in chunks of about this many bytes. Up to this
+        # many chunks are made ahead of the client.
+        EnvVars.MARQO_STREAM_CHUNK_BYTES: 65536,
+        EnvVars.MARQO_STREAM_MAX_BUFFERED_CHUNKS: 8,
+        # docs per _mget when documents are streamed
+        EnvVars.MARQO_STREAM_GET_BATCH_SIZE: 1000,
     }
 
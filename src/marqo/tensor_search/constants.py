@@ -16,4 +16,6 @@ ALLOWED_CUSTOMER_FIELD_TYPES = [str, int, float, bool, list, dict]
 
 NON_TENSORISABLE_FIELD_TYPES = [int, float, bool, list]
 
-ALLOWED_MULTIMODAL_FIELD_TYPES = [str]
\ No newline at end of file
+ALLOWED_MULTIMODAL_FIELD_TYPES = [str]
+# the largest `k` Marqo-OS accepts in a knn query
+MAX_KNN_K = 10000
@@ -18,6 +18,8 @@ class SearchMethod(str, Enum):
     LEXICAL = "LEXICAL"
     # chunk_embeddings
     TENSOR = "TENSOR"
+    # LEXICAL and TENSOR, with their results fused
+    HYBRID = "HYBRID"
 
 
 class TensorField:
@@ -30,6 +32,8 @@ class TensorField:
     # the prefix will have the customer's field name appended to the end of it
     vector_prefix = "__vector_"
     chunks = "__chunks"
+    # content hashes of the doc's fields, used to skip re-vectorising unchanged fields
+    field_hashes = "__field_hashes"
     output_highlights = "_highlights"
     output_score = "_score"
     # output fields:
@@ -53,6 +57,9 @@ class IndexSettingsField:
     image_preprocessing = "image_preprocessing"
     patch_method = "patch_method"
 
+    # the fields copied into each chunk, for filtering and score modifiers in tensor search
+    filterable_fields = "filterable_fields"
+
     number_of_shards = "number_of_shards"
     number_of_replicas = "number_of_replicas"
 
@@ -67,6 +74,11 @@ class IndexSettingsField:
     hnsw_ef_construction = "ef_construction"
     hnsw_m = "m"
 
+    # knn search defaults of the index, which each search can override
+    knn_parameters = "knn_parameters"
+    knn_ef_search = "ef_search"
+    knn_over_fetch = "over_fetch"
+
 
 class SplitMethod:
     # consider moving this enum into processing
@@ -103,6 +115,23 @@ class EnvVars:
     MARQO_ROOT_PATH = "MARQO_ROOT_PATH"
     MARQO_EF_CONSTRUCTION_MAX_VALUE = "MARQO_EF_CONSTRUCTION_MAX_VALUE"
     MARQO_MAX_VECTORISE_BATCH_SIZE = "MARQO_MAX_VECTORISE_BATCH_SIZE"
+    MARQO_MAX_VECTORISE_BATCH_TOKENS = "MARQO_MAX_VECTORISE_BATCH_TOKENS"
+    MARQO_JSON_SERIALIZER = "MARQO_JSON_SERIALIZER"
+    MARQO_REFRESH_COALESCE_WINDOW_MS = "MARQO_REFRESH_COALESCE_WINDOW_MS"
+    MARQO_MAX_BULK_REQUEST_BYTES = "MARQO_MAX_BULK_REQUEST_BYTES"
+    MARQO_MAX_BULK_REQUEST_ACTIONS = "MARQO_MAX_BULK_REQUEST_ACTIONS"
+    MARQO_MAX_CONCURRENT_BULK_REQUESTS = "MARQO_MAX_CONCURRENT_BULK_REQUESTS"
+    MARQO_MAX_PIPELINED_BULK_REQUESTS = "MARQO_MAX_PIPELINED_BULK_REQUESTS"
+    MARQO_INGEST_JOB_WORKERS = "MARQO_INGEST_JOB_WORKERS"
+    MARQO_INGEST_JOB_BATCH_SIZE = "MARQO_INGEST_JOB_BATCH_SIZE"
+    MARQO_MAX_CONCURRENT_CPU_INFERENCE = "MARQO_MAX_CONCURRENT_CPU_INFERENCE"
+    MARQO_MAX_CONCURRENT_CUDA_INFERENCE = "MARQO_MAX_CONCURRENT_CUDA_INFERENCE"
+    MARQO_QUERY_IMAGE_DOWNLOAD_TIMEOUT_MS = "MARQO_QUERY_IMAGE_DOWNLOAD_TIMEOUT_MS"
+    MARQO_MAX_QUERY_IMAGE_DOWNLOAD_TIMEOUT_MS = "MARQO_MAX_QUERY_IMAGE_DOWNLOAD_TIMEOUT_MS"
+    MARQO_QUERY_IMAGE_VECTOR_CACHE_SIZE = "MARQO_QUERY_IMAGE_VECTOR_CACHE_SIZE"
+    MARQO_STREAM_CHUNK_BYTES = "MARQO_STREAM_CHUNK_BYTES"
+    MARQO_STREAM_MAX_BUFFERED_CHUNKS = "MARQO_STREAM_MAX_BUFFERED_CHUNKS"
+    MARQO_STREAM_GET_BATCH_SIZE = "MARQO_STREAM_GET_BATCH_SIZE"
 
 class RequestType:
     INDEX = "INDEX"
@@ -20,6 +20,8 @@ def _clean_doc(doc: dict, doc_id=None, include_vectors: bool = False) -> dict:
         del copied[TensorField.doc_chunk_relation]
     if TensorField.chunk_ids in copied:
         del copied[TensorField.chunk_ids]
+    if TensorField.field_hashes in copied:
+        del copied[TensorField.field_hashes]
     if include_vectors:
         copied[TensorField.tensor_facets] = [
             {ch[TensorField.field_name]: ch[TensorField.field_content],
@@ -0,0 +1,58 @@
+"""Fuses the hits of the lexical and tensor searches of a HYBRID search into one ranking.
+
+Two fusions are supported, chosen per query with hybrid_parameters["fusion"]:
+
+    rrf: reciprocal rank fusion. A hit scores
+            tensor_weight / (rrf_k + tensor rank) + (1 - tensor_weight) / (rrf_k + lexical rank)
+        with ranks starting at 1, and a term only counting if the hit is in that list. It
+        only uses ranks, so the very different scales of BM25 and cosine scores don't matter.
+    weighted: the scores of each list are min-max normalised to [0, 1], and a hit scores
+            tensor_weight * normalised tensor score + (1 - tensor_weight) * normalised lexical score
+"""
+from typing import Dict, List
+
+
+def _rrf_scores(hits: List[dict], rrf_k: float, weight: float) -> Dict[str, float]:
+    return {hit["_id"]: weight / (rrf_k + rank) for rank, hit in enumerate(hits, start=1)}
+
+
+def _normalised_scores(hits: List[dict], weight: float) -> Dict[str, float]:
+    if not hits:
+        return dict()
+    scores = [hit["_score"] for hit in hits]
+    lowest, highest = min(scores), max(scores)
+    if highest == lowest:
+        return {hit["_id"]: weight for hit in hits}
+    return {hit["_id"]: weight * (hit["_score"] - lowest) / (highest - lowest) for hit in hits}
+
+
+def fuse_hits(tensor_hits: List[dict], lexical_hits: List[dict], hybrid_parameters: dict) -> List[dict]:
+    """Merges the hits of both searches into a single list, ranked by their fused score.
+
+    Args:
+        tensor_hits: the formatted hits of the tensor search, best first
+        lexical_hits: the formatted hits of the lexical search, best first
+        hybrid_parameters: validated by validation.validate_hybrid_parameters()
+
+    Returns:
+        a hit per doc, best first. A doc found by both searches keeps its tensor hit, with
+        its highlights. `_score` is the fused score. Ties keep the tensor order, then the
+        lexical order.
+    """
+    tensor_weight = hybrid_parameters["tensor_weight"]
+    if hybrid_parameters["fusion"] == "rrf":
+        tensor_scores = _rrf_scores(tensor_hits, hybrid_parameters["rrf_k"], tensor_weight)
+        lexical_scores = _rrf_scores(lexical_hits, hybrid_parameters["rrf_k"], 1 - tensor_weight)
+    else:
+        tensor_scores = _normalised_scores(tensor_hits, tensor_weight)
+        lexical_scores = _normalised_scores(lexical_hits, 1 - tensor_weight)
+
+    fused = dict()
+    for hit in tensor_hits + lexical_hits:
+        if hit["_id"] not in fused:
+            fused[hit["_id"]] = {
+                **hit,
+                "_score": tensor_scores.get(hit["_id"], 0) + lexical_scores.get(hit["_id"], 0)
+            }
+    # sorted() is stable, so ties keep their insertion order
+    return sorted(fused.values(), key=lambda hit: hit["_score"], reverse=True)
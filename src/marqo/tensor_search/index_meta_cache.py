@@ -5,13 +5,14 @@ index in the search DB via a plugin.
 """
 import asyncio
 import datetime
+import functools
 import time
 import traceback
 from multiprocessing import Process, Manager
 from marqo.tensor_search.models.index_info import IndexInfo
-from typing import Dict
+from typing import Callable, Dict, List, Optional, Pattern, Tuple
 from marqo import errors
-from marqo.tensor_search import backend
+from marqo.tensor_search import backend, utils
 from marqo.config import Config
 from marqo.tensor_search.tensor_search_logging import get_logger
 
@@ -27,10 +28,20 @@ index_info_cache = dict()
 # happens.
 index_last_refreshed_time = dict()
 
+# for each index, the IndexInfo its filter contextualiser was built from, and the contextualiser.
+# See get_contextualised_filter()
+_filter_contextualisers: Dict[str, Tuple[IndexInfo, Callable[[str], str]]] = dict()
+MAX_CACHED_FILTERS_PER_INDEX = 1024
+# for each index, the IndexInfo the regex of its non filterable fields was built from, and the
+# regex. See get_non_filterable_filter_fields()
+_non_filterable_filter_fields: Dict[str, Tuple[IndexInfo, Optional[Pattern]]] = dict()
+
 
 def empty_cache():
     global index_info_cache
     index_info_cache = dict()
+    _filter_contextualisers.clear()
+    _non_filterable_filter_fields.clear()
 
 
 def get_index_info(config: Config, index_name: str) -> IndexInfo:
@@ -60,6 +71,54 @@ def get_cache() -> Dict[str, IndexInfo]:
     return index_info_cache
 
 
+def get_contextualised_filter(index_name: str, index_info: IndexInfo, filter_string: Optional[str]) -> str:
+    """Same as utils.contextualise_filter() with the index's simple properties, but the regex of
+    the index's fields is only built when its IndexInfo changes, and the contextualised filters
+    are cached, up to MAX_CACHED_FILTERS_PER_INDEX of them.
+
+    Args:
+        index_name: name of the index
+        index_info: the IndexInfo of the index the filter is for
+        filter_string: the filter of the search
+    """
+    if filter_string is None:
+        return ''
+    cached_info, contextualise = _filter_contextualisers.get(index_name, (None, None))
+    if cached_info is None or cached_info.version != index_info.version:
+        # refreshing the cache creates a new IndexInfo, even if the index's fields haven't changed
+        if cached_info is None or cached_info.properties != index_info.properties:
+            filter_fields = utils.compile_filter_fields(index_info.get_text_properties())
+            contextualise = functools.lru_cache(maxsize=MAX_CACHED_FILTERS_PER_INDEX)(
+                functools.partial(utils.contextualise_filter_with, filter_fields))
+        _filter_contextualisers[index_name] = (index_info, contextualise)
+    return contextualise(filter_string)
+
+
+def get_non_filterable_filter_fields(index_name: str, index_info: IndexInfo, filter_string: Optional[str]) -> List[str]:
+    """Finds the fields of a filter that aren't in the index's filterable_fields. They aren't
+    copied into the chunks, so no chunk of a tensor search matches a filter on them.
+
+    Like get_contextualised_filter(), the regex of these fields is only built when the
+    IndexInfo changes.
+
+    Returns:
+        the sorted non filterable fields of the filter
+    """
+    if filter_string is None:
+        return []
+    cached_info, non_filterable_fields = _non_filterable_filter_fields.get(index_name, (None, None))
+    if cached_info is None or cached_info.version != index_info.version:
+        if cached_info is None or cached_info.properties != index_info.properties \
+                or cached_info.get_filterable_fields() != index_info.get_filterable_fields():
+            filterable_fields = index_info.get_filterable_fields()
+            non_filterable_fields = None if filterable_fields is None else utils.compile_filter_fields(
+                field for field in index_info.get_text_properties() if field.split(".")[0] not in filterable_fields)
+        _non_filterable_filter_fields[index_name] = (index_info, non_filterable_fields)
+    if non_filterable_fields is None:
+        return []
+    return sorted({match.replace(r"\ ", " ") for match in non_filterable_fields.findall(filter_string)})
+
+
 def refresh_index_info_on_interval(config: Config, index_name: str, interval_seconds: int) -> None:
     """Refreshes an index's index_info if inteval_seconds have elapsed since the last time it was refreshed
 
@@ -0,0 +1,140 @@
+"""Coalesces the _refresh requests made for an index.
+
+Writes with refresh=true each used to send their own `{index}/_refresh`. Under many
+concurrent writers that is a refresh storm. Instead, refresh requests for an index join
+a batch. The batch is sent as a single _refresh once it has been open for
+MARQO_REFRESH_COALESCE_WINDOW_MS, and once the index's previous refresh has completed.
+Every caller in the batch blocks until that _refresh completes, so the writes each
+caller made before asking are visible when it returns.
+
+At most one refresh per index is in flight, and at most one batch is waiting to be sent.
+Indexes of different Marqo-OS clusters are refreshed separately, even if they share a name.
+"""
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from marqo.config import Config
+from marqo._httprequests import HttpRequests
+from marqo.tensor_search.enums import EnvVars
+from marqo.tensor_search.utils import read_int_env_var
+from marqo.tensor_search.tensor_search_logging import get_logger
+
+logger = get_logger(__name__)
+
+
+def _get_coalesce_window_seconds() -> float:
+    """Gets MARQO_REFRESH_COALESCE_WINDOW_MS from the environment, validates it and returns it in seconds."""
+    return read_int_env_var(EnvVars.MARQO_REFRESH_COALESCE_WINDOW_MS, min_value=0) / 1000
+
+
+class _RefreshBatch:
+    """The refresh requests that are answered by a single _refresh"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.n_requests = 0
+        self.response: Optional[dict] = None
+        self.error: Optional[Exception] = None
+
+
+class IndexRefresher:
+    """Coalesces the refreshes of a single index"""
+
+    def __init__(self, index_name: str):
+        self.index_name = index_name
+        self._lock = threading.Lock()
+        # the batch that new requests join. It hasn't been sent yet.
+        self._open_batch: Optional[_RefreshBatch] = None
+        self._in_flight_batch: Optional[_RefreshBatch] = None
+        self.refresh_requests = 0
+        self.refreshes_sent = 0
+
+    def refresh(self, config: Config) -> dict:
+        """Blocks until a _refresh that started after this call has completed.
+
+        Returns:
+            the Marqo-OS response to the coalesced _refresh
+
+        Raises:
+            the error raised by the coalesced _refresh, if it failed
+        """
+        with self._lock:
+            self.refresh_requests += 1
+            is_leader = self._open_batch is None
+            if is_leader:
+                self._open_batch = _RefreshBatch()
+            batch = self._open_batch
+            batch.n_requests += 1
+
+        if is_leader:
+            self._send(config=config, batch=batch)
+        else:
+            batch.done.wait()
+
+        if batch.error is not None:
+            raise batch.error
+        return batch.response
+
+    def _send(self, config: Config, batch: _RefreshBatch) -> None:
+        """Waits for the batch to fill up, then sends it. Only called by the request that opened the batch."""
+        window = _get_coalesce_window_seconds()
+        if window > 0:
+            time.sleep(window)
+        with self._lock:
+            previous_batch = self._in_flight_batch
+        # requests keep joining the batch while the previous refresh completes
+        if previous_batch is not None:
+            previous_batch.done.wait()
+
+        with self._lock:
+            self._open_batch = None
+            self._in_flight_batch = batch
+        try:
+            batch.response = HttpRequests(config).post(path=f"{self.index_name}/_refresh")
+        except Exception as e:
+            batch.error = e
+        finally:
+            with self._lock:
+                self._in_flight_batch = None
+                self.refreshes_sent += 1
+            logger.debug(f"refreshed index `{self.index_name}` for {batch.n_requests} refresh requests")
+            batch.done.set()
+
+    def get_metrics(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "refresh_requests": self.refresh_requests,
+                "refreshes_sent": self.refreshes_sent,
+                "refreshes_saved": self.refresh_requests - self.refreshes_sent,
+            }
+
+
+# refreshers by (Marqo-OS url, index name)
+_refreshers: Dict[Tuple[str, str], IndexRefresher] = dict()
+_refreshers_lock = threading.Lock()
+
+
+def get_refresher(config: Config, index_name: str) -> IndexRefresher:
+    key = (config.url, index_name)
+    with _refreshers_lock:
+        if key not in _refreshers:
+            _refreshers[key] = IndexRefresher(index_name=index_name)
+        return _refreshers[key]
+
+
+def refresh_index(config: Config, index_name: str) -> dict:
+    """Refreshes an index, coalescing concurrent refreshes of the same index into one _refresh.
+
+    Returns:
+        the Marqo-OS response to the _refresh
+    """
+    return get_refresher(config=config, index_name=index_name).refresh(config=config)
+
+
+def get_refresh_metrics(config: Config) -> Dict[str, Dict[str, int]]:
+    """Returns, for each index of config's Marqo-OS refreshed by this process, how many refreshes
+    were requested, how many were sent to Marqo-OS, and how many were saved by coalescing them."""
+    with _refreshers_lock:
+        refreshers = [refresher for (url, _), refresher in _refreshers.items() if url == config.url]
+    return {refresher.index_name: refresher.get_metrics() for refresher in refreshers}
@@ -0,0 +1,72 @@
+"""Limits the inference calls that run at a time on each device, and runs independent
+work, e.g. the vector jobs of a bulk search, concurrently.
+
+Searches, bulk searches and add_documents vectorise through run_on_device(), so calls on
+the same device share a limit across all the requests this Marqo process is serving:
+MARQO_MAX_CONCURRENT_CPU_INFERENCE for the CPU, and MARQO_MAX_CONCURRENT_CUDA_INFERENCE
+for each CUDA device. Calls over the limit wait for a slot on their device. Calls on
+different devices don't wait for each other.
+
+A call must not run another call on the same device, as it would wait for a slot that it
+holds itself. Calls should only do inference, e.g. images are downloaded before taking a
+slot, so that slow downloads don't hold up the device.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, TypeVar, Union
+
+from marqo.tensor_search import utils
+from marqo.tensor_search.enums import EnvVars
+from marqo.tensor_search.tensor_search_logging import get_logger
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+_device_slots: Dict[str, threading.BoundedSemaphore] = dict()
+_device_slots_lock = threading.Lock()
+
+
+def _normalise_device(device: str) -> str:
+    """"cuda" is the current CUDA device, which is cuda:0 unless it has been changed"""
+    return "cuda:0" if device == "cuda" else device
+
+
+def _get_device_slots(device: str) -> threading.BoundedSemaphore:
+    device = _normalise_device(device)
+    with _device_slots_lock:
+        if device not in _device_slots:
+            env_var = EnvVars.MARQO_MAX_CONCURRENT_CUDA_INFERENCE if device.startswith("cuda") \
+                else EnvVars.MARQO_MAX_CONCURRENT_CPU_INFERENCE
+            _device_slots[device] = threading.BoundedSemaphore(utils.read_int_env_var(env_var))
+        return _device_slots[device]
+
+
+def run_on_device(device: str, func: Callable[[], T]) -> T:
+    """Runs func once a slot on its device is free, and returns its result"""
+    with _get_device_slots(device):
+        return func()
+
+
+def run_concurrently(funcs: List[Callable[[], T]]) -> List[Union[T, Exception]]:
+    """Runs each func concurrently. Funcs that do inference should take their device's slot
+    with run_on_device().
+
+    Args:
+        funcs: funcs that take no args
+
+    Returns:
+        the result of each func, in the order of `funcs`. A func that raised an Exception has
+        it in place of its result, and doesn't stop the other funcs.
+    """
+    def run(func: Callable[[], T]) -> Union[T, Exception]:
+        try:
+            return func()
+        except Exception as e:
+            return e
+
+    if len(funcs) <= 1:
+        return [run(func) for func in funcs]
+    with ThreadPoolExecutor(max_workers=len(funcs)) as executor:
+        futures = [executor.submit(run, func) for func in funcs]
+        return [future.result() for future in futures]
@@ -0,0 +1,316 @@
+"""Adds documents in the background, as ingest jobs that survive a restart of Marqo.
+
+A job's docs are split into batches and written to disk, under the Marqo root, before
+the job is acknowledged:
+
+    <marqo root>/ingest_jobs/<job_id>/job.json          the index and add_documents args
+    <marqo root>/ingest_jobs/<job_id>/batch_<n>.json    the docs of batch n, until it is indexed
+    <marqo root>/ingest_jobs/<job_id>/result_<n>.json   the outcome of batch n, once it is indexed
+
+MARQO_INGEST_JOB_WORKERS jobs are processed at a time, each by add_document_batches.
+Batches are indexed in order, and their result is written as each one completes. A job
+stops at the first batch that fails; errors of single docs don't stop it. A job that
+can't be processed at all, e.g. as its files can't be read, is reported as failed until
+the job queue is next created.
+
+Jobs that haven't finished are resumed from their first batch without a result when the
+job queue is created, e.g. after Marqo restarts. A batch that was being indexed when Marqo
+stopped is indexed again. Docs without an _id are given one when the job is submitted, so
+indexing a batch again doesn't duplicate its docs.
+
+Only the most recent MAX_FINISHED_JOBS finished jobs are kept on disk.
+"""
+import collections
+import datetime
+import os
+import queue
+import shutil
+import threading
+import uuid
+from typing import Dict, Iterator, List, Optional
+
+from marqo import errors
+from marqo.config import Config
+from marqo.tensor_search import serialization, tasks, tensor_search, utils
+from marqo.tensor_search.enums import EnvVars
+from marqo.tensor_search.tasks import TaskStatus
+from marqo.tensor_search.tensor_search_logging import get_logger
+
+logger = get_logger(__name__)
+
+MAX_FINISHED_JOBS = 1000
+
+
+def _get_jobs_dir() -> str:
+    return os.path.join(utils.get_marqo_root_from_env(), "ingest_jobs")
+
+
+def _write_json_atomically(path: str, obj) -> None:
+    """Writes obj to path, so that a crash leaves either the old file or the complete new one"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(serialization.dumps(obj))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str):
+    with open(path, "rb") as f:
+        return serialization.loads(f.read())
+
+
+class IngestJobQueue:
+    """Queues ingest jobs on disk, and processes them with a pool of worker threads"""
+
+    def __init__(self, config: Config, jobs_dir: str, n_workers: int):
+        self.config = config
+        self.jobs_dir = jobs_dir
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._lock = threading.Lock()
+        # ids of the jobs being processed
+        self._processing = set()
+        # ids of the finished jobs, oldest first
+        self._finished = collections.deque()
+        # the errors of the jobs that couldn't be processed, by job id
+        self._failed: Dict[str, dict] = dict()
+        self.resume()
+        self._workers = [
+            threading.Thread(target=self._work, name=f"marqo-ingest-{i}", daemon=True) for i in range(n_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def _job_dir(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, job_id)
+
+    def _batch_path(self, job_id: str, batch: int) -> str:
+        return os.path.join(self._job_dir(job_id), f"batch_{batch}.json")
+
+    def _result_path(self, job_id: str, batch: int) -> str:
+        return os.path.join(self._job_dir(job_id), f"result_{batch}.json")
+
+    def _read_results(self, job_id: str, n_batches: int) -> List[dict]:
+        """The results of the job's indexed batches. Batches are indexed in order."""
+        results = []
+        for batch in range(n_batches):
+            result_path = self._result_path(job_id, batch)
+            if not os.path.exists(result_path):
+                break
+            results.append(_read_json(result_path))
+        return results
+
+    @staticmethod
+    def _is_finished(job: dict, results: List[dict]) -> bool:
+        return len(results) == job["n_batches"] or \
+            any(result["status"] == TaskStatus.failed for result in results)
+
+    def resume(self) -> int:
+        """Enqueues the jobs on disk that haven't finished, in the order they were submitted.
+
+        Returns:
+            the number of jobs that were enqueued
+        """
+        jobs = []
+        for job_id in os.listdir(self.jobs_dir):
+            job_path = os.path.join(self._job_dir(job_id), "job.json")
+            if not os.path.exists(job_path):
+                # job.json is written last. Without it, the job was never acknowledged.
+                shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+                continue
+            jobs.append(_read_json(job_path))
+
+        n_resumed = 0
+        for job in sorted(jobs, key=lambda j: datetime.datetime.fromisoformat(j["enqueuedAt"].rstrip("Z"))):
+            if self._is_finished(job, self._read_results(job["job_id"], job["n_batches"])):
+                self._finished.append(job["job_id"])
+            elif job["job_id"] not in self._processing:
+                self._queue.put(job["job_id"])
+                n_resumed += 1
+        if n_resumed:
+            logger.info(f"resuming {n_resumed} unfinished ingest jobs")
+        return n_resumed
+
+    def submit(self, index_name: str, docs: List[dict], batch_size: int, add_docs_args: dict) -> dict:
+        """Writes a job to disk and enqueues it.
+
+        Args:
+            index_name: the index the docs are added to
+            docs: the docs to add
+            batch_size: the docs per batch. 0 uses MARQO_INGEST_JOB_BATCH_SIZE.
+            add_docs_args: the other args of add_documents, e.g. update_mode. They must be
+                JSON serialisable.
+
+        Returns:
+            the status of the enqueued job
+        """
+        if batch_size is None or batch_size == 0:
+            batch_size = utils.read_int_env_var(EnvVars.MARQO_INGEST_JOB_BATCH_SIZE)
+        elif batch_size < 0:
+            raise errors.InvalidArgError("Batch size can't be less than 1!")
+        if not docs:
+            raise errors.BadRequestError("Received empty add documents request")
+
+        for doc in docs:
+            if isinstance(doc, dict) and "_id" not in doc:
+                doc["_id"] = str(uuid.uuid4())
+
+        job_id = str(uuid.uuid4())
+        job_dir = self._job_dir(job_id)
+        os.makedirs(job_dir)
+        n_batches = 0
+        for start in range(0, len(docs), batch_size):
+            _write_json_atomically(self._batch_path(job_id, n_batches), docs[start:start + batch_size])
+            n_batches += 1
+        job = {
+            "job_id": job_id, "index_name": index_name, "n_docs": len(docs), "n_batches": n_batches,
+            "batch_size": batch_size, "add_docs_args": add_docs_args,
+            "enqueuedAt": utils.format_timestamp(datetime.datetime.utcnow()),
+        }
+        _write_json_atomically(os.path.join(job_dir, "job.json"), job)
+        self._queue.put(job_id)
+        logger.debug(f"enqueued ingest job `{job_id}`: {len(docs)} docs in {n_batches} batches "
+                     f"for index `{index_name}`")
+        return self.get_job(job_id)
+
+    def get_job(self, job_id: str) -> dict:
+        """Returns the status of a job, with the results of its indexed batches
+
+        Raises:
+            IngestJobNotFoundError if the job doesn't exist, or has been forgotten
+        """
+        try:
+            # job ids are uuids. This also keeps them from pointing outside of jobs_dir.
+            uuid.UUID(job_id)
+            job = _read_json(os.path.join(self._job_dir(job_id), "job.json"))
+        except (ValueError, FileNotFoundError, NotADirectoryError):
+            raise errors.IngestJobNotFoundError(f"Ingest job `{job_id}` not found.")
+        results = self._read_results(job_id, job["n_batches"])
+
+        if any(result["status"] == TaskStatus.failed for result in results) or job_id in self._failed:
+            status = TaskStatus.failed
+        elif len(results) == job["n_batches"]:
+            status = TaskStatus.succeeded
+        elif job_id in self._processing:
+            status = TaskStatus.processing
+        else:
+            status = TaskStatus.enqueued
+
+        indexed = [result for result in results if result["status"] == TaskStatus.succeeded]
+        as_dict = {
+            "job_id": job_id, "index_name": job["index_name"], "type": "documentAdditionOrUpdate",
+            "status": status,
+            "details": {
+                "receivedDocuments": job["n_docs"],
+                "batches": job["n_batches"],
+                "indexedBatches": len(indexed),
+                "indexedDocuments": sum(result["n_docs"] for result in indexed),
+                "failedDocuments": sum(len(result["failedItems"]) for result in indexed),
+            },
+            "batches": results,
+            "enqueuedAt": job["enqueuedAt"],
+        }
+        failed = [result for result in results if result["status"] == TaskStatus.failed]
+        if failed:
+            as_dict["error"] = failed[0]["error"]
+        elif job_id in self._failed:
+            as_dict["error"] = self._failed[job_id]
+        return as_dict
+
+    def _work(self) -> None:
+        while True:
+            job_id = self._queue.get()
+            with self._lock:
+                self._processing.add(job_id)
+            try:
+                self._process(job_id)
+            except Exception as e:
+                # the job is left unfinished on disk, and is resumed when the queue is next created.
+                # Until then, it's reported as failed rather than enqueued.
+                logger.error(f"could not process ingest job `{job_id}`: {e}")
+                with self._lock:
+                    self._failed[job_id] = tasks.error_to_dict(e)
+                self._on_finished(job_id)
+            finally:
+                with self._lock:
+                    self._processing.discard(job_id)
+
+    def _process(self, job_id: str) -> None:
+        job = _read_json(os.path.join(self._job_dir(job_id), "job.json"))
+        pending = list(range(len(self._read_results(job_id, job["n_batches"])), job["n_batches"]))
+        n_indexed = [0]
+
+        def read_batches() -> Iterator[List[dict]]:
+            # read lazily, so that only the batches being indexed are in memory
+            for batch in pending:
+                yield _read_json(self._batch_path(job_id, batch))
+
+        def on_batch_indexed(i: int, response: dict):
+            batch = pending[i]
+            _write_json_atomically(self._result_path(job_id, batch), {
+                "batch": batch, "status": TaskStatus.succeeded, "n_docs": len(response["items"]),
+                "errors": response["errors"], "processingTimeMs": response.get("processingTimeMs"),
+                "failedItems": [item for item in response["items"] if "error" in item],
+                "finishedAt": utils.format_timestamp(datetime.datetime.utcnow()),
+            })
+            n_indexed[0] += 1
+            os.remove(self._batch_path(job_id, batch))
+
+        logger.info(f"processing ingest job `{job_id}` from batch {pending[0] if pending else job['n_batches']} "
+                    f"of {job['n_batches']}")
+        try:
+            tensor_search.add_document_batches(
+                config=self.config, index_name=job["index_name"], batches=read_batches(),
+                on_batch_indexed=on_batch_indexed, **job["add_docs_args"]
+            )
+        except Exception as e:
+            # batches are collected in order, and the ones before the batch that failed, to be
+            # read, prepared or indexed, are collected before its error is raised
+            if n_indexed[0] >= len(pending):
+                raise
+            batch = pending[n_indexed[0]]
+            logger.error(f"ingest job `{job_id}` failed on batch {batch}: {e}")
+            _write_json_atomically(self._result_path(job_id, batch), {
+                "batch": batch, "status": TaskStatus.failed, "error": tasks.error_to_dict(e),
+                "finishedAt": utils.format_timestamp(datetime.datetime.utcnow()),
+            })
+        self._on_finished(job_id)
+
+    def _on_finished(self, job_id: str) -> None:
+        """Deletes the oldest finished jobs, beyond MAX_FINISHED_JOBS"""
+        with self._lock:
+            self._finished.append(job_id)
+            evicted = []
+            while len(self._finished) > MAX_FINISHED_JOBS:
+                evicted.append(self._finished.popleft())
+            for evicted_id in evicted:
+                self._failed.pop(evicted_id, None)
+        for evicted_id in evicted:
+            shutil.rmtree(self._job_dir(evicted_id), ignore_errors=True)
+
+
+_job_queue: Optional[IngestJobQueue] = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue(config: Config) -> IngestJobQueue:
+    """Returns the job queue of this process. Creating it resumes the unfinished jobs on disk."""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = IngestJobQueue(
+                config=config, jobs_dir=_get_jobs_dir(),
+                n_workers=utils.read_int_env_var(EnvVars.MARQO_INGEST_JOB_WORKERS))
+        return _job_queue
+
+
+def submit_job(config: Config, index_name: str, docs: List[dict], batch_size: int, add_docs_args: dict) -> dict:
+    """Submits docs to be added in the background. See IngestJobQueue.submit()"""
+    return get_job_queue(config).submit(
+        index_name=index_name, docs=docs, batch_size=batch_size, add_docs_args=add_docs_args)
+
+
+def get_job(config: Config, job_id: str) -> dict:
+    """Returns the status of an ingest job. See IngestJobQueue.get_job()"""
+    return get_job_queue(config).get_job(job_id)
@@ -28,6 +28,9 @@ class SearchQuery(BaseMarqoModel):
     image_download_headers: Optional[Dict] = None
     context: Optional[Dict] = None
     scoreModifiers: Optional[Dict] = None
+    hybridParameters: Optional[Dict] = None
+    knnParameters: Optional[Dict] = None
+    imageDownloadTimeoutMs: Optional[int] = None
 
     @pydantic.validator('searchMethod')
     def validate_search_method(cls, value):
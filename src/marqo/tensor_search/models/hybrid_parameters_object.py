@@ -0,0 +1,22 @@
+hybrid_parameters_schema = {
+    "$schema": "http://json-schema.org/draft-07/schema#",
+    "type": "object",
+    "properties": {
+        "fusion": {
+            "enum": ["rrf", "weighted"],
+            "default": "rrf"
+        },
+        "rrf_k": {
+            "type": "number",
+            "exclusiveMinimum": 0,
+            "default": 60
+        },
+        "tensor_weight": {
+            "type": "number",
+            "minimum": 0,
+            "maximum": 1,
+            "default": 0.5
+        }
+    },
+    "additionalProperties": False
+}
@@ -1,22 +1,93 @@
+import functools
+import itertools
 import pprint
-from typing import NamedTuple, Any, Dict
+from typing import Any, Dict, FrozenSet, Optional
 from marqo.tensor_search import enums
 from marqo.tensor_search.enums import IndexSettingsField as NsFields
 from marqo.tensor_search import configs
 
-class IndexInfo(NamedTuple):
+# marks a derived view that hasn't been computed yet
+_NOT_COMPUTED = object()
+_versions = itertools.count(1)
+
+
+def _memoised(view: str):
+    """Caches the result of an IndexInfo method in the IndexInfo's `view` slot"""
+    def decorator(method):
+        @functools.wraps(method)
+        def memoised_method(self):
+            value = getattr(self, view)
+            if value is _NOT_COMPUTED:
+                value = method(self)
+                # concurrent first calls may each compute the view. They compute the same value.
+                object.__setattr__(self, view, value)
+            return value
+        return memoised_method
+    return decorator
+
+
+class IndexInfo:
     """
     model_name: name of the ML model used to encode the data
     properties: keys are different index field names, values
         provide info about the properties
+    index_settings: the settings the index was created with
+
+    An IndexInfo is immutable. A change to the index, e.g. new fields, creates a new IndexInfo
+    with a new version. Its derived views (get_vector_properties() etc.) are computed on their
+    first call and cached, so they and the properties and index_settings dicts must not be
+    mutated.
     """
-    model_name: str
-    properties: dict
-    index_settings: dict
+    _views = ("_index_settings_copy", "_filterable_fields", "_vector_properties", "_text_properties",
+              "_true_text_properties", "_ann_parameters", "_knn_parameters")
+    __slots__ = ("model_name", "properties", "index_settings", "version") + _views
+
+    def __init__(self, model_name: str, properties: dict, index_settings: dict):
+        object.__setattr__(self, "model_name", model_name)
+        object.__setattr__(self, "properties", properties)
+        object.__setattr__(self, "index_settings", index_settings)
+        # unique to each IndexInfo of this process
+        object.__setattr__(self, "version", next(_versions))
+        for view in self._views:
+            object.__setattr__(self, view, _NOT_COMPUTED)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"IndexInfo is immutable. Can't set `{name}`")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"IndexInfo is immutable. Can't delete `{name}`")
+
+    def __eq__(self, other):
+        if not isinstance(other, IndexInfo):
+            return NotImplemented
+        return (self.model_name, self.properties, self.index_settings) == \
+               (other.model_name, other.properties, other.index_settings)
+
+    # the properties and index settings are dicts
+    __hash__ = None
+
+    def __repr__(self):
+        return (f"IndexInfo(model_name={self.model_name!r}, properties={self.properties!r}, "
+                f"index_settings={self.index_settings!r})")
 
+    def __reduce__(self):
+        return IndexInfo, (self.model_name, self.properties, self.index_settings)
+
+    @_memoised("_index_settings_copy")
     def get_index_settings(self) -> dict:
         return self.index_settings.copy()
 
+    @_memoised("_filterable_fields")
+    def get_filterable_fields(self) -> Optional[FrozenSet[str]]:
+        """returns the fields whose values are copied into each chunk, for
+        filtering and score modifiers in tensor search.
+
+        None means that every field is copied, which is the default.
+        """
+        filterable_fields = self.index_settings[NsFields.index_defaults].get(NsFields.filterable_fields)
+        return None if filterable_fields is None else frozenset(filterable_fields)
+
+    @_memoised("_vector_properties")
     def get_vector_properties(self) -> dict:
         """returns a dict containing only names and properties of vector fields
         Perhaps a better approach is to check if the field's props is actually a vector type,
@@ -28,6 +99,7 @@ class IndexInfo(NamedTuple):
             if vector_name.startswith(enums.TensorField.vector_prefix)
         }
 
+    @_memoised("_text_properties")
     def get_text_properties(self) -> dict:
         """returns a dict containing only names and properties of non
         vector fields.
@@ -55,6 +127,7 @@ class IndexInfo(NamedTuple):
         #                                          'my_image': {'type': 'text'},                     'my_combination_field.my_image': {'type': 'text'},
         #                                          'some_text': {'type': 'text'}}}}                   'my_combination_field.some_text': {'type': 'text'}}
 
+    @_memoised("_true_text_properties")
     def get_true_text_properties(self) -> dict:
         """returns a dict containing only names and properties of fields that
         are true text fields
@@ -69,6 +142,7 @@ class IndexInfo(NamedTuple):
                 continue
         return true_text_props
     
+    @_memoised("_ann_parameters")
     def get_ann_parameters(self) -> Dict[str, Any]:
         """Gets the ANN parameters to use as the default for the index.
 
@@ -91,4 +165,16 @@ class IndexInfo(NamedTuple):
             **index_ann_defaults.get(NsFields.ann_method_parameters, {})
         }
 
-        return ann_params
\ No newline at end of file
+        return ann_params
+
+    @_memoised("_knn_parameters")
+    def get_knn_parameters(self) -> Dict[str, Any]:
+        """Gets the knn search parameters to use as the default for the index's searches.
+
+        Returns:
+            Dict of knn parameters. Structure can be seen at `configs.get_default_knn_parameters`.
+        """
+        return {
+            **configs.get_default_knn_parameters(),
+            **self.index_settings[NsFields.index_defaults].get(NsFields.knn_parameters, {})
+        }
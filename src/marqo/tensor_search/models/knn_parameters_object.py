@@ -0,0 +1,28 @@
+from marqo.tensor_search.enums import IndexSettingsField as NsFields
+from marqo.tensor_search.constants import MAX_KNN_K
+
+# The knn parameters of a tensor search. They can be set per search, and as the defaults of
+# an index (index_defaults.knn_parameters).
+knn_parameters_schema = {
+    "$schema": "http://json-schema.org/draft-07/schema#",
+    "type": "object",
+    "properties": {
+        # the size of the candidate list HNSW keeps while searching. Larger is slower, with
+        # better recall. The knn query of each field retrieves at least this many chunks.
+        NsFields.knn_ef_search: {
+            "type": "integer",
+            "minimum": 1,
+            "maximum": MAX_KNN_K,
+            "examples": [100]
+        },
+        # the knn query of each field retrieves over_fetch * (offset + limit) chunks, so that
+        # filtered searches and docs with several matching chunks still fill the page
+        NsFields.knn_over_fetch: {
+            "type": "number",
+            "minimum": 1,
+            "maximum": 100,
+            "examples": [2]
+        }
+    },
+    "additionalProperties": False
+}
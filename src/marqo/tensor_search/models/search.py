@@ -24,6 +24,7 @@ class VectorisedJobs(BaseModel):
     normalize_embeddings: bool
     image_download_headers: Optional[Dict]
     content_type: Literal['text', 'image']
+    image_download_timeout_ms: Optional[int] = None
 
     def __hash__(self):
         return self.groupby_key() + hash(json.dumps(self.content, sort_keys=True))
@@ -31,15 +32,17 @@ class VectorisedJobs(BaseModel):
     def groupby_key(self) -> JHash:
         return VectorisedJobs.get_groupby_key(self.model_name, self.model_properties, self.device,
                                               self.normalize_embeddings, self.content_type,
-                                              self.image_download_headers)
+                                              self.image_download_headers, self.image_download_timeout_ms)
 
     @staticmethod
     def get_groupby_key(model_name: str, model_properties: Dict[str, Any], device: str,
-                        normalize_embeddings: bool, content_type: str, image_download_headers: Optional[Dict]) -> JHash:
+                        normalize_embeddings: bool, content_type: str, image_download_headers: Optional[Dict],
+                        image_download_timeout_ms: Optional[int] = None) -> JHash:
         return JHash(hash(model_name) + hash(json.dumps(model_properties, sort_keys=True))
                      + hash(device) + hash(normalize_embeddings)
                      + hash(content_type)
                      + hash(json.dumps(image_download_headers, sort_keys=True))
+                     + hash(image_download_timeout_ms)
                      )
 
     def add_content(self, content: List[Union[str, List[str]]]) -> VectorisedJobPointer:
@@ -1,6 +1,7 @@
 from marqo.tensor_search import enums as ns_enums
 from marqo.tensor_search.enums import IndexSettingsField as NsFields, EnvVars
 from marqo.tensor_search.utils import read_env_vars_and_defaults
+from marqo.tensor_search.models.knn_parameters_object import knn_parameters_schema
 
 settings_schema = {
     "$schema": "https://json-schema.org/draft/2019-09/schema",
@@ -94,6 +95,25 @@ settings_schema = {
                         NsFields.patch_method: None
                     }]
                 },
+                NsFields.filterable_fields: {
+                    # null (the default) copies every field into the chunks
+                    "type": ["null", "array"],
+                    "items": {
+                        "type": "string"
+                    },
+                    "uniqueItems": True,
+                    "examples": [
+                        ["colour", "price"]
+                    ]
+                },
+                NsFields.knn_parameters: {
+                    # the same schema as a search's knn_parameters, without its $schema
+                    **{key: value for key, value in knn_parameters_schema.items() if key != "$schema"},
+                    "examples": [{
+                        NsFields.knn_ef_search: 100,
+                        NsFields.knn_over_fetch: 1
+                    }]
+                },
                 NsFields.ann_parameters: {
                     "type": "object",
                     "required": [
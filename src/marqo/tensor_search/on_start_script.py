@@ -5,7 +5,7 @@ from marqo.tensor_search.tensor_search_logging import get_logger
 import time
 from marqo.tensor_search.enums import EnvVars
 # we need to import backend before index_meta_cache to prevent circular import error:
-from marqo.tensor_search import backend, index_meta_cache, utils
+from marqo.tensor_search import backend, index_meta_cache, utils, ingest_jobs
 from marqo import config
 from marqo.tensor_search.web import api_utils
 from marqo._httprequests import HttpRequests
@@ -22,6 +22,7 @@ def on_start(marqo_os_url: str):
                         CUDAAvailable(), 
                         ModelsForCacheing(), 
                         InitializeRedis("localhost", 6379),    # TODO, have these variable
+                        ResumeIngestJobs(marqo_os_url),
                         DownloadFinishText(),
                         MarqoWelcome(),
                         MarqoPhrase(),
@@ -161,6 +162,20 @@ class InitializeRedis:
             redis_driver.init_from_app(self.host, self.port)
 
 
+class ResumeIngestJobs:
+    """Resumes the ingest jobs that hadn't finished when Marqo stopped"""
+
+    def __init__(self, marqo_os_url: str):
+        self.marqo_os_url = marqo_os_url
+
+    def run(self):
+        c = config.Config(api_utils.upconstruct_authorized_url(
+            opensearch_url=self.marqo_os_url
+        ))
+        # creating the job queue resumes the unfinished jobs on disk
+        ingest_jobs.get_job_queue(c)
+
+
 class DownloadStartText:
 
     def run(self):
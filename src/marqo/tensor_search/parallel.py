@@ -121,30 +121,29 @@ class IndexChunk:
             logger.info(f"restricting threads to {self.threads_per_process} for process={self.process_id}")
             torch.set_num_threads(self.threads_per_process)
         
-        results = []
         start = time.time()
     
         total_progress_displays = 10
         progress_display_frequency = max(1, self.n_chunks // total_progress_displays)
 
-        for n_processed,_doc in enumerate(np.array_split(self.docs, self.n_chunks)):
-            t_chunk_start = time.time()
-            percent_done = self._calculate_percent_done(n_processed + 1, self.n_chunks)
-            
-            if n_processed % progress_display_frequency == 0:
-                logger.info(f'process={self.process_id} completed={percent_done}/100% on device={self.device}')
+        t_chunk_start = [time.time()]
 
-            results.append(tensor_search.add_documents(
-                config=self.config, index_name=self.index_name, docs=_doc, auto_refresh=self.auto_refresh,
-                update_mode=self.update_mode, non_tensor_fields=self.non_tensor_fields,
-                use_existing_tensors=self.use_existing_tensors, image_download_headers=self.image_download_headers,
-                mappings=self.mappings
-            ))
+        def log_progress(n_processed: int):
+            # called once each chunk is vectorised. Its _bulk request is sent while the next chunk is vectorised.
             t_chunk_end = time.time()
-
-            time_left = round((self.n_chunks - (n_processed + 1))*(t_chunk_end - t_chunk_start), 0)
             if n_processed % progress_display_frequency == 0:
+                percent_done = self._calculate_percent_done(n_processed + 1, self.n_chunks)
+                logger.info(f'process={self.process_id} completed={percent_done}/100% on device={self.device}')
+                time_left = round((self.n_chunks - (n_processed + 1))*(t_chunk_end - t_chunk_start[0]), 0)
                 logger.info(f'estimated time left for process {self.process_id} is {time_left} seconds ')
+            t_chunk_start[0] = t_chunk_end
+
+        results = tensor_search.add_document_batches(
+            config=self.config, index_name=self.index_name, batches=np.array_split(self.docs, self.n_chunks),
+            auto_refresh=self.auto_refresh, update_mode=self.update_mode, non_tensor_fields=self.non_tensor_fields,
+            use_existing_tensors=self.use_existing_tensors, image_download_headers=self.image_download_headers,
+            mappings=self.mappings, on_batch_prepared=log_progress
+        )
 
         end = time.time()
         logger.info(f'took {end - start} sec for {self.n_docs} documents')
@@ -0,0 +1,200 @@
+"""Downloads and vectorises the images of search queries.
+
+Searches that query the same image at the same time share its download and its vector: the
+first search to ask for the image downloads and vectorises it, and the others wait for its
+vector. Queries are for the same image if they have the same url, model, device and download
+headers.
+
+Images must be downloaded before a deadline, which is MARQO_QUERY_IMAGE_DOWNLOAD_TIMEOUT_MS
+after the search asked for them, unless the search sets its own timeout. A search waiting for
+another search's download stops waiting at its own deadline.
+
+The vectors of image queries can also be kept in an LRU cache of
+MARQO_QUERY_IMAGE_VECTOR_CACHE_SIZE images, so that repeated image queries aren't downloaded
+and vectorised again. It is off by default, as an image that changes at its url is only seen
+again once its vector has been evicted.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import UnidentifiedImageError
+
+from marqo.s2_inference import clip_utils, s2_inference
+from marqo.s2_inference.errors import VectoriseError
+from marqo.tensor_search import inference_executor, utils
+from marqo.tensor_search.enums import EnvVars
+from marqo.tensor_search.tensor_search_logging import get_logger
+
+logger = get_logger(__name__)
+
+_ImageKey = Tuple[str, str, str, bool, str, str]
+
+
+class _InFlightImage:
+    """An image query that a search is downloading and vectorising"""
+
+    def __init__(self):
+        self.downloaded = threading.Event()
+        self.vector: "Future[np.ndarray]" = Future()
+
+
+_in_flight: Dict[_ImageKey, _InFlightImage] = dict()
+_in_flight_lock = threading.Lock()
+
+_vector_cache: "OrderedDict[_ImageKey, np.ndarray]" = OrderedDict()
+_vector_cache_lock = threading.Lock()
+
+
+def _get_vector_cache_size() -> int:
+    """Gets MARQO_QUERY_IMAGE_VECTOR_CACHE_SIZE from the environment, validates it before returning it."""
+    return utils.read_int_env_var(EnvVars.MARQO_QUERY_IMAGE_VECTOR_CACHE_SIZE, min_value=0)
+
+
+def empty_vector_cache():
+    with _vector_cache_lock:
+        _vector_cache.clear()
+
+
+def _get_cached_vectors(keys: Dict[str, _ImageKey]) -> Dict[str, np.ndarray]:
+    found = dict()
+    with _vector_cache_lock:
+        for image, key in keys.items():
+            if key in _vector_cache:
+                _vector_cache.move_to_end(key)
+                found[image] = _vector_cache[key]
+    return found
+
+
+def _cache_vectors(vectors: Dict[_ImageKey, np.ndarray], cache_size: int):
+    with _vector_cache_lock:
+        for key, vector in vectors.items():
+            _vector_cache[key] = vector
+            _vector_cache.move_to_end(key)
+        while len(_vector_cache) > cache_size:
+            _vector_cache.popitem(last=False)
+
+
+def _download(image: str, image_download_headers: Optional[Dict], deadline: float) -> Any:
+    """Returns the image as a PIL image, or a VectoriseError if it couldn't be downloaded in time"""
+    try:
+        return clip_utils.load_image_from_path(
+            image, image_download_headers, timeout=max(deadline - time.monotonic(), 0), deadline=deadline)
+    except (UnidentifiedImageError, OSError) as e:
+        return VectoriseError(str(e))
+
+
+def _download_and_vectorise(
+        led: Dict[str, _InFlightImage], model_name: str, model_properties: Dict[str, Any], device: str,
+        normalize_embeddings: bool, image_download_headers: Optional[Dict], deadline: float):
+    """Resolves the in-flight image of each image in `led` with its vector, or its error"""
+    images = list(led)
+    if len(images) <= 1:
+        downloads = [_download(image, image_download_headers, deadline) for image in images]
+    else:
+        with ThreadPoolExecutor(max_workers=len(images)) as executor:
+            downloads = list(executor.map(
+                lambda image: _download(image, image_download_headers, deadline), images))
+
+    downloaded = dict()
+    for image, download in zip(images, downloads):
+        if isinstance(download, Exception):
+            led[image].vector.set_exception(download)
+        else:
+            downloaded[image] = download
+        led[image].downloaded.set()
+
+    if not downloaded:
+        return
+    try:
+        # only the inference takes a slot on the device, not the downloads
+        vectors = inference_executor.run_on_device(device, lambda: s2_inference.vectorise(
+            model_name=model_name, model_properties=model_properties, content=list(downloaded.values()),
+            device=device, normalize_embeddings=normalize_embeddings,
+            image_download_headers=image_download_headers, as_numpy=True
+        ))
+    except Exception as e:
+        for image in downloaded:
+            led[image].vector.set_exception(e)
+        return
+    for image, vector in zip(downloaded, vectors):
+        led[image].vector.set_result(vector)
+
+
+def vectorise_query_images(
+        model_name: str, model_properties: Dict[str, Any], images: List[str], device: str,
+        normalize_embeddings: bool, image_download_headers: Optional[Dict] = None,
+        download_timeout_ms: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """Vectorises the images of a query, sharing their downloads and vectors with any other
+    search querying them at the same time.
+
+    Args:
+        images: urls, or local paths, of the images
+        download_timeout_ms: how long the images may take to download. Defaults to
+            MARQO_QUERY_IMAGE_DOWNLOAD_TIMEOUT_MS.
+        The other args are the same as for s2_inference.vectorise()
+
+    Returns:
+        a mapping of each image to its vector
+
+    Raises:
+        VectoriseError: if an image couldn't be downloaded before the deadline, or couldn't
+            be vectorised. Other errors of s2_inference.vectorise() are raised as they are.
+    """
+    if download_timeout_ms is None:
+        download_timeout_ms = utils.read_int_env_var(EnvVars.MARQO_QUERY_IMAGE_DOWNLOAD_TIMEOUT_MS)
+    deadline = time.monotonic() + download_timeout_ms / 1000
+    cache_size = _get_vector_cache_size()
+
+    model_key = json.dumps(model_properties, sort_keys=True)
+    headers_key = json.dumps(image_download_headers, sort_keys=True)
+    keys = {
+        image: (model_name, model_key, device, normalize_embeddings, image, headers_key)
+        for image in images
+    }
+    vectors = _get_cached_vectors(keys) if cache_size > 0 else dict()
+
+    led: Dict[str, _InFlightImage] = dict()
+    followed: Dict[str, _InFlightImage] = dict()
+    with _in_flight_lock:
+        for image, key in keys.items():
+            if image in vectors:
+                continue
+            if key in _in_flight:
+                followed[image] = _in_flight[key]
+            else:
+                led[image] = _in_flight[key] = _InFlightImage()
+
+    try:
+        if led:
+            _download_and_vectorise(
+                led, model_name=model_name, model_properties=model_properties, device=device,
+                normalize_embeddings=normalize_embeddings, image_download_headers=image_download_headers,
+                deadline=deadline)
+    finally:
+        for in_flight in led.values():
+            if not in_flight.vector.done():
+                in_flight.vector.set_exception(VectoriseError("The search downloading this image failed"))
+            in_flight.downloaded.set()
+        with _in_flight_lock:
+            for image, in_flight in led.items():
+                if _in_flight.get(keys[image]) is in_flight:
+                    del _in_flight[keys[image]]
+
+    for image, in_flight in led.items():
+        vectors[image] = in_flight.vector.result()
+    if led and cache_size > 0:
+        _cache_vectors({keys[image]: vectors[image] for image in led}, cache_size)
+
+    for image, in_flight in followed.items():
+        if not in_flight.downloaded.wait(timeout=max(deadline - time.monotonic(), 0)):
+            raise VectoriseError(
+                f"image url `{image}` wasn't downloaded within the image download timeout "
+                f"of {download_timeout_ms}ms")
+        # once downloaded, the image is vectorised without a deadline, as if this search had downloaded it
+        vectors[image] = in_flight.vector.result()
+    return vectors
@@ -0,0 +1,107 @@
+"""JSON serialisation for Marqo-OS request bodies, Marqo-OS responses and API responses.
+
+The serializer is chosen with the MARQO_JSON_SERIALIZER env var. `orjson` is used by
+default; it writes numpy arrays directly, which matters for the vector-heavy _bulk and
+_msearch bodies. If orjson isn't installed, Marqo falls back to the standard library.
+"""
+import json
+from typing import Any, Dict, Union
+
+import numpy as np
+
+from marqo import errors
+from marqo.tensor_search.enums import EnvVars
+from marqo.tensor_search.utils import read_env_vars_and_defaults
+from marqo.tensor_search.tensor_search_logging import get_logger
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = get_logger(__name__)
+
+
+def _default(obj: Any) -> Any:
+    """Serialises the values the underlying json library doesn't support natively"""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class JsonSerializer:
+    """Base class for serializers. dumps() always returns UTF-8 encoded bytes."""
+
+    name: str = None
+
+    def dumps(self, obj: Any) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        raise NotImplementedError
+
+
+class StdlibJsonSerializer(JsonSerializer):
+    name = "json"
+
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(obj, default=_default).encode("utf-8")
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return json.loads(data)
+
+
+class OrjsonSerializer(JsonSerializer):
+    name = "orjson"
+
+    def __init__(self):
+        if orjson is None:
+            raise ImportError("orjson is not installed")
+        # OPT_NON_STR_KEYS keeps parity with json.dumps, which accepts int keys
+        self._options = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj: Any) -> bytes:
+        return orjson.dumps(obj, default=_default, option=self._options)
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return orjson.loads(data)
+
+
+SERIALIZERS = {
+    StdlibJsonSerializer.name: StdlibJsonSerializer,
+    OrjsonSerializer.name: OrjsonSerializer,
+}
+
+_loaded_serializers: Dict[str, JsonSerializer] = dict()
+
+
+def get_serializer() -> JsonSerializer:
+    """Returns the serializer selected by MARQO_JSON_SERIALIZER.
+
+    Raises:
+        ConfigurationError if the env var doesn't name a known serializer
+    """
+    name = read_env_vars_and_defaults(EnvVars.MARQO_JSON_SERIALIZER)
+    if name not in _loaded_serializers:
+        if name not in SERIALIZERS:
+            raise errors.ConfigurationError(
+                f"Could not properly read env var `MARQO_JSON_SERIALIZER`. Current value: `{name}`. "
+                f"`MARQO_JSON_SERIALIZER` must be one of {list(SERIALIZERS)}.")
+        try:
+            _loaded_serializers[name] = SERIALIZERS[name]()
+        except ImportError as e:
+            logger.warning(f"Could not load the `{name}` JSON serializer ({e}). "
+                           f"Falling back to the `{StdlibJsonSerializer.name}` serializer.")
+            _loaded_serializers[name] = StdlibJsonSerializer()
+    return _loaded_serializers[name]
+
+
+def dumps(obj: Any) -> bytes:
+    """Serialises obj into UTF-8 encoded JSON, including numpy arrays and scalars"""
+    return get_serializer().dumps(obj)
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    return get_serializer().loads(data)
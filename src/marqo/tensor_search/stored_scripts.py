@@ -0,0 +1,237 @@
+"""Painless scripts that are stored in Marqo-OS and referenced by id.
+
+Sending a script's source with every request makes Marqo-OS compile it, and makes _bulk
+bodies carry the whole source for every doc. Instead, each script is stored once per
+Marqo-OS cluster with `PUT _scripts/<id>`, and requests pass the script id and params.
+
+A script's id includes a hash of its source. Changing the source gives it a new id, so
+Marqo instances running different versions of a script don't overwrite each other's.
+
+Marqo-OS can lose stored scripts, e.g. if it's replaced by a fresh cluster behind the same
+url. Requests that fail because their script is missing are retried once, after storing
+the script again. See retry_if_script_missing().
+"""
+import functools
+import hashlib
+import threading
+from typing import Any, Callable, FrozenSet, Optional, Set, Tuple, TypeVar
+
+from marqo.config import Config
+from marqo._httprequests import HttpRequests
+from marqo.tensor_search.enums import TensorField
+from marqo.tensor_search.tensor_search_logging import get_logger
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+
+class StoredScript:
+    """A painless script, stored in Marqo-OS under an id derived from its source"""
+
+    def __init__(self, name: str, source: str):
+        self.name = name
+        self.source = source
+        source_hash = hashlib.blake2b(source.encode("utf-8"), digest_size=6).hexdigest()
+        self.id = f"marqo__{name}__{source_hash}"
+
+    def to_body(self) -> dict:
+        return {"script": {"lang": "painless", "source": self.source}}
+
+
+# Used by add_documents in update mode. Params:
+#   customer_dict: the doc's new fields
+#   doc_fields: the names of the doc's new fields
+#   new_chunks: the chunks of the fields that were vectorised
+#   non_tensor_fields: fields whose chunks are removed
+#   field_hashes: the content hashes of the doc's new fields that were vectorised, or kept.
+#       The stored hashes of the other new fields are removed, as they have no chunks.
+#   kept_fields: fields whose stored chunks are kept, if their stored hash still matches
+# The index's filterable fields are part of the source, so that they aren't sent with every doc.
+# See get_update_doc_script().
+@functools.lru_cache(maxsize=None)
+def get_update_doc_script(filterable_fields: Optional[FrozenSet[str]]) -> StoredScript:
+    """Returns the update script of an index, whose filterable_fields are copied into the chunks.
+
+    Args:
+        filterable_fields: the index's filterable fields, or None if every field is filterable
+    """
+    if filterable_fields is None:
+        filterable_fields_literal = "null"
+    else:
+        # painless string literals only escape backslashes and quotes
+        filterable_fields_literal = "[" + ", ".join(
+            '"' + field.replace("\\", "\\\\").replace('"', '\\"') + '"'
+            for field in sorted(filterable_fields)) + "]"
+    return StoredScript(name="update_doc", source=f"""
+            // the fields copied into the chunks, or null for all fields
+            def filterable_fields = {filterable_fields_literal};
+
+            // updates the doc's fields with the new content
+            for (key in params.customer_dict.keySet()) {{
+                ctx._source[key] = params.customer_dict[key];
+            }}
+
+            // keep track of the merged doc
+            def merged_doc = [:];
+            merged_doc.putAll(ctx._source);
+            merged_doc.remove("{TensorField.chunks}");
+            merged_doc.remove("{TensorField.field_hashes}");
+
+            // the content hashes of the doc's fields before this update
+            def stored_field_hashes = ctx._source.get("{TensorField.field_hashes}");
+            if (stored_field_hashes == null) {{
+                stored_field_hashes = [:];
+            }}
+
+            // remove chunks if the __field_name matches an updated field
+            // All update fields should be recomputed, and it should be safe to delete these chunks.
+            // The exception are fields found to be unchanged, which weren't recomputed. Their chunks are
+            // kept, if the field's stored hash still matches.
+            for (int i=ctx._source.{TensorField.chunks}.length-1; i>=0; i--) {{
+                def field_name = ctx._source.{TensorField.chunks}[i].{TensorField.field_name};
+                if (params.doc_fields.contains(field_name)) {{
+                    if (!(params.kept_fields.contains(field_name)
+                            && stored_field_hashes.get(field_name) == params.field_hashes.get(field_name))) {{
+                        ctx._source.{TensorField.chunks}.remove(i);
+                    }}
+                }}
+                // Check if the field should have a tensor, remove if not.
+                else if (params.non_tensor_fields.contains(ctx._source.{TensorField.chunks}[i].{TensorField.field_name})) {{
+                    ctx._source.{TensorField.chunks}.remove(i);
+                }}
+            }}
+
+            // only the filterable fields are copied into the chunks (all fields, if it is null)
+            if (filterable_fields != null) {{
+                merged_doc.keySet().retainAll(filterable_fields);
+            }}
+
+            // update the chunks, setting fields to the new data
+            for (int i=ctx._source.{TensorField.chunks}.length-1; i>=0; i--) {{
+                for (key in params.customer_dict.keySet()) {{
+                    if (filterable_fields == null || filterable_fields.contains(key)) {{
+                        ctx._source.{TensorField.chunks}[i][key] = params.customer_dict[key];
+                    }}
+                }}
+            }}
+
+            // update the new chunks, adding the existing data
+            for (int i=params.new_chunks.length-1; i>=0; i--) {{
+                for (key in merged_doc.keySet()) {{
+                    params.new_chunks[i][key] = merged_doc[key];
+                }}
+            }}
+
+            // appends the new chunks to the existing chunks
+            ctx._source.{TensorField.chunks}.addAll(params.new_chunks);
+
+            // a kept field whose stored hash no longer matches lost its chunks above, so its hash
+            // isn't stored. Neither is the hash of a field that wasn't vectorised.
+            def new_field_hashes = [:];
+            new_field_hashes.putAll(params.field_hashes);
+            for (field_name in params.kept_fields) {{
+                if (stored_field_hashes.get(field_name) != params.field_hashes.get(field_name)) {{
+                    new_field_hashes.remove(field_name);
+                }}
+            }}
+            for (key in params.doc_fields) {{
+                stored_field_hashes.remove(key);
+            }}
+            stored_field_hashes.putAll(new_field_hashes);
+            ctx._source.{TensorField.field_hashes} = stored_field_hashes;
+""")
+
+
+# the update script of indexes whose fields are all filterable
+UPDATE_DOC_SCRIPT = get_update_doc_script(None)
+
+# Used by searches with score modifiers. Params:
+#   multiply_score_by: a list of {"field": the chunk field, "weight": number}
+#   add_to_score: a list of {"field": the chunk field, "weight": number}
+# A modifier is skipped for chunks where its field is missing or isn't a number.
+SCORE_MODIFIERS_SCRIPT = StoredScript(name="score_modifiers", source="""
+        double score = _score;
+        double additive = 0;
+        for (def modifier : params.multiply_score_by) {
+            // doc.containsKey checks if the field is in the mappings.
+            // doc[].size() > 0 and doc[].value instanceof java.lang.Number check if the field has a valid value
+            if (doc.containsKey(modifier.field) && doc[modifier.field].size() > 0 &&
+                    (doc[modifier.field].value instanceof java.lang.Number)) {
+                score = score * doc[modifier.field].value * modifier.weight;
+            }
+        }
+        for (def modifier : params.add_to_score) {
+            if (doc.containsKey(modifier.field) && doc[modifier.field].size() > 0 &&
+                    (doc[modifier.field].value instanceof java.lang.Number)) {
+                additive = additive + doc[modifier.field].value * modifier.weight;
+            }
+        }
+        return Math.max(0.0, (score + additive));
+""")
+
+# (Marqo-OS url, script id) of the scripts this process has stored
+_stored_scripts: Set[Tuple[str, str]] = set()
+_stored_scripts_lock = threading.Lock()
+
+
+def get_script_id(config: Config, script: StoredScript) -> str:
+    """Returns the id to reference script by, storing it in Marqo-OS the first
+    time it is used by this process.
+
+    Raises:
+        the HttpRequests error if the script can't be stored
+    """
+    key = (config.url, script.id)
+    if key not in _stored_scripts:
+        with _stored_scripts_lock:
+            if key not in _stored_scripts:
+                # storing a script is idempotent, so concurrent Marqo instances can all do it
+                HttpRequests(config).put(path=f"_scripts/{script.id}", body=script.to_body())
+                logger.debug(f"stored the `{script.name}` painless script as `{script.id}`")
+                _stored_scripts.add(key)
+    return script.id
+
+
+def store_script_again(config: Config, script: StoredScript) -> str:
+    """Stores script in Marqo-OS, even if this process has stored it before, e.g. because
+    Marqo-OS has lost it. Returns its id."""
+    with _stored_scripts_lock:
+        _stored_scripts.discard((config.url, script.id))
+    return get_script_id(config=config, script=script)
+
+
+def is_missing_script_error(error: Any) -> bool:
+    """Whether a Marqo-OS error says that a stored script isn't in its cluster state.
+
+    Args:
+        error: a raised error, or the error object of a _bulk item or _msearch response
+    """
+    if error is None:
+        return False
+    text = str(error)
+    return "unable to find script" in text or ("resource_not_found_exception" in text and "script" in text)
+
+
+def retry_if_script_missing(config: Config, script: StoredScript, send: Callable[[], T],
+                            is_missing: Callable[[T], bool]) -> T:
+    """Sends a request that references script. If Marqo-OS has lost the script, it's stored
+    again and the request is sent once more.
+
+    Args:
+        send: sends the request, and returns its response
+        is_missing: whether a response failed because the script is missing. A raised error
+            is checked with is_missing_script_error().
+    """
+    try:
+        response = send()
+    except Exception as e:
+        if not is_missing_script_error(e):
+            raise
+    else:
+        if not is_missing(response):
+            return response
+    logger.warning(f"Marqo-OS couldn't find the `{script.name}` painless script `{script.id}`. "
+                   f"Storing it again, and retrying the request.")
+    store_script_again(config=config, script=script)
+    return send()
@@ -0,0 +1,98 @@
+"""Streams large responses, such as the hits of an export-like search, as NDJSON: a JSON
+object per line.
+
+Items are serialised into chunks of about MARQO_STREAM_CHUNK_BYTES. The chunks are made in a
+background thread, up to MARQO_STREAM_MAX_BUFFERED_CHUNKS ahead of the client, so that items
+are post-processed while earlier chunks are sent, and a slow client only holds that many
+chunks in memory.
+
+Items should be produced lazily, e.g. search hits that are formatted as they are consumed.
+Anything that can fail should happen before the stream is created, as an error during the
+stream can only end it early.
+"""
+import queue
+import threading
+from typing import Any, Iterable, Iterator, TypeVar
+
+from marqo.tensor_search import serialization, utils
+from marqo.tensor_search.enums import EnvVars
+from marqo.tensor_search.tensor_search_logging import get_logger
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+_END = object()
+
+
+class _Failure:
+    """An error raised while producing a stream's items, to be raised to its consumer"""
+
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+def ndjson_chunks(items: Iterable[Any], chunk_bytes: int,
+                  serializer: serialization.JsonSerializer) -> Iterator[bytes]:
+    """Serialises each item as a line of NDJSON, and yields the lines in chunks of at
+    least chunk_bytes, apart from the last one. A line is never split across chunks."""
+    chunk = bytearray()
+    for item in items:
+        chunk += serializer.dumps(item)
+        chunk += b"\n"
+        if len(chunk) >= chunk_bytes:
+            yield bytes(chunk)
+            chunk = bytearray()
+    if chunk:
+        yield bytes(chunk)
+
+
+def prefetch(iterator: Iterator[T], max_buffered: int) -> Iterator[T]:
+    """Consumes iterator in a background thread, at most max_buffered items ahead.
+
+    An error raised by iterator is raised when its place in the stream is reached. Closing
+    the returned iterator, e.g. when the client disconnects, stops the background thread.
+    """
+    buffer = queue.Queue(maxsize=max_buffered)
+    closed = threading.Event()
+
+    def put(item) -> bool:
+        while not closed.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterator:
+                if not put(item):
+                    return
+            put(_END)
+        except Exception as e:
+            put(_Failure(e))
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _END:
+                return
+            if isinstance(item, _Failure):
+                logger.error(f"streamed response failed: {item.error}")
+                raise item.error
+            yield item
+    finally:
+        closed.set()
+
+
+def stream_ndjson(items: Iterable[Any]) -> Iterator[bytes]:
+    """Returns the NDJSON chunks of items, made in a background thread once the returned
+    iterator is first consumed."""
+    chunk_bytes = utils.read_int_env_var(EnvVars.MARQO_STREAM_CHUNK_BYTES)
+    max_buffered = utils.read_int_env_var(EnvVars.MARQO_STREAM_MAX_BUFFERED_CHUNKS)
+    return prefetch(ndjson_chunks(items, chunk_bytes, serialization.get_serializer()), max_buffered)
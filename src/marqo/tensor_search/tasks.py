@@ -0,0 +1,150 @@
+"""Runs long operations in the background, as tasks whose progress can be polled.
+
+Tasks are kept in the memory of the Marqo process that created them. They are lost
+if Marqo restarts. Only the most recent MAX_FINISHED_TASKS finished tasks are kept.
+"""
+import datetime
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from marqo import errors
+from marqo.tensor_search import utils
+from marqo.tensor_search.tensor_search_logging import get_logger
+
+logger = get_logger(__name__)
+
+MAX_FINISHED_TASKS = 1000
+# tasks beyond this many wait for a worker
+MAX_RUNNING_TASKS = 4
+
+
+class TaskStatus:
+    enqueued = "enqueued"
+    processing = "processing"
+    succeeded = "succeeded"
+    failed = "failed"
+
+
+class Task:
+    """A background operation. Its details are updated by the operation as it progresses."""
+
+    def __init__(self, index_name: str, task_type: str, details: dict):
+        self.task_id = str(uuid.uuid4())
+        self.index_name = index_name
+        self.task_type = task_type
+        self.status = TaskStatus.enqueued
+        self._lock = threading.Lock()
+        self._details = dict(details)
+        self.enqueued_at = datetime.datetime.utcnow()
+        self.started_at: Optional[datetime.datetime] = None
+        self.finished_at: Optional[datetime.datetime] = None
+        self.error: Optional[dict] = None
+
+    def update_details(self, **details) -> None:
+        with self._lock:
+            self._details.update(details)
+
+    def increment_details(self, **increments: int) -> None:
+        with self._lock:
+            for key, increment in increments.items():
+                self._details[key] = self._details.get(key, 0) + increment
+
+    def is_finished(self) -> bool:
+        return self.status in (TaskStatus.succeeded, TaskStatus.failed)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            details = dict(self._details)
+        as_dict = {
+            "task_id": self.task_id, "index_name": self.index_name, "type": self.task_type,
+            "status": self.status, "details": details,
+            "enqueuedAt": utils.format_timestamp(self.enqueued_at),
+        }
+        if self.started_at is not None:
+            as_dict["startedAt"] = utils.format_timestamp(self.started_at)
+        if self.finished_at is not None:
+            as_dict["finishedAt"] = utils.format_timestamp(self.finished_at)
+            as_dict["duration"] = utils.create_duration_string(self.finished_at - self.started_at)
+        if self.error is not None:
+            as_dict["error"] = self.error
+        return as_dict
+
+
+_tasks: "OrderedDict[str, Task]" = OrderedDict()
+_tasks_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _tasks_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_RUNNING_TASKS, thread_name_prefix="marqo-task")
+        return _executor
+
+
+def _evict_finished_tasks() -> None:
+    """Forgets the oldest finished tasks, beyond MAX_FINISHED_TASKS. Call with _tasks_lock held."""
+    finished = [task_id for task_id, task in _tasks.items() if task.is_finished()]
+    for task_id in finished[:max(0, len(finished) - MAX_FINISHED_TASKS)]:
+        del _tasks[task_id]
+
+
+def error_to_dict(e: Exception) -> dict:
+    """The error of a failed background operation, as it is reported to the client"""
+    if isinstance(e, errors.MarqoWebError):
+        return {"message": e.message, "code": e.code, "type": e.error_type}
+    return {"message": str(e), "code": errors.InternalError.code, "type": errors.InternalError.error_type}
+
+
+def _run(task: Task, operation: Callable[[Task], None]) -> None:
+    task.started_at = datetime.datetime.utcnow()
+    task.status = TaskStatus.processing
+    try:
+        operation(task)
+        task.status = TaskStatus.succeeded
+    except Exception as e:
+        logger.error(f"task `{task.task_id}` ({task.task_type} on index `{task.index_name}`) failed: {e}")
+        task.error = error_to_dict(e)
+        task.status = TaskStatus.failed
+    finally:
+        task.finished_at = datetime.datetime.utcnow()
+        with _tasks_lock:
+            _evict_finished_tasks()
+
+
+def submit_task(index_name: str, task_type: str, details: dict, operation: Callable[[Task], None]) -> Task:
+    """Runs operation in the background.
+
+    Args:
+        index_name: the index the task operates on
+        task_type: e.g. "documentDeletion"
+        details: the task's initial details
+        operation: called with the task. It reports progress with task.update_details().
+            The task fails if it raises.
+
+    Returns:
+        the enqueued task
+    """
+    task = Task(index_name=index_name, task_type=task_type, details=details)
+    executor = _get_executor()
+    with _tasks_lock:
+        _tasks[task.task_id] = task
+    executor.submit(_run, task, operation)
+    return task
+
+
+def get_task(task_id: str) -> dict:
+    """Returns the status of a task
+
+    Raises:
+        TaskNotFoundError if the task doesn't exist, or has been forgotten
+    """
+    with _tasks_lock:
+        task = _tasks.get(task_id)
+    if task is None:
+        raise errors.TaskNotFoundError(f"Task `{task_id}` not found.")
+    return task.to_dict()
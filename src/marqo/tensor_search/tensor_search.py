@@ -33,13 +33,17 @@ Notes on search behaviour with caching and searchable attributes:
 import copy
 import json
 import datetime
-from collections import defaultdict
+import math
+import collections
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from timeit import default_timer as timer
 import functools
+import itertools
 import pprint
 import typing
 import uuid
-from typing import List, Optional, Union, Iterable, Sequence, Dict, Any, Tuple, Set
+from typing import List, Optional, Union, Iterable, Sequence, Dict, Any, Tuple, Set, Callable, Iterator, Container
 import numpy as np
 from PIL import Image
 import marqo.config as config
@@ -48,7 +52,8 @@ from marqo.tensor_search.enums import (
     EnvVars
 )
 from marqo.tensor_search.enums import IndexSettingsField as NsField
-from marqo.tensor_search import utils, backend, validation, configs, parallel, add_docs
+from marqo.tensor_search import utils, backend, validation, configs, parallel, add_docs, index_refresh, stored_scripts
+from marqo.tensor_search import bulk, tasks, ingest_jobs, hybrid, inference_executor, constants, query_images
 from marqo.tensor_search.formatting import _clean_doc
 from marqo.tensor_search.index_meta_cache import get_cache, get_index_info
 from marqo.tensor_search import index_meta_cache
@@ -93,12 +98,13 @@ def create_vector_index(
         the_index_settings = configs.get_default_index_settings()
 
     validation.validate_settings_object(settings_object=the_index_settings)
+    ef_search = the_index_settings[NsField.index_defaults].get(NsField.knn_parameters, {}).get(NsField.knn_ef_search)
 
     vector_index_settings = {
         "settings": {
             "index": {
                 "knn": True,
-                "knn.algo_param.ef_search": 100,
+                "knn.algo_param.ef_search": 100 if ef_search is None else ef_search,
                 "refresh_interval": refresh_interval,
                 "store.hybrid.mmap.extensions": ["nvd", "dvd", "tim", "tip", "dim", "kdd", "kdi", "cfs", "doc", "vec",
                                                  "vex"]
@@ -131,6 +137,10 @@ def create_vector_index(
                             "type": "text"
                         },
                     }
+                },
+                TensorField.field_hashes: {
+                    "type": "object",
+                    "enabled": False
                 }
             }
         }
@@ -171,16 +181,17 @@ def _marqo_field_limit_to_os_limit(marqo_index_field_limit: int) -> int:
         - One for its vector
         - One for filtering
 
-    There are also 3 fields that will be generated on a Marqo index, in most
+    There are also 4 fields that will be generated on a Marqo index, in most
     cases:
         - one for the chunks field
         - one for chunk's __field_content
         - one for chunk's __field_name
+        - one for the __field_hashes field
 
     Returns:
         The corresponding Marqo-OS limit
     """
-    return (marqo_index_field_limit * 3) + 3
+    return (marqo_index_field_limit * 3) + 4
 
 
 def _autofill_index_settings(index_settings: dict):
@@ -230,11 +241,26 @@ def _autofill_index_settings(index_settings: dict):
     return copied_settings
 
 
-def get_stats(config: Config, index_name: str):
+def get_stats(config: Config, index_name: str, refresh_metrics: bool = False):
+    """Returns the number of documents in the index.
+
+    Args:
+        refresh_metrics: if True, the stats also count the refreshes of the index requested
+            from this Marqo process, and how many of them were coalesced into one _refresh
+    """
     doc_count = HttpRequests(config).post(path=F"{index_name}/_count")["count"]
-    return {
+    stats = {
         "numberOfDocuments": doc_count
     }
+    if refresh_metrics:
+        metrics = index_refresh.get_refresh_metrics(config=config).get(
+            index_name, {"refresh_requests": 0, "refreshes_sent": 0, "refreshes_saved": 0})
+        stats["refreshMetrics"] = {
+            "refreshRequests": metrics["refresh_requests"],
+            "refreshesSent": metrics["refreshes_sent"],
+            "refreshesSaved": metrics["refreshes_saved"],
+        }
+    return stats
 
 
 def _check_and_create_index_if_not_exist(config: Config, index_name: str):
@@ -250,14 +276,31 @@ def add_documents_orchestrator(
         auto_refresh: bool, batch_size: int = 0, processes: int = 1,
         non_tensor_fields=None, image_download_headers: dict = None,
         device=None, update_mode: str = 'replace', use_existing_tensors: bool = False,
-        mappings: dict = None
+        mappings: dict = None, async_mode: bool = False
     ):
+    """Adds docs, batching them and spreading them across processes as requested
+
+    Args:
+        async_mode: if True, the docs are written to disk and added in the background,
+            as an ingest job. The job is returned immediately. Its progress can be polled
+            with ingest_jobs.get_job(). processes is ignored.
+    """
     if image_download_headers is None:
         image_download_headers = dict()
 
     if non_tensor_fields is None:
         non_tensor_fields = []
 
+    if async_mode:
+        return ingest_jobs.submit_job(
+            config=config, index_name=index_name, docs=docs, batch_size=batch_size,
+            add_docs_args=dict(
+                auto_refresh=auto_refresh, device=device, update_mode=update_mode,
+                non_tensor_fields=non_tensor_fields, use_existing_tensors=use_existing_tensors,
+                image_download_headers=image_download_headers, mappings=mappings
+            )
+        )
+
     if batch_size is None or batch_size == 0:
         logger.debug(f"batch_size={batch_size} and processes={processes} - not doing any marqo side batching")
         return add_documents(
@@ -324,28 +367,97 @@ def _batch_request(config: Config, index_name: str, dataset: List[dict],
 
     batched = functools.reduce(lambda x, y: batch_requests(x, y), deeper, [])
 
-    def verbosely_add_docs(i, docs):
-        t0 = timer()
+    results = add_document_batches(
+        config=config, index_name=index_name, batches=batched, auto_refresh=False, device=device,
+        update_mode=update_mode, non_tensor_fields=non_tensor_fields,
+        use_existing_tensors=use_existing_tensors, image_download_headers=image_download_headers,
+        mappings=mappings
+    )
+    if verbose:
+        for i, res in enumerate(results):
+            logger.debug(f"        results from indexing batch {i}: {res}")
+    logger.info('completed batch ingestion.')
+    return results
+
 
-        logger.debug(f"    batch {i}: beginning ingestion. ")
-        res = add_documents(
-            config=config, index_name=index_name,
-            docs=docs, auto_refresh=False, device=device,
-            update_mode=update_mode, non_tensor_fields=non_tensor_fields,
-            use_existing_tensors=use_existing_tensors, image_download_headers=image_download_headers,
-            mappings=mappings
-        )
-        total_batch_time = timer() - t0
-        num_docs = len(docs)
+def _get_max_pipelined_bulk_requests() -> int:
+    """Gets MARQO_MAX_PIPELINED_BULK_REQUESTS from the environment, validates it before returning it."""
+    return utils.read_int_env_var(EnvVars.MARQO_MAX_PIPELINED_BULK_REQUESTS, min_value=0)
 
-        logger.debug(f"    batch {i}: ingested {num_docs} docs. Time taken: {(total_batch_time):.3f}. "
-                    f"Average time per doc {(total_batch_time / num_docs):.3f}")
-        if verbose:
-            logger.debug(f"        results from indexing batch {i}: {res}")
-        return res
 
-    results = [verbosely_add_docs(i, docs) for i, docs in enumerate(batched)]
-    logger.info('completed batch ingestion.')
+def add_document_batches(
+        config: Config, index_name: str, batches: Iterable[List[dict]], auto_refresh: bool,
+        non_tensor_fields=None, device=None, update_mode: str = 'replace',
+        image_download_headers: dict = None, use_existing_tensors: bool = False, mappings: dict = None,
+        on_batch_prepared: Optional[Callable[[int], None]] = None,
+        on_batch_indexed: Optional[Callable[[int, dict], None]] = None) -> List[dict]:
+    """Adds batches of docs with add_documents, pipelined: the _bulk request of a batch
+    is sent in the background while the next batch is prepared and vectorised.
+
+    Up to MARQO_MAX_PIPELINED_BULK_REQUESTS _bulk requests are in flight. Preparing the
+    next batch waits for the oldest one when there are more. If it is 0, each batch is
+    indexed before the next one is prepared.
+
+    Args:
+        batches: the batches of docs. The other args are passed on to add_documents.
+        on_batch_prepared: called with the index of each batch, once it has been vectorised
+        on_batch_indexed: called with the index and add_documents response of each batch,
+            in the order of the batches, once it has been indexed
+
+    Returns:
+        the add_documents response of each batch, in the order of the batches
+
+    Raises:
+        the first error of a batch, including errors raised by iterating batches. The
+        batches after it aren't prepared, and the _bulk requests already in flight are
+        completed first.
+    """
+    max_in_flight = _get_max_pipelined_bulk_requests()
+    results = []
+    # the _bulk requests in flight, oldest first
+    in_flight = collections.deque()
+
+    def collect(result: dict):
+        if on_batch_indexed is not None:
+            on_batch_indexed(len(results), result)
+        results.append(result)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_in_flight), thread_name_prefix="marqo-bulk") as executor:
+        batch_iter = enumerate(batches)
+        while True:
+            t0 = timer()
+            try:
+                try:
+                    i, docs = next(batch_iter)
+                except StopIteration:
+                    break
+                index_documents = _prepare_documents(
+                    config=config, index_name=index_name, docs=docs, auto_refresh=auto_refresh, device=device,
+                    update_mode=update_mode, non_tensor_fields=non_tensor_fields,
+                    use_existing_tensors=use_existing_tensors, image_download_headers=image_download_headers,
+                    mappings=mappings
+                )
+            except Exception:
+                # raised by reading or preparing this batch: the batches before it are still
+                # collected, so that they are reported
+                while in_flight:
+                    collect(in_flight.popleft().result())
+                raise
+            logger.debug(f"    batch {i}: prepared {len(docs)} docs in {(timer() - t0):.3f}s, "
+                         f"with {len(in_flight)} _bulk requests in flight")
+            if on_batch_prepared is not None:
+                on_batch_prepared(i)
+
+            if max_in_flight == 0:
+                collect(index_documents())
+                continue
+            # collects the completed requests, raising their errors without waiting for the others
+            while in_flight and (len(in_flight) >= max_in_flight or in_flight[0].done()):
+                collect(in_flight.popleft().result())
+            in_flight.append(executor.submit(index_documents))
+
+        while in_flight:
+            collect(in_flight.popleft().result())
     return results
 
 
@@ -371,10 +483,55 @@ def _infer_opensearch_data_type(
         return None
 
 
-def _get_chunks_for_field(field_name: str, doc_id: str, doc):
-    # Find the chunks with a specific __field_name in a doc
-    # Note: for a chunkless doc (nothing was tensorised) --> doc["_source"]["__chunks"] == []
-    return [chunk for chunk in doc["_source"]["__chunks"] if chunk["__field_name"] == field_name]
+def _group_chunks_by_field(doc: dict) -> Dict[str, List[dict]]:
+    """Groups the chunks of a doc fetched by _get_documents_for_upsert by their __field_name.
+    The chunk dicts (and their vectors) are not copied."""
+    chunks_by_field = dict()
+    for chunk in doc["_source"].get(TensorField.chunks, []):
+        chunks_by_field.setdefault(chunk[TensorField.field_name], []).append(chunk)
+    return chunks_by_field
+
+
+def _get_field_hash_key(index_info: IndexInfo) -> str:
+    """Returns the index settings that determine how a field's content is chunked and vectorised.
+    They are hashed together with the content, so that changing them invalidates the stored hashes."""
+    index_defaults = index_info.index_settings[NsField.index_defaults]
+    return json.dumps({
+        NsField.model: index_info.model_name,
+        NsField.model_properties: _get_model_properties(index_info),
+        NsField.normalize_embeddings: index_defaults[NsField.normalize_embeddings],
+        NsField.treat_urls_and_pointers_as_images: index_defaults[NsField.treat_urls_and_pointers_as_images],
+        NsField.text_preprocessing: index_defaults[NsField.text_preprocessing],
+        NsField.image_preprocessing: index_defaults[NsField.image_preprocessing],
+    }, sort_keys=True, default=str)
+
+
+def _get_field_hashes(doc, hash_key: str, mappings: Optional[dict] = None,
+                      non_tensor_fields: Iterable[str] = ()) -> Dict[str, str]:
+    """Hashes the content of the fields of doc that can be vectorised (text, images
+    pointers and multimodal combinations).
+
+    Returns:
+        a dict of field name -> content hash. Fields that can't be hashed, or that aren't
+        vectorised as they are non_tensor_fields, are left out, as well as every field of an
+        invalid doc. These are validated later on.
+    """
+    field_hashes = dict()
+    if not isinstance(doc, dict):
+        return field_hashes
+    for field, field_content in doc.items():
+        if field == "_id" or field in non_tensor_fields or not isinstance(field_content, (str, dict)):
+            continue
+        field_hash_key = hash_key
+        if isinstance(field_content, dict):
+            # a multimodal combination also depends on its mapping (e.g. its weights)
+            field_mapping = mappings.get(field) if isinstance(mappings, dict) else None
+            field_hash_key = hash_key + json.dumps(field_mapping, sort_keys=True, default=str)
+        try:
+            field_hashes[field] = utils.generate_field_hash(field_content, hash_key=field_hash_key)
+        except (TypeError, ValueError):
+            continue
+    return field_hashes
 
 
 def add_documents(config: Config, index_name: str, docs: List[dict], auto_refresh: bool,
@@ -390,7 +547,8 @@ def add_documents(config: Config, index_name: str, docs: List[dict], auto_refres
         auto_refresh: Set to False if indexing lots of docs
         non_tensor_fields: List of fields, within documents to not create tensors for. Default to
           make tensors for all fields.
-        use_existing_tensors: Whether or not to use the vectors already in doc (for update docs)
+        use_existing_tensors: Whether or not to use the vectors already in doc (for update docs).
+          A field is only re-vectorised if its content hash differs from the stored one.
         device: Device used to carry out the document update.
         update_mode: {'replace' | 'update'}. If set to replace (default) just
         image_download_thread_count: number of threads used to concurrently download images
@@ -398,6 +556,25 @@ def add_documents(config: Config, index_name: str, docs: List[dict], auto_refres
         mappings: a dictionary used to handle all the object field content in the doc, e.g., multimodal_combination field
     Returns:
 
+    """
+    index_documents = _prepare_documents(
+        config=config, index_name=index_name, docs=docs, auto_refresh=auto_refresh,
+        non_tensor_fields=non_tensor_fields, device=device, update_mode=update_mode,
+        image_download_thread_count=image_download_thread_count, image_download_headers=image_download_headers,
+        use_existing_tensors=use_existing_tensors, mappings=mappings)
+    return index_documents()
+
+
+def _prepare_documents(config: Config, index_name: str, docs: List[dict], auto_refresh: bool,
+                       non_tensor_fields=None, device=None, update_mode: str = "replace",
+                       image_download_thread_count: int = 20, image_download_headers: dict = None,
+                       use_existing_tensors: bool = False, mappings: dict = None) -> Callable[[], dict]:
+    """Prepares and vectorises docs for add_documents, up to their _bulk request.
+    Takes the same args as add_documents.
+
+    Returns:
+        a function that sends the _bulk request, refreshes the index if auto_refresh, and
+        returns the add_documents response. It can be called from another thread.
     """
     # ADD DOCS TIMER-LOGGER (3)
     if image_download_headers is None:
@@ -422,10 +599,6 @@ def add_documents(config: Config, index_name: str, docs: List[dict], auto_refres
     if len(docs) == 0:
         raise errors.BadRequestError(message="Received empty add documents request")
 
-    if use_existing_tensors and update_mode != "replace":
-        raise errors.InvalidArgError("use_existing_tensors=True is only available for add and replace documents,"
-                                     "not for add and update!")
-
     valid_update_modes = ('update', 'replace')
     if update_mode not in valid_update_modes:
         raise errors.InvalidArgError(message=f"Unknown update_mode `{update_mode}` "
@@ -435,6 +608,7 @@ def add_documents(config: Config, index_name: str, docs: List[dict], auto_refres
 
     existing_fields = set(index_info.properties.keys())
     new_fields = set()
+    filterable_fields = index_info.get_filterable_fields()
 
     # A dict to store the multimodal_fields and their (child_fields, opensearch_type)
     # dict = {parent_field_1 : set((child_field_1, type), ),
@@ -456,14 +630,53 @@ def add_documents(config: Config, index_name: str, docs: List[dict], auto_refres
         logger.debug(f"          add_documents image download: took {(timer() - ti_0):.3f}s to concurrently download "
                     f"images for {batch_size} docs using {image_download_thread_count} threads ")
 
-    if update_mode == 'replace' and use_existing_tensors:
-        doc_ids = []
+    # the content hashes of each doc's fields, stored with the doc
+    field_hash_key = _get_field_hash_key(index_info)
+    field_hashes_by_doc = [
+        _get_field_hashes(doc, hash_key=field_hash_key, mappings=mappings, non_tensor_fields=non_tensor_fields)
+        for doc in docs]
 
+    # the fields of each doc whose content hash matches the stored doc's, and the stored chunks of
+    # those fields. Unchanged fields aren't chunked or vectorised again.
+    unchanged_fields_by_doc = [set() for _ in docs]
+    existing_chunks_by_id = dict()
+
+    if use_existing_tensors:
         # Iterate through the list in reverse, only latest doc with dupe id gets added.
-        for i in range(len(docs)-1, -1, -1):
-            if ("_id" in docs[i]) and (docs[i]["_id"] not in doc_ids):
-                doc_ids.append(docs[i]["_id"])
-        existing_docs = _get_documents_for_upsert(config=config, index_name=index_name, document_ids=doc_ids)
+        # Ids that aren't strings are invalid, they are rejected when the doc is validated.
+        doc_ids = list(dict.fromkeys(
+            doc["_id"] for doc in reversed(docs) if isinstance(doc, dict) and isinstance(doc.get("_id"), str)))
+        existing_field_hashes = _get_field_hashes_for_upsert(
+            config=config, index_name=index_name, document_ids=doc_ids)
+
+        # Updates with the same id are applied in turn, so only the first one could be compared
+        # with the stored hashes. For simplicity, these ids are vectorised as usual.
+        ids_to_skip = set()
+        if update_mode == 'update':
+            id_counts = Counter(doc["_id"] for doc in docs if isinstance(doc, dict) and isinstance(doc.get("_id"), str))
+            ids_to_skip = {_id for _id, count in id_counts.items() if count > 1}
+
+        fields_to_reuse_by_id = dict()
+        for doc, field_hashes, unchanged_fields in zip(docs, field_hashes_by_doc, unchanged_fields_by_doc):
+            if not field_hashes or not isinstance(doc.get("_id"), str) or doc["_id"] not in existing_field_hashes \
+                    or doc["_id"] in ids_to_skip:
+                continue
+            stored_hashes = existing_field_hashes[doc["_id"]]
+            unchanged_fields.update(field for field, field_hash in field_hashes.items()
+                                    if stored_hashes.get(field) == field_hash)
+            fields_to_reuse_by_id.setdefault(doc["_id"], set()).update(unchanged_fields)
+
+        # Replaced docs are overwritten, so the vectors of their unchanged fields are fetched to be sent
+        # again. Updated docs keep their unchanged fields' chunks in Marqo-OS.
+        if update_mode == 'replace':
+            existing_chunks_by_id = _get_chunks_for_upsert(
+                config=config, index_name=index_name,
+                fields_by_doc_id={_id: fields for _id, fields in fields_to_reuse_by_id.items() if fields})
+
+    # the index's filterable fields are part of its update script, rather than of every update
+    update_script = stored_scripts.get_update_doc_script(filterable_fields)
+    if update_mode == 'update':
+        update_script_id = stored_scripts.get_script_id(config=config, script=update_script)
 
     for i, doc in enumerate(docs):
 
@@ -493,29 +706,28 @@ def add_documents(config: Config, index_name: str, docs: List[dict], auto_refres
 
         if update_mode == "replace":
             indexing_instructions["index"]["_id"] = doc_id
-            if use_existing_tensors:
-                matching_doc = [doc for doc in existing_docs["docs"] if doc["_id"] == doc_id]
-                # Should only have 1 result, as only 1 id matches
-                if len(matching_doc) == 1:
-                    existing_doc = matching_doc[0]
-                # When a request isn't sent to get matching docs, because the added docs don't
-                # have IDs:
-                elif len(matching_doc) == 0:
-                    existing_doc = {"found": False}
-                else:
-                    raise errors.InternalError(message= f"Upsert: found {len(matching_doc)} matching docs for {doc_id} when only 1 or 0 should have been found.")
         else:
             indexing_instructions["update"]["_id"] = doc_id
 
+        unchanged_fields = unchanged_fields_by_doc[i]
+        # fields whose stored chunks are kept as they are by the update script
+        fields_kept_in_place = []
+        # the hashes of the fields that are vectorised, or whose chunks are kept. Only these are stored,
+        # so that a stored hash always means that the field's chunks are there.
+        field_hashes = dict()
+
         # Metadata can be calculated here at the doc level.
         # Only add chunk values which are string, boolean, numeric or dictionary.
         # Dictionary keys will be store in a list.
+        # If the index declares its filterable fields, only those are added.
         chunk_values_for_filtering = {}
         for key, value in copied.items():
             if not (isinstance(value, str) or isinstance(value, float)
                     or isinstance(value, bool) or isinstance(value, int)
                     or isinstance(value, list) or isinstance(value, dict)):
                 continue
+            if filterable_fields is not None and key not in filterable_fields:
+                continue
             chunk_values_for_filtering[key] = value
 
         chunks = []
@@ -546,9 +758,12 @@ def add_documents(config: Config, index_name: str, docs: List[dict], auto_refres
             # chunks generated by processing this field for this doc:
             chunks_to_append = []
             # Check if content of this field changed. If no, skip all chunking and vectorisation
-            if ((update_mode == 'replace') and use_existing_tensors and existing_doc["found"]
-                    and (field in existing_doc["_source"]) and (existing_doc["_source"][field] == field_content)):
-                chunks_to_append = _get_chunks_for_field(field_name=field, doc_id=doc_id, doc=existing_doc)
+            if field in unchanged_fields:
+                if update_mode == 'replace':
+                    chunks_to_append = existing_chunks_by_id.get(doc_id, dict()).get(field, [])
+                else:
+                    fields_kept_in_place.append(field)
+                field_hashes[field] = field_hashes_by_doc[i][field]
 
             # Chunk and vectorise, since content changed.
             elif isinstance(field_content, (str, Image.Image)):
@@ -620,11 +835,11 @@ def add_documents(config: Config, index_name: str, docs: List[dict], auto_refres
 
                     # ADD DOCS TIMER-LOGGER (4)
                     start_time = timer()
-                    vector_chunks = s2_inference.vectorise(
+                    vector_chunks = inference_executor.run_on_device(selected_device, lambda: s2_inference.vectorise(
                         model_name=index_info.model_name,
                         model_properties=_get_model_properties(index_info), content=content_chunks,
                         device=selected_device, normalize_embeddings=normalize_embeddings,
-                        infer=infer_if_image)
+                        infer=infer_if_image, as_numpy=True))
 
                     end_time = timer()
                     total_vectorise_time += (end_time - start_time)
@@ -657,6 +872,8 @@ def add_documents(config: Config, index_name: str, docs: List[dict], auto_refres
                         TensorField.field_content: text_chunk,
                         TensorField.field_name: field
                     })
+                if field in field_hashes_by_doc[i]:
+                    field_hashes[field] = field_hashes_by_doc[i][field]
             
             elif isinstance(field_content, dict):
                 if mappings[field]["type"]=="multimodal_combination":
@@ -673,6 +890,8 @@ def add_documents(config: Config, index_name: str, docs: List[dict], auto_refres
                         if field not in new_obj_fields:
                             new_obj_fields[field] = set()
                         new_obj_fields[field] = new_obj_fields[field].union(new_fields_from_multimodal_combination)
+                        if field in field_hashes_by_doc[i]:
+                            field_hashes[field] = field_hashes_by_doc[i][field]
                         # TODO: we may want to use chunks_to_append here to make it uniform with use_existing_tensors and normal vectorisation
                         chunks.append({**combo_chunk, **chunk_values_for_filtering})
                         continue
@@ -685,63 +904,25 @@ def add_documents(config: Config, index_name: str, docs: List[dict], auto_refres
             new_fields = new_fields.union(new_fields_from_doc)
             if update_mode == 'replace':
                 copied[TensorField.chunks] = chunks
+                copied[TensorField.field_hashes] = field_hashes
                 bulk_parent_dicts.append(indexing_instructions)
                 bulk_parent_dicts.append(copied)
             else:
                 to_upsert = copied.copy()
                 to_upsert[TensorField.chunks] = chunks
+                to_upsert[TensorField.field_hashes] = field_hashes
                 bulk_parent_dicts.append(indexing_instructions)
                 bulk_parent_dicts.append({
                     "upsert": to_upsert,
                     "script": {
-                        "lang": "painless",
-                        "source": f"""
-            
-            // updates the doc's fields with the new content
-            for (key in params.customer_dict.keySet()) {{
-                ctx._source[key] = params.customer_dict[key];
-            }}            
-                        
-            // keep track of the merged doc
-            def merged_doc = [:];
-            merged_doc.putAll(ctx._source);
-            merged_doc.remove("{TensorField.chunks}");
-            
-            // remove chunks if the __field_name matches an updated field
-            // All update fields should be recomputed, and it should be safe to delete these chunks             
-            for (int i=ctx._source.{TensorField.chunks}.length-1; i>=0; i--) {{
-                if (params.doc_fields.contains(ctx._source.{TensorField.chunks}[i].{TensorField.field_name})) {{
-                   ctx._source.{TensorField.chunks}.remove(i);
-                }}
-                // Check if the field should have a tensor, remove if not.
-                else if (params.non_tensor_fields.contains(ctx._source.{TensorField.chunks}[i].{TensorField.field_name})) {{
-                    ctx._source.{TensorField.chunks}.remove(i);
-                }}
-            }}
-            
-            // update the chunks, setting fields to the new data
-            for (int i=ctx._source.{TensorField.chunks}.length-1; i>=0; i--) {{
-                for (key in params.customer_dict.keySet()) {{
-                    ctx._source.{TensorField.chunks}[i][key] = params.customer_dict[key];
-                }}
-            }}
-            
-            // update the new chunks, adding the existing data 
-            for (int i=params.new_chunks.length-1; i>=0; i--) {{
-                for (key in merged_doc.keySet()) {{
-                    params.new_chunks[i][key] = merged_doc[key];
-                }}
-            }}
-            
-            // appends the new chunks to the existing chunks  
-            ctx._source.{TensorField.chunks}.addAll(params.new_chunks);
-            
-                        """,
+                        "id": update_script_id,
                         "params": {
                             "doc_fields": list(copied.keys()),
                             "new_chunks": chunks,
                             "customer_dict": copied,
-                            "non_tensor_fields": non_tensor_fields
+                            "non_tensor_fields": non_tensor_fields,
+                            "field_hashes": field_hashes,
+                            "kept_fields": fields_kept_in_place,
                         },
                     }
                 })
@@ -760,10 +941,25 @@ def add_documents(config: Config, index_name: str, docs: List[dict], auto_refres
             config=config, index_name=index_name, customer_field_names=new_fields,
             model_properties=_get_model_properties(index_info), multimodal_combination_fields=new_obj_fields)
 
+    return functools.partial(
+        _index_prepared_documents, config=config, index_name=index_name, auto_refresh=auto_refresh,
+        update_mode=update_mode, bulk_parent_dicts=bulk_parent_dicts, unsuccessful_docs=unsuccessful_docs,
+        batch_size=batch_size, t0=t0, update_script=update_script)
+
+
+def _index_prepared_documents(config: Config, index_name: str, auto_refresh: bool, update_mode: str,
+                              bulk_parent_dicts: List[dict], unsuccessful_docs: List[Tuple[int, dict]],
+                              batch_size: int, t0: float, update_script: stored_scripts.StoredScript) -> dict:
+    """Sends the _bulk request prepared by _prepare_documents, and returns the add_documents response"""
+    if bulk_parent_dicts:
         # ADD DOCS TIMER-LOGGER (5)
         start_time_5 = timer()
-        index_parent_response = HttpRequests(config).post(
-            path="_bulk", body=utils.dicts_to_jsonl(bulk_parent_dicts))
+        # oversized batches are split into concurrent sub-requests. Their items keep the order of the docs.
+        actions = [bulk_parent_dicts[i:i + 2] for i in range(0, len(bulk_parent_dicts), 2)]
+        index_parent_response = bulk.send_bulk(config=config, actions=actions)
+        if update_mode == 'update':
+            index_parent_response = _retry_updates_missing_script(
+                config=config, script=update_script, actions=actions, response=index_parent_response)
         end_time_5 = timer()
         total_http_time = end_time_5 - start_time_5
         total_index_time = index_parent_response["took"] * 0.001
@@ -778,7 +974,7 @@ def add_documents(config: Config, index_name: str, docs: List[dict], auto_refres
         index_parent_response = None
 
     if auto_refresh:
-        refresh_response = HttpRequests(config).post(path=F"{index_name}/_refresh")
+        refresh_response = index_refresh.refresh_index(config=config, index_name=index_name)
 
     t1 = timer()
 
@@ -814,6 +1010,31 @@ def add_documents(config: Config, index_name: str, docs: List[dict], auto_refres
     return translate_add_doc_response(response=index_parent_response, time_diff=t1 - t0)
 
 
+def _retry_updates_missing_script(config: Config, script: stored_scripts.StoredScript,
+                                  actions: List[List[dict]], response: dict) -> dict:
+    """Sends the update actions that failed because Marqo-OS has lost their update script
+    again, once, after storing the script again.
+
+    Returns:
+        the _bulk response, with the items of the retried actions replaced
+    """
+    if not response.get("errors"):
+        return response
+    failed = [i for i, item in enumerate(response["items"])
+              if stored_scripts.is_missing_script_error(item.get("update", dict()).get("error"))]
+    if not failed:
+        return response
+    logger.warning(f"Marqo-OS couldn't find the update script for {len(failed)} docs. "
+                   f"Storing it again, and retrying these docs.")
+    stored_scripts.store_script_again(config=config, script=script)
+    retried = bulk.send_bulk(config=config, actions=[actions[i] for i in failed])
+    items = list(response["items"])
+    for i, item in zip(failed, retried["items"]):
+        items[i] = item
+    return {**response, "items": items,
+            "errors": any("error" in action_result for item in items for action_result in item.values())}
+
+
 def get_document_by_id(
         config: Config, index_name: str, document_id: str, show_vectors: bool = False):
     """returns document by its ID"""
@@ -829,9 +1050,14 @@ def get_document_by_id(
 
 def get_documents_by_ids(
         config: Config, index_name: str, document_ids: List[str],
-        show_vectors: bool = False,
+        show_vectors: bool = False, stream: bool = False
 ):
-    """returns documents by their IDs"""
+    """returns documents by their IDs
+
+    If stream is True, "results" is an iterator. The docs are fetched and cleaned in batches of
+    MARQO_STREAM_GET_BATCH_SIZE as it's consumed, apart from the first batch, which is fetched
+    straight away so that its errors are raised here. See streaming.
+    """
     if not isinstance(document_ids, typing.Collection):
         raise errors.InvalidArgError("Get documents must be passed a collection of IDs!")
     if len(document_ids) <= 0:
@@ -849,6 +1075,25 @@ def get_documents_by_ids(
         for d in docs:
             d["_source"] = dict()
             d["_source"]["exclude"] = f"*{TensorField.vector_prefix}*"
+    if not stream:
+        return _mget_documents(config=config, docs=docs, show_vectors=show_vectors)
+
+    batch_size = utils.read_int_env_var(EnvVars.MARQO_STREAM_GET_BATCH_SIZE)
+    batches = [docs[i:i + batch_size] for i in range(0, len(docs), batch_size)]
+
+    def batch_results(batch: List[dict]) -> List[dict]:
+        res = _mget_documents(config=config, docs=batch, show_vectors=show_vectors)
+        if "results" not in res:
+            raise errors.InternalError(f"Marqo-OS returned an unexpected response to _mget: {res}")
+        return res["results"]
+
+    first_results = batch_results(batches[0])
+    return {"results": itertools.chain(
+        first_results, itertools.chain.from_iterable(batch_results(batch) for batch in batches[1:]))}
+
+
+def _mget_documents(config: Config, docs: List[dict], show_vectors: bool) -> dict:
+    """Gets docs, the `docs` of an `_mget` body, and cleans them. See get_documents_by_ids()"""
     res = HttpRequests(config).get(
         f'_mget/',
         body={
@@ -875,9 +1120,20 @@ def get_documents_by_ids(
 
 def _get_documents_for_upsert(
         config: Config, index_name: str, document_ids: List[str],
-        show_vectors: bool = False,
+        source_includes: Union[List[str], Dict[str, List[str]]]
 ):
-    """returns document chunks and content"""
+    """returns the parts of existing docs needed to upsert them
+
+    Each doc is fetched once, in a single _mget.
+
+    Args:
+        source_includes: the _source fields to fetch, either for all docs or as a dict
+            of doc id -> the fields to fetch for that doc
+
+    Returns:
+        {"docs": [...]}, with one result per (unique, valid) id in document_ids.
+        A result is either {"_id": ..., "found": False, ...} or the found doc.
+    """
     if not isinstance(document_ids, typing.Collection):
         raise errors.InvalidArgError("Get documents must be passed a collection of IDs!")
 
@@ -889,6 +1145,7 @@ def _get_documents_for_upsert(
             valid_doc_ids.append(d_id)
         except errors.InvalidDocumentIdError:
             pass
+    valid_doc_ids = list(dict.fromkeys(valid_doc_ids))
 
     if len(valid_doc_ids) <= 0:
         return {"docs": []}
@@ -898,94 +1155,97 @@ def _get_documents_for_upsert(
             f"{len(document_ids)} documents were requested, which is more than the allowed limit of [{max_docs_limit}], "
             f"set by the environment variable `{EnvVars.MARQO_MAX_RETRIEVABLE_DOCS}`")
 
-    # Chunk Docs (get field name, field content, vectors)
-
-    chunk_docs = [
-        {"_index": index_name, "_id": doc_id,
-         "_source": {"include": [f"__chunks.__field_content", f"__chunks.__field_name", f"__chunks.__vector_*"]}}
-        for doc_id in valid_doc_ids
-    ]
-
-    data_docs = [
-        {"_index": index_name, "_id": doc_id, "_source": {"exclude": "__chunks.*"}}
-        for doc_id in valid_doc_ids
-    ]
-
     res = HttpRequests(config).get(
         f'_mget/',
         body={
-            "docs": chunk_docs + data_docs,
+            "docs": [
+                {"_index": index_name, "_id": doc_id, "_source": {
+                    "include": source_includes[doc_id] if isinstance(source_includes, dict) else source_includes}}
+                for doc_id in valid_doc_ids
+            ]
         }
     )
 
-    # Combine the 2 query results (loop through each doc id)
-    combined_result = []
+    # Returns a list of docs, in the order of valid_doc_ids
+    return res
 
-    for doc_id in valid_doc_ids:
-        # There should always be 2 results per doc.
-        result_list = [doc for doc in res["docs"] if doc["_id"] == doc_id]
 
-        if len(result_list) == 0:
-            continue
-        if len(result_list) not in (2, 0):
-            raise errors.InternalError(f"Internal error fetching old documents. "
-                                       f"There are {len(result_list)} results for doc id {doc_id}.")
-
-        for result in result_list:
-            if result["found"]:
-                doc_in_results = True
-                if ("__chunks" in result["_source"]) and (result["_source"]["__chunks"] == []):
-                    res_data = result
-                else:
-                    res_chunks = result
-            else:
-                doc_in_results = False
-                dummy_res = result
-                break
+def _get_field_hashes_for_upsert(config: Config, index_name: str, document_ids: List[str]) -> Dict[str, dict]:
+    """returns the stored field hashes of existing docs, without their content or chunks
 
-        # Put the chunks list in res_data, so it contains all doc data
-        if doc_in_results:
-            # Only add chunks if not a chunkless doc
-            if res_chunks["_source"]:
-                res_data["_source"]["__chunks"] = res_chunks["_source"]["__chunks"]
-            combined_result.append(res_data)
-        else:
-            # This result just says that the doc was not found ("found": False)
-            combined_result.append(dummy_res)
+    Returns:
+        a dict of doc id -> {field name: content hash}, for the docs that were found. Docs indexed
+        before field hashes were stored have no hashes.
+    """
+    existing_docs = _get_documents_for_upsert(
+        config=config, index_name=index_name, document_ids=document_ids,
+        source_includes=[TensorField.field_hashes])
+    return {
+        existing_doc["_id"]: existing_doc["_source"].get(TensorField.field_hashes) or dict()
+        for existing_doc in existing_docs["docs"] if existing_doc["found"]
+    }
 
-    res["docs"] = combined_result
 
-    # Returns a list of combined docs
-    return res
+def _get_chunks_for_upsert(
+        config: Config, index_name: str, fields_by_doc_id: Dict[str, Iterable[str]]
+) -> Dict[str, Dict[str, List[dict]]]:
+    """returns the stored chunks of some fields of existing docs. Only the vectors
+    of the requested fields are fetched.
 
+    Returns:
+        a dict of doc id -> {field name: chunks}, for the docs that were found
+    """
+    if not fields_by_doc_id:
+        return dict()
+    source_includes = {
+        doc_id: [f"{TensorField.chunks}.{TensorField.field_content}", f"{TensorField.chunks}.{TensorField.field_name}"]
+                + [f"{TensorField.chunks}.{utils.generate_vector_name(field)}" for field in sorted(fields)]
+        for doc_id, fields in fields_by_doc_id.items()
+    }
+    existing_docs = _get_documents_for_upsert(
+        config=config, index_name=index_name, document_ids=list(fields_by_doc_id),
+        source_includes=source_includes)
+    return {
+        existing_doc["_id"]: _group_chunks_by_field(existing_doc)
+        for existing_doc in existing_docs["docs"] if existing_doc["found"]
+    }
+
+
+def delete_documents(config: Config, index_name: str, doc_ids: List[str], auto_refresh, async_mode: bool = False):
+    """Deletes documents
 
-def delete_documents(config: Config, index_name: str, doc_ids: List[str], auto_refresh):
-    """Deletes documents """
+    The documents are deleted with _bulk delete actions, which are split into sub-requests
+    that are sent concurrently.
+
+    Args:
+        async_mode: if True, the documents are deleted in the background and the task is
+            returned immediately. Its progress can be polled with tasks.get_task().
+    """
     if not doc_ids:
         raise errors.InvalidDocumentIdError("doc_ids can't be empty!")
 
     for _id in doc_ids:
         validation.validate_id(_id)
 
+    if async_mode:
+        task = tasks.submit_task(
+            index_name=index_name, task_type="documentDeletion",
+            details={"receivedDocumentIds": len(doc_ids), "processedDocumentIds": 0, "deletedDocuments": 0},
+            operation=lambda task: _delete_documents(
+                config=config, index_name=index_name, doc_ids=doc_ids, auto_refresh=auto_refresh, task=task)
+        )
+        return task.to_dict()
+
     # TODO: change to timer()
     t0 = datetime.datetime.utcnow()
-    delete_res_backend = HttpRequests(config=config).post(
-        path=f"{index_name}/_delete_by_query", body={
-            "query": {
-                "terms": {
-                    "_id": doc_ids
-                }
-            }
-        }
-    )
-    if auto_refresh:
-        refresh_response = HttpRequests(config).post(path=F"{index_name}/_refresh")
+    deleted_documents = _delete_documents(
+        config=config, index_name=index_name, doc_ids=doc_ids, auto_refresh=auto_refresh)
     t1 = datetime.datetime.utcnow()
     delete_res = {
         "index_name": index_name, "status": "succeeded",
         "type": "documentDeletion", "details": {
             "receivedDocumentIds": len(doc_ids),
-            "deletedDocuments": delete_res_backend["deleted"],
+            "deletedDocuments": deleted_documents,
         },
         "duration": utils.create_duration_string(t1 - t0),
         "startedAt": utils.format_timestamp(t0),
@@ -994,8 +1254,49 @@ def delete_documents(config: Config, index_name: str, doc_ids: List[str], auto_r
     return delete_res
 
 
+def _delete_documents(config: Config, index_name: str, doc_ids: List[str], auto_refresh,
+                      task: Optional[tasks.Task] = None) -> int:
+    """Deletes documents with _bulk delete actions.
+
+    Args:
+        task: if given, its processedDocumentIds and deletedDocuments details are updated as
+            sub-requests complete. processedDocumentIds counts distinct ids.
+
+    Returns:
+        the number of documents that were deleted
+
+    Raises:
+        IndexNotFoundError if the index doesn't exist
+    """
+    # deleting an id twice in one request would only report it as not found the second time
+    unique_ids = list(dict.fromkeys(doc_ids))
+
+    def count_deleted(items: List[dict]) -> int:
+        return sum(1 for item in items if item["delete"].get("result") == "deleted")
+
+    def on_sub_response(n_actions: int, response: dict):
+        if task is not None:
+            task.increment_details(processedDocumentIds=n_actions, deletedDocuments=count_deleted(response["items"]))
+
+    # a delete action doesn't create its index if it doesn't exist
+    delete_res_backend = bulk.send_bulk(
+        config=config, actions=[[{"delete": {"_index": index_name, "_id": _id}}] for _id in unique_ids],
+        on_sub_response=on_sub_response)
+
+    for item in delete_res_backend["items"]:
+        if "error" in item["delete"]:
+            if item["delete"]["error"].get("type") == "index_not_found_exception":
+                raise errors.IndexNotFoundError(message=f"Index `{index_name}` not found.")
+            logger.warning(f"Could not delete document `{item['delete'].get('_id')}` from index `{index_name}`. "
+                           f"Reason: {item['delete']['error']}")
+
+    if auto_refresh:
+        refresh_response = index_refresh.refresh_index(config=config, index_name=index_name)
+    return count_deleted(delete_res_backend["items"])
+
+
 def refresh_index(config: Config, index_name: str):
-    return HttpRequests(config).post(path=F"{index_name}/_refresh")
+    return index_refresh.refresh_index(config=config, index_name=index_name)
 
 
 @add_timing
@@ -1009,12 +1310,15 @@ def bulk_search(query: BulkSearchQuery, marqo_config: config.Config, verbose: bo
         device:
 
     Notes:
+        All queries, of any search method, are sent to Marqo-OS in a single `/_msearch` request.
+        A query that fails, e.g. because its filter can't be parsed, has an error in place of its
+        hits, and doesn't fail the other queries:
+            {"hits": [], "error": {"message": ..., "code": ..., "type": ...}, "status": 400, ...}
+
         Current limitations:
-          - Lexical and tensor search done in serial.
-          - A single error (e.g. validation errors) on any one of the search queries returns an error and does not
-            process non-erroring queries.
+          - A validation error on any one of the search queries returns an error and does not
+            process the other queries.
     """
-    # TODO: Let non-errored docs to propagate.
     errs = [validation.validate_bulk_query_input(q) for q in query.queries]
     if any(errs):
         err = next(e for e in errs if e is not None)
@@ -1027,30 +1331,18 @@ def bulk_search(query: BulkSearchQuery, marqo_config: config.Config, verbose: bo
 
     selected_device = marqo_config.indexing_device if device is None else device
 
-    tensor_queries: Dict[int, BulkSearchQueryEntity] = dict(filter(lambda e: e[1].searchMethod == SearchMethod.TENSOR, enumerate(query.queries)))
-    lexical_queries: Dict[int, BulkSearchQueryEntity] = dict(filter(lambda e: e[1].searchMethod == SearchMethod.LEXICAL, enumerate(query.queries)))
-
-    tensor_search_results = dict(zip(tensor_queries.keys(), _bulk_vector_text_search(
-            marqo_config, list(tensor_queries.values()), device=selected_device,
-        )))
-
-    # TODO: combine lexical + tensor queries into /_msearch
-    lexical_search_results = dict(zip(lexical_queries.keys(), [_lexical_search(
-        config=marqo_config, index_name=q.index, text=q.q, result_count=q.limit, offset=q.offset,
-        return_doc_ids=True, searchable_attributes=q.searchableAttributes, verbose=verbose,
-        filter_string=q.filter, attributes_to_retrieve=q.attributesToRetrieve
-    ) for q in lexical_queries.values()]))
-
-    # Recombine lexical and tensor in order
-    combined_results = list({**tensor_search_results, **lexical_search_results}.items())
-    combined_results.sort()
-    search_results = [r[1] for r in combined_results]
+    search_results = _bulk_vector_text_search(marqo_config, query.queries, device=selected_device)
 
     for i, s in enumerate(search_results):
         q = query.queries[i]
+        if isinstance(s, errors.MarqoWebError):
+            logger.debug(f"bulk search: query {i} failed: {s.message}")
+            s = search_results[i] = _failed_query_result(s)
         s["query"] = q.q
         s["limit"] = q.limit
         s["offset"] = q.offset
+        if "error" in s:
+            continue
 
         ## TODO: filter out highlights within `_lexical_search`
         if not q.showHighlights:
@@ -1059,13 +1351,21 @@ def bulk_search(query: BulkSearchQuery, marqo_config: config.Config, verbose: bo
 
         if q.reRanker is not None:
             logger.debug(f"reranking {i}th query using {q.reRanker}")
-            rerank_query(q, s, q.reRanker, selected_device, 1)
+            try:
+                rerank_query(q, s, q.reRanker, selected_device, 1)
+            except errors.MarqoWebError as e:
+                search_results[i] = {**_failed_query_result(e), "query": q.q, "limit": q.limit, "offset": q.offset}
 
     return {
         "result": search_results
     }
 
 
+def _failed_query_result(e: errors.MarqoWebError) -> Dict[str, Any]:
+    """The result of a query of a bulk search that failed"""
+    return {"hits": [], "error": tasks.error_to_dict(e), "status": int(e.status_code)}
+
+
 def rerank_query(query: BulkSearchQueryEntity, result: Dict[str, Any], reranker: Union[str, Dict], device: str, num_highlights: int):
     if query.searchableAttributes is None:
         raise errors.InvalidArgError(f"searchable_attributes cannot be None when re-ranking. Specify which fields to search and rerank over.")
@@ -1103,7 +1403,11 @@ def search(config: Config, index_name: str, text: Union[str, dict],
            device=None, boost: Optional[Dict] = None,
            image_download_headers: Optional[Dict] = None,
            context: Optional[Dict] = None,
-           score_modifiers: Optional[Dict] = None) -> Dict:
+           score_modifiers: Optional[Dict] = None,
+           hybrid_parameters: Optional[Dict] = None,
+           knn_parameters: Optional[Dict] = None,
+           image_download_timeout_ms: Optional[int] = None,
+           stream: bool = False) -> Dict:
     """The root search method. Calls the specific search method
 
     Validation should go here. Validations include:
@@ -1128,6 +1432,14 @@ def search(config: Config, index_name: str, text: Union[str, dict],
         image_download_headers: headers for downloading images
         context: a dictionary to allow custom vectors in search, for tensor search only
         score_modifiers: a dictionary to modify the score based on field values, for tensor search only
+        hybrid_parameters: how the lexical and tensor results are fused, for hybrid search only
+        knn_parameters: ef_search and over_fetch of the knn queries, for tensor and hybrid search.
+            They override the index's knn_parameters. See models.knn_parameters_object.
+        image_download_timeout_ms: how long the images of the query may take to download.
+            Defaults to MARQO_QUERY_IMAGE_DOWNLOAD_TIMEOUT_MS. See query_images.
+        stream: if True, "hits" is an iterator, and each hit is formatted as it's consumed,
+            e.g. to stream it. Hits that are reranked or fused by a hybrid search are
+            formatted before they are returned. See streaming.
     Returns:
 
     """
@@ -1154,6 +1466,9 @@ def search(config: Config, index_name: str, text: Union[str, dict],
 
     t0 = timer()
     validation.validate_boost(boost=boost, search_method=search_method)
+    validation.validate_hybrid_parameters(hybrid_parameters=hybrid_parameters, search_method=search_method)
+    validation.validate_knn_parameters(knn_parameters=knn_parameters, search_method=search_method)
+    validation.validate_image_download_timeout_ms(image_download_timeout_ms)
     if searchable_attributes is not None:
         [validation.validate_field_name(attribute) for attribute in searchable_attributes]
     if attributes_to_retrieve is not None:
@@ -1173,19 +1488,32 @@ def search(config: Config, index_name: str, text: Union[str, dict],
         args=(config, index_name, REFRESH_INTERVAL_SECONDS))
     cache_update_thread.start()
 
+    # reranking needs all the formatted hits
+    lazy_hits = stream and reranker is None
     if search_method.upper() == SearchMethod.TENSOR:
         search_result = _vector_text_search(
             config=config, index_name=index_name, query=text, result_count=result_count, offset=offset,
             return_doc_ids=return_doc_ids, searchable_attributes=searchable_attributes, verbose=verbose,
             number_of_highlights=num_highlights, simplified_format=simplified_format,
             filter_string=filter, device=device, attributes_to_retrieve=attributes_to_retrieve, boost=boost,
-            image_download_headers=image_download_headers, context=context, score_modifiers=score_modifiers
+            image_download_headers=image_download_headers, context=context, score_modifiers=score_modifiers,
+            knn_parameters=knn_parameters, image_download_timeout_ms=image_download_timeout_ms,
+            lazy_hits=lazy_hits
         )
     elif search_method.upper() == SearchMethod.LEXICAL:
         search_result = _lexical_search(
             config=config, index_name=index_name, text=text, result_count=result_count, offset=offset,
             return_doc_ids=return_doc_ids, searchable_attributes=searchable_attributes, verbose=verbose,
-            filter_string=filter, attributes_to_retrieve=attributes_to_retrieve
+            filter_string=filter, attributes_to_retrieve=attributes_to_retrieve, lazy_hits=lazy_hits
+        )
+    elif search_method.upper() == SearchMethod.HYBRID:
+        search_result = _hybrid_search(
+            config=config, index_name=index_name, query=text, result_count=result_count, offset=offset,
+            searchable_attributes=searchable_attributes, filter_string=filter, device=device,
+            attributes_to_retrieve=attributes_to_retrieve, boost=boost,
+            image_download_headers=image_download_headers, context=context, score_modifiers=score_modifiers,
+            hybrid_parameters=hybrid_parameters, knn_parameters=knn_parameters,
+            image_download_timeout_ms=image_download_timeout_ms
         )
     else:
         raise errors.InvalidArgError(f"Search called with unknown search method: {search_method}")
@@ -1215,8 +1543,13 @@ def search(config: Config, index_name: str, text: Union[str, dict],
     search_result["offset"] = offset
 
     if not highlights:
-        for hit in search_result["hits"]:
-            del hit["_highlights"]
+        if stream:
+            search_result["hits"] = _without_highlights(search_result["hits"])
+        else:
+            for hit in search_result["hits"]:
+                del hit["_highlights"]
+    elif stream:
+        search_result["hits"] = iter(search_result["hits"])
 
     time_taken = timer() - t0
     search_result["processingTimeMs"] = round(time_taken * 1000)
@@ -1225,10 +1558,17 @@ def search(config: Config, index_name: str, text: Union[str, dict],
     return search_result
 
 
+def _without_highlights(hits: Iterable[dict]) -> Iterator[dict]:
+    for hit in hits:
+        del hit["_highlights"]
+        yield hit
+
+
 def _lexical_search(
         config: Config, index_name: str, text: str, result_count: int = 3, offset: int = 0, return_doc_ids=True,
         searchable_attributes: Sequence[str] = None, verbose: int = 0, filter_string: str = None,
-        attributes_to_retrieve: Optional[List[str]] = None, expose_facets: bool = False):
+        attributes_to_retrieve: Optional[List[str]] = None, expose_facets: bool = False,
+        lazy_hits: bool = False):
     """
 
     Args:
@@ -1241,6 +1581,7 @@ def _lexical_search(
         searchable_attributes:
         number_of_highlights:
         verbose:
+        lazy_hits: if True, "hits" is an iterator that formats each hit as it's consumed
 
     Returns:
 
@@ -1258,6 +1599,47 @@ def _lexical_search(
 
     # SEARCH TIMER-LOGGER (pre-processing)
     start_preprocess_time = timer()
+    body = _create_lexical_search_body(
+        config=config, index_name=index_name, text=text, result_count=result_count, offset=offset,
+        searchable_attributes=searchable_attributes, filter_string=filter_string,
+        attributes_to_retrieve=attributes_to_retrieve, expose_facets=expose_facets
+    )
+
+    end_preprocess_time = timer()
+    total_preprocess_time = end_preprocess_time - start_preprocess_time
+    logger.debug(f"search (lexical) pre-processing: took {(total_preprocess_time):.3f}s to process query.")
+
+    start_search_http_time = timer()
+    search_res = HttpRequests(config).get(path=f"{index_name}/_search", body=body)
+
+    end_search_http_time = timer()
+    total_search_http_time = end_search_http_time - start_search_http_time
+    total_os_process_time = search_res["took"] * 0.001
+    num_results = len(search_res['hits']['hits'])
+    logger.debug(
+        f"search (lexical) roundtrip: took {(total_search_http_time):.3f}s to send search query (roundtrip) to Marqo-os and received {num_results} results.")
+    logger.debug(
+        f"  search (lexical) Marqo-os processing time: took {(total_os_process_time):.3f}s for Marqo-os to execute the search.")
+
+    # SEARCH TIMER-LOGGER (post-processing)
+    start_postprocess_time = timer()
+
+    res = _format_lexical_search_hits(search_res['hits']['hits'], return_doc_ids=return_doc_ids, lazy=lazy_hits)
+
+    end_postprocess_time = timer()
+    total_postprocess_time = end_postprocess_time - start_postprocess_time
+    logger.debug(
+        f"search (lexical) post-processing: took {(total_postprocess_time):.3f}s to "
+        f"{'prepare' if lazy_hits else 'format'} {num_results} results.")
+
+    return res
+
+
+def _create_lexical_search_body(
+        config: Config, index_name: str, text: str, result_count: int, offset: int,
+        searchable_attributes: Sequence[str] = None, filter_string: str = None,
+        attributes_to_retrieve: Optional[List[str]] = None, expose_facets: bool = False) -> dict:
+    """Creates the body of the `_search` request of a lexical search. See _lexical_search()"""
     if searchable_attributes is not None and searchable_attributes:
         fields_to_search = searchable_attributes
     else:
@@ -1265,11 +1647,6 @@ def _lexical_search(
             config=config, index_name=index_name
         ).get_true_text_properties()
 
-    # Validation for offset (pagination is single field)
-    if len(fields_to_search) != 1 and offset > 0:
-        raise errors.InvalidArgError(
-            f"Pagination (offset > 0) is only supported for single field searches! Your search currently has {len(fields_to_search)} fields: {fields_to_search}")
-
     # Parse text into required and optional terms.
     (required_terms, optional_blob) = utils.parse_lexical_query(text)
 
@@ -1312,40 +1689,89 @@ def _lexical_search(
             body["_source"] = dict()
         if body["_source"] is not False:
             body["_source"]["exclude"] = [f"*{TensorField.vector_prefix}*"]
+    return body
 
-    end_preprocess_time = timer()
-    total_preprocess_time = end_preprocess_time - start_preprocess_time
-    logger.debug(f"search (lexical) pre-processing: took {(total_preprocess_time):.3f}s to process query.")
-
-    start_search_http_time = timer()
-    search_res = HttpRequests(config).get(path=f"{index_name}/_search", body=body)
-
-    end_search_http_time = timer()
-    total_search_http_time = end_search_http_time - start_search_http_time
-    total_os_process_time = search_res["took"] * 0.001
-    num_results = len(search_res['hits']['hits'])
-    logger.debug(
-        f"search (lexical) roundtrip: took {(total_search_http_time):.3f}s to send search query (roundtrip) to Marqo-os and received {num_results} results.")
-    logger.debug(
-        f"  search (lexical) Marqo-os processing time: took {(total_os_process_time):.3f}s for Marqo-os to execute the search.")
 
-    # SEARCH TIMER-LOGGER (post-processing)
-    start_postprocess_time = timer()
+def _format_lexical_search_hits(hits: List[dict], return_doc_ids: bool, lazy: bool = False) -> dict:
+    """Formats the Marqo-OS hits of a lexical search as a Marqo search response
 
-    res_list = []
-    for doc in search_res['hits']['hits']:
+    If lazy is True, "hits" is an iterator that formats each hit as it's consumed.
+    """
+    def format_hit(doc: dict) -> dict:
         just_doc = _clean_doc(doc["_source"].copy()) if "_source" in doc else dict()
         if return_doc_ids:
             just_doc["_id"] = doc["_id"]
             just_doc["_score"] = doc["_score"]
-        res_list.append({**just_doc, "_highlights": []})
+        return {**just_doc, "_highlights": []}
 
-    end_postprocess_time = timer()
-    total_postprocess_time = end_postprocess_time - start_postprocess_time
+    formatted = map(format_hit, hits)
+    return {'hits': formatted if lazy else list(formatted)}
+
+
+def _hybrid_search(
+        config: Config, index_name: str, query: str, result_count: int = 3, offset: int = 0,
+        searchable_attributes: Iterable[str] = None, filter_string: str = None, device=None,
+        attributes_to_retrieve: Optional[List[str]] = None, boost: Optional[Dict] = None,
+        image_download_headers: Optional[Dict] = None, context: Optional[Dict] = None,
+        score_modifiers: Optional[Dict] = None, hybrid_parameters: Optional[Dict] = None,
+        knn_parameters: Optional[Dict] = None, image_download_timeout_ms: Optional[int] = None) -> dict:
+    """Runs a lexical and a tensor search in a single `_msearch` request, and fuses their
+    hits with hybrid.fuse_hits()
+
+    Both searches retrieve their top offset + result_count docs, and the page is taken from
+    the fused ranking.
+
+    Args:
+        hybrid_parameters: the fusion and its weights. See models.hybrid_parameters_object.
+            The other args are the same as for _vector_text_search() and _lexical_search().
+
+    Returns:
+        the fused hits, in the simplified format of a tensor search. Docs only found by the
+        lexical search have no highlights.
+    """
+    hybrid_parameters = validation.validate_hybrid_parameters(hybrid_parameters, search_method=SearchMethod.HYBRID)
+    if not isinstance(query, str):
+        raise errors.InvalidArgError(
+            f"Query arg must be of type str for hybrid search! Received query of type {type(query)}.")
+    n_candidates = offset + result_count
+
+    # SEARCH TIMER-LOGGER (pre-processing)
+    start_preprocess_time = timer()
+    tensor_body, contextualised_filter = _create_vector_text_search_body(
+        config=config, index_name=index_name, query=query, result_count=n_candidates, offset=0,
+        searchable_attributes=searchable_attributes, filter_string=filter_string, device=device,
+        attributes_to_retrieve=attributes_to_retrieve, image_download_headers=image_download_headers,
+        context=context, score_modifiers=score_modifiers, knn_parameters=knn_parameters,
+        image_download_timeout_ms=image_download_timeout_ms
+    )
+    lexical_body = _create_lexical_search_body(
+        config=config, index_name=index_name, text=query, result_count=n_candidates, offset=0,
+        searchable_attributes=searchable_attributes, filter_string=filter_string,
+        attributes_to_retrieve=attributes_to_retrieve
+    )
+    # the lexical search is the last search of the _msearch
+    body = tensor_body + [{"index": index_name}, lexical_body]
+    logger.debug(f"search (hybrid) pre-processing: took {(timer() - start_preprocess_time):.3f}s to vectorize and process query.")
+
+    # SEARCH TIMER-LOGGER (roundtrip)
+    start_search_http_time = timer()
+    response = _send_tensor_msearch(config=config, index_name=index_name, body=body)
     logger.debug(
-        f"search (lexical) post-processing: took {(total_postprocess_time):.3f}s to format {len(res_list)} results.")
+        f"search (hybrid) roundtrip: took {(timer() - start_search_http_time):.3f}s to send {len(response['responses'])} "
+        f"search queries (roundtrip) to Marqo-os.")
+    responses = _get_msearch_hits(response, contextualised_filter=contextualised_filter)
 
-    return {'hits': res_list}
+    # SEARCH TIMER-LOGGER (post-processing)
+    start_postprocess_time = timer()
+    tensor_hits = _format_vector_text_search_hits(
+        responses[:-1], result_count=n_candidates, return_doc_ids=True,
+        searchable_attributes=searchable_attributes, boost=boost)["hits"] if tensor_body else []
+    lexical_hits = _format_lexical_search_hits(responses[-1], return_doc_ids=True)["hits"]
+    fused_hits = hybrid.fuse_hits(tensor_hits, lexical_hits, hybrid_parameters)
+    logger.debug(
+        f"search (hybrid) post-processing: took {(timer() - start_postprocess_time):.3f}s to fuse "
+        f"{len(tensor_hits)} tensor and {len(lexical_hits)} lexical results.")
+    return {"hits": fused_hits[offset:offset + result_count]}
 
 
 def construct_vector_input_batches(query: Union[str, Dict], index_info) -> Tuple[List[str], List[str]]:
@@ -1387,14 +1813,51 @@ def get_vector_properties_to_search(searchable_attributes: Union[None, List[str]
         ))
 
 
-def construct_msearch_body_elements(vector_properties_to_search: List[str], offset: int, filter_string: str, index_info: IndexInfo, result_count: int, query_vector: List[float], attributes_to_retrieve: List[str], index_name: str, contextualised_filter: str) -> List[Dict[str, Any]]:
+def _paginate_vector_fields(vector_properties_to_search: Iterable[str], result_count: int, offset: int) -> Tuple[int, int]:
+    """Returns the size and from of each field's search of a tensor search.
+
+    Each field's knn search ranks docs by that field only, so with several fields, a page
+    can't be taken from each of them. Instead, each field's search retrieves the top
+    offset + result_count docs, and the page is taken from the merged ranking. See
+    _paginate_merged_hits(). A single field's search is paginated by Marqo-OS.
+    """
+    if len(vector_properties_to_search) > 1:
+        return offset + result_count, 0
+    return result_count, offset
+
+
+def _paginate_merged_hits(hits: List[dict], n_searches: int, result_count: int, offset: int) -> List[dict]:
+    """Takes the page of a tensor search from its merged hits. See _paginate_vector_fields()"""
+    if n_searches > 1:
+        return hits[offset:offset + result_count]
+    return hits[:result_count]
+
+
+def _get_knn_k(result_count: int, offset: int, index_info: IndexInfo, knn_parameters: Optional[Dict] = None) -> int:
+    """Returns the `k` of each field's knn query of a tensor search.
+
+    Marqo-OS's lucene engine uses `k` as the size of the candidate list HNSW keeps while
+    searching, so `k` is both the search's ef_search and the number of chunks each field's
+    knn query retrieves. It is the larger of ef_search and over_fetch * (offset + result_count),
+    where result_count and offset are those of each field's search. See _paginate_vector_fields()
+
+    Args:
+        knn_parameters: the search's knn parameters, validated by validation.validate_knn_parameters().
+            They override the index's knn_parameters.
+    """
+    knn_parameters = {**index_info.get_knn_parameters(), **(knn_parameters or {})}
+    k = math.ceil((offset + result_count) * knn_parameters[NsField.knn_over_fetch])
+    if knn_parameters[NsField.knn_ef_search] is not None:
+        k = max(k, knn_parameters[NsField.knn_ef_search])
+    # never fewer than the page needs, which the MARQO_MAX_RETRIEVABLE_DOCS limit keeps in bounds
+    return max(min(k, constants.MAX_KNN_K), offset + result_count)
+
+
+def construct_msearch_body_elements(vector_properties_to_search: List[str], offset: int, filter_string: str, index_info: IndexInfo, result_count: int, query_vector: List[float], attributes_to_retrieve: List[str], index_name: str, contextualised_filter: str, knn_parameters: Optional[Dict] = None) -> List[Dict[str, Any]]:
     """Constructs the body payload of a `/_msearch` request for a single bulk search query"""
     body = []
-
-    # Validation for offset (pagination is single field)
-    if len(vector_properties_to_search) != 1 and offset > 0:
-        human_readable_vector_properties = [v.replace(TensorField.vector_prefix, "") for v in list(vector_properties_to_search)]
-        raise errors.InvalidArgError(f"Pagination (offset > 0) is only supported for single field searches! Your search currently has {len(vector_properties_to_search)} vectorisable fields: {human_readable_vector_properties}")
+    result_count, offset = _paginate_vector_fields(vector_properties_to_search, result_count, offset)
+    k = _get_knn_k(result_count, offset, index_info, knn_parameters)
 
     for vector_field in vector_properties_to_search:
         search_query = {
@@ -1412,7 +1875,7 @@ def construct_msearch_body_elements(vector_properties_to_search: List[str], offs
                         "knn": {
                             f"{TensorField.chunks}.{vector_field}": {
                                 "vector": query_vector,
-                                "k": result_count + offset
+                                "k": k
                             }
                         }
                     },
@@ -1436,61 +1899,96 @@ def construct_msearch_body_elements(vector_properties_to_search: List[str], offs
     return body
 
 
-def bulk_msearch(config: Config, body: List[Dict]) -> List[Dict]:
-    """Send an `/_msearch` request to MarqoOS and translate errors into a user-friendly format."""
-    start_search_http_time = timer()
-    try:
-        response = HttpRequests(config).get(path=F"_msearch", body=utils.dicts_to_jsonl(body))
-        end_search_http_time = timer()
-        total_search_http_time = end_search_http_time - start_search_http_time
-        total_os_process_time = response["took"] * 0.001
-        num_responses = len(response["responses"])
-        logger.debug(f"search (tensor) roundtrip: took {total_search_http_time:.3f}s to send {num_responses} search queries (roundtrip) to Marqo-os.")
+def bulk_msearch(config: Config, body: List[Dict], raise_on_error: bool = True
+                 ) -> List[Union[List[Dict], errors.MarqoWebError]]:
+    """Send an `/_msearch` request to MarqoOS and translate errors into a user-friendly format.
 
-        responses = [r['hits']['hits'] for r in response["responses"]]
+    Args:
+        config:
+        body: the `_msearch` body, as a list of header and search dicts
+        raise_on_error: if False, a search that failed has its error in place of its hits,
+            so that the other searches of the request can still be used
 
-    except KeyError as e:
-        # KeyError indicates we have received a non-successful result
-        try:
-            if "index.max_result_window" in response["responses"][0]["error"]["root_cause"][0]["reason"]:
-                raise errors.IllegalRequestedDocCount(
-            "Marqo-OS rejected the response due to too many requested results. "
-            "Try reducing the query's limit parameter") from e
-            elif 'parse_exception' in response["responses"][0]["error"]["root_cause"][0]["reason"]:
-                raise errors.InvalidArgError("Syntax error, could not parse filter string") from e
-            raise errors.BackendCommunicationError(f"Error communicating with Marqo-OS backend:\n{response}")
-        except (KeyError, IndexError) as e2:
-            raise e
+    Returns:
+        the hits of each search, in the order of the body
+    """
+    start_search_http_time = timer()
+    response = HttpRequests(config).get(path=F"_msearch", body=utils.dicts_to_jsonl(body))
+    end_search_http_time = timer()
+    total_search_http_time = end_search_http_time - start_search_http_time
+    num_responses = len(response["responses"])
+    logger.debug(f"search (bulk) roundtrip: took {total_search_http_time:.3f}s to send {num_responses} search queries (roundtrip) to Marqo-os.")
+
+    responses = []
+    for r in response["responses"]:
+        if "error" in r:
+            error = _msearch_error(r)
+            if raise_on_error:
+                raise error
+            responses.append(error)
+        else:
+            responses.append(r['hits']['hits'])
 
-    logger.debug(f"  search (tensor) Marqo-os processing time: took {total_os_process_time:.3f}s for Marqo-os to execute the search.")
+    if "took" in response:
+        logger.debug(f"  search (bulk) Marqo-os processing time: took {response['took'] * 0.001:.3f}s for Marqo-os to execute the search.")
     return responses
 
+
+def _send_tensor_msearch(config: Config, index_name: str, body: List[dict]) -> dict:
+    """Sends the `_msearch` of a tensor or hybrid search. If it failed because Marqo-OS has
+    lost the score modifiers script, the script is stored again and the `_msearch` is retried once."""
+    def is_missing_script(response: dict) -> bool:
+        return any(stored_scripts.is_missing_script_error(r.get("error"))
+                   for r in response.get("responses", []))
+
+    return stored_scripts.retry_if_script_missing(
+        config=config, script=stored_scripts.SCORE_MODIFIERS_SCRIPT,
+        send=lambda: HttpRequests(config).get(path=f"{index_name}/_msearch", body=utils.dicts_to_jsonl(body)),
+        is_missing=is_missing_script)
+
+
+def _msearch_error(failed_response: dict, contextualised_filter: str = '') -> errors.MarqoWebError:
+    """Translates the error of a single search of an `_msearch` response into a Marqo error"""
+    try:
+        reason = failed_response["error"]["root_cause"][0]["reason"]
+    except (KeyError, IndexError, TypeError):
+        return errors.BackendCommunicationError(f"Error communicating with Marqo-OS backend:\n{failed_response}")
+    if "index.max_result_window" in reason:
+        return errors.IllegalRequestedDocCount(
+            "Marqo-OS rejected the response due to too many requested results. "
+            "Try reducing the query's limit parameter")
+    elif 'parse_exception' in reason:
+        return errors.InvalidArgError("Syntax error, could not parse filter string")
+    elif contextualised_filter and contextualised_filter in reason:
+        return errors.InvalidArgError("Syntax error, could not parse filter string")
+    return errors.BackendCommunicationError(f"Error communicating with Marqo-OS backend:\n{failed_response}")
+
 def gather_documents_from_response(resp: List[List[Dict[str, Any]]]) -> Dict[str, Any]:
     """
         For the specific responses to a query, gather correct responses. This is used to aggregate documents, for cases
         where the same document is retrieved for multiple field-queries.
+
+        Makes a single pass over the hits, and doesn't mutate `resp`.
     """
     gathered_docs = dict()
 
-    for i, query_res in enumerate(resp):
+    for query_res in resp:
         for doc in query_res:
             doc_chunks = doc["inner_hits"][TensorField.chunks]["hits"]["hits"]
-            if doc["_id"] in gathered_docs:
-                gathered_docs[doc["_id"]]["doc"] = doc
-                gathered_docs[doc["_id"]]["chunks"].extend(doc_chunks)
+            gathered = gathered_docs.get(doc["_id"])
+            if gathered is not None:
+                gathered["doc"] = doc
+                gathered["chunks"].extend(doc_chunks)
             else:
                 gathered_docs[doc["_id"]] = {
                     "_id": doc["_id"],
                     "doc": doc,
-                    "chunks": doc_chunks
+                    # a copy, so that extending it doesn't change the hit's inner hits
+                    "chunks": list(doc_chunks)
                 }
 
-        # Filter out docs with no inner hits:
-        for doc_id in list(gathered_docs.keys()):
-            if not gathered_docs[doc_id]["chunks"]:
-                del gathered_docs[doc_id]
-
-    return gathered_docs
+    # Filter out docs with no inner hits:
+    return {doc_id: gathered for doc_id, gathered in gathered_docs.items() if gathered["chunks"]}
 
 
 def assign_query_to_vector_job(
@@ -1527,7 +2025,8 @@ def assign_query_to_vector_job(
             device=device,
             normalize_embeddings=index_info.index_settings['index_defaults']['normalize_embeddings'],
             image_download_headers=q.image_download_headers,
-            content_type=content_type
+            content_type=content_type,
+            image_download_timeout_ms=q.imageDownloadTimeoutMs if content_type == 'image' else None
         )
         # If exists, add content to vector job. Otherwise create new
         if jobs.get(vector_job.groupby_key()) is not None:
@@ -1543,9 +2042,10 @@ def assign_query_to_vector_job(
     return ptrs
 
 
-def create_vector_jobs(queries: List[BulkSearchQueryEntity], config: Config, selected_device: str) -> Tuple[Dict[Qidx, List[VectorisedJobPointer]], Dict[JHash, VectorisedJobs]]:
+def create_vector_jobs(queries: List[BulkSearchQueryEntity], config: Config, selected_device: str,
+                       skipped: Container[Qidx] = ()) -> Tuple[Dict[Qidx, List[VectorisedJobPointer]], Dict[JHash, VectorisedJobs]]:
     """
-        For each query:
+        For each query, except the query indexes in skipped:
             - Find what needs to be vectorised
             - Group content (across search requests), that could be vectorised together
             - Keep track of the Job related to a search query
@@ -1558,6 +2058,9 @@ def create_vector_jobs(queries: List[BulkSearchQueryEntity], config: Config, sel
     jobs: Dict[JHash, VectorisedJobs] = {}
     for i, q in enumerate(queries):
         q = queries[i]
+        if q.searchMethod.upper() == SearchMethod.LEXICAL or i in skipped:
+            # lexical queries have nothing to vectorise
+            continue
         index_info = get_index_info(config=config, index_name=q.index)
         # split images from text:
         to_be_vectorised: Tuple[List[str], List[str]] = construct_vector_input_batches(q.q, index_info)
@@ -1565,25 +2068,59 @@ def create_vector_jobs(queries: List[BulkSearchQueryEntity], config: Config, sel
     return qidx_to_job, jobs
 
 
-def vectorise_jobs(jobs: List[VectorisedJobs]) -> Dict[JHash, Dict[str, List[float]]]:
+def vectorise_jobs(jobs: List[VectorisedJobs], raise_on_error: bool = True
+                   ) -> Dict[JHash, Union[Dict[str, List[float]], errors.InvalidArgError]]:
     """ Run s2_+inference.vectorise() on against each vector jobs.
-    TODO: return a mapping of mapping: <JHash: <content: vector> >
+
+    Jobs run concurrently, within the limits of their devices. See inference_executor. Image
+    jobs are vectorised with query_images, so that their images are shared with other searches,
+    and are downloaded before taking a slot on the device.
+
+    Args:
+        jobs:
+        raise_on_error: if False, a job that couldn't be vectorised has its error in place of its
+            vectors, so that the queries of the other jobs can still be searched
+
+    Returns:
+        a mapping of job key to a mapping of content to its vector
     """
-    result: Dict[JHash, Dict[str, List[float]]] = dict()
-    for v in jobs:
-        # TODO: Handle exception for single job, and allow others to run.
-        try:
-            if v.content:
-                vectors = s2_inference.vectorise(
+    jobs = [v for v in jobs if v.content]
+
+    def vectorise_job(v: VectorisedJobs) -> Callable[[], Dict[str, List[float]]]:
+        def vectorise() -> Dict[str, List[float]]:
+            if v.content_type == 'image':
+                return query_images.vectorise_query_images(
                     model_name=v.model_name, model_properties=v.model_properties,
-                    content=v.content, device=v.device,
+                    images=v.content, device=v.device,
                     normalize_embeddings=v.normalize_embeddings,
-                    image_download_headers=v.image_download_headers
+                    image_download_headers=v.image_download_headers,
+                    download_timeout_ms=v.image_download_timeout_ms
                 )
-                result[v.groupby_key()] = dict(zip(v.content, vectors))
-        except s2_inference_errors.S2InferenceError:
+            vectors = inference_executor.run_on_device(v.device, lambda: s2_inference.vectorise(
+                model_name=v.model_name, model_properties=v.model_properties,
+                content=v.content, device=v.device,
+                normalize_embeddings=v.normalize_embeddings,
+                image_download_headers=v.image_download_headers,
+                as_numpy=True
+            ))
+            return dict(zip(v.content, vectors))
+        return vectorise
+
+    outcomes = inference_executor.run_concurrently([vectorise_job(v) for v in jobs])
+
+    result: Dict[JHash, Union[Dict[str, List[float]], errors.InvalidArgError]] = dict()
+    for v, outcome in zip(jobs, outcomes):
+        if isinstance(outcome, s2_inference_errors.S2InferenceError):
             # TODO: differentiate image processing errors from other types of vectorise errors
-            raise errors.InvalidArgError(message=f'Could not process given image in: {v.content}')
+            error = errors.InvalidArgError(message=f'Could not process given image in: {v.content}')
+            if raise_on_error:
+                raise error from outcome
+            logger.debug(f"vectorising the {v.content_type} job of model `{v.model_name}` failed: {outcome}")
+            result[v.groupby_key()] = error
+        elif isinstance(outcome, Exception):
+            raise outcome
+        else:
+            result[v.groupby_key()] = outcome
     return result
 
 
@@ -1633,7 +2170,7 @@ def get_query_vectors_from_jobs(
                 norm = np.linalg.norm(merged_vector, axis=-1, keepdims=True)
                 if norm > 0:
                     merged_vector /= np.linalg.norm(merged_vector, axis=-1, keepdims=True)
-            result[qidx] = list(merged_vector)
+            result[qidx] = merged_vector.astype(np.float32, copy=False)
         else:
             # result[qidx] = vectors[0]
             result[qidx] = get_content_vector(
@@ -1681,14 +2218,17 @@ def create_empty_query_response(queries: List[BulkSearchQueryEntity]) -> List[Di
     )
 
 
-def _bulk_vector_text_search(config: Config, queries: List[BulkSearchQueryEntity], device=None) -> List[Dict]:
-    """Resolve a batch of search queries in parallel.
+def _bulk_vector_text_search(config: Config, queries: List[BulkSearchQueryEntity], device=None
+                             ) -> List[Union[Dict, errors.MarqoWebError]]:
+    """Resolve a batch of search queries in parallel, with a single `/_msearch` request.
 
     Args:
         - config:
-        - queries: A list of independent search queries. Can be across multiple indexes, but are all expected to have `searchMethod = "TENSOR"`
+        - queries: A list of independent search queries. Can be across multiple indexes, and have any searchMethod
+            (TENSOR, LEXICAL or HYBRID).
     Returns:
         A list of search query responses (see `_format_ordered_docs_simple` for structure of individual entities).
+        A query that failed has its error in place of its response, and doesn't affect the other queries.
     Note:
         - Search results are in the same order as `queries`.
     """
@@ -1698,55 +2238,112 @@ def _bulk_vector_text_search(config: Config, queries: List[BulkSearchQueryEntity
     start_preprocessing_time = timer()
     selected_device = config.indexing_device if device is None else device
 
+    # Queries that fail fail on their own. The other queries are still searched.
+    query_errors: Dict[Qidx, errors.MarqoWebError] = dict()
+    for qidx, q in enumerate(queries):
+        if q.searchMethod.upper() == SearchMethod.LEXICAL:
+            continue
+        try:
+            # checked before vectorising, so that queries that can't match aren't vectorised
+            _validate_filter_fields_are_filterable(q.index, get_index_info(config=config, index_name=q.index), q.filter)
+        except errors.InvalidArgError as e:
+            query_errors[qidx] = e
+
     # 1. Pre-process inputs ready for s2_inference.vectorise
     # we can still use qidx_to_job. But the jobs structure may need to be different
     vector_jobs_tuple: Tuple[Dict[Qidx, List[VectorisedJobPointer]], Dict[JHash, VectorisedJobs]] = (
-        create_vector_jobs(queries, config, selected_device)
+        create_vector_jobs(queries, config, selected_device, skipped=query_errors)
     )
     qidx_to_jobs, jobs = vector_jobs_tuple
 
     # 2. Vectorise in batches against all queries
     ## TODO: To ensure that we are vectorising in batches, we can mock vectorise (), and see if the number of calls is as expected (if batch_size = 16, and number of docs = 32, and all args are the same, then number of calls = 2)
     # TODO: we need to enable str/PIL image structure:
-    job_ptr_to_vectors: Dict[JHash, Dict[str, List[float]]] = vectorise_jobs(list(jobs.values()))
+    job_ptr_to_vectors = vectorise_jobs(list(jobs.values()), raise_on_error=False)
+
+    # Queries with content in a job that failed fail too
+    for qidx, ptrs in qidx_to_jobs.items():
+        failed = next((job_ptr_to_vectors[ptr.job_hash] for ptr in ptrs
+                       if isinstance(job_ptr_to_vectors.get(ptr.job_hash), errors.InvalidArgError)), None)
+        if failed is not None:
+            query_errors[qidx] = failed
 
     # 3. For each query, get associated vectors
     qidx_to_vectors: Dict[Qidx, List[float]] = get_query_vectors_from_jobs(
-        queries, qidx_to_jobs, job_ptr_to_vectors, config, jobs
+        queries, {qidx: ptrs for qidx, ptrs in qidx_to_jobs.items() if qidx not in query_errors},
+        job_ptr_to_vectors, config, jobs
     )
 
     ## 4. Create msearch request bodies and combine to aggregate.
     query_to_body_parts: Dict[Qidx, List[Dict]] = dict()
     query_to_body_count: Dict[Qidx, int] = dict() # Keep track of count, so we can separate after msearch call.
     for qidx, q in enumerate(queries):
-        index_info = get_index_info(config=config, index_name=q.index)
-        contextualised_filter = utils.contextualise_filter(filter_string=q.filter, simple_properties=index_info.get_text_properties())
-        vector_properties_to_search = get_vector_properties_to_search(q.searchableAttributes, index_info)
-        body = construct_msearch_body_elements(vector_properties_to_search, q.offset, q.filter, index_info, q.limit, qidx_to_vectors[qidx], q.attributesToRetrieve, q.index, contextualised_filter)
-
+        if qidx in query_errors:
+            query_to_body_parts[qidx] = []
+            query_to_body_count[qidx] = 0
+            continue
+        try:
+            body = _create_bulk_query_body(config, q, qidx_to_vectors.get(qidx))
+        except errors.MarqoWebError as e:
+            # the query fails without being sent. The other queries are still searched.
+            query_errors[qidx] = e
+            body = []
         query_to_body_parts[qidx] = body
         query_to_body_count[qidx] = len(body)
 
     # Combine all msearch request bodies into one request body.
     aggregate_body = functools.reduce(lambda x, y: x + y, query_to_body_parts.values())
-    if not aggregate_body:
+    if not aggregate_body and not query_errors:
         # Must return empty response, per search query
         return create_empty_query_response(queries)
 
-    logger.debug(f"search (tensor) pre-processing: took {(timer() - start_preprocessing_time):.3f}s to vectorize and process query.")
+    logger.debug(f"search (bulk) pre-processing: took {(timer() - start_preprocessing_time):.3f}s to vectorize and process query.")
 
     ## 5. POST aggregate  to /_msearch
-    responses = bulk_msearch(config, aggregate_body)
+    responses = bulk_msearch(config, aggregate_body, raise_on_error=False) if aggregate_body else []
     start_postprocess_time = timer()
 
     # 6. Get documents back to each query, perform "gather" operation
-    results = create_bulk_search_response(queries, query_to_body_count, responses)
+    results = create_bulk_search_response(queries, query_to_body_count, responses, query_errors=query_errors)
 
-    logger.debug(f"bulk search (tensor) post-processing: took {(timer() - start_postprocess_time):.3f}s")
+    logger.debug(f"bulk search post-processing: took {(timer() - start_postprocess_time):.3f}s")
     return results
 
 
-def create_bulk_search_response(queries: List[BulkSearchQueryEntity], query_to_body_count: Dict[Qidx, int], responses) -> List[Dict]:
+def _create_bulk_query_body(config: Config, q: BulkSearchQueryEntity, query_vector: Optional[List[float]]) -> List[Dict]:
+    """Creates the `/_msearch` header and search dicts of a single query of a bulk search.
+
+    TENSOR queries have a knn search per vector field, LEXICAL queries a single search,
+    and HYBRID queries both, with the lexical search last.
+    """
+    search_method = q.searchMethod.upper()
+    if search_method == SearchMethod.LEXICAL:
+        if not isinstance(q.q, str):
+            raise errors.InvalidArgError(
+                f"Query arg must be of type str! text arg is of type {type(q.q)}. Query arg: {q.q}")
+        return [{"index": q.index}, _create_lexical_search_body(
+            config=config, index_name=q.index, text=q.q, result_count=q.limit, offset=q.offset,
+            searchable_attributes=q.searchableAttributes, filter_string=q.filter,
+            attributes_to_retrieve=q.attributesToRetrieve)]
+
+    index_info = get_index_info(config=config, index_name=q.index)
+    contextualised_filter = index_meta_cache.get_contextualised_filter(q.index, index_info, q.filter)
+    vector_properties_to_search = get_vector_properties_to_search(q.searchableAttributes, index_info)
+    if search_method == SearchMethod.HYBRID:
+        # both searches retrieve the top offset + limit docs. The page is taken after fusing them.
+        body = construct_msearch_body_elements(vector_properties_to_search, 0, q.filter, index_info, q.offset + q.limit, query_vector, q.attributesToRetrieve, q.index, contextualised_filter, q.knnParameters)
+        # the lexical search is the last search of a hybrid query
+        body += [{"index": q.index}, _create_lexical_search_body(
+            config=config, index_name=q.index, text=q.q, result_count=q.offset + q.limit, offset=0,
+            searchable_attributes=q.searchableAttributes, filter_string=q.filter,
+            attributes_to_retrieve=q.attributesToRetrieve)]
+        return body
+    return construct_msearch_body_elements(vector_properties_to_search, q.offset, q.filter, index_info, q.limit, query_vector, q.attributesToRetrieve, q.index, contextualised_filter, q.knnParameters)
+
+
+def create_bulk_search_response(queries: List[BulkSearchQueryEntity], query_to_body_count: Dict[Qidx, int], responses,
+                                query_errors: Optional[Dict[Qidx, errors.MarqoWebError]] = None
+                                ) -> List[Union[Dict, errors.MarqoWebError]]:
     """
         Create Marqo search responses by extracting the appropriate elements from the batched /_msearch response. Also handles:
             - Boosting score (optional)
@@ -1755,25 +2352,59 @@ def create_bulk_search_response(queries: List[BulkSearchQueryEntity], query_to_b
             - (no) highlights
         Does not mutate `responses` param.
 
+        A query has an error in place of its response if it is in `query_errors`, or if any of its
+        searches failed.
     """
+    query_errors = dict() if query_errors is None else query_errors
     results = []
-    msearch_resp = copy.deepcopy(responses)
+    # each query's responses follow the previous query's. The body has a header and a search per response.
+    start = 0
     for qidx, count in query_to_body_count.items():
-        num_of_docs = count // 2
-        result = msearch_resp[:num_of_docs]
-        msearch_resp = msearch_resp[num_of_docs:]  # remove docs from response for next query
-
-        query = queries[qidx]
-        gathered_docs = gather_documents_from_response(result)
-        if query.boost is not None:
-            gathered_docs = boost_score(gathered_docs, query.boost, query.searchableAttributes)
-        docs_chunks_sorted = sort_chunks(gathered_docs)
-        results.append(
-            _format_ordered_docs_simple(ordered_docs_w_chunks=docs_chunks_sorted, result_count=query.limit)
-        )
+        end = start + count // 2
+        result = responses[start:end]
+        start = end
+
+        if qidx in query_errors:
+            results.append(query_errors[qidx])
+            continue
+        failed = next((r for r in result if isinstance(r, errors.MarqoWebError)), None)
+        if failed is not None:
+            results.append(failed)
+            continue
+
+        try:
+            results.append(_format_bulk_query_response(queries[qidx], result))
+        except errors.MarqoWebError as e:
+            results.append(e)
 
     return results
 
+
+def _format_bulk_query_response(query: BulkSearchQueryEntity, result: List[List[Dict]]) -> Dict:
+    """Formats the hits of the searches of a single query of a bulk search. See create_bulk_search_response()"""
+    search_method = query.searchMethod.upper()
+    if search_method == SearchMethod.LEXICAL:
+        return _format_lexical_search_hits(result[0] if result else [], return_doc_ids=True)
+    is_hybrid = search_method == SearchMethod.HYBRID
+    if is_hybrid:
+        result, lexical_result = result[:-1], result[-1]
+    gathered_docs = gather_documents_from_response(result)
+    if query.boost is not None:
+        gathered_docs = boost_score(gathered_docs, query.boost, query.searchableAttributes)
+    docs_chunks_sorted = sort_chunks(gathered_docs)
+    if is_hybrid:
+        tensor_hits = _format_ordered_docs_simple(
+            ordered_docs_w_chunks=docs_chunks_sorted, result_count=query.offset + query.limit)["hits"]
+        lexical_hits = _format_lexical_search_hits(lexical_result, return_doc_ids=True)["hits"]
+        fused_hits = hybrid.fuse_hits(tensor_hits, lexical_hits, validation.validate_hybrid_parameters(
+            hybrid_parameters=query.hybridParameters, search_method=query.searchMethod))
+        return {"hits": fused_hits[query.offset:query.offset + query.limit]}
+    return _format_ordered_docs_simple(
+        ordered_docs_w_chunks=_paginate_merged_hits(docs_chunks_sorted, n_searches=len(result),
+                                                    result_count=query.limit, offset=query.offset),
+        result_count=query.limit)
+
+
 def _vector_text_search(
         config: Config, index_name: str, query: Union[str, dict], result_count: int = 5, offset: int = 0,
         return_doc_ids=False, searchable_attributes: Iterable[str] = None, number_of_highlights=3,
@@ -1782,7 +2413,10 @@ def _vector_text_search(
         attributes_to_retrieve: Optional[List[str]] = None, boost: Optional[Dict] = None,
         image_download_headers: Optional[Dict] = None,
         context: Optional[Dict] = None,
-        score_modifiers: Optional[Dict] = None):
+        score_modifiers: Optional[Dict] = None,
+        knn_parameters: Optional[Dict] = None,
+        image_download_timeout_ms: Optional[int] = None,
+        lazy_hits: bool = False):
     """
     Args:
         config:
@@ -1802,6 +2436,9 @@ def _vector_text_search(
         image_download_headers: headers for downloading images
         context: a dictionary to allow custom vectors in search
         score_modifiers: a dictionary to modify the score based on field values, for tensor search only
+        knn_parameters: ef_search and over_fetch of the knn queries. See _get_knn_k()
+        image_download_timeout_ms: how long the images of the query may take to download
+        lazy_hits: if True, "hits" is an iterator that formats each hit as it's consumed
     Returns:
 
     Note:
@@ -1824,6 +2461,130 @@ def _vector_text_search(
     """
     # SEARCH TIMER-LOGGER (pre-processing)
     start_preprocess_time = timer()
+    body, contextualised_filter = _create_vector_text_search_body(
+        config=config, index_name=index_name, query=query, result_count=result_count, offset=offset,
+        searchable_attributes=searchable_attributes, raise_on_searchable_attribs=raise_on_searchable_attribs,
+        filter_string=filter_string, device=device, attributes_to_retrieve=attributes_to_retrieve,
+        image_download_headers=image_download_headers, context=context, score_modifiers=score_modifiers,
+        knn_parameters=knn_parameters, image_download_timeout_ms=image_download_timeout_ms
+    )
+    if verbose:
+        print("vector search body:")
+        if verbose == 1:
+            readable_body = copy.deepcopy(body)
+            for i, q in enumerate(readable_body):
+                if "index" in q:
+                    continue
+                for vec in list(q["query"]["nested"]["query"]["knn"].keys()):
+                    readable_body[i]["query"]["nested"]["query"]["knn"][vec]["vector"] = \
+                        readable_body[i]["query"]["nested"]["query"]["knn"][vec]["vector"][:5]
+            pprint.pprint(readable_body)
+        if verbose == 2:
+            pprint.pprint(body, compact=True)
+
+    if not body:
+        # empty body means that there are no vector fields associated with the index.
+        # This probably means the index is emtpy
+        return {"hits": iter([]) if lazy_hits else []}
+
+    end_preprocess_time = timer()
+    total_preprocess_time = end_preprocess_time - start_preprocess_time
+    logger.debug(f"search (tensor) pre-processing: took {(total_preprocess_time):.3f}s to vectorize and process query.")
+
+    # SEARCH TIMER-LOGGER (roundtrip)
+    start_search_http_time = timer()
+    response = _send_tensor_msearch(config=config, index_name=index_name, body=body)
+
+    end_search_http_time = timer()
+    total_search_http_time = end_search_http_time - start_search_http_time
+    total_os_process_time = response["took"] * 0.001
+    num_responses = len(response["responses"])
+    logger.debug(
+        f"search (tensor) roundtrip: took {(total_search_http_time):.3f}s to send {num_responses} search queries (roundtrip) to Marqo-os.")
+
+    responses = _get_msearch_hits(response, contextualised_filter=contextualised_filter)
+    logger.debug(
+        f"  search (tensor) Marqo-os processing time: took {(total_os_process_time):.3f}s for Marqo-os to execute the search.")
+
+    # SEARCH TIMER-LOGGER (post-processing)
+    start_postprocess_time = timer()
+    if verbose:
+        print("search responses:")
+        pprint.pprint(responses)
+    res = _format_vector_text_search_hits(
+        responses, result_count=result_count, return_doc_ids=return_doc_ids,
+        searchable_attributes=searchable_attributes, number_of_highlights=number_of_highlights,
+        verbose=verbose, simplified_format=simplified_format, boost=boost, offset=offset, lazy=lazy_hits
+    )
+
+    end_postprocess_time = timer()
+    total_postprocess_time = end_postprocess_time - start_postprocess_time
+    if lazy_hits:
+        logger.debug(
+            f"search (tensor) post-processing: took {(total_postprocess_time):.3f}s to sort results from Marqo-os. "
+            f"They are formatted as they are consumed.")
+    else:
+        logger.debug(
+            f"search (tensor) post-processing: took {(total_postprocess_time):.3f}s to sort and format {len(res['hits'])} results from Marqo-os.")
+    return res
+
+
+def _get_msearch_hits(response: dict, contextualised_filter: str = '') -> List[List[dict]]:
+    """Returns the hits of each search of an `_msearch` response
+
+    Raises:
+        a Marqo error if any of the searches failed
+    """
+    try:
+        responses = [r['hits']['hits'] for r in response["responses"]]
+
+        # SEARCH TIMER-LOGGER (Log number of results and time for each search in multisearch)
+        for i, indiv_response in enumerate(response["responses"]):
+            logger.debug(
+                f"  search Marqo-os processing time (search {i}): took {(indiv_response['took'] * 0.001):.3f}s and received {len(indiv_response['hits']['hits'])} hits.")
+
+    except KeyError as e:
+        # KeyError indicates we have received a non-successful result
+        failed_response = next((r for r in response.get("responses", []) if "error" in r), None)
+        if failed_response is None:
+            raise e
+        raise _msearch_error(failed_response, contextualised_filter=contextualised_filter) from e
+    return responses
+
+
+def _validate_filter_fields_are_filterable(index_name: str, index_info: IndexInfo, filter_string: Optional[str]) -> None:
+    """Checks that the filter of a tensor search only uses the index's filterable fields. The
+    other fields aren't copied into the chunks, so no chunk would match a filter on them.
+
+    Raises:
+        InvalidArgError if the filter uses fields that aren't filterable
+    """
+    non_filterable = index_meta_cache.get_non_filterable_filter_fields(index_name, index_info, filter_string)
+    if non_filterable:
+        raise errors.InvalidArgError(
+            f"Filters of tensor and hybrid searches can only use the filterable fields of the index. "
+            f"These fields aren't filterable: {non_filterable}. "
+            f"Add them to the index's `filterable_fields` setting to filter on them."
+        )
+
+
+def _create_vector_text_search_body(
+        config: Config, index_name: str, query: Union[str, dict], result_count: int, offset: int,
+        searchable_attributes: Iterable[str] = None, raise_on_searchable_attribs=False,
+        filter_string: str = None, device=None, attributes_to_retrieve: Optional[List[str]] = None,
+        image_download_headers: Optional[Dict] = None, context: Optional[Dict] = None,
+        score_modifiers: Optional[Dict] = None, knn_parameters: Optional[Dict] = None,
+        image_download_timeout_ms: Optional[int] = None) -> Tuple[List[dict], str]:
+    """Vectorises the query, and creates the `_msearch` body of a tensor search, with a
+    search per vector field. See _vector_text_search()
+
+    If the index treats urls as images, the images of the query are vectorised with
+    query_images, which shares them with other searches querying them at the same time.
+
+    Returns:
+        the `_msearch` body, which is empty if the index has no vector fields, and the
+        contextualised filter string
+    """
     custom_tensors = None
     if context is not None:
         if isinstance(query, dict):
@@ -1841,31 +2602,33 @@ def _vector_text_search(
     except KeyError as e:
         raise errors.IndexNotFoundError(message="Tried to search a non-existent index: {}".format(index_name))
     selected_device = config.indexing_device if device is None else device
+    if score_modifiers is not None:
+        # validated before the query is vectorised
+        validated_score_modifiers = validation.validate_score_modifiers_fields(
+            validation.validate_score_modifiers_object(score_modifiers), index_info.get_filterable_fields())
+    _validate_filter_fields_are_filterable(index_name, index_info, filter_string)
 
     # query, weight pairs, if query is a dict:
-    ordered_queries = None
-
-    if isinstance(query, str):
-        # one batch with one element in the batch:
-        to_be_vectorised = [[query]]
-    else:  # is dict:
-        ordered_queries = list(query.items())
-        if index_info.index_settings[NsField.index_defaults][NsField.treat_urls_and_pointers_as_images]:
-            text_queries = [k for k, _ in ordered_queries if not _is_image(k)]
-            image_queries = [k for k, _ in ordered_queries if _is_image(k)]
-            to_be_vectorised = [batch for batch in [text_queries, image_queries] if batch]
-        else:
-            to_be_vectorised = [[k for k, _ in ordered_queries], ]
+    ordered_queries = list(query.items()) if isinstance(query, dict) else None
+    text_queries, image_queries = construct_vector_input_batches(query, index_info)
+    model_properties = _get_model_properties(index_info)
+    normalize_embeddings = index_info.index_settings['index_defaults']['normalize_embeddings']
     try:
-        vectorised_dicts = [
-            dict(zip(batch, s2_inference.vectorise(
-                model_name=index_info.model_name, model_properties=_get_model_properties(index_info),
-                content=batch, device=selected_device,
-                normalize_embeddings=index_info.index_settings['index_defaults']['normalize_embeddings'],
-                image_download_headers=image_download_headers
-            )))
-            for batch in to_be_vectorised
-        ]
+        vectorised_dicts = []
+        if text_queries:
+            vectorised_dicts.append(dict(zip(text_queries, inference_executor.run_on_device(
+                selected_device, lambda: s2_inference.vectorise(
+                    model_name=index_info.model_name, model_properties=model_properties,
+                    content=text_queries, device=selected_device, normalize_embeddings=normalize_embeddings,
+                    image_download_headers=image_download_headers, as_numpy=True
+                )))))
+        if image_queries:
+            # the images are downloaded before taking a slot on the device
+            vectorised_dicts.append(query_images.vectorise_query_images(
+                model_name=index_info.model_name, model_properties=model_properties,
+                images=image_queries, device=selected_device, normalize_embeddings=normalize_embeddings,
+                image_download_headers=image_download_headers, download_timeout_ms=image_download_timeout_ms
+            ))
 
         if ordered_queries:
             # multiple queries. We have to weight and combine them:
@@ -1889,7 +2652,7 @@ def _vector_text_search(
                 norm = np.linalg.norm(vectorised_text, axis=-1, keepdims=True)
                 if norm > 0:
                     vectorised_text /= np.linalg.norm(vectorised_text, axis=-1, keepdims=True)
-            vectorised_text = list(vectorised_text)
+            vectorised_text = vectorised_text.astype(np.float32, copy=False)
         else:
             vectorised_text = vectorised_dicts[0][query]
     except (s2_inference_errors.UnknownModelError,
@@ -1920,25 +2683,18 @@ def _vector_text_search(
             vector_properties_to_search = searchable_attributes_as_vectors.intersection(
                 index_info.get_vector_properties().keys())
 
-    # Validation for offset (pagination is single field)
-    if len(vector_properties_to_search) != 1 and offset > 0:
-        human_readable_vector_properties = [v.replace(TensorField.vector_prefix, "") for v in
-                                            list(vector_properties_to_search)]
-        raise errors.InvalidArgError(
-            f"Pagination (offset > 0) is only supported for single field searches! Your search currently has {len(vector_properties_to_search)} vectorisable fields: {human_readable_vector_properties}")
+    result_count, offset = _paginate_vector_fields(vector_properties_to_search, result_count, offset)
+    k = _get_knn_k(result_count, offset, index_info, knn_parameters)
 
-    if filter_string is not None:
-        contextualised_filter = utils.contextualise_filter(
-            filter_string=filter_string,
-            simple_properties=index_info.get_text_properties())
-    else:
-        contextualised_filter = ''
+    contextualised_filter = index_meta_cache.get_contextualised_filter(index_name, index_info, filter_string)
 
     if score_modifiers is not None:
-        validated_score_modifiers = validation.validate_score_modifiers_object(score_modifiers)
-        script_score = convert_validated_score_modifiers_to_script_score(validated_score_modifiers)
+        script_score = {
+            "id": stored_scripts.get_script_id(config=config, script=stored_scripts.SCORE_MODIFIERS_SCRIPT),
+            "params": convert_validated_score_modifiers_to_script_params(validated_score_modifiers)
+        }
         for vector_field in vector_properties_to_search:
-            search_query = _create_score_modifiers_tensor_search_query(result_count, offset, vector_field, vectorised_text, script_score)
+            search_query = _create_score_modifiers_tensor_search_query(result_count, offset, vector_field, vectorised_text, script_score, k=k)
             if attributes_to_retrieve is not None:
                 search_query["_source"] = {"include": attributes_to_retrieve} if len(attributes_to_retrieve) > 0 else False
 
@@ -1951,7 +2707,7 @@ def _vector_text_search(
             body += [{"index": index_name}, search_query]
     else:
         for vector_field in vector_properties_to_search:
-            search_query = _create_normal_tensor_search_query(result_count, offset, vector_field, vectorised_text)
+            search_query = _create_normal_tensor_search_query(result_count, offset, vector_field, vectorised_text, k=k)
             if attributes_to_retrieve is not None:
                 search_query["_source"] = {"include": attributes_to_retrieve} if len(attributes_to_retrieve) > 0 else False
 
@@ -1961,77 +2717,24 @@ def _vector_text_search(
                     "query_string": {"query": f"{contextualised_filter}"}
                 }
             body += [{"index": index_name}, search_query]
-    if verbose:
-        print("vector search body:")
-        if verbose == 1:
-            readable_body = copy.deepcopy(body)
-            for i, q in enumerate(readable_body):
-                if "index" in q:
-                    continue
-                for vec in list(q["query"]["nested"]["query"]["knn"].keys()):
-                    readable_body[i]["query"]["nested"]["query"]["knn"][vec]["vector"] = \
-                        readable_body[i]["query"]["nested"]["query"]["knn"][vec]["vector"][:5]
-            pprint.pprint(readable_body)
-        if verbose == 2:
-            pprint.pprint(body, compact=True)
-
-    if not body:
-        # empty body means that there are no vector fields associated with the index.
-        # This probably means the index is emtpy
-        return {"hits": []}
-
-    end_preprocess_time = timer()
-    total_preprocess_time = end_preprocess_time - start_preprocess_time
-    logger.debug(f"search (tensor) pre-processing: took {(total_preprocess_time):.3f}s to vectorize and process query.")
-
-    # SEARCH TIMER-LOGGER (roundtrip)
-    start_search_http_time = timer()
-    response = HttpRequests(config).get(path=F"{index_name}/_msearch",
-                                        body=utils.dicts_to_jsonl(body))
-
-    end_search_http_time = timer()
-    total_search_http_time = end_search_http_time - start_search_http_time
-    total_os_process_time = response["took"] * 0.001
-    num_responses = len(response["responses"])
-    logger.debug(
-        f"search (tensor) roundtrip: took {(total_search_http_time):.3f}s to send {num_responses} search queries (roundtrip) to Marqo-os.")
-
-    try:
-        responses = [r['hits']['hits'] for r in response["responses"]]
-
-        # SEARCH TIMER-LOGGER (Log number of results and time for each search in multisearch)
-        for i in range(len(vector_properties_to_search)):
-            indiv_responses = response["responses"][i]['hits']['hits']
-            indiv_query_time = response["responses"][i]["took"] * 0.001
-            logger.debug(
-                f"  search (tensor) Marqo-os processing time (search field = {list(vector_properties_to_search)[i]}): took {(indiv_query_time):.3f}s and received {len(indiv_responses)} hits.")
+    return body, contextualised_filter
 
-    except KeyError as e:
-        # KeyError indicates we have received a non-successful result
-        try:
-            if "index.max_result_window" in response["responses"][0]["error"]["root_cause"][0]["reason"]:
-                raise errors.IllegalRequestedDocCount(
-                    "Marqo-OS rejected the response due to too many requested results. "
-                    "Try reducing the query's limit parameter") from e
-            elif 'parse_exception' in response["responses"][0]["error"]["root_cause"][0]["reason"]:
-                raise errors.InvalidArgError("Syntax error, could not parse filter string") from e
-            elif (contextualised_filter
-                  and contextualised_filter in response["responses"][0]["error"]["root_cause"][0]["reason"]):
-                raise errors.InvalidArgError("Syntax error, could not parse filter string") from e
-            raise errors.BackendCommunicationError(f"Error communicating with Marqo-OS backend:\n{response}")
-        except (KeyError, IndexError) as e2:
-            raise e
 
-    logger.debug(
-        f"  search (tensor) Marqo-os processing time: took {(total_os_process_time):.3f}s for Marqo-os to execute the search.")
+def _format_vector_text_search_hits(
+        responses: List[List[dict]], result_count: int, return_doc_ids=False,
+        searchable_attributes: Iterable[str] = None, number_of_highlights=3, verbose=0,
+        simplified_format=True, boost: Optional[Dict] = None, offset: int = 0, lazy: bool = False) -> dict:
+    """Gathers the hits of each search of a tensor search's `_msearch` by doc, ranks the
+    docs by their best chunk, and formats them. See _vector_text_search()
 
-    # SEARCH TIMER-LOGGER (post-processing)
-    start_postprocess_time = timer()
+    Args:
+        responses: the Marqo-OS hits of each search
+        offset: the offset of the search. With several searches, the page is taken from the
+            ranked docs. See _paginate_vector_fields()
+        lazy: if True, "hits" is an iterator that formats each ranked doc as it's consumed
+    """
     gathered_docs = dict()
 
-    if verbose:
-        print("search responses:")
-        pprint.pprint(responses)
     for i, query_res in enumerate(responses):
         for doc in query_res:
             doc_chunks = doc["inner_hits"][TensorField.chunks]["hits"]["hits"]
@@ -2097,7 +2800,9 @@ def _vector_text_search(
         as_list = list(docs.values())
         return sorted(as_list, key=lambda x: x["chunks"][0]["_score"], reverse=True)
 
-    completely_sorted = sort_docs(docs_chunks_sorted)
+    # only the docs of the page are formatted
+    completely_sorted = _paginate_merged_hits(
+        sort_docs(docs_chunks_sorted), n_searches=len(responses), result_count=result_count, offset=offset)
 
     if verbose:
         print("Chunk vector search, sorted result:")
@@ -2107,54 +2812,34 @@ def _vector_text_search(
             pprint.pprint(completely_sorted)
 
     # format output:
-    def format_ordered_docs_preserving(ordered_docs_w_chunks: List[dict], num_highlights: Optional[int]) -> dict:
-        """Formats docs so that it preserves the original document, unless doc_ids are returned
-        Args:
-            ordered_docs_w_chunks:
-            num_highlights: number of highlights to return.
-        Returns:
-        """
-        return {'hits': [dict([
+    def format_doc_preserving(doc: dict) -> dict:
+        """Formats a doc so that it preserves the original document, unless doc_ids are returned"""
+        return dict([
             ('doc', _clean_doc(doc['doc']["_source"], doc_id=doc['_id'] if return_doc_ids else None)),
             ('highlights', [{
                 the_chunk["_source"][TensorField.field_name]: the_chunk["_source"][TensorField.field_content]
-            } for the_chunk in doc['chunks']][:num_highlights])
-        ]) for doc in ordered_docs_w_chunks][:result_count]}
+            } for the_chunk in doc['chunks']][:number_of_highlights])
+        ])
 
     # format output:
-    def format_ordered_docs_simple(ordered_docs_w_chunks: List[dict]) -> dict:
-        """Only one highlight is returned
-        Args:
-            ordered_docs_w_chunks:
-        Returns:
-        """
-        simple_results = []
-
-        for d in ordered_docs_w_chunks:
-            if "_source" in d['doc']:
-                cleaned = _clean_doc(d['doc']["_source"], doc_id=d['_id'])
-            else:
-                cleaned = _clean_doc(dict(), doc_id=d['_id'])
+    def format_doc_simple(d: dict) -> dict:
+        """Only one highlight is returned"""
+        if "_source" in d['doc']:
+            cleaned = _clean_doc(d['doc']["_source"], doc_id=d['_id'])
+        else:
+            cleaned = _clean_doc(dict(), doc_id=d['_id'])
 
-            cleaned["_highlights"] = {
-                d["chunks"][0]["_source"][TensorField.field_name]: d["chunks"][0]["_source"][
-                    TensorField.field_content]
-            }
-            cleaned["_score"] = d["chunks"][0]["_score"]
-            simple_results.append(cleaned)
-        return {"hits": simple_results[:result_count]}
+        cleaned["_highlights"] = {
+            d["chunks"][0]["_source"][TensorField.field_name]: d["chunks"][0]["_source"][
+                TensorField.field_content]
+        }
+        cleaned["_score"] = d["chunks"][0]["_score"]
+        return cleaned
 
-    if simplified_format:
-        res = format_ordered_docs_simple(ordered_docs_w_chunks=completely_sorted)
-    else:
-        res = format_ordered_docs_preserving(ordered_docs_w_chunks=completely_sorted,
-                                             num_highlights=number_of_highlights)
+    formatted = map(format_doc_simple if simplified_format else format_doc_preserving,
+                    completely_sorted[:result_count])
+    return {"hits": formatted if lazy else list(formatted)}
 
-    end_postprocess_time = timer()
-    total_postprocess_time = end_postprocess_time - start_postprocess_time
-    logger.debug(
-        f"search (tensor) post-processing: took {(total_postprocess_time):.3f}s to sort and format {len(completely_sorted)} results from Marqo-os.")
-    return res
 
 def _format_ordered_docs_simple(ordered_docs_w_chunks: List[dict], result_count: int) -> dict:
     """Only one highlight is returned
@@ -2185,7 +2870,6 @@ def boost_score(docs: dict, boosters: dict, searchable_attributes) -> dict:
             boosters: {'field_to_be_boosted': (int, int)}
         """
     to_be_boosted = docs.copy()
-    boosted_fields = set()
     if searchable_attributes and boosters:
         if not set(boosters).issubset(set(searchable_attributes)):
             raise errors.InvalidArgError(
@@ -2194,53 +2878,31 @@ def boost_score(docs: dict, boosters: dict, searchable_attributes) -> dict:
         f"\nBoost: {boosters}"
         )
 
+    def boosted(chunk: dict) -> dict:
+        booster = boosters.get(chunk['_source']['__field_name'])
+        if booster is None:
+            return chunk
+        # boosted chunks are copies, so that the Marqo-OS response isn't changed
+        if len(booster) == 2:
+            return {**chunk, '_score': chunk['_score'] * booster[0] + booster[1]}
+        return {**chunk, '_score': chunk['_score'] * booster[0]}
+
     for doc_id in list(to_be_boosted.keys()):
-        for chunk in to_be_boosted[doc_id]["chunks"]:
-            field_name = chunk['_source']['__field_name']
-            if field_name in boosters.keys():
-                booster = boosters[field_name]
-                if len(booster) == 2:
-                    chunk['_score'] = chunk['_score'] * booster[0] + booster[1]
-                else:
-                    chunk['_score'] = chunk['_score'] * booster[0]
-                boosted_fields.add(field_name)
+        to_be_boosted[doc_id]["chunks"] = [boosted(chunk) for chunk in to_be_boosted[doc_id]["chunks"]]
     return to_be_boosted
 
 
-def convert_validated_score_modifiers_to_script_score(validated_score_modifiers: Dict = None) -> str:
+def convert_validated_score_modifiers_to_script_params(validated_score_modifiers: Dict = None) -> dict:
     '''
-    A function that converts the validated score modifiers to a painless script to modify the score.
+    A function that converts the validated score modifiers to the params of the stored score modifiers script.
     '''
-    script_parts = ["double additive = 0;"]
-    for config in validated_score_modifiers.get("multiply_score_by", []):
-        field_name = config["field_name"]
-        weight = config.get("weight", 1)
-        # doc.containsKey check if the field is in the mappings.
-        # doc[].size() >0 and doc[].value instanceof java.lang.Number check if the field has a valid value
-        script_parts.append(f"""
-        if (doc.containsKey('__chunks.{field_name}')) {{
-            if (doc['__chunks.{field_name}'].size() > 0 &&
-                (doc['__chunks.{field_name}'].value instanceof java.lang.Number)) {{
-                _score = _score * doc['__chunks.{field_name}'].value * {weight};
-            }}
-        }}
-        """)
-
-    for config in validated_score_modifiers.get("add_to_score", []):
-        field_name = config["field_name"]
-        weight = config.get("weight", 1)
-        script_parts.append(f""" 
-        if (doc.containsKey('__chunks.{field_name}')) {{     
-            if (doc['__chunks.{field_name}'].size() > 0 &&
-                (doc['__chunks.{field_name}'].value instanceof java.lang.Number)) {{
-                additive = additive + doc['__chunks.{field_name}'].value * {weight};
-            }}
-        }}
-        """)
-
-    script_parts.append(f"return Math.max(0.0, (_score + additive));")
-    script = "\n".join(script_parts)
-    return f"""{script}"""
+    return {
+        modifier_type: [
+            {"field": f"{TensorField.chunks}.{config['field_name']}", "weight": config.get("weight", 1)}
+            for config in validated_score_modifiers.get(modifier_type, [])
+        ]
+        for modifier_type in ["multiply_score_by", "add_to_score"]
+    }
 
 
 def sort_chunks(docs: dict) -> List:
@@ -2467,18 +3129,18 @@ def vectorise_multimodal_combination_field(field: str, multimodal_object: Dict[s
         start_time = timer()
         text_vectors = []
         if len(text_content_to_vectorise) > 0:
-            text_vectors = s2_inference.vectorise(
+            text_vectors = inference_executor.run_on_device(selected_device, lambda: s2_inference.vectorise(
                 model_name=index_info.model_name,
                 model_properties=_get_model_properties(index_info), content=text_content_to_vectorise,
                 device=selected_device, normalize_embeddings=normalize_embeddings,
-                infer=infer_if_image)
+                infer=infer_if_image, as_numpy=True))
         image_vectors = []
         if len(image_content_to_vectorise) > 0:
-            image_vectors = s2_inference.vectorise(
+            image_vectors = inference_executor.run_on_device(selected_device, lambda: s2_inference.vectorise(
                 model_name=index_info.model_name,
                 model_properties=_get_model_properties(index_info), content=image_content_to_vectorise,
                 device=selected_device, normalize_embeddings=normalize_embeddings,
-                infer=infer_if_image)
+                infer=infer_if_image, as_numpy=True))
         end_time = timer()
         combo_vectorise_time_to_add += (end_time - start_time)
     except (s2_inference_errors.UnknownModelError,
@@ -2498,18 +3160,17 @@ def vectorise_multimodal_combination_field(field: str, multimodal_object: Dict[s
         return combo_chunk, combo_document_is_valid, unsuccessful_doc_to_append, combo_vectorise_time_to_add, new_fields_from_multimodal_combination
 
     sub_field_name_list = text_field_names + image_field_names
-    vectors_list = text_vectors + image_vectors
+    vectors_list = list(text_vectors) + list(image_vectors)
 
     if not len(sub_field_name_list) == len(vectors_list):
         raise errors.BatchInferenceSizeError(message=f"Batch inference size does not match content for multimodal field {field}")
 
-    vector_chunk = np.squeeze(np.mean([np.array(vector) * field_map["weights"][sub_field_name] for sub_field_name, vector in zip(sub_field_name_list, vectors_list)], axis=0))
+    weights = np.array([field_map["weights"][sub_field_name] for sub_field_name in sub_field_name_list], dtype=np.float32)
+    vector_chunk = np.squeeze(np.mean(np.asarray(vectors_list, dtype=np.float32) * weights[:, np.newaxis], axis=0))
 
     if normalize_embeddings is True:
         vector_chunk = vector_chunk / np.linalg.norm(vector_chunk)
 
-    vector_chunk = vector_chunk.tolist()
-
     combo_chunk = dict({
         utils.generate_vector_name(field): vector_chunk,
         TensorField.field_content: json.dumps(multimodal_object),
@@ -2517,7 +3178,8 @@ def vectorise_multimodal_combination_field(field: str, multimodal_object: Dict[s
     })
     return combo_chunk, combo_document_is_valid, unsuccessful_doc_to_append, combo_vectorise_time_to_add, new_fields_from_multimodal_combination
 
-def _create_normal_tensor_search_query(result_count, offset, vector_field, vectorised_text) -> dict:
+def _create_normal_tensor_search_query(result_count, offset, vector_field, vectorised_text, k: Optional[int] = None) -> dict:
+    """k: the knn query's k. Defaults to result_count + offset. See _get_knn_k()"""
     search_query = {
         "size": result_count,
         "from": offset,
@@ -2533,7 +3195,7 @@ def _create_normal_tensor_search_query(result_count, offset, vector_field, vecto
                     "knn": {
                         f"{TensorField.chunks}.{vector_field}": {
                             "vector": vectorised_text,
-                            "k": result_count + offset
+                            "k": result_count + offset if k is None else k
                         }
                     }
                 },
@@ -2547,7 +3209,9 @@ def _create_normal_tensor_search_query(result_count, offset, vector_field, vecto
     return search_query
 
 
-def _create_score_modifiers_tensor_search_query(result_count, offset, vector_field, vectorised_text, script_score) -> dict:
+def _create_score_modifiers_tensor_search_query(result_count, offset, vector_field, vectorised_text, script_score: dict,
+                                                k: Optional[int] = None) -> dict:
+    """k: the knn query's k. Defaults to result_count + offset. See _get_knn_k()"""
     search_query = {
         "size": result_count,
         "from": offset,
@@ -2568,16 +3232,14 @@ def _create_score_modifiers_tensor_search_query(result_count, offset, vector_fie
                                     "knn": {
                                         f"{TensorField.chunks}.{vector_field}": {
                                             "vector": vectorised_text,
-                                            "k": result_count + offset
+                                            "k": result_count + offset if k is None else k
                                         }
                                     }
                                 },
                                 "functions": [
                                     {
                                         "script_score": {
-                                            "script": {
-                                                "source": script_score
-                                            }
+                                            "script": script_score
                                         }
                                     }
                                 ],
@@ -1,7 +1,9 @@
 import os
 import typing
 import functools
+import hashlib
 import json
+import re
 from timeit import default_timer as timer
 import torch
 from marqo import errors
@@ -11,15 +13,19 @@ from typing import (
 )
 import copy
 import datetime
+import logging
 import pathlib
 
+# tensor_search_logging reads its settings through this module, so it can't be used here
+logger = logging.getLogger(__name__)
 
-def dicts_to_jsonl(dicts: List[dict]) -> str:
-    """Turns a list of dicts into a JSONL string"""
-    return functools.reduce(
-        lambda x, y: "{}\n{}".format(x, json.dumps(y)),
-        dicts, ""
-    ) + "\n"
+
+def dicts_to_jsonl(dicts: List[dict]) -> bytes:
+    """Turns a list of dicts into a UTF-8 encoded JSONL body. Numpy arrays are written as lists."""
+    # imported here as the serialization module reads its settings through this module
+    from marqo.tensor_search import serialization
+    dumps = serialization.get_serializer().dumps
+    return b"".join([b"\n" + dumps(d) for d in dicts]) + b"\n"
 
 
 def generate_vector_name(field_name: str) -> str:
@@ -27,6 +33,18 @@ def generate_vector_name(field_name: str) -> str:
     return F"{enums.TensorField.vector_prefix}{field_name}"
 
 
+def generate_field_hash(field_content: Union[str, dict], hash_key: str) -> str:
+    """Hashes a field's content together with hash_key, which describes how the
+    content is chunked and vectorised.
+
+    Raises:
+        TypeError or ValueError if field_content isn't JSON serializable
+    """
+    hasher = hashlib.blake2b(hash_key.encode("utf-8") + b"\n", digest_size=16)
+    hasher.update(json.dumps(field_content, sort_keys=True).encode("utf-8"))
+    return hasher.hexdigest()
+
+
 def truncate_dict_vectors(doc: Union[dict, List], new_length: int = 5) -> Union[List, Dict]:
     """Creates a readable version of a dict by truncating identified vectors
     Looks for field names that contains the keyword "vector"
@@ -88,6 +106,35 @@ def construct_authorized_url(url_base: str, username: str, password: str) -> str
     return f"{http_part}{http_sep}{username}:{password}@{domain_part}"
 
 
+# a field reference in a filter string starts the string, or follows whitespace, a bracket or an operator
+_FILTER_FIELD_START = r'(?<![^\s(+\-!&|])'
+
+
+def compile_filter_fields(simple_properties: typing.Iterable) -> Optional[typing.Pattern]:
+    """Builds a regex that matches the references to any of the properties in a filter string.
+
+    Fields with spaces are referenced with escaped spaces (e.g. `my\\ field:`). A reference must
+    start a term of the filter, so a field whose name ends another field's name (e.g. `int` and
+    `an_int`) doesn't match inside the other field's reference.
+
+    Returns:
+        the regex, for contextualise_filter_with(). None if there are no properties.
+    """
+    fields = sorted({field.replace(' ', r'\ ') for field in simple_properties})
+    if not fields:
+        return None
+    return re.compile(_FILTER_FIELD_START + '(' + '|'.join(re.escape(field) for field in fields) + '):')
+
+
+def contextualise_filter_with(filter_fields: Optional[typing.Pattern], filter_string: Optional[str]) -> str:
+    """Same as contextualise_filter(), with a regex built by compile_filter_fields()"""
+    if filter_string is None:
+        return ''
+    if filter_fields is None:
+        return filter_string
+    return filter_fields.sub(f'{enums.TensorField.chunks}.\\g<1>:', filter_string)
+
+
 def contextualise_filter(filter_string: Optional[str], simple_properties: typing.Iterable) -> str:
     """adds the chunk prefix to the start of properties found in simple string
 
@@ -103,14 +150,7 @@ def contextualise_filter(filter_string: Optional[str], simple_properties: typing
     """
     if filter_string is None:
         return ''
-    contextualised_filter = filter_string
-    for field in simple_properties:
-        if ' ' in field:
-            field_with_escaped_space = field.replace(' ', r'\ ') # monitor this: fixed the invalid escape sequence (Deprecation warning).
-            contextualised_filter = contextualised_filter.replace(f'{field_with_escaped_space}:', f'{enums.TensorField.chunks}.{field_with_escaped_space}:')
-        else:
-            contextualised_filter = contextualised_filter.replace(f'{field}:', f'{enums.TensorField.chunks}.{field}:')
-    return contextualised_filter
+    return contextualise_filter_with(compile_filter_fields(simple_properties), filter_string)
 
 
 def check_device_is_available(device: str) -> bool:
@@ -189,6 +229,30 @@ def read_env_vars_and_defaults(var: str) -> Optional[str]:
             return None
 
 
+def read_int_env_var(env_var: str, min_value: int = 1) -> int:
+    """Reads an env var that must be an int of at least min_value, e.g. 0 for settings that
+    0 turns off.
+
+    Raises:
+        ConfigurationError if the env var isn't an int, or is less than min_value
+    """
+    value = read_env_vars_and_defaults(env_var)
+    validation_error_msg = (
+        f"Could not properly read env var `{env_var}`. `{env_var}` must be an int greater than or equal "
+        f"to {min_value}. Current value: `{value}`."
+    )
+    try:
+        as_int = int(value)
+    except (ValueError, TypeError) as e:
+        value_error_msg = f"{validation_error_msg} Reason: {e}"
+        logger.error(value_error_msg)
+        raise errors.ConfigurationError(value_error_msg)
+    if as_int < min_value:
+        logger.error(validation_error_msg)
+        raise errors.ConfigurationError(validation_error_msg)
+    return as_int
+
+
 def parse_lexical_query(text: str) -> Tuple[List[str], str]:
     """Find required terms enclosed within double quotes.
 
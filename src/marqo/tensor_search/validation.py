@@ -1,8 +1,7 @@
-import json
 import pprint
 import typing
 from marqo.tensor_search import constants
-from marqo.tensor_search import enums, utils
+from marqo.tensor_search import enums, utils, serialization
 from typing import Container, Iterable, List, Optional, Union
 from marqo.errors import (
     MarqoError, InvalidFieldNameError, InvalidArgError, InternalError,
@@ -18,6 +17,32 @@ from marqo.tensor_search.models.settings_object import settings_schema
 from marqo.tensor_search.models.mappings_object import mappings_schema, multimodal_combination_schema
 from marqo.tensor_search.models.context_object import context_schema
 from marqo.tensor_search.models.score_modifiers_object import score_modifiers_object_schema
+from marqo.tensor_search.models.hybrid_parameters_object import hybrid_parameters_schema
+from marqo.tensor_search.models.knn_parameters_object import knn_parameters_schema
+
+
+def _compile_schema_validator(schema: dict) -> jsonschema.protocols.Validator:
+    """Checks the schema and builds its validator once, rather than on every request"""
+    validator_class = jsonschema.validators.validator_for(schema)
+    validator_class.check_schema(schema)
+    return validator_class(schema)
+
+
+def _validate_with(validator: jsonschema.protocols.Validator, instance: Any) -> None:
+    """Same as jsonschema.validate(), but with a precompiled validator.
+    Raises the same (best matching) jsonschema.ValidationError"""
+    error = jsonschema.exceptions.best_match(validator.iter_errors(instance))
+    if error is not None:
+        raise error
+
+
+_settings_validator = _compile_schema_validator(settings_schema)
+_mappings_validator = _compile_schema_validator(mappings_schema)
+_multimodal_combination_validator = _compile_schema_validator(multimodal_combination_schema)
+_context_validator = _compile_schema_validator(context_schema)
+_score_modifiers_validator = _compile_schema_validator(score_modifiers_object_schema)
+_hybrid_parameters_validator = _compile_schema_validator(hybrid_parameters_schema)
+_knn_parameters_validator = _compile_schema_validator(knn_parameters_schema)
 
 
 def validate_query(q: Union[dict, str], search_method: Union[str, SearchMethod]):
@@ -74,6 +99,9 @@ def validate_bulk_query_input(q: 'BulkSearchQueryEntity') -> Optional[MarqoError
         )
 
     validate_boost(boost=q.boost, search_method=q.searchMethod)
+    validate_hybrid_parameters(hybrid_parameters=q.hybridParameters, search_method=q.searchMethod)
+    validate_knn_parameters(knn_parameters=q.knnParameters, search_method=q.searchMethod)
+    validate_image_download_timeout_ms(q.imageDownloadTimeoutMs)
     if q.searchableAttributes is not None:
         if not isinstance(q.searchableAttributes, (List, typing.Tuple)):
             raise InvalidArgError("searchableAttributes must be a sequence!")
@@ -159,10 +187,10 @@ def validate_boost(boost: dict, search_method: typing.Union[str, SearchMethod]):
                 validate_field_name(boost_attr)
             except InvalidFieldNameError as e:
                 raise InvalidFieldNameError(f"Invalid boost dictionary. {e.message} {further_info_message}")
-        if search_method != SearchMethod.TENSOR:
-            # to be removed if boosting is implemented for lexical
+        if search_method.upper() not in (SearchMethod.TENSOR, SearchMethod.HYBRID):
+            # to be removed if boosting is implemented for lexical. Hybrid search boosts its tensor results.
             raise InvalidArgError(
-                f'Boosting is only supported for search_method="TENSOR". '
+                f'Boosting is only supported for search_method="TENSOR" and "HYBRID". '
                 f'Received search_method={search_method}'
                 f'{further_info_message}'
             )
@@ -254,13 +282,15 @@ def validate_doc(doc: dict) -> dict:
     max_doc_size = utils.read_env_vars_and_defaults(var=enums.EnvVars.MARQO_MAX_DOC_BYTES)
     if max_doc_size is not None:
         try:
-            serialized = json.dumps(doc)
-        except TypeError as e:
+            # the size in bytes of the doc as written by the fast serializer, without spaces or
+            # ascii escaping. It is close to what is sent to Marqo-OS
+            serialized_length = len(serialization.dumps(doc))
+        except (TypeError, ValueError) as e:
             raise InvalidArgError(f"Unable to index document: it is not serializable! Document: `{doc}` ")
-        if len(serialized) > int(max_doc_size):
+        if serialized_length > int(max_doc_size):
             maybe_id = f" _id:`{doc['_id']}`" if '_id' in doc else ''
             raise DocTooLargeError(
-                f"Document{maybe_id} with length `{len(serialized)}` exceeds "
+                f"Document{maybe_id} with length `{serialized_length}` exceeds "
                 f"the allowed document size limit of [{max_doc_size}]."
             )
     return doc
@@ -374,13 +404,18 @@ def validate_settings_object(settings_object):
     Raises an InvalidArgError if the settings object is badly formatted
     """
     try:
-        jsonschema.validate(instance=settings_object, schema=settings_schema)
-        return settings_object
+        _validate_with(_settings_validator, settings_object)
     except jsonschema.ValidationError as e:
         raise InvalidArgError(
             f"Error validating index settings object. Reason: \n{str(e)}"
             f"\nRead about the index settings object here: https://docs.marqo.ai/0.0.13/API-Reference/indexes/#body"
         )
+    filterable_fields = settings_object[enums.IndexSettingsField.index_defaults].get(
+        enums.IndexSettingsField.filterable_fields)
+    if filterable_fields is not None:
+        for field_name in filterable_fields:
+            validate_field_name(field_name)
+    return settings_object
 
 
 def validate_dict(field: str, field_content: typing.Dict, is_non_tensor_field: bool, mappings: dict):
@@ -468,7 +503,7 @@ def validate_context_object(context_object: dict):
         Raises an InvalidArgError if the context object is badly formatted
         """
     try:
-        jsonschema.validate(instance=context_object, schema=context_schema)
+        _validate_with(_context_validator, context_object)
         return context_object
     except jsonschema.ValidationError as e:
         raise InvalidArgError(
@@ -485,7 +520,7 @@ def validate_mappings_object(mappings_object: dict):
     Raises an InvalidArgError if the settings object is badly formatted
     """
     try:
-        jsonschema.validate(instance=mappings_object, schema=mappings_schema)
+        _validate_with(_mappings_validator, mappings_object)
         for field_name, config in mappings_object.items():
             if config["type"] == enums.MappingsObjectType.multimodal_combination:
                 validate_multimodal_combination_object(config)
@@ -508,7 +543,7 @@ def validate_multimodal_combination_object(multimodal_mappings: dict):
     Raises InvalidArgError if the object is badly formatted
     """
     try:
-        jsonschema.validate(instance=multimodal_mappings, schema=multimodal_combination_schema)
+        _validate_with(_multimodal_combination_validator, multimodal_mappings)
         return multimodal_mappings
     except jsonschema.ValidationError as e:
         raise InvalidArgError(
@@ -562,7 +597,7 @@ def validate_multimodal_combination_mapping(field_mapping: dict):
 
 def validate_score_modifiers_object(score_modifiers: List[dict]):
     try:
-        jsonschema.validate(instance=score_modifiers, schema=score_modifiers_object_schema)
+        _validate_with(_score_modifiers_validator, score_modifiers)
         return score_modifiers
     except jsonschema.ValidationError as e:
         raise InvalidArgError(
@@ -570,3 +605,93 @@ def validate_score_modifiers_object(score_modifiers: List[dict]):
             f"Please revise your score_modifiers based on the provided error."
             f"\n Check `https://docs.marqo.ai/0.0.17/API-Reference/search/#score-modifiers` for more info."
         )
+
+
+def validate_score_modifiers_fields(score_modifiers: dict, filterable_fields: Optional[Iterable[str]]) -> dict:
+    """Checks that validated score modifiers only use the index's filterable fields. The
+    other fields aren't copied into the chunks, so the score modifiers would skip them.
+
+    Args:
+        filterable_fields: the filterable fields of the index, or None if every field is filterable
+    """
+    if filterable_fields is None:
+        return score_modifiers
+    non_filterable = sorted({
+        config["field_name"]
+        for modifier_type in ["multiply_score_by", "add_to_score"]
+        for config in score_modifiers.get(modifier_type, [])
+        if config["field_name"].split(".")[0] not in filterable_fields
+    })
+    if non_filterable:
+        raise InvalidArgError(
+            f"Score modifiers can only use the filterable fields of the index. "
+            f"These fields aren't filterable: {non_filterable}. "
+            f"Add them to the index's `filterable_fields` setting to use them in score modifiers."
+        )
+    return score_modifiers
+
+
+def validate_hybrid_parameters(hybrid_parameters: Optional[dict], search_method: Union[str, SearchMethod]) -> dict:
+    """Validates the fusion parameters of a hybrid search
+
+    Returns:
+        the parameters, with defaults for the missing ones
+    """
+    if hybrid_parameters is not None and search_method.upper() != SearchMethod.HYBRID:
+        raise InvalidArgError(
+            f'hybrid_parameters are only supported for search_method="HYBRID". '
+            f'Received search_method={search_method}')
+    if hybrid_parameters is None:
+        hybrid_parameters = dict()
+    try:
+        _validate_with(_hybrid_parameters_validator, hybrid_parameters)
+    except jsonschema.ValidationError as e:
+        raise InvalidArgError(
+            f"Error validating hybrid_parameters = `{hybrid_parameters}`. Reason: \n{str(e)} "
+            f"Please revise your hybrid_parameters based on the provided error."
+        )
+    return {
+        param: hybrid_parameters.get(param, schema["default"])
+        for param, schema in hybrid_parameters_schema["properties"].items()
+    }
+
+
+def validate_knn_parameters(knn_parameters: Optional[dict], search_method: Union[str, SearchMethod]) -> dict:
+    """Validates the knn parameters of a search, which override those of the index
+
+    Returns:
+        the given parameters, without defaults for the missing ones, as these come from the
+        index. An empty dict if knn_parameters is None.
+    """
+    if knn_parameters is not None and search_method.upper() == SearchMethod.LEXICAL:
+        raise InvalidArgError(
+            f'knn_parameters are only supported for search_method="TENSOR" and search_method="HYBRID". '
+            f'Received search_method={search_method}')
+    if knn_parameters is None:
+        return dict()
+    try:
+        _validate_with(_knn_parameters_validator, knn_parameters)
+    except jsonschema.ValidationError as e:
+        raise InvalidArgError(
+            f"Error validating knn_parameters = `{knn_parameters}`. Reason: \n{str(e)} "
+            f"Please revise your knn_parameters based on the provided error."
+        )
+    return dict(knn_parameters)
+
+
+def validate_image_download_timeout_ms(image_download_timeout_ms: Optional[int]) -> Optional[int]:
+    """Validates how long the images of a search query may take to download
+
+    Returns:
+        the timeout, or None to use MARQO_QUERY_IMAGE_DOWNLOAD_TIMEOUT_MS
+    """
+    if image_download_timeout_ms is None:
+        return None
+    max_timeout_ms = utils.read_int_env_var(enums.EnvVars.MARQO_MAX_QUERY_IMAGE_DOWNLOAD_TIMEOUT_MS)
+    if isinstance(image_download_timeout_ms, bool) or not isinstance(image_download_timeout_ms, int) \
+            or not 0 < image_download_timeout_ms <= max_timeout_ms:
+        raise InvalidArgError(
+            f"image_download_timeout_ms must be an int greater than 0 and at most {max_timeout_ms} "
+            f"(MARQO_MAX_QUERY_IMAGE_DOWNLOAD_TIMEOUT_MS). "
+            f"Received image_download_timeout_ms={image_download_timeout_ms}")
+    return image_download_timeout_ms
@@ -1,12 +1,36 @@
 import json
 import urllib.parse
+from typing import Any, Iterable
+from fastapi.responses import JSONResponse, StreamingResponse
 from marqo.errors import InvalidArgError, InternalError
-from marqo.tensor_search import enums
+from marqo.tensor_search import enums, serialization, streaming
 from typing import Optional
 from marqo.tensor_search.utils import construct_authorized_url
 from marqo import config
 
 
+class MarqoJSONResponse(JSONResponse):
+    """Renders the response with Marqo's JSON serializer (orjson, by default).
+
+    Endpoints that return large payloads, such as search results, return this
+    response directly, which also skips FastAPI's jsonable_encoder pass.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return serialization.dumps(content)
+
+
+class MarqoNDJSONStreamingResponse(StreamingResponse):
+    """Streams items, such as search hits, as NDJSON, with a JSON object per line.
+
+    The items are serialised while earlier lines are sent, within bounded buffers.
+    See streaming.
+    """
+
+    def __init__(self, items: Iterable[Any], **kwargs):
+        super().__init__(streaming.stream_ndjson(items), media_type=streaming.NDJSON_MEDIA_TYPE, **kwargs)
+
+
 def upconstruct_authorized_url(opensearch_url: str) -> str:
     """Generates an authorized URL, if it is not already authorized
     """
@@ -0,0 +1,169 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+import pytest
+
+from marqo.s2_inference import onnx_quantization
+from marqo.s2_inference.errors import InvalidModelPropertiesError, UnknownModelError
+from marqo.s2_inference.reranking import model_utils
+from marqo.s2_inference.s2_inference import (
+    _validate_model_properties, clear_loaded_models, get_model_properties_from_registry, vectorise
+)
+
+
+class TestOnnxQuantization(unittest.TestCase):
+
+    def test_validate_quantization(self):
+        assert onnx_quantization.validate_quantization(None) is None
+        assert onnx_quantization.validate_quantization("int8") == "int8"
+        for bad in ["int4", "INT8", "", "fp16"]:
+            try:
+                onnx_quantization.validate_quantization(bad)
+                raise AssertionError
+            except InvalidModelPropertiesError as e:
+                assert "quantize" in str(e)
+
+    def test_validate_model_properties_quantize(self):
+        model_properties = {"name": "sentence-transformers/all-MiniLM-L6-v1", "dimensions": 384,
+                            "type": "sbert_onnx", "quantize": "int4"}
+        try:
+            _validate_model_properties("my-model", model_properties)
+            raise AssertionError
+        except InvalidModelPropertiesError:
+            pass
+
+    def test_registry_int8_variants(self):
+        for name in ["onnx-int8/all-MiniLM-L6-v1", "onnx-int8/all_datasets_v4_MiniLM-L6",
+                     "onnx32-int8/openai/ViT-L/14"]:
+            props = get_model_properties_from_registry(name)
+            assert props["quantize"] == "int8"
+            fp32_props = get_model_properties_from_registry(name.replace("-int8", "", 1))
+            assert props["name"] == fp32_props["name"]
+            assert props["dimensions"] == fp32_props["dimensions"]
+            assert props["type"] == fp32_props["type"]
+
+        # only the onnx32 clip models get int8 variants
+        try:
+            get_model_properties_from_registry("onnx16-int8/openai/ViT-L/14")
+            raise AssertionError
+        except UnknownModelError:
+            pass
+
+    def test_cross_encoder_int8_variant(self):
+        mock_onnx_model = mock.MagicMock()
+
+        @mock.patch("marqo.s2_inference.reranking.model_utils.HFClassificationOnnx", mock_onnx_model)
+        def run():
+            model_utils.load_sbert_cross_encoder_model("onnx-int8/cross-encoder/ms-marco-TinyBERT-L-2", device="cpu")
+            mock_onnx_model.assert_called_once_with("cross-encoder/ms-marco-TinyBERT-L-2", device="cpu", quantize="int8")
+
+            # the fp32 model is cached separately
+            model_utils.load_sbert_cross_encoder_model("onnx/cross-encoder/ms-marco-TinyBERT-L-2", device="cpu")
+            assert mock_onnx_model.call_args_list[1] == mock.call("cross-encoder/ms-marco-TinyBERT-L-2", device="cpu")
+            model_utils.load_sbert_cross_encoder_model("onnx-int8/cross-encoder/ms-marco-TinyBERT-L-2", device="cpu")
+            assert mock_onnx_model.call_count == 2
+            return True
+
+        try:
+            assert run()
+        finally:
+            clear_loaded_models()
+
+    def test_quantize_onnx_model_is_cached(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            model_path = os.path.join(tmp_dir, "model.onnx")
+
+            def fake_quantize_dynamic(model_input, model_output, weight_type):
+                with open(model_output, "w") as f:
+                    f.write("quantized")
+
+            mock_quantize_dynamic = mock.MagicMock(side_effect=fake_quantize_dynamic)
+
+            @mock.patch("marqo.s2_inference.onnx_quantization.quantize_dynamic", mock_quantize_dynamic)
+            def run():
+                path_1 = onnx_quantization.quantize_onnx_model(model_path, "int8", output_folder=tmp_dir)
+                path_2 = onnx_quantization.quantize_onnx_model(model_path, "int8", output_folder=tmp_dir)
+                assert path_1 == path_2 == os.path.join(tmp_dir, "model-int8.onnx")
+                assert os.path.exists(path_1)
+                # the second call is served from disk
+                assert mock_quantize_dynamic.call_count == 1
+                # no temporary files are left behind
+                assert sorted(os.listdir(tmp_dir)) == ["model-int8.onnx"]
+
+                onnx_quantization.quantize_onnx_model(model_path, "int8", output_folder=tmp_dir,
+                                                      enable_overwrite=True)
+                assert mock_quantize_dynamic.call_count == 2
+                return True
+
+            assert run()
+
+
+@pytest.mark.largemodel
+class TestOnnxQuantizationBenchmark(unittest.TestCase):
+    """Reports the speedup and the embedding drift of the int8 models against their fp32 versions,
+    on a fixed corpus. Run with `pytest --largemodel -s` to see the report."""
+
+    corpus = [
+        "hello",
+        "this is a test sentence. so is this.",
+        "The quick brown fox jumps over the lazy dog.",
+        "Marqo is an end-to-end vector search engine.",
+        "Honey is a delectable food stuff produced by bees from the nectar of flowers.",
+        "Space exploration is the use of astronomy and space technology to explore outer space.",
+        "a red dress with white polka dots",
+        "How many people live in Berlin?",
+    ] * 8
+
+    def tearDown(self) -> None:
+        clear_loaded_models()
+
+    def _benchmark(self, name: str, n_runs: int = 5):
+        vectorise(name, self.corpus, device="cpu")
+        t0 = time.perf_counter()
+        for _ in range(n_runs):
+            vectors = vectorise(name, self.corpus, device="cpu")
+        return np.array(vectors), (time.perf_counter() - t0) / n_runs
+
+    def _report(self, int8_name: str, fp32_time: float, int8_time: float, drift: str) -> None:
+        print(f"\n{int8_name}: fp32 {fp32_time * 1000:.1f}ms, int8 {int8_time * 1000:.1f}ms, "
+              f"speedup x{fp32_time / int8_time:.2f}, {drift}")
+
+    def test_int8_speedup_and_drift(self):
+        # the sbert models, and the text encoder of a clip model
+        pairs = [("onnx/all-MiniLM-L6-v1", "onnx-int8/all-MiniLM-L6-v1"),
+                 ("onnx/all_datasets_v4_MiniLM-L6", "onnx-int8/all_datasets_v4_MiniLM-L6"),
+                 ("onnx32/open_clip/ViT-B-32/openai", "onnx32-int8/open_clip/ViT-B-32/openai")]
+        for fp32_name, int8_name in pairs:
+            fp32_vectors, fp32_time = self._benchmark(fp32_name)
+            int8_vectors, int8_time = self._benchmark(int8_name)
+
+            cosine = np.sum(fp32_vectors * int8_vectors, axis=1) / (
+                np.linalg.norm(fp32_vectors, axis=1) * np.linalg.norm(int8_vectors, axis=1))
+            self._report(int8_name, fp32_time, int8_time,
+                         f"cosine similarity to fp32 min={cosine.min():.4f} mean={cosine.mean():.4f}")
+
+            assert cosine.min() > 0.95
+            clear_loaded_models()
+
+    def test_cross_encoder_int8_speedup_and_drift(self):
+        n_runs = 5
+        pairs = [["How many people live in Berlin?", text] for text in self.corpus]
+        scores, times = [], []
+        for name in ["onnx/cross-encoder/ms-marco-TinyBERT-L-2", "onnx-int8/cross-encoder/ms-marco-TinyBERT-L-2"]:
+            model = model_utils.load_sbert_cross_encoder_model(name, device="cpu")["model"]
+            model.predict(pairs)
+            t0 = time.perf_counter()
+            for _ in range(n_runs):
+                model_scores = model.predict(pairs)
+            times.append((time.perf_counter() - t0) / n_runs)
+            scores.append(np.array(model_scores))
+        correlation = np.corrcoef(scores[0], scores[1])[0, 1]
+        self._report("onnx-int8/cross-encoder/ms-marco-TinyBERT-L-2", times[0], times[1],
+                     f"score correlation to fp32 {correlation:.4f}, "
+                     f"max score difference {np.abs(scores[0] - scores[1]).max():.4f}")
+
+        assert correlation > 0.95
@@ -47,6 +47,19 @@ class TestOutputs(unittest.TestCase):
                                + device)
                 )
 
+    def test_create_model_cache_key_quantized(self):
+        # quantized variants must not collide with the fp32 model in the cache
+        device = 'cpu'
+        fp32_properties = get_model_properties_from_registry("onnx/all-MiniLM-L6-v2")
+        int8_properties = get_model_properties_from_registry("onnx-int8/all-MiniLM-L6-v2")
+        assert fp32_properties['name'] == int8_properties['name']
+        assert int8_properties['quantize'] == 'int8'
+
+        fp32_key = _create_model_cache_key("my-model", device, fp32_properties)
+        int8_key = _create_model_cache_key("my-model", device, int8_properties)
+        assert fp32_key != int8_key
+        assert int8_key.startswith("my-model") and int8_key.endswith(device)
+
     def test_clear_model_cache(self):
         # tests clearing the model cache
         clear_loaded_models()
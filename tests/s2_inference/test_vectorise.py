@@ -1,4 +1,6 @@
+import numpy as np
 import PIL
+from PIL import Image
 from marqo.s2_inference import random_utils, s2_inference
 import unittest
 from unittest import mock
@@ -247,6 +249,38 @@ class TestVectoriseBatching(unittest.TestCase):
         self.assertIsInstance(result, list)
         self.assertEqual(len(result), len(varying_length_content))
 
+    @mock.patch('marqo.s2_inference.s2_inference.available_models', {})
+    @mock.patch('marqo.s2_inference.s2_inference._update_available_models', mock.MagicMock())
+    def test_vectorise_as_numpy(self):
+        s2_inference.available_models.update(self.mock_available_models)
+
+        result = s2_inference.vectorise(model_name='mock_model', content=self.content_list,
+                                        model_properties=self.mock_model_props, as_numpy=True)
+        self.assertIsInstance(result, np.ndarray)
+        self.assertEqual(result.dtype, np.float32)
+        self.assertEqual(result.shape, (len(self.content_list), 128))
+        self.assertTrue(result.flags['C_CONTIGUOUS'])
+        # as_numpy isn't passed on to the model
+        self.assertNotIn('as_numpy', self.mock_model.encode.call_args[1])
+
+        as_lists = s2_inference.vectorise(model_name='mock_model', content=self.content_list,
+                                          model_properties=self.mock_model_props)
+        np.testing.assert_allclose(result, as_lists, rtol=1e-6)
+
+        single = s2_inference.vectorise(model_name='mock_model', content='just a single content',
+                                        model_properties=self.mock_model_props, as_numpy=True)
+        self.assertEqual(single.shape, (1, 128))
+
+    def test_convert_vectorized_output_to_numpy(self):
+        for output in [np.ones(4), np.ones((2, 4), dtype=np.float64), [[1.0] * 4, [2.0] * 4],
+                       [np.ones(4), np.ones(4)]]:
+            converted = s2_inference._convert_vectorized_output_to_numpy(output)
+            self.assertEqual(converted.dtype, np.float32)
+            self.assertEqual(converted.ndim, 2)
+            self.assertEqual(converted.shape[1], 4)
+        with self.assertRaises(TypeError):
+            s2_inference._convert_vectorized_output_to_numpy(np.ones((2, 2, 2)))
+
     @mock.patch('marqo.tensor_search.utils.read_env_vars_and_defaults')
     def test_vectorise_large_batch_size(self, mock_read_env_vars_and_defaults):
         s2_inference.available_models.update(self.mock_available_models)
@@ -307,3 +341,82 @@ class TestVectoriseBatching(unittest.TestCase):
             return True
         assert run()
 
+
+
+class TestVectoriseLengthBucketing(unittest.TestCase):
+
+    def setUp(self):
+        self.mock_model = mock.MagicMock()
+        # each vector encodes its own content, so a vector can be matched back to its content
+        self.mock_model.encode.side_effect = lambda batch, **kwargs: np.array(
+            [[float(len(item)), float(i)] for i, item in enumerate(batch)])
+        self.mock_model_props = {
+            "name": "mock_model",
+            "dimensions": 2,
+            "tokens": 128,
+            "type": "sbert"
+        }
+        self.mock_available_models = {
+            s2_inference._create_model_cache_key(
+                model_name='mock_model', device='cpu',
+                model_properties=self.mock_model_props
+            ): self.mock_model
+        }
+
+    def test_generate_length_bucketed_batches(self):
+        content = ['a', 'b', 'c', 'd', 'e', 'f']
+        token_lengths = [10, 2, 9, 3, 1, 8]
+        batch_order, batches = s2_inference._generate_length_bucketed_batches(
+            content, token_lengths, batch_size=3, max_batch_tokens=1000)
+        assert batch_order == [4, 1, 3, 5, 2, 0]
+        assert batches == [['e', 'b', 'd'], ['f', 'c', 'a']]
+
+        # the token budget splits batches of long content, padded to their longest item
+        batch_order, batches = s2_inference._generate_length_bucketed_batches(
+            content, token_lengths, batch_size=3, max_batch_tokens=18)
+        assert batches == [['e', 'b', 'd'], ['f', 'c'], ['a']]
+
+        # an item longer than the budget still gets a batch of its own
+        _, batches = s2_inference._generate_length_bucketed_batches(
+            content, token_lengths, batch_size=3, max_batch_tokens=5)
+        assert batches == [['e', 'b'], ['d'], ['f'], ['c'], ['a']]
+
+    def test_vectorise_length_bucketed_keeps_content_order(self):
+        content = ['a' * n for n in [7, 1, 5, 3, 6, 2, 4]]
+
+        @mock.patch('marqo.s2_inference.s2_inference.available_models', self.mock_available_models)
+        @mock.patch('marqo.s2_inference.s2_inference._update_available_models', mock.MagicMock())
+        @mock.patch('marqo.s2_inference.s2_inference._get_token_lengths',
+                    lambda model, content: [len(item) for item in content])
+        @mock.patch('marqo.s2_inference.s2_inference._get_max_vectorise_batch_size', lambda: 3)
+        @mock.patch('marqo.s2_inference.s2_inference._get_max_vectorise_batch_tokens', lambda: 1000)
+        def run():
+            result = s2_inference.vectorise(model_name='mock_model', content=content,
+                                            model_properties=self.mock_model_props)
+            batches = [call[0][0] for call in self.mock_model.encode.call_args_list]
+            assert batches == [['a', 'aa', 'aaa'], ['a' * 4, 'a' * 5, 'a' * 6], ['a' * 7]]
+            assert [vector[0] for vector in result] == [len(item) for item in content]
+            return True
+        assert run()
+
+    def test_get_token_lengths_without_tokenizer(self):
+        """models without a huggingface tokenizer, and non-text content, are batched in order"""
+        assert s2_inference._get_token_lengths(self.mock_model, ['hello', 'there']) is None
+        assert s2_inference._get_token_lengths(random_utils.Random(model_name='mock_model', embedding_dim=2),
+                                               ['hello', 'there']) is None
+
+        mock_tokenizer = mock.MagicMock(spec=s2_inference.PreTrainedTokenizerBase)
+        self.mock_model.tokenizer = mock_tokenizer
+        assert s2_inference._get_token_lengths(self.mock_model, ['hello', Image.new('RGB', (2, 2))]) is None
+        mock_tokenizer.assert_not_called()
+
+    def test_get_token_lengths(self):
+        mock_tokenizer = mock.MagicMock(spec=s2_inference.PreTrainedTokenizerBase)
+        mock_tokenizer.side_effect = lambda content, **kwargs: {
+            "input_ids": [list(range(min(len(item.split()) + 2, kwargs.get("max_length") or 10**6)))
+                          for item in content]}
+        # SBERT keeps the tokenizer on the SentenceTransformer
+        self.mock_model.tokenizer = None
+        self.mock_model.model.tokenizer = mock_tokenizer
+        self.mock_model.max_seq_length = 4
+        assert s2_inference._get_token_lengths(self.mock_model, ['one', 'one two', 'one two three']) == [3, 4, 4]
@@ -10,13 +10,17 @@ import PIL
 import marqo.tensor_search.utils as marqo_utils
 import numpy as np
 import requests
-from marqo.tensor_search.enums import TensorField, IndexSettingsField, SearchMethod
+from marqo.tensor_search.enums import TensorField, IndexSettingsField, SearchMethod, EnvVars
 from marqo.tensor_search import enums
-from marqo.errors import IndexNotFoundError, InvalidArgError, BadRequestError
+from marqo.errors import IndexNotFoundError, InvalidArgError, BadRequestError, ConfigurationError
 from marqo.tensor_search import tensor_search, index_meta_cache, backend
 from tests.marqo_test import MarqoTestCase
+import os
+import threading
 import time
-from marqo.tensor_search import add_docs
+import unittest
+from marqo.tensor_search import add_docs, configs
+from marqo.tensor_search.models.index_info import IndexInfo
 
 class TestAddDocuments(MarqoTestCase):
 
@@ -968,6 +972,43 @@ class TestAddDocuments(MarqoTestCase):
             expected_ids={'789'}
         )
 
+    def test_filterable_fields(self):
+        """only the index's filterable fields are copied into the chunks"""
+        for update_mode in ('replace', 'update'):
+            try:
+                tensor_search.delete_index(config=self.config, index_name=self.index_name_1)
+            except IndexNotFoundError:
+                pass
+            tensor_search.create_vector_index(
+                config=self.config, index_name=self.index_name_1,
+                index_settings={"index_defaults": {"filterable_fields": ["colour"]}})
+            tensor_search.add_documents(config=self.config, index_name=self.index_name_1, docs=[
+                {"_id": "1", "title": "A shirt. It is nice.", "colour": "red", "size": "L"},
+                {"_id": "2", "title": "A hat", "colour": "blue", "size": "M"},
+            ], auto_refresh=True, update_mode=update_mode)
+            tensor_search.add_documents(config=self.config, index_name=self.index_name_1, docs=[
+                {"_id": "2", "size": "S"},
+            ], auto_refresh=True, update_mode=update_mode)
+
+            for doc_id in ("1", "2"):
+                stored = requests.get(url=f"{self.endpoint}/{self.index_name_1}/_doc/{doc_id}", verify=False).json()
+                for chunk in stored["_source"][TensorField.chunks]:
+                    assert "size" not in chunk
+                    if doc_id == "1" or update_mode == "update":
+                        assert chunk["colour"] in ("red", "blue")
+
+            searched = tensor_search.search(config=self.config, index_name=self.index_name_1,
+                                            text="shirt", filter="colour:red")
+            assert {h['_id'] for h in searched['hits']} == {"1"}
+            # non-filterable fields can still be used in lexical search filters
+            searched = tensor_search.search(config=self.config, index_name=self.index_name_1, text="",
+                                            filter="size:S", search_method=SearchMethod.LEXICAL)
+            assert {h['_id'] for h in searched['hits']} == {"2"}
+            # but not in tensor search filters, which filter the chunks
+            with self.assertRaises(InvalidArgError):
+                tensor_search.search(config=self.config, index_name=self.index_name_1,
+                                     text="shirt", filter="size:S")
+
     def test_put_document_override_non_tensor_field(self):
         docs_ = [{"_id": "789", "Title": "Story of Alice Appleseed", "Description": "Alice grew up in Houston, Texas."}]
         tensor_search.add_documents(config=self.config, index_name=self.index_name_1, docs=docs_, auto_refresh=True, non_tensor_fields=["Title"])
@@ -1463,4 +1504,249 @@ class TestAddDocuments(MarqoTestCase):
             )
             assert len(expected_repo_structure) == len(image_repo)
             for k in expected_repo_structure:
-                assert isinstance(image_repo[k], expected_repo_structure[k])
\ No newline at end of file
+                assert isinstance(image_repo[k], expected_repo_structure[k])
+
+
+class TestFilterableFieldsBenchmark(unittest.TestCase):
+    """Reports the _bulk bytes per doc for docs with 20 attributes and 30 chunks, with every
+    field copied into the chunks, and with 2 filterable fields. Run with `pytest -s`."""
+
+    n_attributes, n_chunks, n_dims = 20, 30, 384
+
+    def _bulk_bytes_per_doc(self, index_settings: dict, n_docs: int = 20) -> float:
+        docs = [{"_id": str(i), "text": f"doc {i}",
+                 **{f"attribute_{a}": f"value {a} of doc {i}" for a in range(self.n_attributes)}}
+                for i in range(n_docs)]
+        index_info = IndexInfo(model_name="hf/all_datasets_v4_MiniLM-L6", properties=dict(),
+                               index_settings=index_settings)
+        mock_http = mock.MagicMock()
+        mock_http.return_value.post.side_effect = lambda path, body: {
+            "took": 1, "errors": False,
+            "items": [{"index": {"status": 201}} for line in body.splitlines() if b'"_index"' in line]}
+        with mock.patch.object(tensor_search, "HttpRequests", mock_http), \
+                mock.patch.object(tensor_search.bulk, "HttpRequests", mock_http), \
+                mock.patch.object(tensor_search.backend, "get_index_info", return_value=index_info), \
+                mock.patch.object(tensor_search.backend, "add_customer_field_properties"), \
+                mock.patch.object(tensor_search.text_processor, "split_text",
+                                  side_effect=lambda text, **kwargs: [text] * self.n_chunks), \
+                mock.patch.object(tensor_search.s2_inference, "vectorise", side_effect=lambda content, **kwargs:
+                                  np.random.rand(len(content), self.n_dims).astype(np.float32)):
+            # only the text field is vectorised
+            tensor_search.add_documents(config=mock.MagicMock(), index_name="my-index", docs=docs,
+                                        auto_refresh=False,
+                                        non_tensor_fields=[f"attribute_{a}" for a in range(self.n_attributes)])
+        _, kwargs = mock_http.return_value.post.call_args_list[-1]
+        return len(kwargs["body"]) / n_docs
+
+    def test_bulk_bytes_per_doc(self):
+        all_fields = configs.get_default_index_settings()
+        filterable = configs.get_default_index_settings()
+        filterable[IndexSettingsField.index_defaults][IndexSettingsField.filterable_fields] = [
+            "attribute_0", "attribute_1"]
+        all_fields_bytes = self._bulk_bytes_per_doc(all_fields)
+        filterable_bytes = self._bulk_bytes_per_doc(filterable)
+        print(f"\n_bulk bytes per doc ({self.n_attributes} attributes, {self.n_chunks} chunks, {self.n_dims} dims): "
+              f"all fields in chunks {all_fields_bytes:.0f}, 2 filterable fields {filterable_bytes:.0f}")
+        assert filterable_bytes < all_fields_bytes
+
+
+class TestAddDocumentsBulkSplitting(unittest.TestCase):
+    """add_documents against a mocked Marqo-OS, with the _bulk request split into sub-requests"""
+
+    def test_items_keep_doc_order(self):
+        bulk_bodies = []
+
+        def fake_post(path, body):
+            bulk_bodies.append(body)
+            ids = [json.loads(line)["index"]["_id"] for line in body.splitlines() if b'"_index"' in line]
+            return {"took": 1, "errors": False,
+                    "items": [{"index": {"_id": _id, "status": 201, "result": "created"}} for _id in ids]}
+
+        docs = [{"_id": str(i), "text": f"doc {i}"} for i in range(7)]
+        # an invalid doc is reported in its position, without being sent
+        docs.insert(3, {"_id": "invalid", "text": {"a dict": "without mappings"}})
+        index_info = IndexInfo(model_name="hf/all_datasets_v4_MiniLM-L6", properties=dict(),
+                               index_settings=configs.get_default_index_settings())
+        mock_http = mock.MagicMock()
+        mock_http.return_value.post.side_effect = fake_post
+        with mock.patch.object(tensor_search, "HttpRequests", mock_http), \
+                mock.patch.object(tensor_search.bulk, "HttpRequests", mock_http), \
+                mock.patch.object(tensor_search.backend, "get_index_info", return_value=index_info), \
+                mock.patch.object(tensor_search.backend, "add_customer_field_properties"), \
+                mock.patch.object(tensor_search.text_processor, "split_text", side_effect=lambda text, **kwargs: [text]), \
+                mock.patch.object(tensor_search.s2_inference, "vectorise", side_effect=lambda content, **kwargs:
+                                  np.random.rand(len(content), 384).astype(np.float32)), \
+                mock.patch.dict(os.environ, {EnvVars.MARQO_MAX_BULK_REQUEST_ACTIONS: "2"}):
+            res = tensor_search.add_documents(config=mock.MagicMock(), index_name="my-index", docs=docs,
+                                              auto_refresh=False)
+        assert len(bulk_bodies) == 4
+        assert [item["_id"] for item in res["items"]] == ["0", "1", "2", "invalid", "3", "4", "5", "6"]
+        assert res["errors"] is True
+        assert [item["status"] for item in res["items"]] == [201] * 3 + [400] + [201] * 4
+
+    def test_vectorising_uses_the_device_inference_limit(self):
+        index_info = IndexInfo(model_name="hf/all_datasets_v4_MiniLM-L6", properties=dict(),
+                               index_settings=configs.get_default_index_settings())
+        mock_http = mock.MagicMock()
+        mock_http.return_value.post.side_effect = lambda path, body: {"took": 1, "errors": False, "items": [
+            {"index": {"_id": json.loads(line)["index"]["_id"], "status": 201, "result": "created"}}
+            for line in body.splitlines() if b'"_index"' in line]}
+        with mock.patch.object(tensor_search, "HttpRequests", mock_http), \
+                mock.patch.object(tensor_search.bulk, "HttpRequests", mock_http), \
+                mock.patch.object(tensor_search.backend, "get_index_info", return_value=index_info), \
+                mock.patch.object(tensor_search.backend, "add_customer_field_properties"), \
+                mock.patch.object(tensor_search.text_processor, "split_text", side_effect=lambda text, **kwargs: [text]), \
+                mock.patch.object(tensor_search.s2_inference, "vectorise", side_effect=lambda content, **kwargs:
+                                  np.random.rand(len(content), 384).astype(np.float32)), \
+                mock.patch.object(tensor_search.inference_executor, "run_on_device",
+                                  wraps=tensor_search.inference_executor.run_on_device) as mock_run_on_device:
+            tensor_search.add_documents(
+                config=mock.MagicMock(), index_name="my-index", auto_refresh=False, device="cpu",
+                docs=[{"_id": "1", "text": "some text"},
+                      {"_id": "2", "combo": {"a": "text a", "b": "text b"}}],
+                mappings={"combo": {"type": "multimodal_combination", "weights": {"a": 0.5, "b": 0.5}}})
+        # a call for the text field, and a call for the text of the multimodal combination field
+        assert [call.args[0] for call in mock_run_on_device.call_args_list] == ["cpu", "cpu"]
+
+
+class TestAddDocumentBatchesPipelining(unittest.TestCase):
+    """add_document_batches, with the _bulk request of a batch sent while the next batch is vectorised"""
+
+    def setUp(self) -> None:
+        self.events = []
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def _fake_prepare_documents(self, bulk_seconds: float = 0.05, failing_batch: int = None):
+        def prepare_documents(docs, **kwargs):
+            batch = docs[0]["batch"]
+            with self.lock:
+                self.events.append(("prepared", batch))
+
+            def index_documents():
+                with self.lock:
+                    self.in_flight += 1
+                    self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                time.sleep(bulk_seconds)
+                with self.lock:
+                    self.in_flight -= 1
+                    self.events.append(("indexed", batch))
+                if batch == failing_batch:
+                    raise BadRequestError("Marqo-OS rejected the batch")
+                return {"errors": False, "items": [{"_id": doc["_id"]} for doc in docs]}
+            return index_documents
+        return prepare_documents
+
+    def _batches(self, n: int):
+        return [[{"_id": f"{b}-{i}", "batch": b} for i in range(3)] for b in range(n)]
+
+    def test_results_keep_batch_order(self):
+        with mock.patch.object(tensor_search, "_prepare_documents", side_effect=self._fake_prepare_documents()), \
+                mock.patch.dict(os.environ, {EnvVars.MARQO_MAX_PIPELINED_BULK_REQUESTS: "3"}):
+            results = tensor_search.add_document_batches(
+                config=mock.MagicMock(), index_name="my-index", batches=self._batches(8), auto_refresh=False)
+        assert [[item["_id"] for item in res["items"]] for res in results] == \
+               [[f"{b}-{i}" for i in range(3)] for b in range(8)]
+
+    def test_bulk_overlaps_next_batch(self):
+        prepared_batches = []
+        with mock.patch.object(tensor_search, "_prepare_documents", side_effect=self._fake_prepare_documents()), \
+                mock.patch.dict(os.environ, {EnvVars.MARQO_MAX_PIPELINED_BULK_REQUESTS: "1"}):
+            tensor_search.add_document_batches(
+                config=mock.MagicMock(), index_name="my-index", batches=self._batches(4), auto_refresh=False,
+                on_batch_prepared=prepared_batches.append)
+        assert prepared_batches == [0, 1, 2, 3]
+        # batch 1 is prepared while batch 0 is being indexed
+        assert self.events.index(("prepared", 1)) < self.events.index(("indexed", 0))
+        assert self.max_in_flight == 1
+
+    def test_in_flight_bulk_requests_are_bounded(self):
+        for max_pipelined in [1, 2, 4]:
+            self.max_in_flight = 0
+            with mock.patch.object(tensor_search, "_prepare_documents", side_effect=self._fake_prepare_documents()), \
+                    mock.patch.dict(os.environ, {EnvVars.MARQO_MAX_PIPELINED_BULK_REQUESTS: str(max_pipelined)}):
+                tensor_search.add_document_batches(
+                    config=mock.MagicMock(), index_name="my-index", batches=self._batches(10), auto_refresh=False)
+            assert 0 < self.max_in_flight <= max_pipelined
+
+    def test_sequential_when_disabled(self):
+        with mock.patch.object(tensor_search, "_prepare_documents", side_effect=self._fake_prepare_documents()), \
+                mock.patch.dict(os.environ, {EnvVars.MARQO_MAX_PIPELINED_BULK_REQUESTS: "0"}):
+            results = tensor_search.add_document_batches(
+                config=mock.MagicMock(), index_name="my-index", batches=self._batches(3), auto_refresh=False)
+        assert len(results) == 3
+        assert self.events == [("prepared", 0), ("indexed", 0), ("prepared", 1), ("indexed", 1),
+                               ("prepared", 2), ("indexed", 2)]
+
+    def test_failed_batch_stops_ingestion(self):
+        with mock.patch.object(tensor_search, "_prepare_documents",
+                               side_effect=self._fake_prepare_documents(failing_batch=1)), \
+                mock.patch.dict(os.environ, {EnvVars.MARQO_MAX_PIPELINED_BULK_REQUESTS: "1"}):
+            with self.assertRaises(BadRequestError):
+                tensor_search.add_document_batches(
+                    config=mock.MagicMock(), index_name="my-index", batches=self._batches(10), auto_refresh=False)
+        prepared = [batch for event, batch in self.events if event == "prepared"]
+        # the failure is raised before preparing more than one batch past it
+        assert max(prepared) <= 3
+        assert self.in_flight == 0
+
+    def test_batches_error_collects_in_flight_requests(self):
+        def batches():
+            yield from self._batches(2)
+            raise OSError("batch 2 couldn't be read")
+
+        indexed = []
+        with mock.patch.object(tensor_search, "_prepare_documents", side_effect=self._fake_prepare_documents()), \
+                mock.patch.dict(os.environ, {EnvVars.MARQO_MAX_PIPELINED_BULK_REQUESTS: "2"}):
+            with self.assertRaises(OSError):
+                tensor_search.add_document_batches(
+                    config=mock.MagicMock(), index_name="my-index", batches=batches(), auto_refresh=False,
+                    on_batch_indexed=lambda i, result: indexed.append(i))
+        assert indexed == [0, 1]
+        assert self.in_flight == 0
+
+    def test_env_var_validation(self):
+        for bad in ["-1", "some"]:
+            with mock.patch.dict(os.environ, {EnvVars.MARQO_MAX_PIPELINED_BULK_REQUESTS: bad}):
+                with self.assertRaises(ConfigurationError):
+                    tensor_search.add_document_batches(
+                        config=mock.MagicMock(), index_name="my-index", batches=self._batches(1),
+                        auto_refresh=False)
+
+    def test_pipelining_benchmark(self):
+        """Compares sequential and pipelined ingestion. Vectorising a batch and its _bulk request take 30ms each."""
+        def slow_post(path, body):
+            time.sleep(0.03)
+            ids = [json.loads(line)["index"]["_id"] for line in body.splitlines() if b'"_index"' in line]
+            return {"took": 30, "errors": False,
+                    "items": [{"index": {"_id": _id, "status": 201, "result": "created"}} for _id in ids]}
+
+        def slow_vectorise(content, **kwargs):
+            # each doc of a batch is vectorised separately
+            time.sleep(0.003)
+            return np.random.rand(len(content), 384).astype(np.float32)
+
+        index_info = IndexInfo(model_name="hf/all_datasets_v4_MiniLM-L6", properties=dict(),
+                               index_settings=configs.get_default_index_settings())
+        mock_http = mock.MagicMock()
+        mock_http.return_value.post.side_effect = slow_post
+        docs = [{"_id": str(i), "text": f"doc {i}"} for i in range(200)]
+        timings = dict()
+        for max_pipelined in ["0", "1", "2"]:
+            with mock.patch.object(tensor_search, "HttpRequests", mock_http), \
+                    mock.patch.object(tensor_search.bulk, "HttpRequests", mock_http), \
+                    mock.patch.object(tensor_search.backend, "get_index_info", return_value=index_info), \
+                    mock.patch.object(tensor_search.backend, "add_customer_field_properties"), \
+                    mock.patch.object(tensor_search.text_processor, "split_text",
+                                      side_effect=lambda text, **kwargs: [text]), \
+                    mock.patch.object(tensor_search.s2_inference, "vectorise", side_effect=slow_vectorise), \
+                    mock.patch.dict(os.environ, {EnvVars.MARQO_MAX_PIPELINED_BULK_REQUESTS: max_pipelined}):
+                t0 = time.time()
+                results = tensor_search._batch_request(
+                    config=mock.MagicMock(), index_name="my-index", dataset=docs, batch_size=10, verbose=False)
+                timings[max_pipelined] = time.time() - t0
+            assert [item["_id"] for res in results for item in res["items"]] == [str(i) for i in range(200)]
+        print(f"20 batches of 10 docs. sequential: {timings['0']:.2f}s, "
+              f"1 bulk in flight: {timings['1']:.2f}s, 2 bulks in flight: {timings['2']:.2f}s")
+        assert timings["1"] < timings["0"]
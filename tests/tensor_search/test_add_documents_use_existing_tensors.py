@@ -1,5 +1,9 @@
+import os
 import pprint
+import time
 import unittest.mock
+import numpy as np
+import pytest
 import requests
 from tests.marqo_test import MarqoTestCase
 from marqo.tensor_search import add_docs
@@ -7,6 +11,9 @@ from marqo.s2_inference.s2_inference import vectorise
 from marqo.s2_inference.clip_utils import load_image_from_path
 from marqo.tensor_search import tensor_search, index_meta_cache, backend
 from marqo.errors import IndexNotFoundError, InvalidArgError, BadRequestError
+from marqo.tensor_search import configs, serialization
+from marqo.tensor_search.enums import EnvVars, TensorField
+from marqo.tensor_search.models.index_info import IndexInfo
 
 
 class TestAddDocumentsUseExistingTensors(MarqoTestCase):
@@ -292,6 +299,70 @@ class TestAddDocumentsUseExistingTensors(MarqoTestCase):
             return True
         assert run()
 
+    def test_use_existing_tensors_update_mode(self):
+        """In update mode, unchanged fields keep their chunks in Marqo-OS and aren't vectorised again"""
+        tensor_search.add_documents(config=self.config, index_name=self.index_name_1, docs=[
+            {
+                "_id": "123",
+                "title 1": "content 1",
+                "modded field": "original content",
+                "untouched field": "some stuff",
+            }], auto_refresh=True)
+        d1 = tensor_search.get_document_by_id(
+            config=self.config, index_name=self.index_name_1,
+            document_id="123", show_vectors=True)
+
+        def pass_through_vectorise(*arg, **kwargs):
+            return vectorise(*arg, **kwargs)
+
+        mock_vectorise = unittest.mock.MagicMock()
+        mock_vectorise.side_effect = pass_through_vectorise
+
+        @unittest.mock.patch("marqo.s2_inference.s2_inference.vectorise", mock_vectorise)
+        def run():
+            tensor_search.add_documents(config=self.config, index_name=self.index_name_1, docs=[
+                {
+                    "_id": "123",
+                    "title 1": "content 1",  # this one should keep the same vectors
+                    "modded field": "updated content",  # new vectors because the content is modified
+                }], auto_refresh=True, update_mode="update", use_existing_tensors=True)
+            content_to_be_vectorised = [call_kwargs['content'] for call_args, call_kwargs
+                                        in mock_vectorise.call_args_list]
+            assert content_to_be_vectorised == [["updated content"]]
+            return True
+        assert run()
+
+        d2 = tensor_search.get_document_by_id(
+            config=self.config, index_name=self.index_name_1,
+            document_id="123", show_vectors=True)
+        assert d2["modded field"] == "updated content"
+        assert d2["untouched field"] == "some stuff"
+        assert TensorField.field_hashes not in d2
+        facets_1 = {list(facet)[0]: facet for facet in d1["_tensor_facets"]}
+        facets_2 = {list(facet)[0]: facet for facet in d2["_tensor_facets"]}
+        assert set(facets_2) == {"title 1", "modded field", "untouched field"}
+        assert facets_2["title 1"] == facets_1["title 1"]
+        assert facets_2["untouched field"] == facets_1["untouched field"]
+        assert facets_2["modded field"]["modded field"] == "updated content"
+
+    def test_use_existing_tensors_update_mode_field_without_chunks(self):
+        """A field whose chunks were removed by an update is vectorised when its original content is set back"""
+        def add(doc, **kwargs):
+            tensor_search.add_documents(config=self.config, index_name=self.index_name_1, docs=[doc],
+                                        auto_refresh=True, update_mode="update", use_existing_tensors=True, **kwargs)
+
+        def tensor_fields():
+            doc = tensor_search.get_document_by_id(
+                config=self.config, index_name=self.index_name_1, document_id="123", show_vectors=True)
+            return {list(facet)[0] for facet in doc["_tensor_facets"]}
+
+        add({"_id": "123", "title": "content 1", "other": "content 2"})
+        for title_update, non_tensor_fields in [(5, []), ("content 1", ["title"])]:
+            add({"_id": "123", "title": title_update}, non_tensor_fields=non_tensor_fields)
+            assert tensor_fields() == {"other"}
+            add({"_id": "123", "title": "content 1"})
+            assert tensor_fields() == {"title", "other"}
+
     def test_use_existing_tensors_check_meta_data(self):
         """
 
@@ -539,4 +610,294 @@ class TestAddDocumentsUseExistingTensors(MarqoTestCase):
                 config=self.config, index_name=self.index_name_1,
                 document_ids=[doc["_id" ]for doc in doc_arg], show_vectors=True)
 
-            self.assertEqual(d1, d2)
\ No newline at end of file
+            self.assertEqual(d1, d2)
+
+
+class _FakeUpsertBackend:
+    """Stands in for HttpRequests in tensor_search. _mget serves stored_docs (doc id -> _source),
+    applying the requested _source includes. _bulk stores the indexed docs, and applies updates
+    as the update script does to chunks and field hashes."""
+
+    def __init__(self, stored_docs: dict):
+        self.stored_docs = stored_docs
+        self.mget_bodies = []
+        self.bulk_bodies = []
+        self.stored_scripts = dict()
+
+    def __call__(self, config):
+        return self
+
+    def get(self, path, body=None):
+        self.mget_bodies.append(body)
+        docs = []
+        for entry in body["docs"]:
+            if entry["_id"] not in self.stored_docs:
+                docs.append({"_index": entry["_index"], "_id": entry["_id"], "found": False})
+                continue
+            stored = self.stored_docs[entry["_id"]]
+            includes = entry["_source"]["include"]
+            source = {field: value for field, value in stored.items() if field in includes}
+            chunk_includes = {include.split(".", 1)[1] for include in includes
+                              if include.startswith(f"{TensorField.chunks}.")}
+            if chunk_includes:
+                source[TensorField.chunks] = [{key: value for key, value in chunk.items() if key in chunk_includes}
+                                              for chunk in stored[TensorField.chunks]]
+            docs.append({"_index": entry["_index"], "_id": entry["_id"], "found": True, "_source": source})
+        return {"docs": docs}
+
+    def put(self, path, body=None):
+        self.stored_scripts[path] = body
+        return {"acknowledged": True}
+
+    def _update(self, doc_id: str, update: dict):
+        """The update script, for the doc's fields, chunks and field hashes"""
+        if doc_id not in self.stored_docs:
+            self.stored_docs[doc_id] = update["upsert"]
+            return
+        params = update["script"]["params"]
+        stored = self.stored_docs[doc_id]
+        stored_hashes = stored.get(TensorField.field_hashes) or dict()
+        stored.update(params["customer_dict"])
+        stored[TensorField.chunks] = [
+            chunk for chunk in stored[TensorField.chunks]
+            if (chunk[TensorField.field_name] not in params["doc_fields"]
+                and chunk[TensorField.field_name] not in params["non_tensor_fields"])
+            or (chunk[TensorField.field_name] in params["kept_fields"]
+                and stored_hashes.get(chunk[TensorField.field_name]) ==
+                params["field_hashes"].get(chunk[TensorField.field_name]))
+        ] + params["new_chunks"]
+        new_hashes = {field: field_hash for field, field_hash in params["field_hashes"].items()
+                      if field not in params["kept_fields"] or stored_hashes.get(field) == field_hash}
+        stored[TensorField.field_hashes] = {
+            **{field: field_hash for field, field_hash in stored_hashes.items() if field not in params["doc_fields"]},
+            **new_hashes}
+
+    def post(self, path, body=None):
+        self.bulk_bodies.append(body)
+        lines = [serialization.loads(line) for line in body.splitlines() if line]
+        for instructions, source in zip(lines[::2], lines[1::2]):
+            if "index" in instructions:
+                self.stored_docs[instructions["index"]["_id"]] = source
+            else:
+                self._update(instructions["update"]["_id"], source)
+        return {"took": 1, "errors": False,
+                "items": [{action: {"_id": instructions[action]["_id"], "status": 200}}
+                          for instructions in lines[::2] for action in instructions]}
+
+
+class _UpsertMatchingTestCase(unittest.TestCase):
+
+    fields = ["title", "description"]
+    n_dims = 384
+
+    def _index_info(self):
+        return IndexInfo(
+            model_name="hf/all_datasets_v4_MiniLM-L6",
+            properties={field: {"type": "text"} for field in self.fields},
+            index_settings=configs.get_default_index_settings())
+
+    def _docs(self, n_docs):
+        return [{"_id": str(i), **{field: f"{field} of {i}" for field in self.fields}} for i in range(n_docs)]
+
+    def _stored_docs(self, docs):
+        """docs as add_documents stores them, with a single chunk per field"""
+        hash_key = tensor_search._get_field_hash_key(self._index_info())
+        stored_docs = dict()
+        for doc in docs:
+            source = {field: value for field, value in doc.items() if field != "_id"}
+            source[TensorField.chunks] = [{
+                f"{TensorField.vector_prefix}{field}": [0.5] * self.n_dims,
+                TensorField.field_content: value, TensorField.field_name: field
+            } for field, value in source.items()]
+            source[TensorField.field_hashes] = tensor_search._get_field_hashes(doc, hash_key=hash_key)
+            stored_docs[doc["_id"]] = source
+        return stored_docs
+
+    def _add_documents(self, docs, fake_backend, **kwargs):
+        """Returns the add_documents response and the content that was vectorised"""
+        def fake_vectorise(content, **kwargs):
+            return np.ones((len(content), self.n_dims), dtype=np.float32)
+
+        with unittest.mock.patch.object(tensor_search, "HttpRequests", fake_backend), \
+                unittest.mock.patch.object(tensor_search.stored_scripts, "HttpRequests", fake_backend), \
+                unittest.mock.patch.object(tensor_search.bulk, "HttpRequests", fake_backend), \
+                unittest.mock.patch.object(tensor_search.stored_scripts, "_stored_scripts", set()), \
+                unittest.mock.patch.object(tensor_search.backend, "get_index_info", return_value=self._index_info()), \
+                unittest.mock.patch.object(tensor_search.backend, "add_customer_field_properties"), \
+                unittest.mock.patch.object(tensor_search.text_processor, "split_text",
+                                           side_effect=lambda text, **kwargs: [text]), \
+                unittest.mock.patch.object(tensor_search.s2_inference, "vectorise",
+                                           side_effect=fake_vectorise) as mock_vectorise, \
+                unittest.mock.patch.dict(os.environ, {EnvVars.MARQO_MAX_RETRIEVABLE_DOCS: str(len(docs))}):
+            res = tensor_search.add_documents(
+                config=unittest.mock.MagicMock(), index_name="my-index", docs=docs,
+                auto_refresh=False, use_existing_tensors=True, **kwargs)
+        return res, [call_kwargs["content"] for _, call_kwargs in mock_vectorise.call_args_list]
+
+    def _bulk_lines(self, fake_backend):
+        return [serialization.loads(line) for line in fake_backend.bulk_bodies[0].splitlines() if line]
+
+
+
+class TestUpsertMatching(_UpsertMatchingTestCase):
+
+    def test_group_chunks_by_field(self):
+        chunks = [
+            {TensorField.field_name: "a", TensorField.field_content: "1"},
+            {TensorField.field_name: "b", TensorField.field_content: "2"},
+            {TensorField.field_name: "a", TensorField.field_content: "3"},
+        ]
+        grouped = tensor_search._group_chunks_by_field({"_source": {TensorField.chunks: chunks}})
+        assert grouped == {"a": [chunks[0], chunks[2]], "b": [chunks[1]]}
+        # the chunks are reused, not copied
+        assert grouped["a"][0] is chunks[0]
+        # chunkless docs
+        assert tensor_search._group_chunks_by_field({"_source": {TensorField.chunks: []}}) == dict()
+        assert tensor_search._group_chunks_by_field({"_source": {"a": "1"}}) == dict()
+
+    def test_get_field_hashes(self):
+        hash_key = tensor_search._get_field_hash_key(self._index_info())
+        doc = {"_id": "1", "title": "hello", "n": 3, "flag": True, "tags": ["a"],
+               "combo": {"text": "hello", "image": "https://a.com/a.png"}}
+        mappings = {"combo": {"type": "multimodal_combination", "weights": {"text": 0.5, "image": 0.5}}}
+        field_hashes = tensor_search._get_field_hashes(doc, hash_key=hash_key, mappings=mappings)
+        # only the fields that can be vectorised are hashed
+        assert set(field_hashes) == {"title", "combo"}
+        assert field_hashes == tensor_search._get_field_hashes(doc, hash_key=hash_key, mappings=mappings)
+        assert field_hashes["title"] != tensor_search._get_field_hashes(
+            {"title": "hello!"}, hash_key=hash_key)["title"]
+        # a multimodal combination is re-vectorised if its weights change
+        other_mappings = {"combo": {"type": "multimodal_combination", "weights": {"text": 0.9, "image": 0.1}}}
+        assert field_hashes["combo"] != tensor_search._get_field_hashes(
+            doc, hash_key=hash_key, mappings=other_mappings)["combo"]
+        # as is every field, if the chunking settings change
+        index_info = self._index_info()
+        index_info.index_settings["index_defaults"]["text_preprocessing"]["split_length"] = 7
+        assert field_hashes["title"] != tensor_search._get_field_hashes(
+            doc, hash_key=tensor_search._get_field_hash_key(index_info), mappings=mappings)["title"]
+        # invalid docs are validated later on
+        assert tensor_search._get_field_hashes(["not a doc"], hash_key=hash_key) == dict()
+
+    def test_get_documents_for_upsert_single_mget(self):
+        fake_backend = _FakeUpsertBackend(stored_docs=self._stored_docs(self._docs(3)))
+        with unittest.mock.patch.object(tensor_search, "HttpRequests", fake_backend):
+            res = tensor_search._get_documents_for_upsert(
+                config=unittest.mock.MagicMock(), index_name="my-index",
+                document_ids=["2", "1", "2", 1234, "", "not found"], source_includes=[TensorField.field_hashes])
+        assert [doc["_id"] for doc in res["docs"]] == ["2", "1", "not found"]
+        assert [doc["found"] for doc in res["docs"]] == [True, True, False]
+        assert len(fake_backend.mget_bodies) == 1
+        # one entry per unique, valid id
+        assert [entry["_id"] for entry in fake_backend.mget_bodies[0]["docs"]] == ["2", "1", "not found"]
+
+    def test_add_documents_replace_reuses_unchanged_fields(self):
+        docs = self._docs(3)
+        fake_backend = _FakeUpsertBackend(stored_docs=self._stored_docs(docs))
+        docs[1]["title"] = "a new title"
+        docs.append({"_id": "new", "title": "a new doc"})
+        res, vectorised = self._add_documents(docs=docs, fake_backend=fake_backend)
+        assert not res["errors"]
+        assert vectorised == [["a new title"], ["a new doc"]]
+
+        # the hashes are fetched first, then only the vectors of the unchanged fields
+        hashes_body, chunks_body = fake_backend.mget_bodies
+        assert all(entry["_source"]["include"] == [TensorField.field_hashes] for entry in hashes_body["docs"])
+        chunk_includes = {entry["_id"]: entry["_source"]["include"] for entry in chunks_body["docs"]}
+        assert set(chunk_includes) == {"0", "1", "2"}
+        assert f"{TensorField.chunks}.{TensorField.vector_prefix}title" in chunk_includes["0"]
+        assert f"{TensorField.chunks}.{TensorField.vector_prefix}title" not in chunk_includes["1"]
+        assert f"{TensorField.chunks}.{TensorField.vector_prefix}description" in chunk_includes["1"]
+
+        replaced = {line["title"]: line
+                    for line in self._bulk_lines(fake_backend)[1::2]}
+        assert len(replaced["title of 0"][TensorField.chunks]) == 2
+        assert replaced["title of 0"][TensorField.chunks][0][f"{TensorField.vector_prefix}title"] == \
+               [0.5] * self.n_dims
+        assert replaced["a new title"][TensorField.chunks][0][f"{TensorField.vector_prefix}title"] == \
+               [1.0] * self.n_dims
+        # the hashes are stored with the doc
+        assert replaced["title of 0"][TensorField.field_hashes] == fake_backend.stored_docs["0"][TensorField.field_hashes]
+
+    def test_add_documents_update_fetches_only_hashes(self):
+        docs = self._docs(2)
+        fake_backend = _FakeUpsertBackend(stored_docs=self._stored_docs(docs))
+        docs[0]["description"] = "a new description"
+        res, vectorised = self._add_documents(docs=docs, fake_backend=fake_backend, update_mode="update")
+        assert not res["errors"]
+        assert vectorised == [["a new description"]]
+        assert len(fake_backend.mget_bodies) == 1
+        assert all(entry["_source"]["include"] == [TensorField.field_hashes]
+                   for entry in fake_backend.mget_bodies[0]["docs"])
+
+        updates = self._bulk_lines(fake_backend)[1::2]
+        # the update script is stored once, and referenced by id
+        script_id = tensor_search.stored_scripts.UPDATE_DOC_SCRIPT.id
+        assert list(fake_backend.stored_scripts) == [f"_scripts/{script_id}"]
+        assert all(update["script"] == {"id": script_id, "params": update["script"]["params"]} for update in updates)
+        # the index's filterable fields are part of the script, rather than of every update
+        assert all("filterable_fields" not in update["script"]["params"] for update in updates)
+        assert updates[0]["script"]["params"]["kept_fields"] == ["title"]
+        assert len(updates[0]["script"]["params"]["new_chunks"]) == 1
+        assert updates[1]["script"]["params"]["kept_fields"] == ["title", "description"]
+        assert updates[1]["script"]["params"]["new_chunks"] == []
+        assert updates[1]["script"]["params"]["field_hashes"] == fake_backend.stored_docs["1"][TensorField.field_hashes]
+
+
+    def _chunk_fields(self, fake_backend, doc_id):
+        return sorted(chunk[TensorField.field_name] for chunk in fake_backend.stored_docs[doc_id][TensorField.chunks])
+
+    def test_non_tensor_field_becoming_a_tensor_field_is_vectorised(self):
+        for update_mode in ["replace", "update"]:
+            fake_backend = _FakeUpsertBackend(stored_docs=dict())
+            doc = {"_id": "1", "title": "a title", "description": "a description"}
+            self._add_documents(docs=[dict(doc)], fake_backend=fake_backend, update_mode=update_mode,
+                                non_tensor_fields=["title"])
+            # the non tensor field has no chunks, so it has no hash
+            assert self._chunk_fields(fake_backend, "1") == ["description"]
+            assert set(fake_backend.stored_docs["1"][TensorField.field_hashes]) == {"description"}
+
+            _, vectorised = self._add_documents(docs=[dict(doc)], fake_backend=fake_backend, update_mode=update_mode)
+            assert vectorised == [["a title"]]
+            assert self._chunk_fields(fake_backend, "1") == ["description", "title"]
+
+    def test_field_that_loses_its_chunks_loses_its_hash(self):
+        fake_backend = _FakeUpsertBackend(stored_docs=dict())
+        doc = {"_id": "1", "title": "a title", "description": "a description"}
+        self._add_documents(docs=[dict(doc)], fake_backend=fake_backend, update_mode="update")
+        assert set(fake_backend.stored_docs["1"][TensorField.field_hashes]) == {"title", "description"}
+
+        for title_update in [{"title": 5}, {"title": "a title", "non_tensor_fields": ["title"]}]:
+            non_tensor_fields = title_update.pop("non_tensor_fields", [])
+            self._add_documents(docs=[{"_id": "1", **title_update}], fake_backend=fake_backend,
+                                update_mode="update", non_tensor_fields=non_tensor_fields)
+            assert self._chunk_fields(fake_backend, "1") == ["description"]
+            assert set(fake_backend.stored_docs["1"][TensorField.field_hashes]) == {"description"}
+
+            # setting the original title back vectorises it again
+            _, vectorised = self._add_documents(docs=[{"_id": "1", "title": "a title"}], fake_backend=fake_backend,
+                                                update_mode="update")
+            assert vectorised == [["a title"]]
+            assert self._chunk_fields(fake_backend, "1") == ["description", "title"]
+
+
+@pytest.mark.largemodel
+class TestUpsertMatchingBenchmark(_UpsertMatchingTestCase):
+    """Times add_documents(use_existing_tensors=True) against a mocked Marqo-OS, for
+    batches where every doc already exists unchanged. Run with `pytest --largemodel -s`."""
+
+    def test_upsert_scaling(self):
+        print()
+        for update_mode in ["replace", "update"]:
+            timings = dict()
+            for n_docs in [100, 1000, 10000, 50000]:
+                docs = self._docs(n_docs)
+                fake_backend = _FakeUpsertBackend(stored_docs=self._stored_docs(docs))
+                t0 = time.perf_counter()
+                _, vectorised = self._add_documents(docs=docs, fake_backend=fake_backend, update_mode=update_mode)
+                timings[n_docs] = time.perf_counter() - t0
+                assert vectorised == []
+                print(f"    {update_mode}, {n_docs} docs: {timings[n_docs] * 1000:.1f}ms, "
+                      f"{timings[n_docs] / n_docs * 1e6:.1f}us per doc, "
+                      f"_bulk body {len(fake_backend.bulk_bodies[0]) / n_docs:.0f} bytes per doc")
+            # the matching is linear: the time per doc shouldn't grow with the batch size
+            assert timings[50000] / 50000 < 5 * timings[1000] / 1000
@@ -1,9 +1,13 @@
 import copy
 import json
 import pprint
+import threading
+import time
+import unittest
 
 import requests
-from marqo.tensor_search import enums, backend, utils
+from marqo.tensor_search import enums, backend, utils, configs, index_meta_cache
+from marqo.tensor_search.models.index_info import IndexInfo
 from marqo.tensor_search import tensor_search
 from marqo.tensor_search.configs import get_default_ann_parameters
 from marqo.errors import MarqoApiError, IndexNotFoundError
@@ -71,6 +75,27 @@ class TestBackend(MarqoTestCase):
         assert "lucene" == sent_dict["properties"][enums.TensorField.chunks
             ]["properties"][utils.generate_vector_name(field_name="f1")]["method"]["engine"]
     
+    def test_add_customer_field_properties_filterable_fields(self):
+        mock_config = copy.deepcopy(self.config)
+        mock__put = mock.MagicMock()
+
+        tensor_search.create_vector_index(
+            config=mock_config, index_name=self.index_name_1,
+            index_settings={"index_defaults": {"filterable_fields": ["f1"]}})
+        @mock.patch("marqo._httprequests.HttpRequests.put", mock__put)
+        def run():
+            tensor_search.add_documents(config=mock_config, docs=[{"f1": "doc"}, {"f2": "C"}],
+                                        index_name=self.index_name_1, auto_refresh=True)
+            return True
+        assert run()
+        args, kwargs0 = mock__put.call_args_list[0]
+        chunk_properties = json.loads(kwargs0["body"])["properties"][enums.TensorField.chunks]["properties"]
+        # both fields get a vector, but only the filterable field is copied into the chunks
+        assert utils.generate_vector_name(field_name="f1") in chunk_properties
+        assert utils.generate_vector_name(field_name="f2") in chunk_properties
+        assert chunk_properties["f1"]["type"] == "keyword"
+        assert "f2" not in chunk_properties
+
     def test_add_customer_field_properties_default_ann_parameters(self):
         mock_config = copy.deepcopy(self.config)
         mock__put = mock.MagicMock()
@@ -118,4 +143,89 @@ class TestBackend(MarqoTestCase):
         assert sent_dict["properties"][enums.TensorField.chunks]["properties"][utils.generate_vector_name(field_name="f1")]["method"]["parameters"] == {
                             enums.IndexSettingsField.hnsw_ef_construction: 1,
                             enums.IndexSettingsField.hnsw_m: 2
-                        }
\ No newline at end of file
+                        }
+
+
+class TestAddCustomerFieldPropertiesDeltas(unittest.TestCase):
+
+    index_name = "my-test-index-1"
+    model_properties = {"dimensions": 384}
+
+    def setUp(self) -> None:
+        index_meta_cache.get_cache()[self.index_name] = IndexInfo(
+            model_name="hf/all_datasets_v4_MiniLM-L6",
+            properties={
+                enums.TensorField.chunks: {"type": "nested", "properties": {
+                    enums.TensorField.field_name: {"type": "keyword"},
+                    enums.TensorField.field_content: {"type": "text"}}},
+                enums.TensorField.field_hashes: {"type": "object", "enabled": False}
+            },
+            index_settings=configs.get_default_index_settings())
+        self.mock_http = mock.MagicMock()
+        self.mock_put = self.mock_http.return_value.put
+
+    def tearDown(self) -> None:
+        del index_meta_cache.get_cache()[self.index_name]
+
+    def _add(self, customer_field_names, multimodal_combination_fields=None):
+        with mock.patch.object(backend, "HttpRequests", self.mock_http):
+            return backend.add_customer_field_properties(
+                config=mock.MagicMock(), index_name=self.index_name,
+                customer_field_names=customer_field_names, model_properties=self.model_properties,
+                multimodal_combination_fields=multimodal_combination_fields or dict())
+
+    def _sent_chunk_properties(self, call_index=-1):
+        _, kwargs = self.mock_put.call_args_list[call_index]
+        return json.loads(kwargs["body"])["properties"][enums.TensorField.chunks]["properties"]
+
+    def test_only_deltas_are_sent(self):
+        self._add({("f1", enums.OpenSearchDataType.text)})
+        assert set(self._sent_chunk_properties()) == {"f1", utils.generate_vector_name("f1")}
+
+        # nothing new: no request
+        assert self._add({("f1", enums.OpenSearchDataType.text)}) is None
+        assert self._add(set()) is None
+        assert self.mock_put.call_count == 1
+
+        self._add({("f1", enums.OpenSearchDataType.text), ("f2", enums.OpenSearchDataType.text)})
+        assert self.mock_put.call_count == 2
+        assert set(self._sent_chunk_properties()) == {"f2", utils.generate_vector_name("f2")}
+
+        # the cache has every field
+        chunk_properties = index_meta_cache.get_cache()[self.index_name].properties[
+            enums.TensorField.chunks]["properties"]
+        assert {"f1", "f2", utils.generate_vector_name("f1"), utils.generate_vector_name("f2"),
+                enums.TensorField.field_name, enums.TensorField.field_content} == set(chunk_properties)
+
+    def test_multimodal_deltas(self):
+        self._add(set(), {"combo": {("text", enums.OpenSearchDataType.text)}})
+        assert set(self._sent_chunk_properties()["combo"]["properties"]) == {"text"}
+        assert self._add(set(), {"combo": {("text", enums.OpenSearchDataType.text)}}) is None
+        self._add(set(), {"combo": {("text", enums.OpenSearchDataType.text),
+                                    ("image", enums.OpenSearchDataType.text)}})
+        assert self._sent_chunk_properties() == {"combo": {"properties": {
+            "image": {"type": "keyword", "ignore_above": 32766}}}}
+        assert set(index_meta_cache.get_cache()[self.index_name].properties[
+            enums.TensorField.chunks]["properties"]["combo"]["properties"]) == {"text", "image"}
+
+    def test_field_hashes_mapped_for_old_indexes(self):
+        del index_meta_cache.get_cache()[self.index_name].properties[enums.TensorField.field_hashes]
+        self._add(set())
+        _, kwargs = self.mock_put.call_args
+        assert json.loads(kwargs["body"]) == {"properties": {
+            enums.TensorField.field_hashes: {"type": "object", "enabled": False}}}
+        assert self._add(set()) is None
+
+    def test_concurrent_batches_are_coalesced(self):
+        def slow_put(*args, **kwargs):
+            time.sleep(0.05)
+            return {"acknowledged": True}
+        self.mock_put.side_effect = slow_put
+
+        threads = [threading.Thread(target=self._add, args=({("f1", enums.OpenSearchDataType.text)},))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert self.mock_put.call_count == 1
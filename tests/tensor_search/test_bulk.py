@@ -0,0 +1,207 @@
+import os
+import threading
+import time
+import unittest
+from unittest import mock
+
+from marqo import errors
+from marqo.config import Config
+from marqo.tensor_search import bulk, serialization
+from marqo.tensor_search.enums import EnvVars
+
+
+class TestBulk(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.config = Config(url="http://localhost:9200")
+        self.bodies = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+        def fake_post(_self, path, body=None, *args, **kwargs):
+            with self.lock:
+                self.bodies.append(body)
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            time.sleep(0.02)
+            lines = [serialization.loads(line) for line in body.splitlines() if line]
+            with self.lock:
+                self.in_flight -= 1
+            return {"took": 2, "errors": False,
+                    "items": [{"delete": {"_id": line["delete"]["_id"], "result": "deleted", "status": 200}}
+                              for line in lines]}
+
+        self.patch = mock.patch("marqo._httprequests.HttpRequests.post", fake_post)
+        self.patch.start()
+
+    def tearDown(self) -> None:
+        self.patch.stop()
+
+    def _actions(self, n: int):
+        return [[{"delete": {"_index": "my-index", "_id": str(i)}}] for i in range(n)]
+
+    def test_split_bulk_actions(self):
+        actions = [b"a" * 10, b"b" * 10, b"c" * 25, b"d" * 5, b"e" * 5, b"f" * 5]
+        assert bulk.split_bulk_actions(actions, max_bytes=20, max_actions=10) == [
+            [b"a" * 10, b"b" * 10], [b"c" * 25], [b"d" * 5, b"e" * 5, b"f" * 5]]
+        assert bulk.split_bulk_actions(actions, max_bytes=1000, max_actions=4) == [actions[:4], actions[4:]]
+        assert bulk.split_bulk_actions([], max_bytes=10, max_actions=10) == []
+
+    def test_send_bulk_single_request(self):
+        response = bulk.send_bulk(config=self.config, actions=self._actions(5))
+        assert len(self.bodies) == 1
+        assert [item["delete"]["_id"] for item in response["items"]] == ["0", "1", "2", "3", "4"]
+        assert bulk.send_bulk(config=self.config, actions=[]) is None
+
+    def test_send_bulk_merges_sub_requests_in_order(self):
+        progress = []
+        with mock.patch.dict(os.environ, {EnvVars.MARQO_MAX_BULK_REQUEST_ACTIONS: "7",
+                                          EnvVars.MARQO_MAX_CONCURRENT_BULK_REQUESTS: "3"}):
+            response = bulk.send_bulk(config=self.config, actions=self._actions(50),
+                                      on_sub_response=lambda n, res: progress.append(n))
+        assert len(self.bodies) == 8
+        assert 1 < self.max_in_flight <= 3
+        assert sorted(progress) == [1] + [7] * 7
+        assert [item["delete"]["_id"] for item in response["items"]] == [str(i) for i in range(50)]
+        assert response["took"] == 16
+        assert response["errors"] is False
+
+    def test_send_bulk_splits_by_bytes(self):
+        one_action_bytes = len(b"".join(
+            [b"\n" + serialization.dumps(d) for d in self._actions(1)[0]]) + b"\n")
+        with mock.patch.dict(os.environ, {EnvVars.MARQO_MAX_BULK_REQUEST_BYTES: str(one_action_bytes * 2)}):
+            bulk.send_bulk(config=self.config, actions=self._actions(6))
+        assert len(self.bodies) == 3
+        assert all(len(body) <= one_action_bytes * 2 for body in self.bodies)
+
+    def test_send_bulk_raises_sub_request_errors(self):
+        def failing_post(_self, path, body=None, *args, **kwargs):
+            raise errors.BackendCommunicationError("Marqo-OS is down")
+
+        with mock.patch("marqo._httprequests.HttpRequests.post", failing_post), \
+                mock.patch.dict(os.environ, {EnvVars.MARQO_MAX_BULK_REQUEST_ACTIONS: "2"}):
+            with self.assertRaises(errors.BackendCommunicationError):
+                bulk.send_bulk(config=self.config, actions=self._actions(6))
+
+    def test_env_var_validation(self):
+        for env_var in [EnvVars.MARQO_MAX_BULK_REQUEST_BYTES, EnvVars.MARQO_MAX_BULK_REQUEST_ACTIONS,
+                        EnvVars.MARQO_MAX_CONCURRENT_BULK_REQUESTS]:
+            for bad in ["0", "-5", "many"]:
+                with mock.patch.dict(os.environ, {env_var: bad}):
+                    with self.assertRaises(errors.ConfigurationError):
+                        bulk.send_bulk(config=self.config, actions=self._actions(1))
+
+
+class TestBulkBackoff(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.config = Config(url="http://localhost:9200")
+        self.sent_ids = []
+        self.patches = [mock.patch.object(bulk, "INITIAL_BACKOFF_SECONDS", 0.001)]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self) -> None:
+        for patch in self.patches:
+            patch.stop()
+
+    def _actions(self, n: int):
+        return [[{"index": {"_index": "my-index", "_id": str(i)}}, {"title": f"doc {i}"}] for i in range(n)]
+
+    def _post_rejecting(self, rejected_ids_per_call: list):
+        """Returns a fake post that rejects the given ids on successive calls.
+        A None entry rejects the whole request with a 429."""
+        calls = iter(rejected_ids_per_call)
+
+        def fake_post(_self, path, body=None, *args, **kwargs):
+            ids = [line["index"]["_id"] for line in
+                   [serialization.loads(line) for line in body.splitlines() if line] if "index" in line]
+            self.sent_ids.append(ids)
+            rejected = next(calls, set())
+            if rejected is None:
+                raise errors.TooManyRequestsError("Marqo-OS received too many requests!")
+            items = []
+            for _id in ids:
+                if _id in rejected:
+                    items.append({"index": {"_id": _id, "status": 429, "error": {
+                        "type": "es_rejected_execution_exception", "reason": "rejected execution"}}})
+                else:
+                    items.append({"index": {"_id": _id, "status": 201, "result": "created"}})
+            return {"took": 3, "errors": bool(rejected), "items": items}
+        return fake_post
+
+    def test_rejected_actions_are_retried(self):
+        with mock.patch("marqo._httprequests.HttpRequests.post", self._post_rejecting([{"1", "3"}, {"3"}])):
+            response = bulk.send_bulk(config=self.config, actions=self._actions(5))
+        # only the rejected actions are sent again
+        assert self.sent_ids == [["0", "1", "2", "3", "4"], ["1", "3"], ["3"]]
+        assert [item["index"]["_id"] for item in response["items"]] == ["0", "1", "2", "3", "4"]
+        assert all(item["index"]["status"] == 201 for item in response["items"])
+        assert response["errors"] is False
+        assert response["took"] == 9
+
+    def test_rejected_requests_are_retried(self):
+        with mock.patch("marqo._httprequests.HttpRequests.post", self._post_rejecting([None, None])):
+            response = bulk.send_bulk(config=self.config, actions=self._actions(3))
+        assert len(self.sent_ids) == 3
+        assert [item["index"]["_id"] for item in response["items"]] == ["0", "1", "2"]
+
+    def test_rejections_after_max_retries(self):
+        n_attempts = bulk.MAX_REJECTED_RETRIES + 1
+        with mock.patch("marqo._httprequests.HttpRequests.post", self._post_rejecting([None] * n_attempts)):
+            with self.assertRaises(errors.TooManyRequestsError):
+                bulk.send_bulk(config=self.config, actions=self._actions(3))
+        assert len(self.sent_ids) == n_attempts
+
+        # actions that are still rejected keep their rejected item
+        self.sent_ids = []
+        with mock.patch("marqo._httprequests.HttpRequests.post", self._post_rejecting([{"1"}] * n_attempts)):
+            response = bulk.send_bulk(config=self.config, actions=self._actions(3))
+        assert len(self.sent_ids) == n_attempts
+        assert response["errors"] is True
+        assert response["items"][1]["index"]["error"]["type"] == "es_rejected_execution_exception"
+        assert response["items"][0]["index"]["status"] == 201
+
+    def test_adaptive_concurrency(self):
+        concurrency = bulk._AdaptiveConcurrency(max_concurrent=8)
+        for _ in range(3):
+            concurrency.acquire()
+        concurrency.release(rejected=True)
+        assert concurrency.limit == 4
+        concurrency.release(rejected=True)
+        concurrency.release(rejected=True)
+        assert concurrency.limit == 1
+        for _ in range(20):
+            concurrency.acquire()
+            concurrency.release(rejected=False)
+        assert concurrency.limit == 8
+        assert concurrency.in_flight == 0
+
+    def test_concurrency_drops_after_rejections(self):
+        in_flight, max_in_flight_after_rejection = [0], [0]
+        rejected_once = threading.Event()
+        lock = threading.Lock()
+
+        def fake_post(_self, path, body=None, *args, **kwargs):
+            with lock:
+                in_flight[0] += 1
+                if rejected_once.is_set():
+                    max_in_flight_after_rejection[0] = max(max_in_flight_after_rejection[0], in_flight[0])
+            time.sleep(0.01)
+            with lock:
+                in_flight[0] -= 1
+                if not rejected_once.is_set():
+                    rejected_once.set()
+                    raise errors.TooManyRequestsError("Marqo-OS received too many requests!")
+            lines = [serialization.loads(line) for line in body.splitlines() if line]
+            return {"took": 1, "errors": False,
+                    "items": [{"index": {"_id": line["index"]["_id"], "status": 201}}
+                              for line in lines if "index" in line]}
+
+        with mock.patch("marqo._httprequests.HttpRequests.post", fake_post), \
+                mock.patch.dict(os.environ, {EnvVars.MARQO_MAX_BULK_REQUEST_ACTIONS: "1",
+                                             EnvVars.MARQO_MAX_CONCURRENT_BULK_REQUESTS: "8"}):
+            response = bulk.send_bulk(config=self.config, actions=self._actions(40))
+        assert [item["index"]["_id"] for item in response["items"]] == [str(i) for i in range(40)]
+        assert max_in_flight_after_rejection[0] <= 8
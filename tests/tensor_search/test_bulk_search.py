@@ -1,7 +1,11 @@
 import copy
+import json
 import math
+import os
 import requests
 import random
+import threading
+import time
 from unittest import mock
 from marqo.s2_inference.s2_inference import vectorise
 import unittest
@@ -11,12 +15,15 @@ from marqo.errors import (
 )
 from marqo.tensor_search import api
 from marqo.tensor_search.models.api_models import BulkSearchQuery, BulkSearchQueryEntity
-from marqo.tensor_search import tensor_search, constants, index_meta_cache, utils
+from marqo.tensor_search import tensor_search, constants, index_meta_cache, utils, inference_executor
+from marqo.tensor_search.models.search import VectorisedJobs
+from marqo.s2_inference.errors import VectoriseError
 from fastapi.exceptions import RequestValidationError
 import numpy as np
 from tests.marqo_test import MarqoTestCase
 from typing import List
 import pydantic
+import pytest
 
 
 def pass_through_vectorise(*arg, **kwargs):
@@ -224,16 +231,18 @@ class TestBulkSearch(MarqoTestCase):
                 }
             ], auto_refresh=True
         )
-        try:
-            tensor_search.bulk_search(
-                query=BulkSearchQuery(queries=[
-                    BulkSearchQueryEntity(index=self.index_name_1, q="moon outfits", searchableAttributes=["Description"], boost={"Title": [5, 1]}),
-                ]),
-                marqo_config=self.config,
-            )
-            raise AssertionError("Boost attributes are not in searchable attributes")
-        except InvalidArgError:
-            pass
+        res = tensor_search.bulk_search(
+            query=BulkSearchQuery(queries=[
+                BulkSearchQueryEntity(index=self.index_name_1, q="moon outfits", searchableAttributes=["Description"], boost={"Title": [5, 1]}),
+                BulkSearchQueryEntity(index=self.index_name_1, q="moon outfits", searchableAttributes=["Description"]),
+            ]),
+            marqo_config=self.config,
+        )
+        # Boost attributes are not in searchable attributes. Only that query fails.
+        assert res["result"][0]["error"]["code"] == InvalidArgError.code
+        assert res["result"][0]["hits"] == []
+        assert "error" not in res["result"][1]
+        assert len(res["result"][1]["hits"]) > 0
 
     def test_bulk_search_multiple_indexes(self):
         tensor_search.add_documents(
@@ -310,7 +319,8 @@ class TestBulkSearch(MarqoTestCase):
                 content=['one thing'],
                 device='cpu',
                 normalize_embeddings=False,
-                image_download_headers=None
+                image_download_headers=None,
+                as_numpy=True
             )
 
             print("ock_vectorise.call_args_listock_vectorise.call_args_list",  mock_vectorise.call_args_list)
@@ -321,7 +331,8 @@ class TestBulkSearch(MarqoTestCase):
                 content=['two things'],
                 device='cpu',
                 normalize_embeddings=True,
-                image_download_headers=None
+                image_download_headers=None,
+                as_numpy=True
             )
 
             self.assertEqual(mock_vectorise.call_count, 2)
@@ -350,7 +361,8 @@ class TestBulkSearch(MarqoTestCase):
                 content=['one thing', 'two things'],
                 device='cpu',
                 normalize_embeddings=True,
-                image_download_headers=None
+                image_download_headers=None,
+                as_numpy=True
             )
             self.assertEqual(mock_vectorise.call_count, 1)
             return True
@@ -439,16 +451,15 @@ class TestBulkSearch(MarqoTestCase):
                 {"abc": "random text", "other field": "Close match hehehe", "_id": "id1-second"},
             ], auto_refresh=True)
 
-        try:
-            tensor_search.bulk_search(
-                query=BulkSearchQuery(queries=[
-                    BulkSearchQueryEntity(index=self.index_name_1, q="match", reRanker='_testing'),
-                ]),
-                marqo_config=self.config,
-            )
-            raise AssertionError("Cannot use reranker with no searchableAttributes")
-        except InvalidArgError:
-            pass
+        res = tensor_search.bulk_search(
+            query=BulkSearchQuery(queries=[
+                BulkSearchQueryEntity(index=self.index_name_1, q="match", reRanker='_testing'),
+            ]),
+            marqo_config=self.config,
+        )
+        # Cannot use reranker with no searchableAttributes
+        assert res["result"][0]["error"]["code"] == InvalidArgError.code
+        assert res["result"][0]["query"] == "match"
 
 
     def test_each_doc_returned_once(self):
@@ -1201,73 +1212,26 @@ class TestBulkSearch(MarqoTestCase):
     
         assert run()
 
-    def test_pagination_multi_field_error(self):
-        # Try pagination with 0, 2, and 3 fields
-        # To be removed when multi-field pagination is added.
-        docs = [
-            {
-                "field_a": 0,
-                "field_b": 0,
-                "field_c": 0
-            },
-            {
-                "field_a": 1,
-                "field_b": 1,
-                "field_c": 1
-            }
-        ]
-    
+    def test_pagination_multi_field(self):
+        docs = [{"_id": str(i), "field_a": f"a {i}", "field_b": f"b {10 - i}", "field_c": f"c {i % 3}"}
+                for i in range(10)]
         tensor_search.add_documents(
             config=self.config, index_name=self.index_name_1,
             docs=docs, auto_refresh=False
         )
-    
         tensor_search.refresh_index(config=self.config, index_name=self.index_name_1)
-    
+
         for search_method in (SearchMethod.LEXICAL, SearchMethod.TENSOR):
-            try:
-                tensor_search.bulk_search(
-                    marqo_config=self.config, query=BulkSearchQuery(
-                    queries=[BulkSearchQueryEntity(
-                        index=self.index_name_1,
-                        q=" ",
-                        searchMethod=search_method,
-                        searchableAttributes=["field_a", "field_b"],
-                        offset=1
-                    )]
-                ))
-                raise AssertionError
-            except InvalidArgError:
-                pass
-    
-            try:
-                tensor_search.bulk_search(
-                    marqo_config=self.config, query=BulkSearchQuery(
-                    queries=[BulkSearchQueryEntity(
-                        index=self.index_name_1,
-                        q=" ",
-                        searchMethod=search_method,
-                        offset=1
-                    )]
-                ))
-                raise AssertionError
-            except InvalidArgError:
-                pass
-    
-            try:
-                tensor_search.bulk_search(
-                    marqo_config=self.config, query=BulkSearchQuery(
-                    queries=[BulkSearchQueryEntity(
-                        index=self.index_name_1,
-                        q=" ",
-                        searchMethod=search_method,
-                        searchableAttributes=[],
-                        offset=1
-                    )]
-                ))
-                raise AssertionError
-            except InvalidArgError:
-                pass
+            for searchable_attributes in (["field_a", "field_b"], None):
+                full = tensor_search.bulk_search(marqo_config=self.config, query=BulkSearchQuery(queries=[
+                    BulkSearchQueryEntity(index=self.index_name_1, q="a 3", searchMethod=search_method,
+                                          searchableAttributes=searchable_attributes, limit=10)]))
+                pages = tensor_search.bulk_search(marqo_config=self.config, query=BulkSearchQuery(queries=[
+                    BulkSearchQueryEntity(index=self.index_name_1, q="a 3", searchMethod=search_method,
+                                          searchableAttributes=searchable_attributes, limit=3, offset=offset)
+                    for offset in range(0, 10, 3)]))
+                paginated_ids = [hit["_id"] for page in pages["result"] for hit in page["hits"]]
+                assert paginated_ids == [hit["_id"] for hit in full["result"][0]["hits"]]
 
     def test_image_search_highlights(self):
         """does the URL get returned as the highlight? (it should - because no rerankers are being used)"""
@@ -1714,3 +1678,251 @@ class TestBulkSearch(MarqoTestCase):
             manually_combined = list(manually_combined)
 
             assert np.allclose(combined_queries[i], manually_combined, atol=1e-6)
+
+
+class TestBulkSearchSingleMsearch(unittest.TestCase):
+    """Bulk search against a mocked Marqo-OS and model, checking that queries of every search method
+    share one `_msearch` request, that vector jobs run concurrently, and that queries fail independently"""
+
+    index_name = "my-index"
+    other_index_name = "my-other-index"
+
+    def setUp(self) -> None:
+        from marqo.tensor_search import configs
+        from marqo.tensor_search.models.index_info import IndexInfo
+        # the indexes have different models, so their queries are vectorised in separate jobs
+        self.index_infos = {index_name: IndexInfo(
+            model_name=model_name,
+            properties={
+                "title": {"type": "text"}, "desc": {"type": "text"},
+                TensorField.chunks: {"type": "nested", "properties": {
+                    f"{TensorField.vector_prefix}title": {"type": "knn_vector"},
+                    f"{TensorField.vector_prefix}desc": {"type": "knn_vector"},
+                }}
+            },
+            index_settings=configs.get_default_index_settings())
+            for index_name, model_name in [(self.index_name, "hf/all_datasets_v4_MiniLM-L6"),
+                                           (self.other_index_name, "hf/all_datasets_v4_MiniLM-L12")]}
+        self.get_paths = []
+        self.msearch_bodies = []
+        self.vectorised = []
+        self.vectorise_seconds = 0
+        self.lock = threading.Lock()
+        self.in_flight, self.max_in_flight = 0, 0
+
+        mock_http = mock.MagicMock()
+        mock_http.return_value.get.side_effect = self._fake_get
+        get_index_info = lambda config, index_name: self.index_infos[index_name]
+        self.patches = [
+            mock.patch.object(tensor_search, "HttpRequests", mock_http),
+            mock.patch.object(tensor_search, "get_index_info", side_effect=get_index_info),
+            mock.patch.object(index_meta_cache, "get_index_info", side_effect=get_index_info),
+            mock.patch.object(index_meta_cache, "get_cache", return_value=self.index_infos),
+            mock.patch.object(index_meta_cache, "refresh_index_info_on_interval"),
+            mock.patch.object(tensor_search.s2_inference, "vectorise", side_effect=self._fake_vectorise),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self) -> None:
+        for patch in self.patches:
+            patch.stop()
+
+    def _fake_vectorise(self, content, model_name, **kwargs):
+        with self.lock:
+            self.vectorised.append((model_name, list(content)))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.vectorise_seconds)
+        with self.lock:
+            self.in_flight -= 1
+        if any(c.startswith("unprocessable") for c in content):
+            raise VectoriseError("could not vectorise")
+        return np.ones((len(content), 384), dtype=np.float32)
+
+    def _fake_get(self, path, body=None):
+        self.get_paths.append(path)
+        searches = [json.loads(line) for line in body.splitlines() if line][1::2]
+        self.msearch_bodies.append(searches)
+        responses = []
+        for search in searches:
+            if "bad" in json.dumps(search.get("query", {}).get("bool", {}).get("filter", "")) or \
+                    "bad" in json.dumps(search["query"].get("nested", {})):
+                responses.append({"status": 400, "error": {"root_cause": [{"reason": "parse_exception: bad"}]}})
+            elif "nested" in search["query"]:
+                responses.append({"took": 1, "hits": {"hits": [{
+                    "_id": "tensor-doc", "_score": 0.9, "_source": {"title": "a title"},
+                    "inner_hits": {TensorField.chunks: {"hits": {"hits": [{"_score": 0.9, "_source": {
+                        TensorField.field_name: "title", TensorField.field_content: "a title"}}]}}}}]}})
+            else:
+                responses.append({"took": 1, "hits": {"hits": [
+                    {"_id": "lexical-doc", "_score": 3.0, "_source": {"title": "a title"}}]}})
+        return {"took": 2, "responses": responses}
+
+    def _bulk_search(self, queries: List[dict]) -> dict:
+        return tensor_search.bulk_search(
+            query=BulkSearchQuery(queries=[{"index": self.index_name, **q} for q in queries]),
+            marqo_config=mock.MagicMock(), device="cpu")
+
+    def test_lexical_queries_share_the_msearch(self):
+        res = self._bulk_search([
+            {"q": "first", "searchMethod": "LEXICAL", "searchableAttributes": ["title"]},
+            {"q": "second", "searchMethod": "TENSOR"},
+            {"q": "third", "searchMethod": "LEXICAL", "limit": 5, "showHighlights": False},
+        ])
+        assert self.get_paths == ["_msearch"]
+        searches = self.msearch_bodies[0]
+        assert [("nested" in search["query"]) for search in searches] == [False, True, True, False]
+        assert searches[0]["query"]["bool"]["should"] == [{"match": {"title": "first"}}]
+        assert searches[3]["size"] == 5
+
+        assert [[hit["_id"] for hit in r["hits"]] for r in res["result"]] == \
+               [["lexical-doc"], ["tensor-doc"], ["lexical-doc"]]
+        assert res["result"][0]["hits"][0]["_highlights"] == []
+        assert "_highlights" not in res["result"][2]["hits"][0]
+        assert [r["query"] for r in res["result"]] == ["first", "second", "third"]
+
+    def test_failed_searches_only_fail_their_query(self):
+        res = self._bulk_search([
+            {"q": "first", "searchMethod": "LEXICAL", "filter": "title:(bad"},
+            {"q": "second", "searchMethod": "TENSOR"},
+            {"q": "third", "searchMethod": "TENSOR", "filter": "title:(bad"},
+            {"q": "fourth", "searchMethod": "LEXICAL"},
+        ])
+        assert len(self.msearch_bodies) == 1
+        for failed in (res["result"][0], res["result"][2]):
+            assert failed["hits"] == []
+            assert failed["status"] == 400
+            assert failed["error"]["code"] == InvalidArgError.code
+        assert res["result"][2]["query"] == "third"
+        assert [hit["_id"] for hit in res["result"][1]["hits"]] == ["tensor-doc"]
+        assert [hit["_id"] for hit in res["result"][3]["hits"]] == ["lexical-doc"]
+
+    def test_queries_that_cant_be_sent_only_fail_themselves(self):
+        create_lexical_search_body = tensor_search._create_lexical_search_body
+
+        def failing_lexical_search_body(text, **kwargs):
+            if text == "first":
+                raise InvalidArgError("can't search `first`")
+            return create_lexical_search_body(text=text, **kwargs)
+
+        with mock.patch.object(tensor_search, "_create_lexical_search_body", side_effect=failing_lexical_search_body):
+            res = self._bulk_search([
+                {"q": "first", "searchMethod": "LEXICAL"},
+                {"q": "second", "searchMethod": "LEXICAL"},
+            ])
+        assert len(self.msearch_bodies[0]) == 1
+        assert res["result"][0]["error"]["code"] == InvalidArgError.code
+        assert [hit["_id"] for hit in res["result"][1]["hits"]] == ["lexical-doc"]
+
+    def test_bulk_msearch_raise_on_error(self):
+        error_response = {"responses": [
+            {"took": 1, "hits": {"hits": []}},
+            {"error": {"root_cause": [{"reason": "Result window is too large, index.max_result_window"}]}}]}
+        with mock.patch.object(tensor_search, "HttpRequests") as mock_http:
+            mock_http.return_value.get.return_value = error_response
+            with self.assertRaises(IllegalRequestedDocCount):
+                tensor_search.bulk_msearch(mock.MagicMock(), [])
+            responses = tensor_search.bulk_msearch(mock.MagicMock(), [], raise_on_error=False)
+        assert responses[0] == []
+        assert isinstance(responses[1], IllegalRequestedDocCount)
+
+    def test_jobs_of_different_models_are_vectorised_concurrently(self):
+        self.vectorise_seconds = 0.05
+        with mock.patch.dict(os.environ, {EnvVars.MARQO_MAX_CONCURRENT_CPU_INFERENCE: "2"}), \
+                mock.patch.dict(inference_executor._device_slots, clear=True):
+            res = self._bulk_search([
+                {"q": "first"},
+                {"q": "second", "index": self.other_index_name},
+                {"q": "third"},
+            ])
+        assert sorted(self.vectorised) == [
+            ("hf/all_datasets_v4_MiniLM-L12", ["second"]), ("hf/all_datasets_v4_MiniLM-L6", ["first", "third"])]
+        assert self.max_in_flight == 2
+        assert all(len(r["hits"]) == 1 for r in res["result"])
+
+    def test_device_concurrency_limit(self):
+        self.vectorise_seconds = 0.02
+        with mock.patch.dict(os.environ, {EnvVars.MARQO_MAX_CONCURRENT_CPU_INFERENCE: "1"}), \
+                mock.patch.dict(inference_executor._device_slots, clear=True):
+            self._bulk_search([{"q": "first"}, {"q": "second", "index": self.other_index_name}])
+        assert len(self.vectorised) == 2
+        assert self.max_in_flight == 1
+
+    def test_failed_jobs_only_fail_their_queries(self):
+        res = self._bulk_search([
+            {"q": "first"},
+            {"q": "unprocessable query", "index": self.other_index_name},
+            {"q": "second", "index": self.other_index_name, "searchMethod": "LEXICAL"},
+            {"q": "third"},
+        ])
+        assert res["result"][1]["error"]["code"] == InvalidArgError.code
+        assert res["result"][1]["query"] == "unprocessable query"
+        assert [len(res["result"][i]["hits"]) for i in (0, 2, 3)] == [1, 1, 1]
+        # the failed query isn't sent to Marqo-OS
+        assert len(self.msearch_bodies[0]) == 2 + 1 + 2
+
+        with self.assertRaises(InvalidArgError):
+            tensor_search.vectorise_jobs([VectorisedJobs(
+                model_name="hf/all_datasets_v4_MiniLM-L6", model_properties={}, content=["unprocessable"],
+                device="cpu", normalize_embeddings=True, image_download_headers=None, content_type="text")])
+
+
+class TestBulkSearchResponseAssembly(unittest.TestCase):
+
+    def _responses(self, n_queries: int, n_fields: int = 3, n_hits: int = 10):
+        """Fake `_msearch` responses, with a response per field of each query"""
+        queries = [BulkSearchQueryEntity(index="my-index", q=f"query {i}", limit=n_hits) for i in range(n_queries)]
+        responses = []
+        for q in range(n_queries):
+            for f in range(n_fields):
+                responses.append([{
+                    "_id": f"query-{q}-doc-{h}", "_score": 1 - h / 100,
+                    "_source": {"title": f"title {h}", "desc": "some description " * 20},
+                    "inner_hits": {TensorField.chunks: {"hits": {"hits": [
+                        {"_score": 1 - h / 100 - f / 1000 - c / 10000, "_source": {
+                            TensorField.field_name: f"field_{f}", TensorField.field_content: f"content {c}"}}
+                        for c in range(2)]}}}
+                } for h in range(n_hits)])
+        return queries, {qidx: 2 * n_fields for qidx in range(n_queries)}, responses
+
+    def test_responses_are_split_per_query(self):
+        queries, query_to_body_count, responses = self._responses(3, n_fields=2, n_hits=2)
+        # the second query has no vector fields, so no searches
+        query_to_body_count[1] = 0
+        results = tensor_search.create_bulk_search_response(queries, query_to_body_count, responses[:2] + responses[2:4])
+        assert [[hit["_id"] for hit in r["hits"]] for r in results] == [
+            ["query-0-doc-0", "query-0-doc-1"], [], ["query-1-doc-0", "query-1-doc-1"]]
+        # the highest scoring chunk of each doc is its highlight
+        assert results[0]["hits"][0]["_highlights"] == {"field_0": "content 0"}
+
+    def test_responses_are_not_mutated(self):
+        queries, query_to_body_count, responses = self._responses(4, n_fields=2, n_hits=3)
+        queries[1].boost = {"field_1": [2, 1]}
+        original = copy.deepcopy(responses)
+        results = tensor_search.create_bulk_search_response(queries, query_to_body_count, responses)
+        assert responses == original
+        assert results[1]["hits"][0]["_highlights"] == {"field_1": "content 0"}
+        assert results[1]["hits"][0]["_score"] == pytest.approx((1 - 0.001) * 2 + 1)
+
+    def test_gather_documents_keeps_docs_found_by_any_field(self):
+        no_chunks = {"_id": "a", "inner_hits": {TensorField.chunks: {"hits": {"hits": []}}}}
+        chunk = {"_score": 0.5, "_source": {TensorField.field_name: "title"}}
+        with_chunks = {"_id": "a", "inner_hits": {TensorField.chunks: {"hits": {"hits": [chunk]}}}}
+        gathered = tensor_search.gather_documents_from_response([[no_chunks], [with_chunks], [no_chunks]])
+        assert gathered["a"]["chunks"] == [chunk]
+        assert tensor_search.gather_documents_from_response([[no_chunks]]) == {}
+
+    def test_benchmark(self):
+        """Response assembly time for bulk searches of 1 to 500 queries, of 3 fields and 10 hits each.
+        Run with `pytest -s` to see the timings."""
+        for n_queries in [1, 10, 100, 500]:
+            queries, query_to_body_count, responses = self._responses(n_queries)
+            repeats = max(1, 200 // n_queries)
+            t0 = time.perf_counter()
+            for _ in range(repeats):
+                results = tensor_search.create_bulk_search_response(queries, query_to_body_count, responses)
+            seconds = (time.perf_counter() - t0) / repeats
+            assert len(results) == n_queries
+            print(f"create_bulk_search_response: {n_queries} queries took {seconds * 1000:.2f}ms "
+                  f"({seconds * 1e6 / n_queries:.0f}us per query)")
@@ -1,6 +1,16 @@
+import os
 import pprint
+import threading
+import time
+import unittest
+from collections import OrderedDict
+from unittest import mock
 
-from marqo.tensor_search import tensor_search
+import pytest
+
+from marqo import errors
+from marqo.tensor_search import tensor_search, tasks, serialization, utils
+from marqo.tensor_search.enums import EnvVars
 from marqo.config import Config
 from marqo.errors import IndexNotFoundError
 from tests.marqo_test import MarqoTestCase
@@ -77,3 +87,181 @@ class TestDeleteDocuments(MarqoTestCase):
         assert "Z" in res["startedAt"]
         assert "T" in res["finishedAt"]
 
+
+
+class TestDeleteDocumentsBulk(unittest.TestCase):
+    """delete_documents against a mocked Marqo-OS"""
+
+    def setUp(self) -> None:
+        self.config = Config(url="http://localhost:9200")
+        self.stored_ids = {str(i) for i in range(100)}
+        self.bulk_bodies = []
+        self.index_exists = True
+        self.release_bulk = threading.Event()
+        self.release_bulk.set()
+
+        def fake_post(_self, path, body=None, *args, **kwargs):
+            if path.endswith("_refresh"):
+                return {"_shards": {"failed": 0}}
+            assert path == "_bulk"
+            self.release_bulk.wait()
+            self.bulk_bodies.append(body)
+            items = []
+            for line in [serialization.loads(line) for line in body.splitlines() if line]:
+                _id = line["delete"]["_id"]
+                if not self.index_exists:
+                    items.append({"delete": {"_id": _id, "status": 404, "error": {
+                        "type": "index_not_found_exception", "index": line["delete"]["_index"]}}})
+                elif _id in self.stored_ids:
+                    self.stored_ids.remove(_id)
+                    items.append({"delete": {"_id": _id, "result": "deleted", "status": 200}})
+                else:
+                    items.append({"delete": {"_id": _id, "result": "not_found", "status": 404}})
+            return {"took": 1, "errors": not self.index_exists, "items": items}
+
+        self.patch = mock.patch("marqo._httprequests.HttpRequests.post", fake_post)
+        self.patch.start()
+
+    def tearDown(self) -> None:
+        self.release_bulk.set()
+        self.patch.stop()
+
+    def test_delete_documents_bulk(self):
+        with mock.patch.dict(os.environ, {EnvVars.MARQO_MAX_BULK_REQUEST_ACTIONS: "30"}):
+            res = tensor_search.delete_documents(
+                config=self.config, index_name="my-index", auto_refresh=True,
+                doc_ids=[str(i) for i in range(90, 150)] + ["95"])
+        assert res["status"] == "succeeded"
+        assert res["details"] == {"receivedDocumentIds": 61, "deletedDocuments": 10}
+        assert self.stored_ids == {str(i) for i in range(90)}
+        # duplicate ids are deleted once, in sub-requests of at most 30 actions
+        assert len(self.bulk_bodies) == 2
+
+    def test_delete_documents_index_not_found(self):
+        self.index_exists = False
+        with self.assertRaises(IndexNotFoundError):
+            tensor_search.delete_documents(config=self.config, index_name="my-index", doc_ids=["1"],
+                                           auto_refresh=False)
+
+    def test_delete_documents_invalid_ids(self):
+        for bad_ids in [[], ["1", 2], ["1", ""]]:
+            with self.assertRaises(errors.InvalidDocumentIdError):
+                tensor_search.delete_documents(config=self.config, index_name="my-index", doc_ids=bad_ids,
+                                               auto_refresh=False, async_mode=True)
+        assert not self.bulk_bodies
+
+    def _wait_for_task(self, task_id: str) -> dict:
+        for _ in range(200):
+            task = tasks.get_task(task_id)
+            if task["status"] in (tasks.TaskStatus.succeeded, tasks.TaskStatus.failed):
+                return task
+            time.sleep(0.01)
+        raise AssertionError("the task didn't finish")
+
+    def test_delete_documents_async(self):
+        self.release_bulk.clear()
+        res = tensor_search.delete_documents(
+            config=self.config, index_name="my-index", doc_ids=["1", "2", "not stored"], auto_refresh=True,
+            async_mode=True)
+        assert res["type"] == "documentDeletion"
+        assert res["status"] in (tasks.TaskStatus.enqueued, tasks.TaskStatus.processing)
+        assert res["details"] == {"receivedDocumentIds": 3, "processedDocumentIds": 0, "deletedDocuments": 0}
+        assert self.stored_ids == {str(i) for i in range(100)}
+
+        self.release_bulk.set()
+        task = self._wait_for_task(res["task_id"])
+        assert task["status"] == tasks.TaskStatus.succeeded
+        assert task["details"] == {"receivedDocumentIds": 3, "processedDocumentIds": 3, "deletedDocuments": 2}
+        assert "Z" in task["finishedAt"] and "PT" in task["duration"]
+        assert "1" not in self.stored_ids
+
+    def test_delete_documents_async_progress(self):
+        with mock.patch.dict(os.environ, {EnvVars.MARQO_MAX_BULK_REQUEST_ACTIONS: "10",
+                                          EnvVars.MARQO_MAX_CONCURRENT_BULK_REQUESTS: "1"}):
+            self.release_bulk.clear()
+            res = tensor_search.delete_documents(
+                config=self.config, index_name="my-index", doc_ids=[str(i) for i in range(50)],
+                auto_refresh=False, async_mode=True)
+            processed = set()
+            while len(self.bulk_bodies) < 5:
+                self.release_bulk.set()
+                processed.add(tasks.get_task(res["task_id"])["details"]["processedDocumentIds"])
+                time.sleep(0.005)
+            task = self._wait_for_task(res["task_id"])
+        assert task["details"]["processedDocumentIds"] == task["details"]["deletedDocuments"] == 50
+        assert all(count % 10 == 0 for count in processed)
+
+    def test_delete_documents_async_failure(self):
+        self.index_exists = False
+        res = tensor_search.delete_documents(config=self.config, index_name="my-index", doc_ids=["1"],
+                                             auto_refresh=False, async_mode=True)
+        task = self._wait_for_task(res["task_id"])
+        assert task["status"] == tasks.TaskStatus.failed
+        assert task["error"]["code"] == IndexNotFoundError.code
+
+    def test_get_task_not_found(self):
+        with self.assertRaises(errors.TaskNotFoundError):
+            tasks.get_task("not a task")
+
+    def test_finished_tasks_are_evicted(self):
+        with mock.patch.object(tasks, "MAX_FINISHED_TASKS", 3), mock.patch.object(tasks, "_tasks", OrderedDict()):
+            task_ids = [tasks.submit_task(index_name="my-index", task_type="test", details={},
+                                          operation=lambda task: None).task_id for _ in range(6)]
+            for task_id in task_ids[-3:]:
+                self._wait_for_task(task_id)
+            time.sleep(0.05)
+            assert list(tasks._tasks) == task_ids[-3:]
+
+
+@pytest.mark.largemodel
+class TestDeleteDocumentsBenchmark(MarqoTestCase):
+    """Compares deleting 10k ids with _delete_by_query against the _bulk deletes used by
+    delete_documents. Needs Marqo-OS. Run with `pytest --largemodel -s`."""
+
+    index_name = "my-test-delete-benchmark-index"
+    n_docs = 10000
+
+    def setUp(self) -> None:
+        try:
+            tensor_search.delete_index(config=self.config, index_name=self.index_name)
+        except IndexNotFoundError:
+            pass
+        tensor_search.create_vector_index(config=self.config, index_name=self.index_name)
+
+    def tearDown(self) -> None:
+        tensor_search.delete_index(config=self.config, index_name=self.index_name)
+
+    def _add_docs(self):
+        # the docs are written directly, as vectorising them isn't what is being measured
+        body = utils.dicts_to_jsonl([d for i in range(self.n_docs) for d in (
+            {"index": {"_index": self.index_name, "_id": str(i)}}, {"title": f"doc {i}"})])
+        requests.post(f"{self.authorized_url}/_bulk?refresh=true", data=body, verify=False,
+                      headers={"Content-Type": "application/json"}).raise_for_status()
+
+    def _count(self) -> int:
+        return requests.post(f"{self.authorized_url}/{self.index_name}/_count", verify=False).json()["count"]
+
+    def test_delete_10k_ids(self):
+        doc_ids = [str(i) for i in range(self.n_docs)]
+        timings = dict()
+
+        self._add_docs()
+        t0 = time.perf_counter()
+        res = requests.post(f"{self.authorized_url}/{self.index_name}/_delete_by_query", verify=False,
+                            json={"query": {"terms": {"_id": doc_ids}}}).json()
+        tensor_search.refresh_index(config=self.config, index_name=self.index_name)
+        timings["_delete_by_query"] = time.perf_counter() - t0
+        assert res["deleted"] == self.n_docs
+        assert self._count() == 0
+
+        self._add_docs()
+        t0 = time.perf_counter()
+        res = tensor_search.delete_documents(config=self.config, index_name=self.index_name, doc_ids=doc_ids,
+                                             auto_refresh=True)
+        timings["_bulk deletes"] = time.perf_counter() - t0
+        assert res["details"]["deletedDocuments"] == self.n_docs
+        assert self._count() == 0
+
+        print(f"\ndeleting {self.n_docs} ids:")
+        for name, timing in timings.items():
+            print(f"    {name}: {timing * 1000:.0f}ms")
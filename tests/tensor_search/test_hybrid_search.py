@@ -0,0 +1,361 @@
+import json
+import os
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import numpy as np
+import pytest
+
+from marqo.errors import IndexNotFoundError, InvalidArgError
+from marqo.tensor_search import configs, hybrid, tensor_search, validation
+from marqo.tensor_search.enums import EnvVars, IndexSettingsField, SearchMethod, TensorField
+from marqo.tensor_search.models.api_models import BulkSearchQuery
+from marqo.tensor_search.models.index_info import IndexInfo
+from tests.marqo_test import MarqoTestCase
+
+
+def _hits(*ids_and_scores):
+    return [{"_id": _id, "_score": score, "_highlights": {}} for _id, score in ids_and_scores]
+
+
+class TestFuseHits(unittest.TestCase):
+
+    def _params(self, **params):
+        return validation.validate_hybrid_parameters(params, search_method=SearchMethod.HYBRID)
+
+    def test_rrf(self):
+        tensor_hits = _hits(("a", 0.9), ("b", 0.8), ("c", 0.7))
+        lexical_hits = _hits(("c", 12.0), ("d", 9.0), ("a", 1.0))
+        fused = hybrid.fuse_hits(tensor_hits, lexical_hits, self._params(rrf_k=60))
+        scores = {hit["_id"]: hit["_score"] for hit in fused}
+        assert scores["a"] == pytest.approx(0.5 / 61 + 0.5 / 63)
+        assert scores["c"] == pytest.approx(0.5 / 63 + 0.5 / 61)
+        assert scores["b"] == pytest.approx(0.5 / 62)
+        assert scores["d"] == pytest.approx(0.5 / 62)
+        # a and c tie, as do b and d. Ties keep the tensor order, then the lexical order.
+        assert [hit["_id"] for hit in fused] == ["a", "c", "b", "d"]
+
+    def test_rrf_tensor_weight(self):
+        tensor_hits = _hits(("a", 0.9), ("b", 0.8))
+        lexical_hits = _hits(("b", 5.0), ("a", 1.0))
+        assert [hit["_id"] for hit in hybrid.fuse_hits(
+            tensor_hits, lexical_hits, self._params(tensor_weight=0.8))] == ["a", "b"]
+        assert [hit["_id"] for hit in hybrid.fuse_hits(
+            tensor_hits, lexical_hits, self._params(tensor_weight=0.2))] == ["b", "a"]
+
+    def test_weighted(self):
+        tensor_hits = _hits(("a", 0.9), ("b", 0.7), ("c", 0.5))
+        lexical_hits = _hits(("c", 20.0), ("a", 10.0), ("d", 0.0))
+        fused = hybrid.fuse_hits(tensor_hits, lexical_hits, self._params(fusion="weighted", tensor_weight=0.5))
+        scores = {hit["_id"]: hit["_score"] for hit in fused}
+        assert scores == pytest.approx({"a": 0.5 + 0.25, "b": 0.25, "c": 0.5, "d": 0.0})
+        assert [hit["_id"] for hit in fused] == ["a", "c", "b", "d"]
+
+    def test_weighted_with_equal_scores(self):
+        fused = hybrid.fuse_hits(_hits(("a", 0.5), ("b", 0.5)), [], self._params(fusion="weighted"))
+        assert [hit["_score"] for hit in fused] == [0.5, 0.5]
+
+    def test_docs_keep_their_tensor_hit(self):
+        tensor_hits = [{"_id": "a", "_score": 0.9, "_highlights": {"title": "the title"}, "title": "the title"}]
+        lexical_hits = [{"_id": "a", "_score": 3.0, "_highlights": [], "title": "the title"},
+                        {"_id": "b", "_score": 2.0, "_highlights": [], "title": "other"}]
+        fused = hybrid.fuse_hits(tensor_hits, lexical_hits, self._params())
+        assert fused[0]["_highlights"] == {"title": "the title"}
+        assert fused[1]["_highlights"] == []
+        # the hits passed in aren't changed
+        assert tensor_hits[0]["_score"] == 0.9
+
+    def test_validate_hybrid_parameters(self):
+        assert self._params() == {"fusion": "rrf", "rrf_k": 60, "tensor_weight": 0.5}
+        assert self._params(fusion="weighted", tensor_weight=1) == \
+               {"fusion": "weighted", "rrf_k": 60, "tensor_weight": 1}
+        for bad in [{"fusion": "max"}, {"rrf_k": 0}, {"tensor_weight": 1.5}, {"alpha": 0.3}, {"rrf_k": "60"}]:
+            with self.assertRaises(InvalidArgError):
+                validation.validate_hybrid_parameters(bad, search_method=SearchMethod.HYBRID)
+        with self.assertRaises(InvalidArgError):
+            validation.validate_hybrid_parameters({"fusion": "rrf"}, search_method=SearchMethod.TENSOR)
+        # hybrid_parameters are optional for other search methods
+        validation.validate_hybrid_parameters(None, search_method=SearchMethod.LEXICAL)
+
+
+class TestHybridSearchMocked(unittest.TestCase):
+    """Hybrid search against a mocked Marqo-OS, which returns canned tensor and lexical hits"""
+
+    index_name = "my-index"
+
+    def setUp(self) -> None:
+        self.index_info = IndexInfo(
+            model_name="hf/all_datasets_v4_MiniLM-L6",
+            properties={
+                "title": {"type": "text"}, "desc": {"type": "text"},
+                TensorField.chunks: {"type": "nested", "properties": {
+                    f"{TensorField.vector_prefix}title": {"type": "knn_vector"},
+                    f"{TensorField.vector_prefix}desc": {"type": "knn_vector"},
+                }}
+            },
+            index_settings=configs.get_default_index_settings())
+        # canned hits, best first
+        self.tensor_hits = {"title": [("a", 0.9), ("b", 0.8), ("c", 0.7)], "desc": [("b", 0.85), ("e", 0.6)]}
+        self.lexical_hits = [("c", 11.0), ("d", 7.0), ("a", 2.0)]
+        self.lexical_error = None
+        self.msearch_bodies = []
+        self.rtt_seconds = 0
+
+        mock_http = mock.MagicMock()
+        mock_http.return_value.get.side_effect = self._fake_get
+        self.patches = [
+            mock.patch.object(tensor_search, "HttpRequests", mock_http),
+            mock.patch.object(tensor_search, "get_index_info", return_value=self.index_info),
+            mock.patch.object(tensor_search.index_meta_cache, "get_index_info", return_value=self.index_info),
+            mock.patch.object(tensor_search.index_meta_cache, "get_cache",
+                              return_value={self.index_name: self.index_info}),
+            mock.patch.object(tensor_search.index_meta_cache, "refresh_index_info_on_interval"),
+            mock.patch.object(tensor_search.s2_inference, "vectorise", side_effect=lambda content, **kwargs:
+                              np.ones((len(content), 384), dtype=np.float32)),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self) -> None:
+        for patch in self.patches:
+            patch.stop()
+
+    def _fake_get(self, path, body=None):
+        time.sleep(self.rtt_seconds)
+        if path.endswith("_search"):
+            return {"took": 1, "hits": {"hits": self._lexical_response(body)["hits"]["hits"]}}
+        searches = [json.loads(line) for line in body.splitlines() if line][1::2]
+        self.msearch_bodies.append(searches)
+        return {"took": 2, "responses": [
+            self._lexical_response(search) if "bool" in search["query"] else self._tensor_response(search)
+            for search in searches]}
+
+    def _tensor_response(self, search: dict) -> dict:
+        query = search["query"]
+        if "function_score" in query:
+            # a search with score modifiers
+            query = query["function_score"]["query"]["nested"]["query"]["function_score"]["query"]
+        else:
+            query = query["nested"]["query"]
+        knn_field = next(iter(query["knn"]))
+        field = knn_field.split(TensorField.vector_prefix)[1]
+        hits = self.tensor_hits[field][search["from"]:search["from"] + search["size"]]
+        return {"took": 1, "hits": {"hits": [{
+            "_id": _id, "_score": score, "_source": {field: f"{field} of {_id}"},
+            "inner_hits": {TensorField.chunks: {"hits": {"hits": [{"_score": score, "_source": {
+                TensorField.field_name: field, TensorField.field_content: f"{field} of {_id}"}}]}}}
+        } for _id, score in hits]}}
+
+    def _lexical_response(self, search: dict) -> dict:
+        if self.lexical_error is not None:
+            return {"error": self.lexical_error, "status": 400}
+        hits = self.lexical_hits[search["from"]:search["from"] + search["size"]]
+        return {"took": 1, "hits": {"hits": [
+            {"_id": _id, "_score": score, "_source": {"title": f"title of {_id}"}} for _id, score in hits]}}
+
+    def _search(self, **kwargs) -> dict:
+        return tensor_search.search(config=mock.MagicMock(), index_name=self.index_name, text="some query",
+                                    search_method=SearchMethod.HYBRID, **kwargs)
+
+    def test_single_msearch_round_trip(self):
+        res = self._search(result_count=10)
+        assert len(self.msearch_bodies) == 1
+        searches = self.msearch_bodies[0]
+        # a knn search per vector field, then the lexical search
+        assert [("nested" in search["query"]) for search in searches] == [True, True, False]
+        assert all(search["size"] == 10 and search["from"] == 0 for search in searches)
+        # a and c are found by both searches, and tie
+        assert [hit["_id"] for hit in res["hits"]] == ["a", "c", "b", "d", "e"]
+        assert res["hits"][0]["_highlights"] == {"title": "title of a"}
+
+    def test_pagination_over_the_fused_ranking(self):
+        all_ids = [hit["_id"] for hit in self._search(result_count=5)["hits"]]
+        self.msearch_bodies = []
+        page = self._search(result_count=2, offset=2)
+        # each search retrieves offset + limit candidates
+        assert all(search["size"] == 4 and search["from"] == 0 for search in self.msearch_bodies[0])
+        assert [hit["_id"] for hit in page["hits"]] == all_ids[2:4]
+
+    def test_hybrid_parameters(self):
+        tensor_first = self._search(result_count=5, hybrid_parameters={"tensor_weight": 1})
+        assert [hit["_id"] for hit in tensor_first["hits"][:3]] == ["a", "b", "c"]
+        lexical_first = self._search(result_count=5, hybrid_parameters={"fusion": "weighted", "tensor_weight": 0})
+        assert lexical_first["hits"][0]["_id"] == "c"
+        with self.assertRaises(InvalidArgError):
+            self._search(hybrid_parameters={"fusion": "max"})
+
+    def test_filter_and_searchable_attributes_apply_to_both_searches(self):
+        self._search(result_count=3, filter="title:(some title)", searchable_attributes=["title"])
+        tensor, lexical = self.msearch_bodies[0]
+        assert "filter" in tensor["query"]["nested"]["query"]["knn"][f"{TensorField.chunks}.{TensorField.vector_prefix}title"]
+        assert lexical["query"]["bool"]["filter"] == [{"query_string": {"query": "title:(some title)"}}]
+        assert lexical["query"]["bool"]["should"] == [{"match": {"title": "some query"}}]
+
+    def test_score_modifiers_must_be_filterable(self):
+        score_modifiers = {"multiply_score_by": [{"field_name": "price", "weight": 1}],
+                           "add_to_score": [{"field_name": "rating", "weight": 2}]}
+        with mock.patch.object(IndexInfo, "get_filterable_fields", return_value=frozenset({"price"})), \
+                mock.patch.object(tensor_search.stored_scripts, "get_script_id", return_value="score-modifiers"):
+            for search_method in [SearchMethod.TENSOR, SearchMethod.HYBRID]:
+                with self.assertRaises(InvalidArgError) as e:
+                    tensor_search.search(config=mock.MagicMock(), index_name=self.index_name, text="some query",
+                                         search_method=search_method, score_modifiers=score_modifiers)
+                assert "['rating']" in str(e.exception)
+            assert self.msearch_bodies == []
+
+            del score_modifiers["add_to_score"]
+            res = self._search(score_modifiers=score_modifiers, result_count=10)
+        assert len(self.msearch_bodies) == 1
+        assert [("function_score" in search["query"]) for search in self.msearch_bodies[0]] == [True, True, False]
+        assert [hit["_id"] for hit in res["hits"]] == ["a", "c", "b", "d", "e"]
+
+    def _set_filterable_fields(self, filterable_fields: list) -> None:
+        index_settings = configs.get_default_index_settings()
+        index_settings[IndexSettingsField.index_defaults][IndexSettingsField.filterable_fields] = filterable_fields
+        index_info = IndexInfo(model_name=self.index_info.model_name, properties=self.index_info.properties,
+                               index_settings=index_settings)
+        tensor_search.get_index_info.return_value = index_info
+        tensor_search.index_meta_cache.get_index_info.return_value = index_info
+
+    def test_filters_must_be_filterable(self):
+        self._set_filterable_fields(["title"])
+        for search_method in [SearchMethod.TENSOR, SearchMethod.HYBRID]:
+            with self.assertRaises(InvalidArgError) as e:
+                tensor_search.search(config=mock.MagicMock(), index_name=self.index_name, text="some query",
+                                     search_method=search_method, filter="title:(a) AND desc:(b)")
+            assert "['desc']" in str(e.exception)
+        # the query isn't vectorised
+        assert tensor_search.s2_inference.vectorise.call_count == 0
+        assert self.msearch_bodies == []
+
+        self._search(filter="title:(a)")
+        # lexical searches search the documents, which have every field
+        tensor_search.search(config=mock.MagicMock(), index_name=self.index_name, text="some query",
+                             search_method=SearchMethod.LEXICAL, filter="desc:(b)")
+        assert len(self.msearch_bodies) == 1
+
+    def test_bulk_search_filters_must_be_filterable(self):
+        self._set_filterable_fields(["title"])
+        res = tensor_search.bulk_search(query=BulkSearchQuery(queries=[
+            {"index": self.index_name, "q": "first", "searchMethod": "TENSOR", "filter": "desc:(b)"},
+            {"index": self.index_name, "q": "second", "searchMethod": "HYBRID", "filter": "title:(a)"},
+        ]), marqo_config=mock.MagicMock(), device="cpu")
+        assert res["result"][0]["error"]["code"] == InvalidArgError.code
+        assert "['desc']" in res["result"][0]["error"]["message"]
+        assert "error" not in res["result"][1]
+        assert len(res["result"][1]["hits"]) > 0
+        # only the query with a valid filter is vectorised
+        assert [call.kwargs["content"] for call in tensor_search.s2_inference.vectorise.call_args_list] == \
+               [["second"]]
+
+    def test_searches_share_the_device_inference_limit(self):
+        lock = threading.Lock()
+        in_flight, max_in_flight = [0], [0]
+
+        def slow_vectorise(content, **kwargs):
+            with lock:
+                in_flight[0] += 1
+                max_in_flight[0] = max(max_in_flight[0], in_flight[0])
+            time.sleep(0.03)
+            with lock:
+                in_flight[0] -= 1
+            return np.ones((len(content), 384), dtype=np.float32)
+
+        def search(search_method: str):
+            return tensor_search.search(config=mock.MagicMock(), index_name=self.index_name, text="some query",
+                                        search_method=search_method, device="cpu")
+
+        with mock.patch.object(tensor_search.s2_inference, "vectorise", side_effect=slow_vectorise), \
+                mock.patch.dict(tensor_search.inference_executor._device_slots, clear=True), \
+                mock.patch.dict(os.environ, {EnvVars.MARQO_MAX_CONCURRENT_CPU_INFERENCE: "1"}):
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                list(executor.map(search, [SearchMethod.TENSOR, SearchMethod.HYBRID] * 2))
+        assert max_in_flight[0] == 1
+
+    def test_lexical_errors_are_raised(self):
+        self.lexical_error = {"root_cause": [{"reason": "parse_exception: bad filter"}]}
+        with self.assertRaises(InvalidArgError):
+            self._search(filter="title:(")
+
+    def test_only_str_queries(self):
+        with self.assertRaises(InvalidArgError):
+            tensor_search.search(config=mock.MagicMock(), index_name=self.index_name, text={"some query": 1},
+                                 search_method=SearchMethod.HYBRID)
+
+    def test_bulk_search(self):
+        res = tensor_search.bulk_search(query=BulkSearchQuery(queries=[
+            {"index": self.index_name, "q": "first", "searchMethod": "TENSOR", "limit": 3},
+            {"index": self.index_name, "q": "second", "searchMethod": "hybrid", "limit": 2, "offset": 1,
+             "hybridParameters": {"fusion": "rrf", "rrf_k": 10}},
+            {"index": self.index_name, "q": "third", "searchMethod": "HYBRID", "limit": 5},
+        ]), marqo_config=mock.MagicMock(), device="cpu")
+        assert len(self.msearch_bodies) == 1
+        # 2 knn searches for the tensor query, and 3 searches for each hybrid query
+        assert len(self.msearch_bodies[0]) == 8
+        hybrid_ids = [hit["_id"] for hit in res["result"][2]["hits"]]
+        assert [hit["_id"] for hit in res["result"][1]["hits"]] == hybrid_ids[1:3]
+        assert [hit["_id"] for hit in res["result"][0]["hits"]] == ["a", "b", "c"]
+
+    def test_latency_against_two_calls(self):
+        """Hybrid search against a TENSOR and a LEXICAL search, with a simulated 20ms round trip to Marqo-OS"""
+        self.rtt_seconds = 0.02
+        n_queries = 20
+        t0 = time.perf_counter()
+        for _ in range(n_queries):
+            self._search(result_count=10)
+        hybrid_seconds = (time.perf_counter() - t0) / n_queries
+        t0 = time.perf_counter()
+        for _ in range(n_queries):
+            for search_method in [SearchMethod.TENSOR, SearchMethod.LEXICAL]:
+                tensor_search.search(config=mock.MagicMock(), index_name=self.index_name, text="some query",
+                                     search_method=search_method, result_count=10)
+        two_calls_seconds = (time.perf_counter() - t0) / n_queries
+        print(f"hybrid: {hybrid_seconds * 1000:.1f}ms per query. "
+              f"TENSOR + LEXICAL: {two_calls_seconds * 1000:.1f}ms per query")
+        assert hybrid_seconds < two_calls_seconds
+
+
+@pytest.mark.largemodel
+class TestHybridSearchBenchmark(MarqoTestCase):
+    """Compares the latency of a HYBRID search with a TENSOR and a LEXICAL search made
+    one after the other. Needs Marqo-OS. Run with `pytest --largemodel -s`."""
+
+    index_name = "my-test-hybrid-benchmark-index"
+
+    def setUp(self) -> None:
+        try:
+            tensor_search.delete_index(config=self.config, index_name=self.index_name)
+        except IndexNotFoundError:
+            pass
+        tensor_search.add_documents(config=self.config, index_name=self.index_name, docs=[
+            {"_id": str(i), "title": f"document number {i} about {['cats', 'dogs', 'birds'][i % 3]}",
+             "desc": f"a description of the {['red', 'green', 'blue'][i % 3]} animal {i}"}
+            for i in range(500)], auto_refresh=True)
+
+    def tearDown(self) -> None:
+        tensor_search.delete_index(config=self.config, index_name=self.index_name)
+
+    def test_hybrid_against_two_calls(self):
+        queries = ["cats", "a green animal", "document about birds", "dogs 42"] * 10
+        for search_method in [SearchMethod.TENSOR, SearchMethod.LEXICAL, SearchMethod.HYBRID]:
+            # warms up the model and Marqo-OS caches
+            tensor_search.search(config=self.config, index_name=self.index_name, text="warm up",
+                                 search_method=search_method)
+        timings = {"hybrid": [], "two calls": []}
+        for q in queries:
+            t0 = time.perf_counter()
+            res = tensor_search.search(config=self.config, index_name=self.index_name, text=q,
+                                       search_method=SearchMethod.HYBRID, result_count=10)
+            timings["hybrid"].append(time.perf_counter() - t0)
+            assert len(res["hits"]) == 10
+
+            t0 = time.perf_counter()
+            for search_method in [SearchMethod.TENSOR, SearchMethod.LEXICAL]:
+                tensor_search.search(config=self.config, index_name=self.index_name, text=q,
+                                     search_method=search_method, result_count=10)
+            timings["two calls"].append(time.perf_counter() - t0)
+        for name, times in timings.items():
+            print(f"{name}: p50 {np.percentile(times, 50) * 1000:.1f}ms, p95 {np.percentile(times, 95) * 1000:.1f}ms")
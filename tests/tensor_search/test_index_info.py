@@ -1,4 +1,7 @@
+import copy
+import pickle
 import pprint
+import time
 import unittest
 from marqo.tensor_search.models.index_info import IndexInfo
 from marqo.tensor_search.models import index_info
@@ -157,4 +160,73 @@ class TestIndexInfo(unittest.TestCase):
         del actual[NsFields.ann_method_parameters]
         del default[NsFields.ann_method_parameters]
         
-        assert actual == default
\ No newline at end of file
+        assert actual == default
+
+    def test_derived_views_are_computed_once(self):
+        index_settings = configs.get_default_index_settings()
+        index_settings[NsFields.index_defaults][NsFields.filterable_fields] = ["a"]
+        ii = IndexInfo(
+            model_name='a',
+            properties={
+                "a": {"type": "text"}, "b": {"type": "keyword"},
+                TensorField.chunks: {"properties": {"__vector_a": {1: 2}}}},
+            index_settings=index_settings)
+        for view in [ii.get_vector_properties, ii.get_text_properties, ii.get_true_text_properties,
+                     ii.get_ann_parameters, ii.get_knn_parameters, ii.get_index_settings,
+                     ii.get_filterable_fields]:
+            assert view() is view()
+        assert ii.get_true_text_properties() == {"a": {"type": "text"}}
+        assert ii.get_filterable_fields() == {"a"}
+
+    def test_immutable(self):
+        ii = IndexInfo(model_name='a', properties=dict(), index_settings=configs.get_default_index_settings())
+        for attribute in ["model_name", "properties", "version", "_text_properties", "something_else"]:
+            with self.assertRaises(AttributeError):
+                setattr(ii, attribute, "b")
+        with self.assertRaises(AttributeError):
+            del ii.model_name
+        assert ii.model_name == 'a'
+
+    def test_versions(self):
+        properties = {"a": {"type": "text"}}
+        first = IndexInfo(model_name='a', properties=properties, index_settings=configs.get_default_index_settings())
+        second = IndexInfo(model_name='a', properties=properties, index_settings=configs.get_default_index_settings())
+        assert second.version > first.version
+        # IndexInfos with the same contents are equal, whatever their version
+        assert first == second
+        assert first != IndexInfo(model_name='b', properties=properties,
+                                  index_settings=configs.get_default_index_settings())
+
+    def test_copy_and_pickle(self):
+        ii = IndexInfo(model_name='a', properties={"a": {"type": "text"}},
+                       index_settings=configs.get_default_index_settings())
+        ii.get_text_properties()
+        for copied in [pickle.loads(pickle.dumps(ii)), copy.deepcopy(ii), copy.copy(ii)]:
+            assert copied == ii
+            assert copied.get_text_properties() == {"a": {"type": "text"}}
+
+    def test_benchmark(self):
+        """Time of the derived views of a 500 field index, on their first call and once cached.
+        Run with `pytest -s` to see the timings."""
+        properties = {f"field_{i}": {"type": "text"} for i in range(500)}
+        properties[TensorField.chunks] = {"properties": {
+            **{f"{TensorField.vector_prefix}field_{i}": {"type": "knn_vector"} for i in range(500)},
+            **{f"field_{i}": {"type": "keyword"} for i in range(500)}}}
+        views = ["get_vector_properties", "get_text_properties", "get_true_text_properties",
+                 "get_ann_parameters", "get_index_settings"]
+        repeats = 200
+        first_call = {view: 0. for view in views}
+        cached = {view: 0. for view in views}
+        for _ in range(repeats):
+            ii = IndexInfo(model_name='a', properties=properties, index_settings=configs.get_default_index_settings())
+            for view in views:
+                t0 = time.perf_counter()
+                getattr(ii, view)()
+                first_call[view] += time.perf_counter() - t0
+                t0 = time.perf_counter()
+                getattr(ii, view)()
+                cached[view] += time.perf_counter() - t0
+        assert len(ii.get_vector_properties()) == len(ii.get_text_properties()) == 500
+        for view in views:
+            print(f"{view}: first call {first_call[view] / repeats * 1e6:.1f}us, "
+                  f"cached {cached[view] / repeats * 1e6:.2f}us")
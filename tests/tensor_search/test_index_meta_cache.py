@@ -655,3 +655,76 @@ class TestIndexMetaCache(MarqoTestCase):
             return True
 
         assert run()
+
+
+class TestContextualisedFilterCache(unittest.TestCase):
+
+    def setUp(self) -> None:
+        index_meta_cache.empty_cache()
+
+    def tearDown(self) -> None:
+        index_meta_cache.empty_cache()
+
+    def _index_info(self, fields):
+        return IndexInfo(model_name="hf/all_datasets_v4_MiniLM-L6",
+                         properties={field: {"type": "text"} for field in fields},
+                         index_settings=configs.get_default_index_settings())
+
+    def test_filter_fields_are_compiled_once_per_index_info(self):
+        chunks = TensorField.chunks
+        index_info = self._index_info(["abc", "bc"])
+        with mock.patch.object(utils, "compile_filter_fields", wraps=utils.compile_filter_fields) as mock_compile, \
+                mock.patch.object(utils, "contextualise_filter_with",
+                                  wraps=utils.contextualise_filter_with) as mock_contextualise:
+            for _ in range(3):
+                assert index_meta_cache.get_contextualised_filter("my-index", index_info, "abc:1 AND bc:2") == \
+                       f"{chunks}.abc:1 AND {chunks}.bc:2"
+            assert mock_compile.call_count == 1
+            assert mock_contextualise.call_count == 1
+
+            # a refreshed IndexInfo with the same fields reuses the compiled fields and cached filters
+            index_meta_cache.get_contextualised_filter("my-index", self._index_info(["abc", "bc"]), "abc:1 AND bc:2")
+            assert (mock_compile.call_count, mock_contextualise.call_count) == (1, 1)
+
+            # new fields are contextualised once the IndexInfo has them
+            assert index_meta_cache.get_contextualised_filter("my-index", index_info, "c:3") == "c:3"
+            assert index_meta_cache.get_contextualised_filter(
+                "my-index", self._index_info(["abc", "bc", "c"]), "c:3") == f"{chunks}.c:3"
+            assert mock_compile.call_count == 2
+
+            # each index has its own fields
+            assert index_meta_cache.get_contextualised_filter(
+                "my-other-index", self._index_info(["c"]), "abc:1 AND c:3") == f"abc:1 AND {chunks}.c:3"
+
+    def test_no_filter(self):
+        assert index_meta_cache.get_contextualised_filter("my-index", self._index_info(["abc"]), None) == ""
+
+
+    def test_non_filterable_fields_are_compiled_once_per_index_info(self):
+        def index_info_with(fields, filterable_fields):
+            index_info = self._index_info(fields)
+            index_info.index_settings[IndexSettingsField.index_defaults][IndexSettingsField.filterable_fields] = \
+                filterable_fields
+            return index_info
+
+        index_info = index_info_with(["abc", "bc", "other field"], ["abc"])
+        with mock.patch.object(utils, "compile_filter_fields", wraps=utils.compile_filter_fields) as mock_compile:
+            for _ in range(3):
+                assert index_meta_cache.get_non_filterable_filter_fields(
+                    "my-index", index_info, r"abc:1 AND bc:2 OR other\ field:3") == ["bc", "other field"]
+            assert index_meta_cache.get_non_filterable_filter_fields("my-index", index_info, "abc:1") == []
+            assert mock_compile.call_count == 1
+
+            # a refreshed IndexInfo with the same fields reuses the regex
+            index_meta_cache.get_non_filterable_filter_fields(
+                "my-index", index_info_with(["abc", "bc", "other field"], ["abc"]), "bc:2")
+            assert mock_compile.call_count == 1
+
+            assert index_meta_cache.get_non_filterable_filter_fields(
+                "my-index", index_info_with(["abc", "bc", "other field"], ["abc", "bc"]), "bc:2") == []
+            assert mock_compile.call_count == 2
+
+        # every field is filterable by default
+        assert index_meta_cache.get_non_filterable_filter_fields(
+            "my-other-index", self._index_info(["abc"]), "abc:1") == []
+        assert index_meta_cache.get_non_filterable_filter_fields("my-index", index_info, None) == []
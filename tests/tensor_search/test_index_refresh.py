@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+import unittest
+from unittest import mock
+
+from marqo import errors
+from marqo.config import Config
+from marqo.tensor_search import api, index_refresh
+from marqo.tensor_search.enums import EnvVars
+
+
+class TestIndexRefresh(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.config = Config(url="http://localhost:9200")
+        self.refreshes_posted = []
+        self.post_started = threading.Event()
+        self.release_post = threading.Event()
+        self.release_post.set()
+
+        def fake_post(_self, path, *args, **kwargs):
+            if path.endswith("/_count"):
+                return {"count": 3}
+            self.refreshes_posted.append(path)
+            self.post_started.set()
+            self.release_post.wait()
+            return {"_shards": {"total": 1, "successful": 1, "failed": 0}}
+
+        self.patches = [
+            mock.patch("marqo.tensor_search.index_refresh._refreshers", dict()),
+            mock.patch("marqo._httprequests.HttpRequests.post", fake_post),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self) -> None:
+        for patch in self.patches:
+            patch.stop()
+
+    def _refresh_concurrently(self, n_threads: int, index_name: str = "my-index"):
+        results, errors_raised = [], []
+
+        def refresh():
+            try:
+                results.append(index_refresh.refresh_index(config=self.config, index_name=index_name))
+            except Exception as e:
+                errors_raised.append(e)
+
+        threads = [threading.Thread(target=refresh) for _ in range(n_threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, errors_raised
+
+    def test_single_refresh(self):
+        response = index_refresh.refresh_index(config=self.config, index_name="my-index")
+        assert response["_shards"]["successful"] == 1
+        assert self.refreshes_posted == ["my-index/_refresh"]
+        assert index_refresh.get_refresh_metrics(config=self.config) == {
+            "my-index": {"refresh_requests": 1, "refreshes_sent": 1, "refreshes_saved": 0}}
+
+    def test_concurrent_refreshes_coalesce_within_window(self):
+        with mock.patch.dict(os.environ, {EnvVars.MARQO_REFRESH_COALESCE_WINDOW_MS: "200"}):
+            results, errors_raised = self._refresh_concurrently(n_threads=16)
+        assert not errors_raised
+        assert len(results) == 16
+        assert self.refreshes_posted == ["my-index/_refresh"]
+        assert index_refresh.get_refresh_metrics(config=self.config)["my-index"] == {
+            "refresh_requests": 16, "refreshes_sent": 1, "refreshes_saved": 15}
+
+    def test_requests_during_in_flight_refresh_get_a_later_refresh(self):
+        self.release_post.clear()
+        first = threading.Thread(
+            target=index_refresh.refresh_index, kwargs={"config": self.config, "index_name": "my-index"})
+        first.start()
+        self.post_started.wait()
+
+        # these are made while the first refresh is in flight, so they can't be answered by it
+        followers = [threading.Thread(
+            target=index_refresh.refresh_index, kwargs={"config": self.config, "index_name": "my-index"})
+            for _ in range(8)]
+        for follower in followers:
+            follower.start()
+        time.sleep(0.1)
+        assert len(self.refreshes_posted) == 1
+        assert all(follower.is_alive() for follower in followers)
+
+        self.release_post.set()
+        first.join()
+        for follower in followers:
+            follower.join()
+        # the followers share a single refresh, sent after the first one completed
+        assert len(self.refreshes_posted) == 2
+        assert index_refresh.get_refresh_metrics(config=self.config)["my-index"]["refreshes_saved"] == 7
+
+    def test_indexes_are_refreshed_separately(self):
+        index_refresh.refresh_index(config=self.config, index_name="index-a")
+        index_refresh.refresh_index(config=self.config, index_name="index-b")
+        assert self.refreshes_posted == ["index-a/_refresh", "index-b/_refresh"]
+        assert set(index_refresh.get_refresh_metrics(config=self.config)) == {"index-a", "index-b"}
+
+    def test_clusters_are_refreshed_separately(self):
+        other_config = Config(url="http://other-host:9200")
+        with mock.patch.dict(os.environ, {EnvVars.MARQO_REFRESH_COALESCE_WINDOW_MS: "200"}):
+            threads = [threading.Thread(target=index_refresh.refresh_index,
+                                        kwargs={"config": config, "index_name": "my-index"})
+                       for config in [self.config, other_config]]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        # an index of one cluster doesn't answer refreshes of the other's index of the same name
+        assert self.refreshes_posted == ["my-index/_refresh", "my-index/_refresh"]
+        for config in [self.config, other_config]:
+            assert index_refresh.get_refresh_metrics(config=config) == {
+                "my-index": {"refresh_requests": 1, "refreshes_sent": 1, "refreshes_saved": 0}}
+
+    def test_refresh_error_is_raised_to_every_caller(self):
+        def failing_post(_self, path, *args, **kwargs):
+            self.refreshes_posted.append(path)
+            raise errors.IndexNotFoundError("no such index")
+
+        with mock.patch("marqo._httprequests.HttpRequests.post", failing_post), \
+                mock.patch.dict(os.environ, {EnvVars.MARQO_REFRESH_COALESCE_WINDOW_MS: "200"}):
+            results, errors_raised = self._refresh_concurrently(n_threads=4)
+        assert not results
+        assert len(errors_raised) == 4
+        assert all(isinstance(e, errors.IndexNotFoundError) for e in errors_raised)
+        assert len(self.refreshes_posted) == 1
+
+        # the refresher recovers after an error
+        assert index_refresh.refresh_index(config=self.config, index_name="my-index")["_shards"]
+
+    def test_index_stats_include_refresh_metrics(self):
+        with mock.patch.dict(os.environ, {EnvVars.MARQO_REFRESH_COALESCE_WINDOW_MS: "200"}):
+            self._refresh_concurrently(n_threads=4)
+        assert api.get_index_stats(index_name="my-index", marqo_config=self.config) == {"numberOfDocuments": 3}
+        assert api.get_index_stats(index_name="my-index", refresh_metrics=True, marqo_config=self.config) == {
+            "numberOfDocuments": 3,
+            "refreshMetrics": {"refreshRequests": 4, "refreshesSent": 1, "refreshesSaved": 3}}
+        # an index that this process hasn't refreshed
+        assert api.get_index_stats(index_name="other-index", refresh_metrics=True, marqo_config=self.config)[
+            "refreshMetrics"] == {"refreshRequests": 0, "refreshesSent": 0, "refreshesSaved": 0}
+
+    def test_get_coalesce_window_seconds(self):
+        for value, expected in [("0", 0), ("250", 0.25)]:
+            with mock.patch.dict(os.environ, {EnvVars.MARQO_REFRESH_COALESCE_WINDOW_MS: value}):
+                assert index_refresh._get_coalesce_window_seconds() == expected
+        for bad in ["-1", "fast", "1.5"]:
+            with mock.patch.dict(os.environ, {EnvVars.MARQO_REFRESH_COALESCE_WINDOW_MS: bad}):
+                with self.assertRaises(errors.ConfigurationError):
+                    index_refresh._get_coalesce_window_seconds()
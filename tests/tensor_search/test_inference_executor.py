@@ -0,0 +1,65 @@
+import functools
+import os
+import threading
+import time
+import unittest
+from unittest import mock
+
+from marqo import errors
+from marqo.tensor_search import inference_executor
+from marqo.tensor_search.enums import EnvVars
+
+
+class TestInferenceExecutor(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.max_in_flight = {}
+        # device limits are created from the env vars on first use
+        self.slots_patch = mock.patch.dict(inference_executor._device_slots, clear=True)
+        self.slots_patch.start()
+
+    def tearDown(self) -> None:
+        self.slots_patch.stop()
+
+    def _run_on_devices(self, calls):
+        return inference_executor.run_concurrently([
+            functools.partial(inference_executor.run_on_device, device, call) for device, call in calls])
+
+    def _call(self, device: str, result, seconds: float = 0.03):
+        def call():
+            with self.lock:
+                self.in_flight[device] = self.in_flight.get(device, 0) + 1
+                self.max_in_flight[device] = max(self.max_in_flight.get(device, 0), self.in_flight[device])
+            time.sleep(seconds)
+            with self.lock:
+                self.in_flight[device] -= 1
+            if isinstance(result, Exception):
+                raise result
+            return result
+        return device, call
+
+    def test_results_in_order_with_errors_in_place(self):
+        error = ValueError("bad content")
+        results = self._run_on_devices([
+            self._call("cpu", 1), self._call("cpu", error), self._call("cuda:0", 3)])
+        assert results == [1, error, 3]
+        assert self._run_on_devices([]) == []
+
+    def test_per_device_limits(self):
+        with mock.patch.dict(os.environ, {EnvVars.MARQO_MAX_CONCURRENT_CPU_INFERENCE: "2",
+                                          EnvVars.MARQO_MAX_CONCURRENT_CUDA_INFERENCE: "1"}):
+            self._run_on_devices(
+                [self._call("cpu", i) for i in range(5)] + [self._call("cuda", i) for i in range(3)]
+                + [self._call("cuda:1", i) for i in range(2)])
+        assert self.max_in_flight["cpu"] == 2
+        # "cuda" is cuda:0, and each CUDA device has its own limit
+        assert self.max_in_flight["cuda"] == 1
+        assert self.max_in_flight["cuda:1"] == 1
+        assert set(inference_executor._device_slots) == {"cpu", "cuda:0", "cuda:1"}
+
+    def test_invalid_limits(self):
+        with mock.patch.dict(os.environ, {EnvVars.MARQO_MAX_CONCURRENT_CPU_INFERENCE: "0"}):
+            results = self._run_on_devices([self._call("cpu", 1)])
+        assert isinstance(results[0], errors.ConfigurationError)
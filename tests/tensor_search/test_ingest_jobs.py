@@ -0,0 +1,245 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from marqo import errors
+from marqo.tensor_search import ingest_jobs, tensor_search
+from marqo.tensor_search.enums import EnvVars
+from marqo.tensor_search.tasks import TaskStatus
+
+
+class _Crash(BaseException):
+    """Stops a worker thread without it recording the batch, like a crash of Marqo"""
+
+
+class TestIngestJobs(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.jobs_dir = tempfile.mkdtemp()
+        self.prepared = []
+        self.indexed_ids = []
+        self.lock = threading.Lock()
+        self.queues = []
+        # worker threads killed by _Crash report it to threading.excepthook
+        self.excepthook_patch = mock.patch.object(threading, "excepthook")
+        self.excepthook_patch.start()
+
+    def tearDown(self) -> None:
+        self.excepthook_patch.stop()
+        shutil.rmtree(self.jobs_dir, ignore_errors=True)
+
+    def _fake_prepare_documents(self, failing_batch_doc: str = None, crashing_batch_doc: str = None):
+        def prepare_documents(docs, **kwargs):
+            first_id = docs[0]["_id"]
+            with self.lock:
+                self.prepared.append(first_id)
+            if first_id == failing_batch_doc:
+                raise errors.IndexNotFoundError("index `my-index` not found")
+            if first_id == crashing_batch_doc:
+                raise _Crash()
+
+            def index_documents():
+                with self.lock:
+                    self.indexed_ids.extend(doc["_id"] for doc in docs)
+                items = [{"_id": doc["_id"], "result": "created", "status": 201} for doc in docs]
+                for item, doc in zip(items, docs):
+                    if "bad" in doc:
+                        item.update({"status": 400, "error": "invalid doc"})
+                        del item["result"]
+                return {"errors": any("error" in item for item in items), "items": items,
+                        "processingTimeMs": 1}
+            return index_documents
+        return prepare_documents
+
+    def _queue(self, n_workers: int = 1) -> ingest_jobs.IngestJobQueue:
+        job_queue = ingest_jobs.IngestJobQueue(config=mock.MagicMock(), jobs_dir=self.jobs_dir, n_workers=n_workers)
+        self.queues.append(job_queue)
+        return job_queue
+
+    def _wait_until_finished(self, job_queue: ingest_jobs.IngestJobQueue, job_id: str, timeout: float = 5) -> dict:
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            job = job_queue.get_job(job_id)
+            if job["status"] in (TaskStatus.succeeded, TaskStatus.failed):
+                return job
+            time.sleep(0.01)
+        raise AssertionError(f"job {job_id} didn't finish: {job_queue.get_job(job_id)}")
+
+    def _docs(self, n: int):
+        return [{"_id": str(i), "text": f"doc {i}"} for i in range(n)]
+
+    def test_job_is_indexed_in_batches(self):
+        with mock.patch.object(tensor_search, "_prepare_documents", side_effect=self._fake_prepare_documents()):
+            job_queue = self._queue()
+            docs = self._docs(25)
+            docs[12]["bad"] = True
+            enqueued = job_queue.submit(index_name="my-index", docs=docs, batch_size=10,
+                                        add_docs_args={"auto_refresh": False})
+            assert enqueued["status"] in (TaskStatus.enqueued, TaskStatus.processing)
+            job = self._wait_until_finished(job_queue, enqueued["job_id"])
+
+        assert job["status"] == TaskStatus.succeeded
+        assert job["details"] == {"receivedDocuments": 25, "batches": 3, "indexedBatches": 3,
+                                  "indexedDocuments": 25, "failedDocuments": 1}
+        assert [batch["batch"] for batch in job["batches"]] == [0, 1, 2]
+        assert job["batches"][1]["errors"] is True
+        assert [item["_id"] for item in job["batches"][1]["failedItems"]] == ["12"]
+        assert self.indexed_ids == [str(i) for i in range(25)]
+        # the docs of indexed batches are removed from disk
+        assert sorted(os.listdir(os.path.join(self.jobs_dir, job["job_id"]))) == \
+               ["job.json", "result_0.json", "result_1.json", "result_2.json"]
+
+    def test_docs_without_ids_get_them_on_submission(self):
+        with mock.patch.object(tensor_search, "_prepare_documents", side_effect=self._fake_prepare_documents()):
+            job_queue = self._queue()
+            job = job_queue.submit(index_name="my-index", docs=[{"text": "no id"}, {"_id": "a", "text": "id"}],
+                                   batch_size=0, add_docs_args={"auto_refresh": False})
+            self._wait_until_finished(job_queue, job["job_id"])
+        assert len(self.indexed_ids) == 2
+        assert self.indexed_ids[1] == "a"
+        assert self.indexed_ids[0]
+
+    def test_failed_batch_fails_the_job(self):
+        with mock.patch.object(tensor_search, "_prepare_documents",
+                               side_effect=self._fake_prepare_documents(failing_batch_doc="10")):
+            job_queue = self._queue()
+            job = job_queue.submit(index_name="my-index", docs=self._docs(40), batch_size=10,
+                                   add_docs_args={"auto_refresh": False})
+            job = self._wait_until_finished(job_queue, job["job_id"])
+
+        assert job["status"] == TaskStatus.failed
+        assert job["error"]["code"] == errors.IndexNotFoundError.code
+        assert [batch["status"] for batch in job["batches"]] == [TaskStatus.succeeded, TaskStatus.failed]
+        assert job["details"]["indexedDocuments"] == 10
+        # the batches after the failed one aren't prepared
+        assert self.prepared == ["0", "10"]
+
+    def _start_worker(self, job_queue: ingest_jobs.IngestJobQueue) -> None:
+        threading.Thread(target=job_queue._work, daemon=True).start()
+
+    def test_unreadable_batch_fails_the_job(self):
+        with mock.patch.object(tensor_search, "_prepare_documents", side_effect=self._fake_prepare_documents()):
+            job_queue = self._queue(n_workers=0)
+            job_id = job_queue.submit(index_name="my-index", docs=self._docs(30), batch_size=10,
+                                      add_docs_args={"auto_refresh": False})["job_id"]
+            os.remove(os.path.join(self.jobs_dir, job_id, "batch_1.json"))
+            self._start_worker(job_queue)
+            job = self._wait_until_finished(job_queue, job_id)
+
+        assert job["status"] == TaskStatus.failed
+        # batch 0 was in flight when batch 1 couldn't be read, and is still recorded
+        assert [(batch["batch"], batch["status"]) for batch in job["batches"]] == \
+               [(0, TaskStatus.succeeded), (1, TaskStatus.failed)]
+        assert self.indexed_ids == [str(i) for i in range(10)]
+        assert sorted(os.listdir(os.path.join(self.jobs_dir, job_id))) == \
+               ["batch_2.json", "job.json", "result_0.json", "result_1.json"]
+
+    def test_job_that_cant_be_processed_is_failed(self):
+        read_json = ingest_jobs._read_json
+        failed_reads = []
+
+        def flaky_read_json(path: str):
+            # the worker's first read of job.json fails
+            if path.endswith("job.json") and threading.current_thread() is not threading.main_thread() \
+                    and not failed_reads:
+                failed_reads.append(path)
+                raise OSError("disk error")
+            return read_json(path)
+
+        with mock.patch.object(tensor_search, "_prepare_documents", side_effect=self._fake_prepare_documents()), \
+                mock.patch.object(ingest_jobs, "_read_json", side_effect=flaky_read_json):
+            job_queue = self._queue(n_workers=0)
+            job_id = job_queue.submit(index_name="my-index", docs=self._docs(20), batch_size=10,
+                                      add_docs_args={"auto_refresh": False})["job_id"]
+            self._start_worker(job_queue)
+            job = self._wait_until_finished(job_queue, job_id)
+            assert job["status"] == TaskStatus.failed
+            assert "disk error" in str(job["error"])
+            assert job["batches"] == []
+
+            # the job is still on disk, and is resumed when the queue is next created
+            job = self._wait_until_finished(self._queue(), job_id)
+        assert job["status"] == TaskStatus.succeeded
+        assert self.indexed_ids == [str(i) for i in range(20)]
+
+    def test_unfinished_jobs_resume_after_a_crash(self):
+        with mock.patch.object(tensor_search, "_prepare_documents",
+                               side_effect=self._fake_prepare_documents(crashing_batch_doc="20")), \
+                mock.patch.dict(os.environ, {EnvVars.MARQO_MAX_PIPELINED_BULK_REQUESTS: "0"}):
+            crashed_queue = self._queue()
+            job_id = crashed_queue.submit(index_name="my-index", docs=self._docs(40), batch_size=10,
+                                          add_docs_args={"auto_refresh": False})["job_id"]
+            deadline = time.time() + 5
+            while "20" not in self.prepared and time.time() < deadline:
+                time.sleep(0.01)
+            crashed_queue._workers[0].join(timeout=5)
+        assert not crashed_queue._workers[0].is_alive()
+        assert self.indexed_ids == [str(i) for i in range(20)]
+
+        # a new queue, e.g. after Marqo restarts, resumes the job from the batch that crashed
+        self.prepared = []
+        with mock.patch.object(tensor_search, "_prepare_documents", side_effect=self._fake_prepare_documents()):
+            restarted_queue = self._queue()
+            job = self._wait_until_finished(restarted_queue, job_id)
+        assert job["status"] == TaskStatus.succeeded
+        assert self.prepared == ["20", "30"]
+        assert self.indexed_ids == [str(i) for i in range(40)]
+        assert job["details"]["indexedDocuments"] == 40
+
+    def test_unacknowledged_jobs_are_discarded(self):
+        os.makedirs(os.path.join(self.jobs_dir, "partial-job"))
+        job_queue = self._queue(n_workers=0)
+        assert os.listdir(self.jobs_dir) == []
+        assert job_queue.resume() == 0
+
+    def test_jobs_run_concurrently(self):
+        in_flight, max_in_flight = [0], [0]
+
+        def slow_prepare_documents(docs, **kwargs):
+            with self.lock:
+                in_flight[0] += 1
+                max_in_flight[0] = max(max_in_flight[0], in_flight[0])
+            time.sleep(0.05)
+            with self.lock:
+                in_flight[0] -= 1
+            return lambda: {"errors": False, "items": [{"_id": doc["_id"], "status": 201} for doc in docs]}
+
+        with mock.patch.object(tensor_search, "_prepare_documents", side_effect=slow_prepare_documents):
+            job_queue = self._queue(n_workers=3)
+            job_ids = [job_queue.submit(index_name="my-index", docs=self._docs(10), batch_size=5,
+                                        add_docs_args={"auto_refresh": False})["job_id"] for _ in range(3)]
+            for job_id in job_ids:
+                assert self._wait_until_finished(job_queue, job_id)["status"] == TaskStatus.succeeded
+        assert max_in_flight[0] > 1
+
+    def test_get_unknown_job(self):
+        job_queue = self._queue(n_workers=0)
+        for job_id in ["9f4cbd41-4b5b-4f4e-9d5c-1a1d2c3e4f50", "..", "not-a-uuid"]:
+            with self.assertRaises(errors.IngestJobNotFoundError):
+                job_queue.get_job(job_id)
+
+    def test_invalid_submissions(self):
+        job_queue = self._queue(n_workers=0)
+        with self.assertRaises(errors.InvalidArgError):
+            job_queue.submit(index_name="my-index", docs=self._docs(3), batch_size=-1, add_docs_args={})
+        with self.assertRaises(errors.BadRequestError):
+            job_queue.submit(index_name="my-index", docs=[], batch_size=10, add_docs_args={})
+        with mock.patch.dict(os.environ, {EnvVars.MARQO_INGEST_JOB_BATCH_SIZE: "0"}):
+            with self.assertRaises(errors.ConfigurationError):
+                job_queue.submit(index_name="my-index", docs=self._docs(3), batch_size=0, add_docs_args={})
+
+    def test_orchestrator_submits_async_jobs(self):
+        with mock.patch.object(ingest_jobs, "submit_job", return_value={"job_id": "a"}) as mock_submit:
+            res = tensor_search.add_documents_orchestrator(
+                config=mock.MagicMock(), index_name="my-index", docs=self._docs(3), auto_refresh=True,
+                batch_size=2, processes=4, non_tensor_fields=["text"], async_mode=True)
+        assert res == {"job_id": "a"}
+        kwargs = mock_submit.call_args.kwargs
+        assert kwargs["batch_size"] == 2
+        assert kwargs["add_docs_args"] == {
+            "auto_refresh": True, "device": None, "update_mode": "replace", "non_tensor_fields": ["text"],
+            "use_existing_tensors": False, "image_download_headers": {}, "mappings": None}
@@ -0,0 +1,304 @@
+import json
+import re
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+import pytest
+
+from marqo.errors import IndexNotFoundError, InvalidArgError
+from marqo.tensor_search import tensor_search, configs, constants, index_meta_cache, validation
+from marqo.tensor_search.enums import IndexSettingsField as NsFields, SearchMethod, TensorField
+from marqo.tensor_search.models.api_models import BulkSearchQuery
+from marqo.tensor_search.models.index_info import IndexInfo
+from marqo.s2_inference import s2_inference
+from tests.marqo_test import MarqoTestCase
+
+
+def _index_info(knn_parameters: dict = None) -> IndexInfo:
+    index_settings = configs.get_default_index_settings()
+    if knn_parameters is not None:
+        index_settings[NsFields.index_defaults][NsFields.knn_parameters] = knn_parameters
+    return IndexInfo(
+        model_name="hf/all_datasets_v4_MiniLM-L6",
+        properties={
+            "title": {"type": "text"}, "colour": {"type": "text"},
+            TensorField.chunks: {"type": "nested", "properties": {
+                f"{TensorField.vector_prefix}title": {"type": "knn_vector"},
+            }}
+        },
+        index_settings=index_settings)
+
+
+class TestKnnParameters(unittest.TestCase):
+
+    def test_k_defaults_to_the_page(self):
+        assert tensor_search._get_knn_k(result_count=10, offset=5, index_info=_index_info()) == 15
+
+    def test_k_over_fetches(self):
+        assert tensor_search._get_knn_k(10, 5, _index_info(), {NsFields.knn_over_fetch: 2.5}) == 38
+
+    def test_k_is_at_least_ef_search(self):
+        assert tensor_search._get_knn_k(10, 0, _index_info(), {NsFields.knn_ef_search: 200}) == 200
+        assert tensor_search._get_knn_k(300, 0, _index_info(), {NsFields.knn_ef_search: 200}) == 300
+
+    def test_search_parameters_override_the_index(self):
+        index_info = _index_info({NsFields.knn_ef_search: 200, NsFields.knn_over_fetch: 3})
+        assert tensor_search._get_knn_k(10, 0, index_info) == 200
+        assert tensor_search._get_knn_k(10, 0, index_info, {NsFields.knn_ef_search: 20}) == 30
+        assert tensor_search._get_knn_k(10, 0, index_info, {NsFields.knn_over_fetch: 1}) == 200
+
+    def test_k_is_capped(self):
+        assert tensor_search._get_knn_k(1000, 0, _index_info(), {NsFields.knn_over_fetch: 100}) == constants.MAX_KNN_K
+
+    def test_validate_knn_parameters(self):
+        assert validation.validate_knn_parameters(None, search_method=SearchMethod.TENSOR) == dict()
+        assert validation.validate_knn_parameters(
+            {NsFields.knn_ef_search: 100}, search_method="hybrid") == {NsFields.knn_ef_search: 100}
+        for bad in [{NsFields.knn_ef_search: 0}, {NsFields.knn_ef_search: constants.MAX_KNN_K + 1},
+                    {NsFields.knn_ef_search: 1.5}, {NsFields.knn_over_fetch: 0.5},
+                    {"ef_construction": 100}]:
+            with self.assertRaises(InvalidArgError):
+                validation.validate_knn_parameters(bad, search_method=SearchMethod.TENSOR)
+        with self.assertRaises(InvalidArgError):
+            validation.validate_knn_parameters({NsFields.knn_ef_search: 100}, search_method=SearchMethod.LEXICAL)
+
+    def test_index_settings_knn_parameters(self):
+        settings = configs.get_default_index_settings()
+        settings[NsFields.index_defaults][NsFields.knn_parameters] = {
+            NsFields.knn_ef_search: 400, NsFields.knn_over_fetch: 2}
+        validation.validate_settings_object(settings)
+        settings[NsFields.index_defaults][NsFields.knn_parameters] = {NsFields.knn_over_fetch: 0}
+        with self.assertRaises(InvalidArgError):
+            validation.validate_settings_object(settings)
+
+    def test_create_index_sets_ef_search(self):
+        for knn_parameters, expected in [(None, 100), ({NsFields.knn_ef_search: 400}, 400)]:
+            index_defaults = {} if knn_parameters is None else {NsFields.knn_parameters: knn_parameters}
+            with mock.patch.object(tensor_search, "HttpRequests") as mock_http, \
+                    mock.patch.object(tensor_search, "get_cache", return_value=dict()):
+                tensor_search.create_vector_index(config=mock.MagicMock(), index_name="my-index",
+                                                  index_settings={NsFields.index_defaults: index_defaults})
+            body = mock_http.return_value.put.call_args.kwargs["body"]
+            assert body["settings"]["index"]["knn.algo_param.ef_search"] == expected
+
+
+class TestKnnParametersMocked(unittest.TestCase):
+    """Tensor searches with knn parameters, against a stub Marqo-OS.
+
+    The stub's knn query works like an approximate index: it shortlists the `k` chunks with
+    the best scores in a coarse, low dimensional projection of the vectors, and ranks the
+    shortlist by their exact scores. The knn query's filter is applied to the shortlist. The
+    results are compared with a brute-force reference.
+    """
+
+    index_name = "my-index"
+    n_docs = 5000
+    dimension = 64
+    colours = ["red", "green", "blue", "yellow", "purple"]
+
+    def setUp(self) -> None:
+        rng = np.random.default_rng(42)
+        # docs are in clusters, like the embeddings of real docs about a few topics
+        centres = rng.normal(size=(50, self.dimension))
+        self.doc_vectors = (centres[rng.integers(0, len(centres), size=self.n_docs)]
+                            + rng.normal(scale=0.7, size=(self.n_docs, self.dimension))).astype(np.float32)
+        self.doc_vectors /= np.linalg.norm(self.doc_vectors, axis=1, keepdims=True)
+        self.doc_colours = np.array([self.colours[i % len(self.colours)] for i in range(self.n_docs)])
+        self.projection = rng.normal(size=(self.dimension, 24)).astype(np.float32)
+        self.projected_docs = self.doc_vectors @ self.projection
+        self.query_vectors = dict()
+        for i in range(50):
+            # queries near a doc, like real queries are near their relevant docs
+            vector = self.doc_vectors[i * 97] + rng.normal(scale=0.1, size=self.dimension).astype(np.float32)
+            self.query_vectors[f"query {i}"] = vector / np.linalg.norm(vector)
+        self.searches = []
+
+        self.index_info = _index_info()
+        mock_http = mock.MagicMock()
+        mock_http.return_value.get.side_effect = self._fake_get
+        self.patches = [
+            mock.patch.object(tensor_search, "HttpRequests", mock_http),
+            mock.patch.object(tensor_search, "get_index_info", side_effect=lambda **kwargs: self.index_info),
+            mock.patch.object(index_meta_cache, "get_index_info", side_effect=lambda **kwargs: self.index_info),
+            mock.patch.object(index_meta_cache, "get_cache", side_effect=lambda: {self.index_name: self.index_info}),
+            mock.patch.object(index_meta_cache, "refresh_index_info_on_interval"),
+            mock.patch.object(tensor_search.s2_inference, "vectorise", side_effect=lambda content, **kwargs:
+                              np.stack([self.query_vectors[c] for c in content])),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self) -> None:
+        for patch in self.patches:
+            patch.stop()
+
+    def _fake_get(self, path, body=None):
+        searches = [json.loads(line) for line in body.splitlines() if line][1::2]
+        self.searches.extend(searches)
+        responses = []
+        for search in searches:
+            knn = next(iter(search["query"]["nested"]["query"]["knn"].values()))
+            query_vector = np.asarray(knn["vector"], dtype=np.float32)
+            coarse_scores = self.projected_docs @ (query_vector @ self.projection)
+            shortlist = np.argpartition(-coarse_scores, knn["k"] - 1)[:knn["k"]]
+            if "filter" in knn:
+                colour = re.fullmatch(rf"{TensorField.chunks}\.colour:\((\w+)\)",
+                                      knn["filter"]["query_string"]["query"]).group(1)
+                shortlist = shortlist[self.doc_colours[shortlist] == colour]
+            scores = self.doc_vectors[shortlist] @ query_vector
+            ranked = shortlist[np.argsort(-scores, kind="stable")]
+            hits = ranked[search["from"]:search["from"] + search["size"]]
+            responses.append({"took": 1, "hits": {"hits": [{
+                "_id": str(i), "_score": float(self.doc_vectors[i] @ query_vector),
+                "_source": {"title": f"title of {i}", "colour": str(self.doc_colours[i])},
+                "inner_hits": {TensorField.chunks: {"hits": {"hits": [{
+                    "_score": float(self.doc_vectors[i] @ query_vector),
+                    "_source": {TensorField.field_name: "title", TensorField.field_content: f"title of {i}"}}]}}}
+            } for i in hits]}})
+        return {"took": 1, "responses": responses}
+
+    def _reference_ids(self, query: str, result_count: int, colour: str = None) -> list:
+        scores = self.doc_vectors @ self.query_vectors[query]
+        if colour is not None:
+            scores = np.where(self.doc_colours == colour, scores, -np.inf)
+        return [str(i) for i in np.argsort(-scores, kind="stable")[:result_count]]
+
+    def _search(self, query: str, **kwargs) -> dict:
+        return tensor_search.search(config=mock.MagicMock(), index_name=self.index_name, text=query, **kwargs)
+
+    def _recall(self, knn_parameters: dict = None, colour: str = None, result_count: int = 10):
+        recalls, page_fills, timings = [], [], []
+        for query in self.query_vectors:
+            t0 = time.perf_counter()
+            res = self._search(query, result_count=result_count, knn_parameters=knn_parameters,
+                               filter=None if colour is None else f"colour:({colour})")
+            timings.append(time.perf_counter() - t0)
+            ids = [hit["_id"] for hit in res["hits"]]
+            reference = self._reference_ids(query, result_count, colour)
+            recalls.append(len(set(ids) & set(reference)) / len(reference))
+            page_fills.append(len(ids) / result_count)
+        return np.mean(recalls), np.mean(page_fills), np.percentile(timings, 50) * 1000
+
+    def test_knn_parameters_set_k(self):
+        self._search("query 0", result_count=10, offset=5, knn_parameters={NsFields.knn_over_fetch: 2})
+        assert self.searches[-1]["query"]["nested"]["query"]["knn"][
+                   f"{TensorField.chunks}.{TensorField.vector_prefix}title"]["k"] == 30
+        assert (self.searches[-1]["from"], self.searches[-1]["size"]) == (5, 10)
+
+        self.index_info = _index_info({NsFields.knn_ef_search: 250})
+        self._search("query 0", result_count=10)
+        assert self.searches[-1]["query"]["nested"]["query"]["knn"][
+                   f"{TensorField.chunks}.{TensorField.vector_prefix}title"]["k"] == 250
+
+    def test_knn_parameters_with_score_modifiers(self):
+        with mock.patch.object(tensor_search.stored_scripts, "get_script_id", return_value="score-modifiers"):
+            body, _ = tensor_search._create_vector_text_search_body(
+                config=mock.MagicMock(), index_name=self.index_name, query="query 0", result_count=10, offset=0,
+                score_modifiers={"multiply_score_by": [{"field_name": "price", "weight": 1}]},
+                knn_parameters={NsFields.knn_ef_search: 120})
+        knn = body[1]["query"]["function_score"]["query"]["nested"]["query"]["function_score"]["query"]["knn"]
+        assert knn[f"{TensorField.chunks}.{TensorField.vector_prefix}title"]["k"] == 120
+
+    def test_bulk_search_knn_parameters(self):
+        queries = [
+            {"index": self.index_name, "q": "query 0", "limit": 10},
+            {"index": self.index_name, "q": "query 1", "limit": 10, "knnParameters": {NsFields.knn_ef_search: 300}},
+        ]
+        res = tensor_search.bulk_search(BulkSearchQuery(queries=queries), marqo_config=mock.MagicMock(), device="cpu")
+        assert [len(result["hits"]) for result in res["result"]] == [10, 10]
+        assert [next(iter(search["query"]["nested"]["query"]["knn"].values()))["k"]
+                for search in self.searches] == [10, 300]
+
+        queries = [{"index": self.index_name, "q": "query 0", "searchMethod": "LEXICAL",
+                    "knnParameters": {NsFields.knn_ef_search: 300}}]
+        with self.assertRaises(InvalidArgError):
+            tensor_search.bulk_search(BulkSearchQuery(queries=queries), marqo_config=mock.MagicMock(), device="cpu")
+
+    def test_over_fetch_fills_filtered_pages(self):
+        _, page_fill, _ = self._recall(colour="red")
+        # 1 in 5 docs is red, so a shortlist of 10 chunks has about 2 red docs
+        assert page_fill < 0.5
+        _, page_fill, _ = self._recall(knn_parameters={NsFields.knn_over_fetch: 20}, colour="red")
+        assert page_fill == 1
+
+    def test_benchmark(self):
+        """Reports the recall@10 against a brute-force search, and the median latency of each setting.
+        The stub's latency barely depends on k. TestKnnParametersBenchmark measures Marqo-OS's."""
+        settings = [None] + [{NsFields.knn_ef_search: ef_search} for ef_search in [20, 50, 100, 200, 500, 1000]]
+        recalls = dict()
+        for colour in [None, "red"]:
+            for knn_parameters in settings:
+                if colour is not None:
+                    knn_parameters = {**(knn_parameters or {}), NsFields.knn_over_fetch: len(self.colours)}
+                recall, page_fill, latency = self._recall(knn_parameters=knn_parameters, colour=colour)
+                recalls[(colour, json.dumps(knn_parameters))] = recall
+                print(f"filter={colour} knn_parameters={knn_parameters}: recall@10 {recall:.3f}, "
+                      f"page fill {page_fill:.2f}, p50 {latency:.2f}ms")
+            colour_recalls = [recall for (c, _), recall in recalls.items() if c == colour]
+            # a larger ef_search never loses recall
+            assert colour_recalls == sorted(colour_recalls)
+            assert colour_recalls[-1] > colour_recalls[0]
+
+
+@pytest.mark.largemodel
+class TestKnnParametersBenchmark(MarqoTestCase):
+    """Reports the recall@10 of tensor searches against a brute-force search over the index's
+    vectors, and their latency, for several knn parameters. Needs Marqo-OS. Run with
+    `pytest --largemodel -s`."""
+
+    index_name = "my-test-knn-parameters-benchmark-index"
+    colours = ["red", "green", "blue", "yellow", "purple"]
+
+    def setUp(self) -> None:
+        try:
+            tensor_search.delete_index(config=self.config, index_name=self.index_name)
+        except IndexNotFoundError:
+            pass
+        topics = ["cats", "dogs", "birds", "cars", "boats", "trains", "music", "films", "food", "sport"]
+        docs = [{"_id": str(i), "title": f"a story about {topics[i % 10]} and {topics[(i * 7) % 10]}, number {i}",
+                 "colour": self.colours[i % len(self.colours)]} for i in range(2000)]
+        tensor_search.add_documents(config=self.config, index_name=self.index_name, docs=docs,
+                                    auto_refresh=True, non_tensor_fields=["colour"])
+        doc_ids = [doc["_id"] for doc in docs]
+        results = []
+        for i in range(0, len(doc_ids), 500):
+            results += tensor_search.get_documents_by_ids(
+                config=self.config, index_name=self.index_name, document_ids=doc_ids[i:i + 500],
+                show_vectors=True)["results"]
+        self.doc_ids = np.array([res["_id"] for res in results])
+        self.doc_colours = np.array([res["colour"] for res in results])
+        self.doc_vectors = np.array([res[TensorField.tensor_facets][0][TensorField.embedding] for res in results])
+        self.queries = [f"{topic} {other}" for topic in topics for other in ["stories", "news"]]
+
+    def tearDown(self) -> None:
+        tensor_search.delete_index(config=self.config, index_name=self.index_name)
+
+    def _reference_ids(self, query: str, colour: str = None) -> set:
+        index_info = tensor_search.get_index_info(config=self.config, index_name=self.index_name)
+        query_vector = s2_inference.vectorise(model_name=index_info.model_name, content=[query],
+                                              device=self.config.indexing_device, normalize_embeddings=True)[0]
+        scores = self.doc_vectors @ np.asarray(query_vector)
+        if colour is not None:
+            scores = np.where(self.doc_colours == colour, scores, -np.inf)
+        return set(self.doc_ids[np.argsort(-scores)[:10]])
+
+    def test_recall_against_latency(self):
+        for colour in [None, "red"]:
+            references = {query: self._reference_ids(query, colour) for query in self.queries}
+            for knn_parameters in [None, {"ef_search": 50}, {"ef_search": 100}, {"ef_search": 500},
+                                   {"over_fetch": 5}, {"ef_search": 500, "over_fetch": 5}]:
+                recalls, page_fills, timings = [], [], []
+                for query in self.queries:
+                    t0 = time.perf_counter()
+                    res = tensor_search.search(
+                        config=self.config, index_name=self.index_name, text=query, result_count=10,
+                        knn_parameters=knn_parameters, filter=None if colour is None else f"colour:({colour})")
+                    timings.append(time.perf_counter() - t0)
+                    ids = {hit["_id"] for hit in res["hits"]}
+                    recalls.append(len(ids & references[query]) / 10)
+                    page_fills.append(len(ids) / 10)
+                print(f"filter={colour} knn_parameters={knn_parameters}: recall@10 {np.mean(recalls):.3f}, "
+                      f"page fill {np.mean(page_fills):.2f}, p50 {np.percentile(timings, 50) * 1000:.1f}ms, "
+                      f"p95 {np.percentile(timings, 95) * 1000:.1f}ms")
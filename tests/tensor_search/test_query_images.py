@@ -0,0 +1,274 @@
+import os
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from timeit import default_timer as timer
+from unittest import mock
+
+import numpy as np
+import requests
+from PIL import Image, UnidentifiedImageError
+
+from marqo import errors
+from marqo.s2_inference import clip_utils
+from marqo.s2_inference.errors import VectoriseError
+from marqo.tensor_search import inference_executor, tensor_search, query_images, validation
+from marqo.tensor_search.enums import EnvVars
+from marqo.tensor_search.models.api_models import BulkSearchQueryEntity
+from marqo.tensor_search.models.search import VectorisedJobs
+
+URL_A = "https://example.com/a.png"
+URL_B = "https://example.com/b.png"
+
+
+class TestQueryImages(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.lock = threading.Lock()
+        self.downloads = []
+        self.vectorised = []
+        self.download_seconds = 0.1
+        self.failing_urls = set()
+        query_images.empty_vector_cache()
+        self.patches = [
+            mock.patch.object(query_images.clip_utils, "load_image_from_path", side_effect=self._load_image),
+            mock.patch.object(query_images.s2_inference, "vectorise", side_effect=self._vectorise),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self) -> None:
+        for patch in self.patches:
+            patch.stop()
+        query_images.empty_vector_cache()
+
+    def _load_image(self, image_path, image_download_headers, timeout=3, deadline=None):
+        with self.lock:
+            self.downloads.append((image_path, timeout, deadline))
+        time.sleep(self.download_seconds)
+        if image_path in self.failing_urls:
+            raise UnidentifiedImageError(f"image url `{image_path}` returned 404")
+        # the colour identifies the url
+        return Image.new("RGB", (2, 2), color=(len(image_path), 0, 0))
+
+    def _vectorise(self, model_name, content, model_properties=None, device="cpu",
+                   normalize_embeddings=True, as_numpy=False, **kwargs):
+        with self.lock:
+            self.vectorised.append(content)
+        return np.array([[image.getpixel((0, 0))[0], 1.0] for image in content], dtype=np.float32)
+
+    def _vectorise_images(self, images, **kwargs):
+        return query_images.vectorise_query_images(
+            model_name="ViT-B/32", model_properties={"dimensions": 2}, images=images, device="cpu",
+            normalize_embeddings=True, **kwargs)
+
+    def test_concurrent_queries_share_download_and_vector(self):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda _: self._vectorise_images([URL_A]), range(8)))
+        assert len(self.downloads) == 1
+        assert len(self.vectorised) == 1
+        for result in results:
+            np.testing.assert_array_equal(result[URL_A], [len(URL_A), 1.0])
+        # nothing is left in flight, so a later query downloads the image again
+        assert query_images._in_flight == {}
+        self._vectorise_images([URL_A])
+        assert len(self.downloads) == 2
+
+    def test_downloads_dont_take_a_device_slot(self):
+        self.download_seconds = 0.3
+        with mock.patch.dict(inference_executor._device_slots, clear=True), \
+                mock.patch.dict(os.environ, {EnvVars.MARQO_MAX_CONCURRENT_CPU_INFERENCE: "1"}), \
+                mock.patch.object(inference_executor, "run_on_device",
+                                  wraps=inference_executor.run_on_device) as mock_run_on_device:
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                searches = [executor.submit(self._vectorise_images, [URL_A]) for _ in range(3)]
+                time.sleep(0.05)
+                # other inference on the device isn't held up by the download
+                start = timer()
+                assert inference_executor.run_on_device("cpu", lambda: "other inference") == "other inference"
+                assert timer() - start < 0.1
+                results = [search.result() for search in searches]
+        # the searches share the download and the vector
+        assert len(self.downloads) == 1 and len(self.vectorised) == 1
+        assert all(URL_A in result for result in results)
+        assert [call.args[0] for call in mock_run_on_device.call_args_list] == ["cpu", "cpu"]
+
+    def test_different_headers_arent_shared(self):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            list(executor.map(lambda headers: self._vectorise_images([URL_A], image_download_headers=headers),
+                              [{"Authorization": "a"}, {"Authorization": "b"}]))
+        assert len(self.downloads) == 2
+
+    def test_images_of_a_query_are_vectorised_together(self):
+        start = timer()
+        result = self._vectorise_images([URL_A, URL_B])
+        # downloaded concurrently
+        assert timer() - start < 2 * self.download_seconds
+        assert len(self.vectorised) == 1 and len(self.vectorised[0]) == 2
+        assert set(result) == {URL_A, URL_B}
+
+    def test_download_deadline(self):
+        with mock.patch.dict(os.environ, {EnvVars.MARQO_QUERY_IMAGE_DOWNLOAD_TIMEOUT_MS: "2000"}):
+            before = time.monotonic()
+            self._vectorise_images([URL_A])
+            self._vectorise_images([URL_B], download_timeout_ms=500)
+        (_, timeout_a, deadline_a), (_, timeout_b, deadline_b) = self.downloads
+        assert 1.5 < deadline_a - before <= 2.5 and timeout_a <= 2
+        assert deadline_b - deadline_a < 0 and timeout_b <= 0.5
+
+    def test_follower_stops_waiting_at_its_deadline(self):
+        self.download_seconds = 0.5
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            leader = executor.submit(self._vectorise_images, [URL_A])
+            time.sleep(0.05)
+            start = timer()
+            with self.assertRaises(VectoriseError) as e:
+                self._vectorise_images([URL_A], download_timeout_ms=50)
+            assert timer() - start < 0.3
+            assert "timeout of 50ms" in str(e.exception)
+            # the leader isn't affected
+            assert URL_A in leader.result()
+        assert len(self.downloads) == 1
+
+    def test_failed_download_fails_every_query_of_the_image(self):
+        self.failing_urls = {URL_A}
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(self._vectorise_images, [URL_A]) for _ in range(4)]
+        for future in futures:
+            with self.assertRaises(VectoriseError) as e:
+                future.result()
+            assert "404" in str(e.exception)
+        assert len(self.downloads) == 1
+        assert self.vectorised == []
+        assert query_images._in_flight == {}
+
+    def test_vector_cache(self):
+        # off by default
+        self._vectorise_images([URL_A])
+        self._vectorise_images([URL_A])
+        assert len(self.downloads) == 2
+
+        urls = [f"https://example.com/{i}.png" for i in range(3)]
+        with mock.patch.dict(os.environ, {EnvVars.MARQO_QUERY_IMAGE_VECTOR_CACHE_SIZE: "2"}):
+            self._vectorise_images(urls[:2])
+            cached = self._vectorise_images(urls[:2])
+            assert len(self.downloads) == 4
+            np.testing.assert_array_equal(cached[urls[0]], [len(urls[0]), 1.0])
+            # urls[0] was used more recently than urls[1], so urls[1] is evicted
+            self._vectorise_images([urls[0]])
+            self._vectorise_images([urls[2]])
+            self._vectorise_images([urls[0], urls[1]])
+        assert [url for url, _, _ in self.downloads[4:]] == [urls[2], urls[1]]
+
+    def test_invalid_env_vars(self):
+        for env_var, value in [(EnvVars.MARQO_QUERY_IMAGE_VECTOR_CACHE_SIZE, "-1"),
+                               (EnvVars.MARQO_QUERY_IMAGE_VECTOR_CACHE_SIZE, "some"),
+                               (EnvVars.MARQO_QUERY_IMAGE_DOWNLOAD_TIMEOUT_MS, "0")]:
+            with mock.patch.dict(os.environ, {env_var: value}):
+                with self.assertRaises(errors.ConfigurationError):
+                    self._vectorise_images([URL_A])
+
+    def test_benchmark(self):
+        """Concurrent searches for the same image. Run with `pytest -s` to see the timings."""
+        self.download_seconds = 0.05
+        n_searches = 16
+        with ThreadPoolExecutor(max_workers=n_searches) as executor:
+            start = timer()
+            list(executor.map(lambda _: self._vectorise_images([URL_A]), range(n_searches)))
+            shared = timer() - start
+        downloads = len(self.downloads)
+        print(f"\n{n_searches} concurrent searches for one image: {downloads} download(s), "
+              f"{len(self.vectorised)} vectorise call(s), {shared:.3f}s")
+        assert downloads == 1
+
+
+class TestQueryImagesInSearch(unittest.TestCase):
+
+    def test_bulk_image_jobs_use_query_images(self):
+        jobs = [
+            VectorisedJobs(model_name="ViT-B/32", model_properties={}, content=[URL_A], device="cpu",
+                           normalize_embeddings=True, image_download_headers=None, content_type="image",
+                           image_download_timeout_ms=200),
+            VectorisedJobs(model_name="ViT-B/32", model_properties={}, content=["a dog"], device="cpu",
+                           normalize_embeddings=True, image_download_headers=None, content_type="text"),
+        ]
+        with mock.patch.object(tensor_search.query_images, "vectorise_query_images",
+                               return_value={URL_A: np.ones(2)}) as mock_images, \
+                mock.patch.object(tensor_search.s2_inference, "vectorise",
+                                  return_value=np.zeros((1, 2))) as mock_vectorise:
+            result = tensor_search.vectorise_jobs(jobs)
+        assert mock_images.call_args.kwargs["download_timeout_ms"] == 200
+        assert mock_images.call_args.kwargs["images"] == [URL_A]
+        assert mock_vectorise.call_args.kwargs["content"] == ["a dog"]
+        np.testing.assert_array_equal(result[jobs[0].groupby_key()][URL_A], np.ones(2))
+
+    def test_bulk_image_timeout_is_an_invalid_arg(self):
+        job = VectorisedJobs(model_name="ViT-B/32", model_properties={}, content=[URL_A], device="cpu",
+                             normalize_embeddings=True, image_download_headers=None, content_type="image")
+        with mock.patch.object(tensor_search.query_images, "vectorise_query_images",
+                               side_effect=VectoriseError("timed out")):
+            result = tensor_search.vectorise_jobs([job], raise_on_error=False)
+            with self.assertRaises(errors.InvalidArgError):
+                tensor_search.vectorise_jobs([job])
+        assert isinstance(result[job.groupby_key()], errors.InvalidArgError)
+
+    def test_validate_image_download_timeout_ms(self):
+        assert validation.validate_image_download_timeout_ms(None) is None
+        assert validation.validate_image_download_timeout_ms(100) == 100
+        for invalid in [0, -5, 1.5, True, "100"]:
+            with self.assertRaises(errors.InvalidArgError):
+                validation.validate_image_download_timeout_ms(invalid)
+        with self.assertRaises(errors.InvalidArgError):
+            validation.validate_bulk_query_input(
+                BulkSearchQueryEntity(index="my-index", q="a dog", imageDownloadTimeoutMs=-1))
+
+    def test_validate_image_download_timeout_ms_max(self):
+        assert validation.validate_image_download_timeout_ms(30000) == 30000
+        with self.assertRaises(errors.InvalidArgError):
+            validation.validate_image_download_timeout_ms(30001)
+        with mock.patch.dict(os.environ, {EnvVars.MARQO_MAX_QUERY_IMAGE_DOWNLOAD_TIMEOUT_MS: "500"}):
+            assert validation.validate_image_download_timeout_ms(500) == 500
+            with self.assertRaises(errors.InvalidArgError):
+                validation.validate_image_download_timeout_ms(501)
+            with self.assertRaises(errors.InvalidArgError):
+                validation.validate_bulk_query_input(
+                    BulkSearchQueryEntity(index="my-index", q="a dog", imageDownloadTimeoutMs=1000))
+
+
+class TestLoadImageDeadline(unittest.TestCase):
+
+    def test_passed_deadline_isnt_downloaded(self):
+        with mock.patch.object(clip_utils.requests, "get") as mock_get:
+            with self.assertRaises(UnidentifiedImageError):
+                clip_utils.load_image_from_path(URL_A, {}, deadline=time.monotonic() - 1)
+        mock_get.assert_not_called()
+
+    def test_timeout_is_bounded_by_deadline(self):
+        response = mock.MagicMock(ok=True)
+        response.iter_content.return_value = [b"not", b"an image"]
+        with mock.patch.object(clip_utils.requests, "get", return_value=response) as mock_get:
+            with self.assertRaises(UnidentifiedImageError):
+                clip_utils.load_image_from_path(URL_A, {}, timeout=3, deadline=time.monotonic() + 0.5)
+        assert mock_get.call_args.kwargs["timeout"] <= 0.5
+        response.close.assert_called_once()
+
+    def test_slow_body_misses_deadline(self):
+        def slow_body(chunk_size):
+            yield b"x" * 10
+            time.sleep(0.2)
+            yield b"x" * 10
+
+        response = mock.MagicMock(ok=True)
+        response.iter_content.side_effect = slow_body
+        with mock.patch.object(clip_utils.requests, "get", return_value=response):
+            with self.assertRaises(UnidentifiedImageError) as e:
+                clip_utils.load_image_from_path(URL_A, {}, deadline=time.monotonic() + 0.1)
+        assert "deadline" in str(e.exception)
+
+    def test_read_errors_are_unidentified_images(self):
+        response = mock.MagicMock(ok=True)
+        response.iter_content.side_effect = requests.exceptions.ChunkedEncodingError()
+        with mock.patch.object(clip_utils.requests, "get", return_value=response):
+            with self.assertRaises(UnidentifiedImageError):
+                clip_utils.load_image_from_path(URL_A, {}, deadline=time.monotonic() + 1)
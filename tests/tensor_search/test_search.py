@@ -1,4 +1,6 @@
+import json
 import math
+import unittest
 from unittest import mock
 from marqo.s2_inference.s2_inference import vectorise
 import numpy as np
@@ -963,62 +965,29 @@ class TestVectorSearch(MarqoTestCase):
 
         assert run()
 
-    def test_pagination_multi_field_error(self):
-        # Try pagination with 0, 2, and 3 fields
-        # To be removed when multi-field pagination is added.
-        docs = [
-            {
-                "field_a": 0,
-                "field_b": 0, 
-                "field_c": 0
-            },
-            {
-                "field_a": 1,
-                "field_b": 1, 
-                "field_c": 1
-            }
-        ]
-
+    def test_pagination_multi_field(self):
+        docs = [{"_id": str(i), "field_a": f"a {i}", "field_b": f"b {10 - i}", "field_c": f"c {i % 3}"}
+                for i in range(10)]
         tensor_search.add_documents(
             config=self.config, index_name=self.index_name_1,
             docs=docs, auto_refresh=False
         )
-
         tensor_search.refresh_index(config=self.config, index_name=self.index_name_1)
 
         for search_method in (SearchMethod.LEXICAL, SearchMethod.TENSOR):
-            try:
-                tensor_search.search(text=" ",
-                                    index_name=self.index_name_1, 
-                                    config=self.config, 
-                                    offset=1,
-                                    searchable_attributes=["field_a", "field_b"],
-                                    search_method=search_method)
-                raise AssertionError
-            except InvalidArgError:
-                pass
-        
-            try:
-                tensor_search.search(text=" ",
-                                    index_name=self.index_name_1, 
-                                    config=self.config, 
-                                    offset=1,
-                                    search_method=search_method)
-                raise AssertionError
-            except InvalidArgError:
-                pass
-            
-            try:
-                tensor_search.search(text=" ",
-                                    index_name=self.index_name_1, 
-                                    config=self.config, 
-                                    offset=1,
-                                    searchable_attributes=[],
-                                    search_method=search_method)
-                raise AssertionError
-            except InvalidArgError:
-                pass
-    
+            for searchable_attributes in (["field_a", "field_b"], None):
+                full = tensor_search.search(text="a 3", index_name=self.index_name_1, config=self.config,
+                                            result_count=10, searchable_attributes=searchable_attributes,
+                                            search_method=search_method)
+                paginated_ids = []
+                for offset in range(0, 10, 3):
+                    page = tensor_search.search(text="a 3", index_name=self.index_name_1, config=self.config,
+                                                result_count=3, offset=offset,
+                                                searchable_attributes=searchable_attributes,
+                                                search_method=search_method)
+                    paginated_ids.extend(hit["_id"] for hit in page["hits"])
+                assert paginated_ids == [hit["_id"] for hit in full["hits"]]
+
     def test_image_search_highlights(self):
         """does the URL get returned as the highlight? (it should - because no rerankers are being used)"""
         settings = {
@@ -1332,3 +1301,95 @@ class TestVectorSearch(MarqoTestCase):
             highlight_field = list(hit['_highlights'].keys())[0]
             assert highlight_field in original_doc
             assert hit[highlight_field] == original_doc[highlight_field]
+
+
+class TestMultiFieldPaginationMocked(unittest.TestCase):
+    """Pagination of tensor searches over several fields, against a mocked Marqo-OS where each
+    field ranks the docs differently"""
+
+    index_name = "my-index"
+
+    def setUp(self) -> None:
+        from marqo.tensor_search import configs
+        from marqo.tensor_search.models.index_info import IndexInfo
+        index_info = IndexInfo(
+            model_name="hf/all_datasets_v4_MiniLM-L6",
+            properties={
+                "title": {"type": "text"}, "desc": {"type": "text"},
+                TensorField.chunks: {"type": "nested", "properties": {
+                    f"{TensorField.vector_prefix}title": {"type": "knn_vector"},
+                    f"{TensorField.vector_prefix}desc": {"type": "knn_vector"},
+                }}
+            },
+            index_settings=configs.get_default_index_settings())
+        # the best docs of each field, best first
+        self.field_rankings = {
+            "title": [(f"doc-{i}", 1 - i / 20) for i in range(0, 20, 2)],
+            "desc": [(f"doc-{i}", 0.975 - i / 20) for i in range(1, 20, 2)] + [("doc-0", 0.1)],
+        }
+        self.searches = []
+
+        mock_http = mock.MagicMock()
+        mock_http.return_value.get.side_effect = self._fake_get
+        self.patches = [
+            mock.patch.object(tensor_search, "HttpRequests", mock_http),
+            mock.patch.object(tensor_search, "get_index_info", return_value=index_info),
+            mock.patch.object(index_meta_cache, "get_index_info", return_value=index_info),
+            mock.patch.object(index_meta_cache, "get_cache", return_value={self.index_name: index_info}),
+            mock.patch.object(index_meta_cache, "refresh_index_info_on_interval"),
+            mock.patch.object(tensor_search.s2_inference, "vectorise", side_effect=lambda content, **kwargs:
+                              np.ones((len(content), 384), dtype=np.float32)),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self) -> None:
+        for patch in self.patches:
+            patch.stop()
+
+    def _fake_get(self, path, body=None):
+        searches = [json.loads(line) for line in body.splitlines() if line][1::2]
+        self.searches.extend(searches)
+        responses = []
+        for search in searches:
+            knn_field = next(iter(search["query"]["nested"]["query"]["knn"]))
+            field = knn_field.split(TensorField.vector_prefix)[1]
+            hits = self.field_rankings[field][search["from"]:search["from"] + search["size"]]
+            responses.append({"took": 1, "hits": {"hits": [{
+                "_id": _id, "_score": score, "_source": {field: f"{field} of {_id}"},
+                "inner_hits": {TensorField.chunks: {"hits": {"hits": [{"_score": score, "_source": {
+                    TensorField.field_name: field, TensorField.field_content: f"{field} of {_id}"}}]}}}
+            } for _id, score in hits]}})
+        return {"took": 1, "responses": responses}
+
+    def _search(self, **kwargs) -> dict:
+        return tensor_search.search(config=mock.MagicMock(), index_name=self.index_name, text="a query", **kwargs)
+
+    def test_pages_match_the_merged_ranking(self):
+        full_ids = [hit["_id"] for hit in self._search(result_count=20)["hits"]]
+        assert full_ids == [f"doc-{i}" for i in range(20)]
+
+        self.searches = []
+        paginated_ids = []
+        for offset in range(0, 20, 3):
+            paginated_ids.extend(hit["_id"] for hit in self._search(result_count=3, offset=offset)["hits"])
+        assert paginated_ids == full_ids
+        # each field's search retrieves the top offset + limit docs
+        assert [(search["from"], search["size"]) for search in self.searches[-2:]] == [(0, 21), (0, 21)]
+        assert self.searches[-1]["query"]["nested"]["query"]["knn"][
+                   f"{TensorField.chunks}.{TensorField.vector_prefix}desc"]["k"] == 21
+
+    def test_single_field_is_paginated_by_marqo_os(self):
+        page = self._search(result_count=3, offset=3, searchable_attributes=["title"])
+        assert [hit["_id"] for hit in page["hits"]] == ["doc-6", "doc-8", "doc-10"]
+        assert [(search["from"], search["size"]) for search in self.searches] == [(3, 3)]
+
+    def test_bulk_search_pages(self):
+        from marqo.tensor_search.models.api_models import BulkSearchQuery
+        res = tensor_search.bulk_search(query=BulkSearchQuery(queries=[
+            {"index": self.index_name, "q": "a query", "limit": 4, "offset": offset} for offset in (0, 4, 8)
+        ] + [{"index": self.index_name, "q": "a query", "limit": 2, "offset": 2, "searchableAttributes": ["desc"]}]),
+            marqo_config=mock.MagicMock(), device="cpu")
+        assert [[hit["_id"] for hit in r["hits"]] for r in res["result"]] == [
+            ["doc-0", "doc-1", "doc-2", "doc-3"], ["doc-4", "doc-5", "doc-6", "doc-7"],
+            ["doc-8", "doc-9", "doc-10", "doc-11"], ["doc-5", "doc-7"]]
@@ -0,0 +1,116 @@
+import json
+import os
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from marqo import errors
+from marqo.tensor_search import serialization, utils
+from marqo.tensor_search.enums import EnvVars, TensorField
+from marqo.tensor_search.web.api_utils import MarqoJSONResponse
+
+
+class TestSerialization(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.obj = {
+            "_id": "1",
+            "a string": "héllo",
+            "an int": 3,
+            "a float": 0.25,
+            "a bool": True,
+            "nothing": None,
+            "a list": [1, "two", 3.5],
+            "nested": {"numpy scalar": np.float32(1.5), "numpy int": np.int64(7)},
+            TensorField.chunks: [{"__vector_a": np.array([0.5, -1.25, 3.0], dtype=np.float32)}],
+        }
+        self.expected = {
+            **self.obj,
+            "nested": {"numpy scalar": 1.5, "numpy int": 7},
+            TensorField.chunks: [{"__vector_a": [0.5, -1.25, 3.0]}],
+        }
+
+    def test_serializers_roundtrip(self):
+        for serializer_cls in serialization.SERIALIZERS.values():
+            serializer = serializer_cls()
+            dumped = serializer.dumps(self.obj)
+            assert isinstance(dumped, bytes)
+            assert json.loads(dumped) == self.expected
+            assert serializer.loads(dumped) == self.expected
+            assert serializer.loads(dumped.decode("utf-8")) == self.expected
+
+    def test_serializers_numpy_edge_cases(self):
+        for serializer_cls in serialization.SERIALIZERS.values():
+            serializer = serializer_cls()
+            # non-contiguous arrays and float64 arrays
+            matrix = np.arange(12, dtype=np.float32).reshape(3, 4)
+            assert json.loads(serializer.dumps({"v": matrix[:, 1]})) == {"v": [1.0, 5.0, 9.0]}
+            assert json.loads(serializer.dumps({"v": np.array([0.5, 1.0])})) == {"v": [0.5, 1.0]}
+            # int keys are written as strings, like json.dumps does
+            assert json.loads(serializer.dumps({1: "a"})) == {"1": "a"}
+            with self.assertRaises(TypeError):
+                serializer.dumps({"a set": {1, 2}})
+
+    def test_get_serializer(self):
+        for name, serializer_cls in serialization.SERIALIZERS.items():
+            with mock.patch.dict(os.environ, {EnvVars.MARQO_JSON_SERIALIZER: name}):
+                assert isinstance(serialization.get_serializer(), serializer_cls)
+                assert serialization.get_serializer() is serialization.get_serializer()
+                assert json.loads(serialization.dumps(self.obj)) == self.expected
+
+    def test_get_serializer_unknown(self):
+        with mock.patch.dict(os.environ, {EnvVars.MARQO_JSON_SERIALIZER: "yaml"}):
+            with self.assertRaises(errors.ConfigurationError):
+                serialization.get_serializer()
+
+    @mock.patch("marqo.tensor_search.serialization.orjson", None)
+    @mock.patch("marqo.tensor_search.serialization._loaded_serializers", dict())
+    def test_get_serializer_orjson_not_installed(self):
+        with mock.patch.dict(os.environ, {EnvVars.MARQO_JSON_SERIALIZER: "orjson"}):
+            assert isinstance(serialization.get_serializer(), serialization.StdlibJsonSerializer)
+
+    def test_marqo_json_response(self):
+        response = MarqoJSONResponse({"hits": [{"_score": np.float32(0.5), "_id": "1"}]})
+        assert response.media_type == "application/json"
+        assert json.loads(response.body) == {"hits": [{"_score": 0.5, "_id": "1"}]}
+
+
+class TestSerializationBenchmark(unittest.TestCase):
+    """Compares the serializers on a _bulk body of 1,000 docs with 768-dim vectors.
+    Run with `pytest -s` to see the report."""
+
+    def test_bulk_body_benchmark(self):
+        n_docs, n_dims, n_runs = 1000, 768, 3
+        vectors = np.random.rand(n_docs, n_dims).astype(np.float32)
+        bulk_parent_dicts = []
+        for i, vector in enumerate(vectors):
+            bulk_parent_dicts.append({"index": {"_index": "my-index", "_id": str(i)}})
+            bulk_parent_dicts.append({
+                "_id": str(i), "title": f"document number {i}",
+                TensorField.chunks: [{"__vector_title": vector, "__field_name": "title",
+                                      "__field_content": f"document number {i}"}]
+            })
+        as_lists = json.loads(serialization.StdlibJsonSerializer().dumps(bulk_parent_dicts))
+
+        timings = dict()
+        # the previous behaviour: vectors as python lists, written with json.dumps
+        t0 = time.perf_counter()
+        for _ in range(n_runs):
+            "".join(["\n" + json.dumps(d) for d in as_lists])
+        timings["json, vectors as lists"] = (time.perf_counter() - t0) / n_runs
+
+        for name in serialization.SERIALIZERS:
+            with mock.patch.dict(os.environ, {EnvVars.MARQO_JSON_SERIALIZER: name}):
+                t0 = time.perf_counter()
+                for _ in range(n_runs):
+                    body = utils.dicts_to_jsonl(bulk_parent_dicts)
+                timings[f"{name}, vectors as float32 arrays"] = (time.perf_counter() - t0) / n_runs
+                lines = [json.loads(line) for line in body.splitlines() if line]
+                assert len(lines) == 2 * n_docs
+                np.testing.assert_allclose(lines[1][TensorField.chunks][0]["__vector_title"], vectors[0])
+
+        print(f"\n_bulk body with {n_docs} docs x {n_dims} dims:")
+        for name, timing in timings.items():
+            print(f"    {name}: {timing * 1000:.1f}ms")
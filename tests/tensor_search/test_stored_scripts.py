@@ -0,0 +1,168 @@
+import threading
+import unittest
+from unittest import mock
+
+from marqo.config import Config
+from marqo.tensor_search import stored_scripts, tensor_search
+from marqo.tensor_search.enums import TensorField
+
+
+class TestStoredScripts(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.config = Config(url="http://localhost:9200")
+        self.mock_put = mock.MagicMock(return_value={"acknowledged": True})
+        self.patches = [
+            mock.patch("marqo._httprequests.HttpRequests.put", self.mock_put),
+            mock.patch("marqo.tensor_search.stored_scripts._stored_scripts", set()),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self) -> None:
+        for patch in self.patches:
+            patch.stop()
+
+    def test_script_ids(self):
+        scripts = [stored_scripts.UPDATE_DOC_SCRIPT, stored_scripts.SCORE_MODIFIERS_SCRIPT]
+        assert len({script.id for script in scripts}) == len(scripts)
+        for script in scripts:
+            assert script.id.startswith(f"marqo__{script.name}__")
+            assert script.to_body() == {"script": {"lang": "painless", "source": script.source}}
+        # the id changes with the source
+        changed = stored_scripts.StoredScript(name="update_doc", source=stored_scripts.UPDATE_DOC_SCRIPT.source + " ")
+        assert changed.id != stored_scripts.UPDATE_DOC_SCRIPT.id
+
+    def test_update_doc_script_per_filterable_fields(self):
+        assert stored_scripts.get_update_doc_script(None) is stored_scripts.UPDATE_DOC_SCRIPT
+        assert "def filterable_fields = null;" in stored_scripts.UPDATE_DOC_SCRIPT.source
+        script = stored_scripts.get_update_doc_script(frozenset({"colour", 'a "quoted" \\ field'}))
+        assert script.name == "update_doc"
+        assert 'def filterable_fields = ["a \\"quoted\\" \\\\ field", "colour"];' in script.source
+        # each set of filterable fields has its own script, which is only built once
+        assert script is stored_scripts.get_update_doc_script(frozenset({'a "quoted" \\ field', "colour"}))
+        assert len({script.id, stored_scripts.UPDATE_DOC_SCRIPT.id,
+                    stored_scripts.get_update_doc_script(frozenset({"colour"})).id}) == 3
+
+    def test_get_script_id_stores_script_once(self):
+        script = stored_scripts.SCORE_MODIFIERS_SCRIPT
+        threads = [threading.Thread(target=stored_scripts.get_script_id,
+                                    kwargs={"config": self.config, "script": script}) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert stored_scripts.get_script_id(config=self.config, script=script) == script.id
+        self.mock_put.assert_called_once_with(path=f"_scripts/{script.id}", body=script.to_body())
+
+        # each Marqo-OS cluster gets its own copy
+        stored_scripts.get_script_id(config=Config(url="http://other-host:9200"), script=script)
+        assert self.mock_put.call_count == 2
+
+    def test_get_script_id_retries_after_error(self):
+        self.mock_put.side_effect = [RuntimeError("Marqo-OS is down"), {"acknowledged": True}]
+        script = stored_scripts.UPDATE_DOC_SCRIPT
+        with self.assertRaises(RuntimeError):
+            stored_scripts.get_script_id(config=self.config, script=script)
+        assert stored_scripts.get_script_id(config=self.config, script=script) == script.id
+        assert self.mock_put.call_count == 2
+
+    def test_convert_validated_score_modifiers_to_script_params(self):
+        params = tensor_search.convert_validated_score_modifiers_to_script_params({
+            "multiply_score_by": [{"field_name": "reputation", "weight": 1.5}, {"field_name": "rate"}],
+            "add_to_score": [{"field_name": "popularity", "weight": -2}]
+        })
+        assert params == {
+            "multiply_score_by": [{"field": f"{TensorField.chunks}.reputation", "weight": 1.5},
+                                  {"field": f"{TensorField.chunks}.rate", "weight": 1}],
+            "add_to_score": [{"field": f"{TensorField.chunks}.popularity", "weight": -2}]
+        }
+        assert tensor_search.convert_validated_score_modifiers_to_script_params({"add_to_score": []}) == {
+            "multiply_score_by": [], "add_to_score": []}
+
+    def test_score_modifiers_query_references_stored_script(self):
+        script_score = {"id": stored_scripts.SCORE_MODIFIERS_SCRIPT.id,
+                        "params": {"multiply_score_by": [], "add_to_score": []}}
+        query = tensor_search._create_score_modifiers_tensor_search_query(
+            result_count=3, offset=0, vector_field="__vector_a", vectorised_text=[0.5], script_score=script_score)
+        functions = query["query"]["function_score"]["query"]["nested"]["query"]["function_score"]["functions"]
+        assert functions == [{"script_score": {"script": script_score}}]
+
+    def _missing_script_error(self, script: stored_scripts.StoredScript) -> dict:
+        reason = f"unable to find script [{script.id}] in cluster state"
+        return {"root_cause": [{"type": "resource_not_found_exception", "reason": reason}],
+                "type": "resource_not_found_exception", "reason": reason}
+
+    def test_retry_if_script_missing(self):
+        script = stored_scripts.SCORE_MODIFIERS_SCRIPT
+        stored_scripts.get_script_id(config=self.config, script=script)
+        send = mock.MagicMock(side_effect=["missing", "found"])
+        response = stored_scripts.retry_if_script_missing(
+            config=self.config, script=script, send=send, is_missing=lambda r: r == "missing")
+        assert response == "found"
+        # stored again, even though this process had stored it before
+        assert self.mock_put.call_count == 2
+
+        # only retried once
+        send = mock.MagicMock(side_effect=["missing", "missing"])
+        assert stored_scripts.retry_if_script_missing(
+            config=self.config, script=script, send=send, is_missing=lambda r: r == "missing") == "missing"
+        assert send.call_count == 2
+
+        # raised errors are retried if they are about the missing script
+        send = mock.MagicMock(side_effect=[RuntimeError(str(self._missing_script_error(script))), "found"])
+        assert stored_scripts.retry_if_script_missing(
+            config=self.config, script=script, send=send, is_missing=lambda r: False) == "found"
+        send = mock.MagicMock(side_effect=RuntimeError("Marqo-OS is down"))
+        with self.assertRaises(RuntimeError):
+            stored_scripts.retry_if_script_missing(
+                config=self.config, script=script, send=send, is_missing=lambda r: False)
+        assert send.call_count == 1
+
+    def test_tensor_msearch_stores_lost_score_modifiers_script(self):
+        script = stored_scripts.SCORE_MODIFIERS_SCRIPT
+        stored_scripts.get_script_id(config=self.config, script=script)
+        ok = {"took": 1, "responses": [{"took": 1, "hits": {"hits": []}}]}
+        lost = {"took": 1, "responses": [{"error": self._missing_script_error(script), "status": 404}]}
+        with mock.patch("marqo._httprequests.HttpRequests.get", side_effect=[lost, ok]) as mock_get:
+            response = tensor_search._send_tensor_msearch(config=self.config, index_name="my-index", body=[{}])
+        assert response == ok
+        assert mock_get.call_count == 2
+        assert self.mock_put.call_count == 2
+        assert self.mock_put.call_args.kwargs == {"path": f"_scripts/{script.id}", "body": script.to_body()}
+
+        # other errors aren't retried
+        failed = {"took": 1, "responses": [{"error": {"type": "parse_exception"}, "status": 400}]}
+        with mock.patch("marqo._httprequests.HttpRequests.get", return_value=failed) as mock_get:
+            assert tensor_search._send_tensor_msearch(config=self.config, index_name="my-index", body=[{}]) == failed
+        assert mock_get.call_count == 1
+
+    def test_update_bulk_stores_lost_update_script(self):
+        script = stored_scripts.UPDATE_DOC_SCRIPT
+        stored_scripts.get_script_id(config=self.config, script=script)
+        actions = [[{"update": {"_id": str(i)}}, {"script": {"id": script.id}}] for i in range(3)]
+        response = {"took": 5, "errors": True, "items": [
+            {"update": {"_id": "0", "status": 404, "error": self._missing_script_error(script)}},
+            {"update": {"_id": "1", "status": 200, "result": "updated"}},
+            {"update": {"_id": "2", "status": 404, "error": self._missing_script_error(script)}},
+        ]}
+        retried = {"took": 2, "errors": False, "items": [
+            {"update": {"_id": "0", "status": 200, "result": "updated"}},
+            {"update": {"_id": "2", "status": 200, "result": "updated"}},
+        ]}
+        with mock.patch.object(tensor_search.bulk, "send_bulk", return_value=retried) as mock_send_bulk:
+            merged = tensor_search._retry_updates_missing_script(
+                config=self.config, script=script, actions=actions, response=response)
+        mock_send_bulk.assert_called_once_with(config=self.config, actions=[actions[0], actions[2]])
+        assert self.mock_put.call_count == 2
+        assert merged["errors"] is False
+        assert [item["update"]["_id"] for item in merged["items"]] == ["0", "1", "2"]
+        assert all(item["update"]["status"] == 200 for item in merged["items"])
+
+        # nothing is retried if no update lost its script
+        other_error = {"took": 5, "errors": True, "items": [
+            {"update": {"_id": "0", "status": 400, "error": {"type": "mapper_parsing_exception"}}}]}
+        with mock.patch.object(tensor_search.bulk, "send_bulk") as mock_send_bulk:
+            assert tensor_search._retry_updates_missing_script(
+                config=self.config, script=script, actions=actions[:1], response=other_error) == other_error
+        mock_send_bulk.assert_not_called()
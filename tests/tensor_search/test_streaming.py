@@ -0,0 +1,231 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import tracemalloc
+import unittest
+from timeit import default_timer as timer
+from unittest import mock
+
+import numpy as np
+
+from marqo import errors
+from marqo.tensor_search import tensor_search, configs, index_meta_cache, serialization, streaming
+from marqo.tensor_search.enums import EnvVars, SearchMethod, TensorField
+from marqo.tensor_search.models.index_info import IndexInfo
+from marqo.tensor_search.web.api_utils import MarqoJSONResponse, MarqoNDJSONStreamingResponse
+
+
+class TestStreaming(unittest.TestCase):
+
+    def test_ndjson_chunks(self):
+        items = [{"_id": str(i), "_score": np.float32(0.5)} for i in range(100)]
+        chunks = list(streaming.ndjson_chunks(items, chunk_bytes=200, serializer=serialization.get_serializer()))
+        # every chunk but the last is at least chunk_bytes, and ends with a whole line
+        assert all(len(chunk) >= 200 for chunk in chunks[:-1])
+        assert all(chunk.endswith(b"\n") for chunk in chunks)
+        lines = b"".join(chunks).splitlines()
+        assert [json.loads(line) for line in lines] == [{"_id": str(i), "_score": 0.5} for i in range(100)]
+        assert list(streaming.ndjson_chunks([], chunk_bytes=200, serializer=serialization.get_serializer())) == []
+
+    def test_prefetch_is_bounded(self):
+        produced = []
+
+        def items():
+            for i in range(100):
+                produced.append(i)
+                yield i
+
+        stream = streaming.prefetch(items(), max_buffered=4)
+        assert next(stream) == 0
+        time.sleep(0.1)
+        # the buffer is full, and the producer waits with one more item
+        assert len(produced) <= 1 + 4 + 1
+        assert list(stream) == list(range(1, 100))
+
+    def test_prefetch_raises_errors_in_place(self):
+        def items():
+            yield 1
+            yield 2
+            raise errors.InternalError("Marqo-OS went away")
+
+        stream = streaming.prefetch(items(), max_buffered=1)
+        assert next(stream) == 1
+        assert next(stream) == 2
+        with self.assertRaises(errors.InternalError):
+            next(stream)
+
+    def test_closing_prefetch_stops_the_producer(self):
+        produced = []
+        stopped = threading.Event()
+
+        def items():
+            try:
+                for i in range(1000):
+                    produced.append(i)
+                    yield i
+            finally:
+                stopped.set()
+
+        stream = streaming.prefetch(items(), max_buffered=2)
+        next(stream)
+        stream.close()
+        assert stopped.wait(timeout=2)
+        assert len(produced) < 10
+
+    def test_invalid_env_vars(self):
+        for env_var in [EnvVars.MARQO_STREAM_CHUNK_BYTES, EnvVars.MARQO_STREAM_MAX_BUFFERED_CHUNKS]:
+            with mock.patch.dict(os.environ, {env_var: "0"}):
+                with self.assertRaises(errors.ConfigurationError):
+                    streaming.stream_ndjson([])
+
+    def test_streaming_response(self):
+        hits = ({"_id": str(i), "_score": np.float32(i)} for i in range(3))
+        response = MarqoNDJSONStreamingResponse(hits)
+        assert response.media_type == "application/x-ndjson"
+
+        async def body() -> bytes:
+            return b"".join([chunk async for chunk in response.body_iterator])
+
+        lines = asyncio.run(body()).splitlines()
+        assert [json.loads(line) for line in lines] == [{"_id": str(i), "_score": i} for i in range(3)]
+
+
+class TestStreamingMocked(unittest.TestCase):
+    """Streamed searches and gets, against a stub Marqo-OS"""
+
+    index_name = "my-index"
+    n_docs = 50
+
+    def setUp(self) -> None:
+        self.index_info = IndexInfo(
+            model_name="hf/all_datasets_v4_MiniLM-L6",
+            properties={
+                "title": {"type": "text"},
+                TensorField.chunks: {"type": "nested", "properties": {
+                    f"{TensorField.vector_prefix}title": {"type": "knn_vector"},
+                }}
+            },
+            index_settings=configs.get_default_index_settings())
+        self.mget_bodies = []
+        mock_http = mock.MagicMock()
+        mock_http.return_value.get.side_effect = self._fake_get
+        self.cleaned = []
+        clean_doc = tensor_search._clean_doc
+        self.patches = [
+            mock.patch.object(tensor_search, "HttpRequests", mock_http),
+            mock.patch.object(tensor_search, "get_index_info", side_effect=lambda **kwargs: self.index_info),
+            mock.patch.object(index_meta_cache, "get_index_info", side_effect=lambda **kwargs: self.index_info),
+            mock.patch.object(index_meta_cache, "get_cache", side_effect=lambda: {self.index_name: self.index_info}),
+            mock.patch.object(index_meta_cache, "refresh_index_info_on_interval"),
+            mock.patch.object(tensor_search.s2_inference, "vectorise",
+                              side_effect=lambda content, **kwargs: np.ones((len(content), 4), dtype=np.float32)),
+            mock.patch.object(tensor_search, "_clean_doc",
+                              side_effect=lambda doc, *args, **kwargs: self.cleaned.append(doc) or
+                              clean_doc(doc, *args, **kwargs)),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self) -> None:
+        for patch in self.patches:
+            patch.stop()
+
+    def _source(self, i: int) -> dict:
+        return {"title": f"title of {i}", TensorField.field_hashes: {"title": "hash"}}
+
+    def _fake_get(self, path, body=None):
+        if path.startswith("_mget"):
+            self.mget_bodies.append(body)
+            return {"docs": [
+                {"_id": doc["_id"], "found": doc["_id"] != "missing", "_source": self._source(int(doc["_id"]))}
+                if doc["_id"] != "missing" else {"_id": doc["_id"], "found": False}
+                for doc in body["docs"]]}
+        if path.endswith("_msearch"):
+            searches = [json.loads(line) for line in body.splitlines() if line][1::2]
+            return {"took": 1, "responses": [{"took": 1, "hits": {"hits": [{
+                "_id": str(i), "_score": 1 - i / 100, "_source": self._source(i),
+                "inner_hits": {TensorField.chunks: {"hits": {"hits": [{
+                    "_score": 1 - i / 100,
+                    "_source": {TensorField.field_name: "title", TensorField.field_content: f"title of {i}"}}]}}}
+            } for i in range(search["from"], min(search["from"] + search["size"], self.n_docs))]}}
+                for search in searches]}
+        return {"took": 1, "hits": {"hits": [
+            {"_id": str(i), "_score": 1 - i / 100, "_source": self._source(i)}
+            for i in range(body["from"], min(body["from"] + body["size"], self.n_docs))]}}
+
+    def _search(self, **kwargs) -> dict:
+        return tensor_search.search(config=mock.MagicMock(), index_name=self.index_name, text="a title",
+                                    result_count=20, **kwargs)
+
+    def test_streamed_search_matches_search(self):
+        for search_method in [SearchMethod.TENSOR, SearchMethod.LEXICAL, SearchMethod.HYBRID]:
+            for highlights in [True, False]:
+                expected = self._search(search_method=search_method, highlights=highlights)
+                streamed = self._search(search_method=search_method, highlights=highlights, stream=True)
+                assert not isinstance(streamed["hits"], list)
+                assert list(streamed["hits"]) == expected["hits"]
+                assert len(expected["hits"]) == 20
+
+    def test_streamed_search_formats_hits_as_they_are_consumed(self):
+        for search_method in [SearchMethod.TENSOR, SearchMethod.LEXICAL]:
+            self.cleaned.clear()
+            hits = self._search(search_method=search_method, stream=True)["hits"]
+            assert self.cleaned == []
+            first = next(hits)
+            assert first["_id"] == "0" and TensorField.field_hashes not in first
+            assert len(self.cleaned) == 1
+            assert len(list(hits)) == 19
+
+    def test_streamed_get_documents_by_ids(self):
+        ids = [str(i) for i in range(5)] + ["missing"]
+        expected = tensor_search.get_documents_by_ids(
+            config=mock.MagicMock(), index_name=self.index_name, document_ids=ids)
+        self.mget_bodies.clear()
+        with mock.patch.dict(os.environ, {EnvVars.MARQO_STREAM_GET_BATCH_SIZE: "2"}):
+            streamed = tensor_search.get_documents_by_ids(
+                config=mock.MagicMock(), index_name=self.index_name, document_ids=ids, stream=True)
+        # only the first batch is fetched before the results are consumed
+        assert len(self.mget_bodies) == 1
+        assert list(streamed["results"]) == expected["results"]
+        assert [len(body["docs"]) for body in self.mget_bodies] == [2, 2, 2]
+        assert expected["results"][-1] == {"_id": "missing", TensorField.found: False}
+
+    def test_streamed_get_documents_by_ids_validates_first(self):
+        with self.assertRaises(errors.InvalidArgError):
+            tensor_search.get_documents_by_ids(
+                config=mock.MagicMock(), index_name=self.index_name, document_ids=[], stream=True)
+        assert self.mget_bodies == []
+
+    def test_benchmark(self):
+        """Time to first byte and peak memory of a lexical search of 5,000 large hits, as a
+        JSON response and as a stream. Run with `pytest -s` to see the timings."""
+        self.n_docs = 5000
+        large_source = {"title": "title", "text": "some text " * 200, TensorField.field_hashes: {"title": "hash"}}
+        self._source = lambda i: large_source
+        # don't keep the cleaned docs, so that they don't count towards the peak memory
+        self.patches.pop().stop()
+
+        async def consume(response, first_byte_times: list):
+            async for _ in response.body_iterator:
+                if not first_byte_times:
+                    first_byte_times.append(timer())
+
+        for stream in [False, True]:
+            tracemalloc.start()
+            start = timer()
+            result = tensor_search.search(
+                config=mock.MagicMock(), index_name=self.index_name, text="a title",
+                search_method=SearchMethod.LEXICAL, result_count=self.n_docs, stream=stream)
+            first_byte_times = []
+            if stream:
+                asyncio.run(consume(MarqoNDJSONStreamingResponse(result["hits"]), first_byte_times))
+            else:
+                MarqoJSONResponse(result)
+                first_byte_times.append(timer())
+            total = timer() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"\n{'stream' if stream else 'json'}: first byte {(first_byte_times[0] - start) * 1000:.1f}ms, "
+                  f"total {total * 1000:.1f}ms, peak traced memory {peak / 2 ** 20:.1f}MB")
@@ -1,4 +1,9 @@
+import json
+import time
+import jsonschema
 from marqo.tensor_search import validation
+from marqo.tensor_search import configs
+from marqo.tensor_search.models.settings_object import settings_schema
 from enum import Enum
 from marqo.tensor_search import enums
 import unittest
@@ -249,6 +254,30 @@ class TestValidation(unittest.TestCase):
 
         assert run()
 
+    def test_validate_doc_not_serializable(self):
+        try:
+            validation.validate_doc({"a set": {1, 2}})
+            raise AssertionError
+        except InvalidArgError as e:
+            assert "not serializable" in e.message
+
+    def test_compiled_validators_match_jsonschema(self):
+        """the precompiled validators raise the same errors as jsonschema.validate()"""
+        bad_settings = configs.get_default_index_settings()
+        bad_settings["number_of_shards"] = "five"
+        bad_settings["index_defaults"]["model"] = 5
+        del bad_settings["index_defaults"]["normalize_embeddings"]
+        try:
+            jsonschema.validate(instance=bad_settings, schema=settings_schema)
+            raise AssertionError
+        except jsonschema.ValidationError as e:
+            expected_message = str(e)
+        try:
+            validation.validate_settings_object(bad_settings)
+            raise AssertionError
+        except InvalidArgError as e:
+            assert expected_message in e.message
+
     def test_index_name_validation(self):
         assert "my-index-name" == validation.validate_index_name("my-index-name")
         bad_names = ['.opendistro_security', 'security-auditlog-', 'security-auditlog-100']
@@ -492,6 +521,26 @@ class TestValidateIndexSettings(unittest.TestCase):
         settings['index_defaults']['image_preprocessing']["path_method"] = "frcnn"
         assert settings == validation.validate_settings_object(settings)
 
+    def test_validate_index_settings_filterable_fields(self):
+        settings = self.get_good_index_settings()
+        for good in [None, [], ["colour", "price"]]:
+            settings['index_defaults']['filterable_fields'] = good
+            assert settings == validation.validate_settings_object(settings)
+        for bad in ["colour", [1, 2], ["colour", "colour"], {"colour": True}]:
+            settings['index_defaults']['filterable_fields'] = bad
+            try:
+                validation.validate_settings_object(settings)
+                raise AssertionError
+            except InvalidArgError:
+                pass
+        for bad_field_name in ["__chunks", "__vector_colour", ""]:
+            settings['index_defaults']['filterable_fields'] = ["colour", bad_field_name]
+            try:
+                validation.validate_settings_object(settings)
+                raise AssertionError
+            except InvalidFieldNameError:
+                pass
+
     def test_validate_index_settings_misplaced_fields(self):
         bad_settings = [
             {
@@ -1130,4 +1179,45 @@ class TestValidateIndexSettings(unittest.TestCase):
         ]
 
         for valid_custom_score_fields in valid_custom_score_fields_list:
-            validation.validate_score_modifiers_object(valid_custom_score_fields)
\ No newline at end of file
+            validation.validate_score_modifiers_object(valid_custom_score_fields)
+
+
+class TestValidationBenchmark(unittest.TestCase):
+    """Reports how long validate_doc takes for 10,000 docs. Run with `pytest -s` to see the report."""
+
+    def test_validate_doc_benchmark(self):
+        docs = [{
+            "_id": str(i),
+            "title": f"The title of document number {i}",
+            "description": "Some long description of the document, with a bit of unicode: é. " * 20,
+            "price": i * 1.5,
+            "in stock": i % 2 == 0,
+            "tags": ["tag1", "tag2", "tag3"],
+        } for i in range(10000)]
+
+        # the previous way of sizing docs
+        t0 = time.perf_counter()
+        for doc in docs:
+            len(json.dumps(doc))
+        json_dumps_time = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        for doc in docs:
+            validation.validate_doc(doc)
+        validate_doc_time = time.perf_counter() - t0
+
+        settings = configs.get_default_index_settings()
+        t0 = time.perf_counter()
+        for _ in range(1000):
+            jsonschema.validate(instance=settings, schema=settings_schema)
+        jsonschema_validate_time = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        for _ in range(1000):
+            validation.validate_settings_object(settings)
+        compiled_validate_time = time.perf_counter() - t0
+
+        print(f"\n10,000 docs: json.dumps sizing {json_dumps_time * 1000:.1f}ms, "
+              f"validate_doc {validate_doc_time * 1000:.1f}ms"
+              f"\n1,000 index settings: jsonschema.validate {jsonschema_validate_time * 1000:.1f}ms, "
+              f"precompiled validator {compiled_validate_time * 1000:.1f}ms")